@@ -1,14 +1,212 @@
-from fastapi import APIRouter, Form, File, UploadFile, HTTPException
-import traceback
-from app.schemas.dto import AnalyzeResponse
+from fastapi import APIRouter, Form, File, UploadFile, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from pydantic import TypeAdapter, ValidationError
+from typing import List, Union
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from app import metrics
+from app.clients.backends import preload_backend_modules
+from app.clients.hedged_client import HedgedLLMClient
+from app.logging_config import dropped_logs
+from app.schemas.dto import AnalyzeResponse, BatchAnalyzeResponse, BatchEmail, BatchItemResult, JobResponse
 from app.services.analyzer_service import EmailAnalyzerService
+from app.services.job_queue import JobQueue
+from app.services.local_classifier import preload_local_classifier
+from app.shared_state import get_shared_state
+from app.utils.file_reader import MultipartFileStream
+from app.utils.mime_reader import MboxReader
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-analyzer = EmailAnalyzerService()
+# Criado no warm-up (start_warmup, chamado no lifespan em app/main.py) e não no import:
+# o SDK da OpenAI, o modelo local e o cache carregam enquanto o health já responde
+analyzer: EmailAnalyzerService | None = None
+jobs = JobQueue()
+_warmup: asyncio.Future | None = None
+_warmup_error: str | None = None
+
+# Quantidade máxima de emails aceitos em um lote
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 100))
+
+# Intervalo entre as publicações das métricas de cada worker no estado compartilhado
+METRICS_PUBLISH_SECONDS = float(os.getenv("METRICS_PUBLISH_SECONDS", 5))
+
+_batch_emails_adapter = TypeAdapter(List[Union[BatchEmail, str]])
+
+def start_warmup() -> asyncio.Future:
+  """Inicia (uma vez) a criação do serviço de análise fora do event loop"""
+  global _warmup
+  if _warmup is None:
+    _warmup = asyncio.ensure_future(_build_analyzer())
+  return _warmup
+
+
+async def get_analyzer() -> EmailAnalyzerService:
+  """Serviço de análise; durante o warm-up espera ele terminar"""
+  if analyzer is not None:
+    return analyzer
+  try:
+    return await asyncio.shield(start_warmup())
+  except Exception:
+    raise HTTPException(
+      status_code=503,
+      detail=f"Serviço de análise indisponível: {_warmup_error}"
+    )
+
+
+async def _build_analyzer() -> EmailAnalyzerService:
+  global analyzer, _warmup_error
+  start = time.perf_counter()
+  try:
+    service = await run_in_threadpool(EmailAnalyzerService)
+  except Exception as e:
+    _warmup_error = str(e)
+    logger.error("Falha no warm-up do serviço de análise: %s: %s", type(e).__name__, e)
+    raise
+  analyzer = service
+  jobs.start(service)
+  logger.info("Serviço de análise pronto em %.2fs", time.perf_counter() - start)
+  return service
+
+
+def publish_metrics() -> None:
+  """Publica os valores deste worker no estado compartilhado (sem SHARED_STATE_PATH, nada a fazer)"""
+  state = get_shared_state()
+  if state is not None:
+    state.publish_metrics(metrics.REGISTRY.snapshot())
+
+
+async def publish_metrics_periodically() -> None:
+  """Com vários workers, a coleta em um deles vê os demais com até METRICS_PUBLISH_SECONDS de atraso"""
+  while True:
+    await asyncio.sleep(METRICS_PUBLISH_SECONDS)
+    try:
+      await run_in_threadpool(publish_metrics)
+    except sqlite3.Error as e:
+      logger.warning("Falha ao publicar as métricas no estado compartilhado: %s", e)
+
+
+def preload_shared() -> None:
+  """
+  Chamado no processo mestre do gunicorn antes do fork (gunicorn.conf.py):
+  carrega o que os workers só leem (SDK do LLM, modelo local), que passa a
+  ocupar páginas de memória compartilhadas entre eles.
+  """
+  preload_backend_modules()
+  preload_local_classifier()
+
+
+def _from_analyzer(read):
+  """Valor lido do serviço na coleta das métricas (0 enquanto o warm-up não termina)"""
+  return lambda: read(analyzer) if analyzer is not None else 0
+
+
+def _from_llm(read):
+  """Como _from_analyzer, lido do backend do LLM (0 se ele não tiver o componente, ex.: heuristic)"""
+  def collect():
+    try:
+      return read(analyzer.ai_client) if analyzer is not None else 0
+    except AttributeError:
+      return 0
+  return collect
+
+
+def _llm_stats(name: str, read):
+  """Seção do health lida do backend do LLM; None se ele não tiver o componente"""
+  component = getattr(analyzer.ai_client, name, None)
+  return read(component) if component is not None else None
+
+
+# Contadores mantidos pelo serviço, lidos na hora da coleta
+_CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+for _metric in (
+    metrics.CallbackMetric(
+        "email_analyzer_cache_hits_total", "Análises respondidas pelo cache",
+        _from_analyzer(lambda service: service.cache.stats()["hits"]), type="counter"
+    ),
+    metrics.CallbackMetric(
+        "email_analyzer_cache_misses_total", "Análises não encontradas no cache",
+        _from_analyzer(lambda service: service.cache.stats()["misses"]), type="counter"
+    ),
+    metrics.CallbackMetric(
+        "email_analyzer_llm_calls_coalesced_total", "Chamadas ao LLM compartilhadas por requisições idênticas",
+        _from_analyzer(lambda service: service.single_flight.coalesced), type="counter"
+    ),
+    metrics.CallbackMetric(
+        "email_analyzer_near_duplicate_hits_total", "Análises reaproveitadas de emails quase duplicados sem chamar o LLM",
+        _from_analyzer(lambda service: service.near_duplicates.hits), type="counter"
+    ),
+    metrics.CallbackMetric(
+        "email_analyzer_local_tier_served_total", "Análises respondidas pelo modelo local sem chamar o LLM",
+        _from_analyzer(lambda service: service.local_tier.local), type="counter"
+    ),
+    metrics.CallbackMetric(
+        "email_analyzer_llm_circuit_state", "Estado do circuit breaker do LLM (0=closed, 1=half_open, 2=open)",
+        _from_llm(lambda client: _CIRCUIT_STATE_VALUES[client.breaker.state.value]), aggregate="max"
+    ),
+    metrics.CallbackMetric(
+        "email_analyzer_llm_rate_limited_total", "Respostas 429 recebidas do LLM",
+        _from_llm(lambda client: client.limiter.rate_limited), type="counter"
+    ),
+    metrics.CallbackMetric(
+        "email_analyzer_llm_latency_budget_exceeded_total", "Análises que desistiram da fila do limitador de taxa",
+        _from_llm(lambda client: client.limiter.rejected), type="counter"
+    ),
+    metrics.CallbackMetric(
+        "email_analyzer_llm_rate_limit_waiting", "Chamadas ao LLM aguardando o limitador de taxa",
+        _from_llm(lambda client: client.limiter.stats()["waiting"])
+    ),
+    metrics.CallbackMetric(
+        "email_analyzer_jobs_queued", "Jobs aguardando processamento",
+        # Todos os workers leem a mesma fila: o valor não soma
+        lambda: jobs.stats()["queued"], aggregate="max"
+    ),
+    metrics.CallbackMetric(
+        "email_analyzer_logs_dropped_total", "Registros de log descartados com a fila de escrita cheia",
+        dropped_logs, type="counter"
+    ),
+):
+    metrics.REGISTRY.register(_metric)
 
 @router.get("/health")
 def health():
-    return {"status": "ok"}
+    # Responde já durante o warm-up: "starting" até o serviço ficar pronto
+    if analyzer is None:
+        if _warmup_error is not None:
+            return JSONResponse(
+                status_code=503,
+                content={"status": "error", "detail": _warmup_error}
+            )
+        return {"status": "starting", "jobs": jobs.stats()}
+    return {
+        "status": "ok",
+        "cache": analyzer.cache.stats(),
+        "single_flight": analyzer.single_flight.stats(),
+        "near_duplicate": analyzer.near_duplicates.stats(),
+        "local_tier": analyzer.local_tier.stats(),
+        "micro_batch": analyzer.batcher.stats(),
+        "llm_circuit": _llm_stats("breaker", lambda breaker: breaker.snapshot()),
+        "llm_rate_limit": _llm_stats("limiter", lambda limiter: limiter.stats()),
+        "llm_hedge": analyzer.ai_client.stats() if isinstance(analyzer.ai_client, HedgedLLMClient) else None,
+        "jobs": jobs.stats()
+    }
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métricas no formato texto do Prometheus (somadas entre os workers, com estado compartilhado)"""
+    state = get_shared_state()
+    if state is None:
+        return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+    publish_metrics()
+    return PlainTextResponse(metrics.REGISTRY.render(state.metric_snapshots()), media_type=metrics.CONTENT_TYPE)
 
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(
@@ -16,7 +214,7 @@ async def analyze(
    file: UploadFile | None = File(default=None)
 ):
   """
-  Analisa um email enviado como texto ou arquivo (.txt ou .pdf)
+  Analisa um email enviado como texto ou arquivo (.txt, .pdf ou .eml)
   """
 
   if file is not None and not getattr(file, "filename", None):
@@ -28,9 +226,10 @@ async def analyze(
   if not text_valid and file is None:
      raise HTTPException(
         status_code=400,
-        detail="Envie um texto ou um arquivo (em .pdf ou .txt) para a análise do email"
+        detail="Envie um texto ou um arquivo (em .pdf, .txt ou .eml) para a análise do email"
      )
   
+  analyzer = await get_analyzer()
   try:
      return await analyzer.analyze(text=text, file=file)
   
@@ -38,8 +237,334 @@ async def analyze(
      raise
 
   except Exception as e:
-   traceback.print_exc()
+   logger.exception("Erro ao processar a mensagem do email")
    raise HTTPException(
         status_code=500,
         detail=f"Erro ao processar a mensagem do email: {str(e)}"
    )
+
+
+@router.post(
+  "/analyze/stream",
+  response_class=StreamingResponse,
+  responses={200: {
+    "content": {"text/event-stream": {}},
+    "description": "Eventos category, delta (trechos da resposta sugerida) e result (AnalyzeResponse)"
+  }}
+)
+async def analyze_stream(
+   text: str | None = Form(default=None),
+   file: UploadFile | None = File(default=None)
+):
+  """
+  Mesma análise do /api/analyze, em server-sent events.
+
+  `category` chega assim que o modelo decide a categoria, seguido de um
+  `delta` por trecho da resposta sugerida conforme é gerada. O último
+  evento, `result`, traz a análise completa (validada) e prevalece sobre
+  os anteriores: se o LLM falhar no meio, ele traz o fallback.
+  Erros de entrada respondem 400 antes do stream começar; erros depois
+  disso chegam como evento `error`.
+  """
+
+  if file is not None and not getattr(file, "filename", None):
+     file = None
+
+  if not (text and text.strip()) and file is None:
+     raise HTTPException(
+        status_code=400,
+        detail="Envie um texto ou um arquivo (em .pdf, .txt ou .eml) para a análise do email"
+     )
+
+  analyzer = await get_analyzer()
+  events = await analyzer.analyze_events(text=text, file=file)
+
+  async def sse():
+    try:
+      async for kind, value in events:
+        if kind == "category":
+          data = json.dumps({"category": value.value})
+        elif kind == "delta":
+          data = json.dumps({"text": value}, ensure_ascii=False)
+        else:
+          data = value.model_dump_json()
+        yield f"event: {kind}\ndata: {data}\n\n"
+    except Exception as e:
+      logger.error("Erro durante análise em streaming: %s: %s", type(e).__name__, e, exc_info=True)
+      yield f"event: error\ndata: {json.dumps({'detail': f'Erro ao processar: {str(e)}'}, ensure_ascii=False)}\n\n"
+
+  return StreamingResponse(
+    sse(),
+    media_type="text/event-stream",
+    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+  )
+
+
+@router.post(
+  "/analyze/batch",
+  response_model=BatchAnalyzeResponse,
+  openapi_extra={
+    "requestBody": {
+      "required": True,
+      "content": {
+        "application/json": {
+          "schema": {
+            "type": "array",
+            "items": {
+              "anyOf": [
+                {"$ref": "#/components/schemas/BatchEmail"},
+                {"type": "string"}
+              ]
+            }
+          }
+        },
+        "multipart/form-data": {
+          "schema": {
+            "type": "object",
+            "properties": {
+              "files": {"type": "array", "items": {"type": "string", "format": "binary"}}
+            }
+          }
+        }
+      }
+    }
+  }
+)
+async def analyze_batch(request: Request):
+  """
+  Analisa vários emails em uma única requisição.
+
+  Aceita um array JSON de emails (strings ou objetos com `id` e `text`)
+  ou multipart/form-data com vários arquivos (.txt, .pdf ou .eml) no campo `files`.
+  Os resultados (ou erros) de cada item voltam na ordem de entrada.
+  """
+  analyzer = await get_analyzer()
+  content_type = request.headers.get("content-type", "")
+
+  if content_type.startswith("multipart/form-data"):
+    async with request.form(max_files=BATCH_MAX_ITEMS) as form:
+      files = [
+        f for f in form.getlist("files")
+        if not isinstance(f, str) and getattr(f, "filename", None)
+      ]
+      ids = [f.filename for f in files]
+      _validate_batch_size(len(files))
+      results = await analyzer.analyze_batch([(None, f) for f in files])
+  else:
+    try:
+      payload = _batch_emails_adapter.validate_json(await request.body())
+    except ValidationError as e:
+      raise RequestValidationError([
+        {**error, "loc": ("body", *error["loc"])}
+        for error in e.errors(include_url=False, include_context=False, include_input=False)
+      ])
+
+    emails = [BatchEmail(text=e) if isinstance(e, str) else e for e in payload]
+    ids = [e.id for e in emails]
+    _validate_batch_size(len(emails))
+    results = await analyzer.analyze_batch([(e.text, None) for e in emails])
+
+  items = []
+  for index, (item_id, outcome) in enumerate(zip(ids, results)):
+    if isinstance(outcome, HTTPException):
+      items.append(BatchItemResult(
+        index=index,
+        id=item_id,
+        ok=False,
+        status_code=outcome.status_code,
+        detail=str(outcome.detail)
+      ))
+    else:
+      items.append(BatchItemResult(index=index, id=item_id, ok=True, result=outcome))
+
+  succeeded = sum(1 for item in items if item.ok)
+  return BatchAnalyzeResponse(
+    total=len(items),
+    succeeded=succeeded,
+    failed=len(items) - succeeded,
+    results=items
+  )
+
+
+@router.post(
+  "/analyze/mbox",
+  response_class=StreamingResponse,
+  responses={200: {"content": {"application/x-ndjson": {}}, "description": "Um BatchItemResult (JSON) por linha"}},
+  openapi_extra={
+    "requestBody": {
+      "required": True,
+      "content": {
+        "multipart/form-data": {
+          "schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}}
+          }
+        }
+      }
+    }
+  }
+)
+async def analyze_mbox(request: Request):
+  """
+  Analisa cada mensagem de uma exportação mbox (campo `file`).
+
+  A resposta é NDJSON: uma linha por mensagem, no formato de item do lote
+  (`id` é o Message-ID), enviada assim que a mensagem é analisada.
+  O upload é lido conforme chega: as primeiras mensagens são analisadas
+  (e respondidas) enquanto o resto do arquivo ainda está sendo enviado,
+  e o tamanho do mbox não afeta a memória.
+  """
+  analyzer = await get_analyzer()
+  upload = MultipartFileStream(request, "file")
+  if not await upload.open():
+    raise HTTPException(
+      status_code=400,
+      detail="Envie o arquivo .mbox no campo file"
+    )
+  body_read = asyncio.Event()
+
+  async def messages():
+    reader = MboxReader()
+    try:
+      async for chunk in upload.chunks():
+        # Parsing (base64, HTML) fora do event loop, um bloco recebido por vez
+        for message in await run_in_threadpool(reader.feed, chunk):
+          yield message
+    finally:
+      body_read.set()
+    for message in await run_in_threadpool(reader.close):
+      yield message
+
+  async def ndjson():
+    index = 0
+    try:
+      async for message, outcome in analyzer.analyze_stream(messages()):
+        if isinstance(outcome, HTTPException):
+          item = BatchItemResult(
+            index=index,
+            id=message.message_id or None,
+            ok=False,
+            status_code=outcome.status_code,
+            detail=str(outcome.detail)
+          )
+        else:
+          item = BatchItemResult(index=index, id=message.message_id or None, ok=True, result=outcome)
+        index += 1
+        yield item.model_dump_json() + "\n"
+    except HTTPException as exc:
+      # Upload interrompido depois do início da resposta (ex.: 413 do limite de
+      # tamanho, multipart malformado): vira o último item, sem id
+      logger.warning("Upload de mbox interrompido na mensagem %d: %s", index, exc.detail)
+      item = BatchItemResult(index=index, ok=False, status_code=exc.status_code, detail=str(exc.detail))
+      yield item.model_dump_json() + "\n"
+    except ClientDisconnect:
+      logger.info("Cliente desconectou durante o upload do mbox (%d mensagens respondidas)", index)
+
+  return _UploadStreamingResponse(ndjson(), body_read, media_type="application/x-ndjson")
+
+
+class _UploadStreamingResponse(StreamingResponse):
+  """
+  StreamingResponse que responde enquanto o corpo da requisição ainda chega.
+  O StreamingResponse padrão lê o receive() para notar a desconexão e
+  consumiria os pedaços do upload; aqui isso só começa depois que o corpo
+  foi lido (até lá, request.stream() já acusa a desconexão).
+  """
+
+  def __init__(self, content, body_read: asyncio.Event, **kwargs):
+    super().__init__(content, **kwargs)
+    self._body_read = body_read
+
+  async def listen_for_disconnect(self, receive) -> None:
+    await self._body_read.wait()
+    await super().listen_for_disconnect(receive)
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(
+   text: str | None = Form(default=None),
+   file: UploadFile | None = File(default=None)
+):
+  """
+  Enfileira a análise de um email (texto ou arquivo .txt, .pdf ou .eml) e responde na hora.
+
+  Indicado para arquivos grandes: a extração e a chamada ao LLM rodam em
+  segundo plano. Acompanhe por GET /api/jobs/{id} ou pelo stream
+  GET /api/jobs/{id}/events.
+  """
+  if file is not None and not getattr(file, "filename", None):
+     file = None
+
+  if not (text and text.strip()) and file is None:
+     raise HTTPException(
+        status_code=400,
+        detail="Envie um texto ou um arquivo (em .pdf, .txt ou .eml) para a análise do email"
+     )
+
+  job = await jobs.submit(text=text, file=file)
+  return JSONResponse(
+    status_code=202,
+    content=JobResponse(**job).model_dump(mode="json"),
+    headers={"Location": f"/api/jobs/{job['id']}"}
+  )
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str):
+  """
+  Consulta o estado de um job; `result` é preenchido quando o status é done
+  """
+  return JobResponse(**_get_job(job_id))
+
+
+@router.get(
+  "/jobs/{job_id}/events",
+  response_class=StreamingResponse,
+  responses={200: {"content": {"text/event-stream": {}}, "description": "Um evento por mudança de status do job"}}
+)
+async def job_events(job_id: str):
+  """
+  Stream (server-sent events) com o job a cada mudança de status.
+
+  O nome do evento é o status (queued, running, done ou failed) e `data`
+  traz o job em JSON. O stream termina em done ou failed.
+  """
+  await run_in_threadpool(_get_job, job_id)
+
+  async def events():
+    async for job in jobs.watch(job_id):
+      if job is None:
+        yield ": ping\n\n"
+      else:
+        yield f"event: {job['status']}\ndata: {JobResponse(**job).model_dump_json()}\n\n"
+
+  return StreamingResponse(
+    events(),
+    media_type="text/event-stream",
+    # X-Accel-Buffering: o nginx repassa cada evento sem acumular
+    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+  )
+
+
+def _get_job(job_id: str) -> dict:
+  job = jobs.get(job_id)
+  if job is None:
+    raise HTTPException(
+      status_code=404,
+      detail="Job não encontrado (ou expirado)"
+    )
+  return job
+
+
+def _validate_batch_size(size: int) -> None:
+  if size == 0:
+    raise HTTPException(
+      status_code=400,
+      detail="Envie ao menos um email (texto ou arquivo) no lote"
+    )
+  if size > BATCH_MAX_ITEMS:
+    raise HTTPException(
+      status_code=400,
+      detail=f"Lote muito grande. Máximo de {BATCH_MAX_ITEMS} emails por requisição"
+    )
@@ -0,0 +1,389 @@
+"""
+Linha de comando do Email Analyzer.
+
+bulk: classifica em massa emails arquivados (.txt, .pdf, .eml e .mbox)
+sem passar pela API. A listagem dos arquivos e a separação dos mbox rodam
+numa thread; extração, redução e pré-processamento rodam num pool
+de processos; as classificações rodam no event loop com concorrência
+limitada, pelo mesmo EmailAnalyzerService da API (cache, modelo local,
+limitador de taxa com prioridade de processamento em massa, fallback). Os resultados são gravados aos poucos em
+JSONL ou Parquet e os ids concluídos vão para um checkpoint: uma execução
+interrompida continua de onde parou.
+
+Uso:
+    python -m app.cli bulk arquivo/ --out resultados.jsonl --workers 8 --concurrency 64 --rpm 3000
+    python -m app.cli bulk caixa.mbox --out resultados/ --format parquet
+    python -m app.cli bulk arquivo/ --out resultados.jsonl --fallback-only   # sem rede (heurística)
+"""
+
+import argparse
+import asyncio
+import glob
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+from fastapi import HTTPException
+
+from app.clients.backends import build_llm_client
+from app.clients.hedged_client import HedgedLLMClient
+from app.clients.llm_client import HeuristicLLMClient
+from app.services.analyzer_service import EmailAnalyzerService
+from app.utils.file_reader import read_file_text
+from app.utils.mime_reader import iter_chunks, iter_mbox
+from app.utils.text_preprocessor import preprocess_text
+from app.utils.text_reducer import reduce_email
+
+SUPPORTED_EXTENSIONS = (".txt", ".pdf", ".eml", ".mbox")
+
+# Saída e checkpoint são persistidos a cada N resultados ou T segundos
+FLUSH_EVERY = 500
+FLUSH_SECONDS = 5.0
+
+RECORD_FIELDS = (
+    "id", "message_id", "category", "confidence", "suggested_reply",
+    "fallback", "status_code", "error", "latency_ms",
+)
+
+
+class JsonlWriter:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """Cada flush grava um arquivo part-*.parquet no diretório de saída (requer pyarrow)"""
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Saída em Parquet requer o pyarrow: pip install pyarrow")
+        self._pa, self._pq = pyarrow, pyarrow.parquet
+        self._schema = pyarrow.schema([
+            ("id", pyarrow.string()), ("message_id", pyarrow.string()),
+            ("category", pyarrow.string()), ("confidence", pyarrow.float64()),
+            ("suggested_reply", pyarrow.string()), ("fallback", pyarrow.bool_()),
+            ("status_code", pyarrow.int32()), ("error", pyarrow.string()),
+            ("latency_ms", pyarrow.float64()),
+        ])
+        os.makedirs(path, exist_ok=True)
+        # Nome único por execução: retomar não sobrescreve as partes anteriores
+        self._prefix = os.path.join(path, f"part-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}")
+        self._rows: list = []
+        self._parts = 0
+
+    def write(self, record: dict) -> None:
+        self._rows.append(record)
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        table = self._pa.Table.from_pylist(self._rows, schema=self._schema)
+        self._pq.write_table(table, f"{self._prefix}-{self._parts:05d}.parquet")
+        self._rows = []
+        self._parts += 1
+
+    def close(self) -> None:
+        self.flush()
+
+
+def iter_sources(source: str) -> Iterator[str]:
+    """Arquivos suportados do diretório (recursivo, em ordem estável) ou o próprio arquivo"""
+    if os.path.isfile(source):
+        yield source
+        return
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def iter_items(source: str) -> Iterator[tuple]:
+    """
+    (id, caminho, Message-ID, texto) de cada email. Em arquivos avulsos o
+    texto é None (lido no pool); mensagens de mbox já vêm extraídas e o id
+    é "<arquivo>#<posição>".
+    """
+    root = os.path.dirname(source) if os.path.isfile(source) else source
+    for path in iter_sources(source):
+        relative = os.path.relpath(path, root)
+        if path.lower().endswith(".mbox"):
+            with open(path, "rb") as f:
+                for index, message in enumerate(iter_mbox(iter_chunks(f))):
+                    yield f"{relative}#{index}", path, message.message_id, message.text
+        else:
+            yield relative, path, "", None
+
+
+def prepare_item(path: str, text: str | None) -> tuple[str | None, int | None, str | None]:
+    """
+    Roda nos processos do pool: extração (se preciso), redução e pré-processamento.
+    Retorna (conteúdo, None, None) ou (None, status_code, detalhe do erro).
+    """
+    try:
+        if text is None:
+            text = read_file_text(path)
+        content = preprocess_text(reduce_email(text))
+    except HTTPException as exc:
+        return None, exc.status_code, str(exc.detail)
+    except Exception as e:
+        return None, 500, f"{type(e).__name__}: {e}"
+    if not content:
+        return None, 400, "Conteúdo do email está vazio"
+    return content, None, None
+
+
+def prepare_chunk(chunk: list[tuple[str, str | None]]) -> list[tuple]:
+    """Um envio ao pool por bloco de emails: a troca entre processos custa mais que um email curto"""
+    return [prepare_item(path, text) for path, text in chunk]
+
+
+class Checkpoint:
+    """
+    Ids já gravados na saída. O arquivo é só de acréscimo (um JSON por linha) e
+    é a fonte da verdade; o índice SQLite ao lado (<checkpoint>.index) responde
+    "já foi?" sem carregar milhões de ids na memória. O índice guarda até que
+    byte do arquivo já foi indexado: ao abrir, indexa o que faltou (execução
+    interrompida entre as duas escritas) ou reconstrói tudo se sumiu.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "ab")
+        # Consultado pela thread que lista as origens e gravado pelo event loop
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"{path}.index", check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS done (id TEXT PRIMARY KEY) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+        )
+        self._catch_up(path)
+
+    def _catch_up(self, path: str) -> None:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'offset'").fetchone()
+        offset = row[0] if row else 0
+        if offset > os.path.getsize(path):
+            # Arquivo recriado por fora: o índice não vale mais
+            self._conn.execute("DELETE FROM done")
+            offset = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while lines := f.readlines(1 << 20):
+                if not lines[-1].endswith(b"\n"):
+                    # Linha incompleta no fim (queda no meio da escrita): descartada, o item é refeito
+                    self._file.truncate(offset + sum(map(len, lines[:-1])))
+                    lines.pop()
+                offset += sum(map(len, lines))
+                self._index([json.loads(line) for line in lines if line.strip()], offset)
+        self._conn.commit()
+
+    def _index(self, ids: list, offset: int) -> None:
+        self._conn.executemany("INSERT OR IGNORE INTO done (id) VALUES (?)", ((item_id,) for item_id in ids))
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('offset', ?)", (offset,))
+
+    def __contains__(self, item_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM done WHERE id = ?", (item_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM done").fetchone()[0]
+
+    def add(self, ids: list) -> None:
+        """Arquivo primeiro: se o índice ficar para trás, a próxima abertura completa"""
+        if not ids:
+            return
+        with self._lock:
+            self._file.write("".join(json.dumps(item_id, ensure_ascii=False) + "\n" for item_id in ids).encode("utf-8"))
+            self._file.flush()
+            self._index(ids, self._file.tell())
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+            self._conn.close()
+
+
+async def run_bulk(args) -> dict:
+    if args.fallback_only:
+        ai_client = HeuristicLLMClient()
+    else:
+        ai_client = build_llm_client(model=args.model)
+    if hasattr(ai_client, "limiter"):
+        # Os cabeçalhos x-ratelimit-* da API corrigem estes limites durante a execução
+        ai_client.limiter.set_limits(rpm=args.rpm, tpm=args.tpm)
+    service = EmailAnalyzerService(ai_client=ai_client)
+
+    checkpoint_path = args.checkpoint or f"{args.out.rstrip(os.sep)}.checkpoint"
+    if args.restart:
+        _remove_outputs(args.out, args.format, checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+    if done := len(checkpoint):
+        print(f"Retomando: {done} emails já concluídos em {checkpoint_path}", file=sys.stderr)
+
+    # Gerador consumido só pela thread do produtor: os.walk e a separação do mbox não travam o event loop
+    items = (item for item in iter_items(args.source) if item[0] not in checkpoint)
+    if args.limit:
+        items = itertools.islice(items, args.limit)
+
+    writer = ParquetWriter(args.out) if args.format == "parquet" else JsonlWriter(args.out)
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    loop = asyncio.get_running_loop()
+    concurrency = max(1, args.concurrency)
+    # Limita os itens preparados em memória à espera do LLM
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.workers * args.chunk_size * 2)
+
+    stats = {"processed": 0, "ok": 0, "errors": 0, "fallback": 0}
+    completed: list = []
+    started = last_flush = time.perf_counter()
+
+    def flush() -> None:
+        nonlocal last_flush
+        # Checkpoint só depois da saída: no pior caso um item sai duplicado, nunca perdido
+        writer.flush()
+        checkpoint.add(completed)
+        completed.clear()
+        last_flush = time.perf_counter()
+        rate = stats["processed"] / (last_flush - started) if last_flush > started else 0.0
+        print(f"  {stats['processed']} emails ({rate:.0f}/s), {stats['errors']} erros, "
+              f"{stats['fallback']} fallback", file=sys.stderr)
+
+    async def produce() -> None:
+        try:
+            while chunk := await loop.run_in_executor(None, list, itertools.islice(items, args.chunk_size)):
+                future = loop.run_in_executor(pool, prepare_chunk, [(path, text) for _, path, _, text in chunk])
+                for index, (item_id, path, message_id, _) in enumerate(chunk):
+                    await queue.put((item_id, path, message_id, future, index))
+        finally:
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    async def consume() -> None:
+        while (entry := await queue.get()) is not None:
+            item_id, path, message_id, future, index = entry
+            start = time.perf_counter()
+            record = dict.fromkeys(RECORD_FIELDS)
+            record.update(id=item_id, message_id=message_id or None)
+            try:
+                # shield: o bloco é compartilhado pelos emails dele; o timeout de um não cancela os outros
+                prepared = await asyncio.wait_for(asyncio.shield(future), args.item_timeout)
+                content, status_code, detail = prepared[index]
+                if content is None:
+                    record.update(status_code=status_code, error=detail)
+                else:
+                    input_type = os.path.splitext(path)[1].lstrip(".").lower()
+                    resp = await service.analyze_prepared(content, input_type)
+                    record.update(
+                        category=resp.category.value,
+                        confidence=resp.confidence,
+                        suggested_reply=resp.suggested_reply,
+                        fallback=resp.fallback,
+                    )
+            except asyncio.TimeoutError:
+                record.update(status_code=504, error=f"Tempo limite excedido ({args.item_timeout:.0f}s)")
+            except Exception as e:
+                record.update(status_code=500, error=f"{type(e).__name__}: {e}")
+            record["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+            writer.write(record)
+            stats["processed"] += 1
+            if record["error"] is None:
+                stats["ok"] += 1
+                stats["fallback"] += bool(record["fallback"])
+            else:
+                stats["errors"] += 1
+            # Todo registro gravado entra no checkpoint, inclusive erros: retomar não duplica a saída
+            completed.append(item_id)
+            if len(completed) >= FLUSH_EVERY or time.perf_counter() - last_flush >= FLUSH_SECONDS:
+                flush()
+
+    try:
+        await asyncio.gather(produce(), *(consume() for _ in range(concurrency)))
+    finally:
+        flush()
+        writer.close()
+        checkpoint.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+        await ai_client.aclose()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **stats,
+        "elapsed_seconds": round(elapsed, 2),
+        "emails_per_second": round(stats["processed"] / elapsed, 1) if elapsed else 0.0,
+        "cache": service.cache.stats(),
+        "near_duplicate": service.near_duplicates.stats(),
+        "local_tier": service.local_tier.stats(),
+        "micro_batch": service.batcher.stats(),
+        "llm_rate_limit": ai_client.limiter.stats() if hasattr(ai_client, "limiter") else None,
+        "llm_hedge": ai_client.stats() if isinstance(ai_client, HedgedLLMClient) else None,
+    }
+
+
+def _remove_outputs(out: str, output_format: str, checkpoint_path: str) -> None:
+    paths = glob.glob(os.path.join(out, "part-*.parquet")) if output_format == "parquet" else [out]
+    for path in [*paths, checkpoint_path, f"{checkpoint_path}.index"]:
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bulk = commands.add_parser("bulk", help="Classifica em massa um diretório de emails ou um mbox")
+    bulk.add_argument("source", help="Diretório (recursivo) ou arquivo .txt/.pdf/.eml/.mbox")
+    bulk.add_argument("--out", required=True, help="Arquivo .jsonl ou diretório de saída (Parquet)")
+    bulk.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    bulk.add_argument("--checkpoint", help="Ids concluídos (padrão: <out>.checkpoint, com índice em <checkpoint>.index)")
+    bulk.add_argument("--restart", action="store_true", help="Descarta saída e checkpoint existentes")
+    bulk.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                      help="Processos de extração e pré-processamento")
+    bulk.add_argument("--chunk-size", type=int, default=32, help="Emails por envio ao pool de processos")
+    bulk.add_argument("--concurrency", type=int, default=32, help="Classificações em andamento")
+    bulk.add_argument("--rpm", type=float, help="Limite inicial de chamadas ao LLM por minuto (padrão: LLM_RPM_LIMIT)")
+    bulk.add_argument("--tpm", type=float, help="Limite inicial de tokens por minuto (padrão: LLM_TPM_LIMIT)")
+    bulk.add_argument("--item-timeout", type=float, default=120, help="Tempo máximo de preparo de um bloco (s)")
+    bulk.add_argument("--limit", type=int, help="Processa no máximo N emails nesta execução")
+    bulk.add_argument("--model", help="Modelo do backend principal (padrão: LLM_MODEL)")
+    bulk.add_argument("--fallback-only", action="store_true", help="Sem rede: usa só a heurística de keywords")
+    bulk.add_argument("--log-level", default="ERROR", help="Nível de log do pipeline (padrão: ERROR)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper())
+    if not os.path.exists(args.source):
+        parser.error(f"Origem não encontrada: {args.source}")
+    try:
+        summary = asyncio.run(run_bulk(args))
+    except KeyboardInterrupt:
+        print("\nInterrompido. Rode de novo com o mesmo --out para continuar.", file=sys.stderr)
+        sys.exit(130)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
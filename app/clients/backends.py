@@ -0,0 +1,81 @@
+"""
+Backends de LLM plugáveis.
+
+Todo backend segue o LLMBackend: model e analyze/analyze_async/
+analyze_many_async/analyze_stream_async devolvendo o dict de análise
+(com fallback=True quando quem respondeu foi a heurística). Tipos:
+
+- openai: OpenAILLMClient (Responses API)
+- compatible: OpenAICompatibleLLMClient, qualquer servidor com a API de
+  Chat Completions (vLLM, llama.cpp, Ollama, um stub local)
+- heuristic: HeuristicLLMClient, só a heurística de keywords, sem rede
+
+build_llm_client() monta o backend pelas variáveis de ambiente e, com
+LLM_HEDGE_BACKEND definida, o combina com um secundário no HedgedLLMClient.
+"""
+
+import importlib
+import os
+from typing import AsyncIterator, Protocol
+
+from app.clients.hedged_client import HedgedLLMClient
+from app.clients.llm_client import HeuristicLLMClient, OpenAICompatibleLLMClient, OpenAILLMClient
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4.1-mini")
+# Para openai, vazio mantém o padrão do SDK (inclui OPENAI_BASE_URL); obrigatória para compatible
+LLM_BASE_URL = os.getenv("LLM_BASE_URL")
+# Para openai, vazio usa OPENAI_API_KEY_EMAIL_ANALYZER
+LLM_API_KEY = os.getenv("LLM_API_KEY")
+
+# Backend secundário do hedge; vazio desativa
+LLM_HEDGE_BACKEND = os.getenv("LLM_HEDGE_BACKEND", "")
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", LLM_MODEL)
+LLM_HEDGE_BASE_URL = os.getenv("LLM_HEDGE_BASE_URL")
+LLM_HEDGE_API_KEY = os.getenv("LLM_HEDGE_API_KEY")
+
+BACKENDS = ("openai", "compatible", "heuristic")
+
+
+class LLMBackend(Protocol):
+    """Interface usada pelo EmailAnalyzerService; model entra na chave do cache"""
+
+    model: str
+
+    def analyze(self, content: str) -> dict: ...
+
+    async def analyze_async(self, content: str) -> dict: ...
+
+    async def analyze_many_async(self, contents: list[str]) -> list[dict]: ...
+
+    def analyze_stream_async(self, content: str) -> AsyncIterator[tuple[str, object]]: ...
+
+    async def aclose(self) -> None: ...
+
+
+def build_backend(kind: str, model: str, base_url: str | None = None, api_key: str | None = None) -> LLMBackend:
+    if kind == "openai":
+        return OpenAILLMClient(model=model, base_url=base_url, api_key=api_key)
+    if kind == "compatible":
+        if not base_url:
+            raise RuntimeError("Backend compatible exige a URL do servidor (LLM_BASE_URL/LLM_HEDGE_BASE_URL)")
+        return OpenAICompatibleLLMClient(model=model, base_url=base_url, api_key=api_key)
+    if kind == "heuristic":
+        return HeuristicLLMClient()
+    raise ValueError(f"Backend de LLM desconhecido: {kind!r} (opções: {', '.join(BACKENDS)})")
+
+
+def preload_backend_modules() -> None:
+    """Importa o SDK dos backends configurados (no mestre do gunicorn, antes do fork dos workers)"""
+    if {LLM_BACKEND, LLM_HEDGE_BACKEND} & {"openai", "compatible"}:
+        for module in ("httpx", "openai"):
+            importlib.import_module(module)
+
+
+def build_llm_client(model: str | None = None) -> LLMBackend:
+    """Backend configurado nas variáveis LLM_*; model substitui LLM_MODEL no primário"""
+    primary = build_backend(LLM_BACKEND, model or LLM_MODEL, LLM_BASE_URL, LLM_API_KEY)
+    if not LLM_HEDGE_BACKEND:
+        return primary
+    secondary = build_backend(LLM_HEDGE_BACKEND, LLM_HEDGE_MODEL, LLM_HEDGE_BASE_URL, LLM_HEDGE_API_KEY)
+    return HedgedLLMClient(primary, secondary)
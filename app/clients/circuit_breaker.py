@@ -0,0 +1,180 @@
+"""
+Circuit breaker para chamadas a dependências externas (LLM).
+
+Estados:
+- closed: chamadas passam; erros e chamadas lentas são medidos numa janela
+- open: chamadas são recusadas na hora (o chamador usa o fallback)
+- half_open: após o tempo de espera, algumas chamadas de teste passam;
+  se todas derem certo o circuito fecha, se uma falhar ele reabre
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from enum import Enum
+
+LLM_CB_ERROR_RATE = float(os.getenv("LLM_CB_ERROR_RATE", 0.5))
+LLM_CB_SLOW_CALL_SECONDS = float(os.getenv("LLM_CB_SLOW_CALL_SECONDS", 10))
+LLM_CB_SLOW_CALL_RATE = float(os.getenv("LLM_CB_SLOW_CALL_RATE", 0.5))
+LLM_CB_WINDOW_SECONDS = float(os.getenv("LLM_CB_WINDOW_SECONDS", 60))
+LLM_CB_MIN_CALLS = int(os.getenv("LLM_CB_MIN_CALLS", 10))
+LLM_CB_OPEN_SECONDS = float(os.getenv("LLM_CB_OPEN_SECONDS", 30))
+LLM_CB_HALF_OPEN_CALLS = int(os.getenv("LLM_CB_HALF_OPEN_CALLS", 3))
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por taxa de erro e de chamadas lentas numa janela de tempo.
+
+    Uso:
+        if not breaker.allow_request():
+            return fallback()
+        ... chamada ...
+        breaker.record_success(latency) / breaker.record_failure(latency)
+    """
+
+    def __init__(
+        self,
+        name: str = "llm",
+        error_rate_threshold: float = LLM_CB_ERROR_RATE,
+        slow_call_seconds: float = LLM_CB_SLOW_CALL_SECONDS,
+        slow_call_rate_threshold: float = LLM_CB_SLOW_CALL_RATE,
+        window_seconds: float = LLM_CB_WINDOW_SECONDS,
+        minimum_calls: int = LLM_CB_MIN_CALLS,
+        open_seconds: float = LLM_CB_OPEN_SECONDS,
+        half_open_max_calls: int = LLM_CB_HALF_OPEN_CALLS,
+        clock=time.monotonic
+    ):
+        self.name = name
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.window_seconds = window_seconds
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self.state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        # (instante, falhou, lenta) de cada chamada na janela
+        self._calls: deque = deque()
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        self.rejected_calls = 0
+        self.transitions: deque = deque(maxlen=20)
+
+    def allow_request(self) -> bool:
+        """Indica se a chamada pode ir ao serviço (False = usar o fallback)"""
+        with self._lock:
+            if self.state is CircuitState.CLOSED:
+                return True
+
+            if self.state is CircuitState.OPEN:
+                if self._clock() - self._opened_at < self.open_seconds:
+                    self.rejected_calls += 1
+                    return False
+                self._transition(CircuitState.HALF_OPEN, "tempo de espera encerrado")
+
+            if self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def record_success(self, latency: float) -> None:
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if self.state is CircuitState.HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                if slow:
+                    self._open(f"chamada de teste lenta ({latency:.1f}s)")
+                    return
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.half_open_max_calls:
+                    self._calls.clear()
+                    self._transition(CircuitState.CLOSED, "chamadas de teste bem-sucedidas")
+                return
+            self._record(failed=False, slow=slow)
+
+    def record_failure(self, latency: float = 0.0) -> None:
+        with self._lock:
+            if self.state is CircuitState.HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._open("falha em chamada de teste")
+                return
+            self._record(failed=True, slow=latency >= self.slow_call_seconds)
+
+    def release(self) -> None:
+        """Chamada abandonada pelo chamador (ex.: perdeu o hedge): não conta como sucesso nem falha"""
+        with self._lock:
+            if self.state is CircuitState.HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def _record(self, failed: bool, slow: bool) -> None:
+        now = self._clock()
+        self._calls.append((now, failed, slow))
+        self._prune(now)
+        if self.state is not CircuitState.CLOSED or len(self._calls) < self.minimum_calls:
+            return
+
+        error_rate, slow_rate = self._rates()
+        if error_rate >= self.error_rate_threshold:
+            self._open(f"taxa de erro {error_rate:.0%}")
+        elif slow_rate >= self.slow_call_rate_threshold:
+            self._open(f"taxa de chamadas lentas {slow_rate:.0%}")
+
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _rates(self) -> tuple:
+        total = len(self._calls)
+        if not total:
+            return 0.0, 0.0
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        slow = sum(1 for _, _, is_slow in self._calls if is_slow)
+        return failures / total, slow / total
+
+    def _open(self, reason: str) -> None:
+        self._opened_at = self._clock()
+        self._transition(CircuitState.OPEN, reason)
+
+    def _transition(self, state: CircuitState, reason: str) -> None:
+        self.transitions.append({
+            "from": self.state.value,
+            "to": state.value,
+            "reason": reason,
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        })
+        self.state = state
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+
+    def snapshot(self) -> dict:
+        """Estado atual, métricas da janela e últimas transições"""
+        with self._lock:
+            self._prune(self._clock())
+            error_rate, slow_rate = self._rates()
+            retry_in = 0.0
+            if self.state is CircuitState.OPEN:
+                retry_in = max(0.0, self.open_seconds - (self._clock() - self._opened_at))
+            return {
+                "name": self.name,
+                "state": self.state.value,
+                "window_calls": len(self._calls),
+                "error_rate": round(error_rate, 4),
+                "slow_call_rate": round(slow_rate, 4),
+                "rejected_calls": self.rejected_calls,
+                "retry_in_seconds": round(retry_in, 1),
+                "transitions": list(self.transitions),
+            }
@@ -0,0 +1,227 @@
+"""
+Requisições com hedge entre dois backends de LLM.
+
+A latência do LLM tem cauda longa: quase todas as chamadas respondem
+perto da mediana, mas algumas demoram várias vezes mais (fila no
+provedor, GPU ocupada). Em vez de esperar a chamada lenta, se o backend
+primário não responder até o p95 das suas latências recentes, a mesma
+análise vai também para o secundário e vale a primeira resposta que
+chegar; a outra chamada é cancelada. Só ~5% das chamadas passam do p95,
+então o custo extra fica perto disso, e LLM_HEDGE_MAX_RATIO limita o
+pior caso (primário inteiro lento, antes de o p95 acompanhar).
+
+Se o primário cair no fallback (erro, circuito aberto), o secundário é
+consultado na hora, sem esperar o prazo.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable
+
+from app import metrics
+
+# Percentil das latências recentes do primário usado como prazo do hedge
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+# Prazo enquanto não há latências suficientes e limites do prazo calculado
+LLM_HEDGE_INITIAL_DELAY_MS = float(os.getenv("LLM_HEDGE_INITIAL_DELAY_MS", 2000))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", 50))
+LLM_HEDGE_MAX_DELAY_MS = float(os.getenv("LLM_HEDGE_MAX_DELAY_MS", 10000))
+# Fração máxima das chamadas recentes que podem disparar o secundário por lentidão
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", 0.1))
+
+_LATENCY_WINDOW = 200
+_MIN_SAMPLES = 20
+# Janelas separadas: um lote ou o primeiro evento do stream não tem a latência de uma análise
+_KINDS = ("single", "batch", "stream")
+
+
+def _is_fallback(result) -> bool:
+    """Análise da heurística (dict) ou lote inteiro da heurística (lista)"""
+    if isinstance(result, list):
+        return all(item.get("fallback") for item in result)
+    return bool(result.get("fallback"))
+
+
+def _is_fallback_event(event: tuple) -> bool:
+    kind, value = event
+    return kind == "result" and _is_fallback(value)
+
+
+class HedgedLLMClient:
+    """
+    Backend que combina um primário e um secundário com hedge.
+
+    Mesma interface dos backends (model, analyze*, aclose). model, breaker
+    e limiter são os do primário: o cache identifica as análises pelo
+    modelo configurado, não pelo que respondeu cada uma.
+    """
+
+    def __init__(
+        self,
+        primary,
+        secondary,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        initial_delay: float = LLM_HEDGE_INITIAL_DELAY_MS / 1000,
+        min_delay: float = LLM_HEDGE_MIN_DELAY_MS / 1000,
+        max_delay: float = LLM_HEDGE_MAX_DELAY_MS / 1000,
+        max_ratio: float = LLM_HEDGE_MAX_RATIO
+    ):
+        self.primary = primary
+        self.secondary = secondary
+        self.model = primary.model
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_ratio = max_ratio
+        # Latências do primário (s); chamadas canceladas entram com o tempo até o cancelamento
+        self._latencies = {kind: deque(maxlen=_LATENCY_WINDOW) for kind in _KINDS}
+        # Se cada chamada recente disparou o secundário por lentidão
+        self._recent: deque = deque(maxlen=_LATENCY_WINDOW)
+
+        self.calls = 0
+        self.hedged = 0
+        self.failovers = 0
+        self.secondary_wins = 0
+        self.budget_exhausted = 0
+
+    @property
+    def breaker(self):
+        return self.primary.breaker
+
+    @property
+    def limiter(self):
+        return self.primary.limiter
+
+    def hedge_delay(self, kind: str = "single") -> float:
+        """Prazo (s) até disparar o secundário: o percentil das latências recentes do primário"""
+        latencies = self._latencies[kind]
+        if len(latencies) < _MIN_SAMPLES:
+            delay = self.initial_delay
+        else:
+            ordered = sorted(latencies)
+            delay = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def analyze(self, content: str) -> dict:
+        """Versão síncrona: sem concorrência para o hedge, só troca para o secundário no fallback"""
+        result = self.primary.analyze(content)
+        if not _is_fallback(result):
+            return result
+        secondary = self.secondary.analyze(content)
+        self._count("fallback", "none" if _is_fallback(secondary) else "secondary")
+        return result if _is_fallback(secondary) else secondary
+
+    async def analyze_async(self, content: str) -> dict:
+        _, result = await self._first("single", lambda client: client.analyze_async(content), _is_fallback)
+        return result
+
+    async def analyze_many_async(self, contents: list[str]) -> list[dict]:
+        _, results = await self._first("batch", lambda client: client.analyze_many_async(contents), _is_fallback)
+        return results
+
+    async def analyze_stream_async(self, content: str) -> AsyncIterator[tuple[str, object]]:
+        """
+        Hedge no primeiro evento: se o primário não gerar nada até o prazo, o
+        secundário também é aberto e segue o stream que começar primeiro.
+        """
+        streams = []
+
+        async def first_event(client) -> tuple:
+            stream = client.analyze_stream_async(content)
+            streams.append(stream)
+            return stream, await stream.__anext__()
+
+        try:
+            winner, (stream, event) = await self._first(
+                "stream", first_event, lambda first: _is_fallback_event(first[1])
+            )
+            yield event
+            if winner != "none" and event[0] != "result":
+                async for event in stream:
+                    yield event
+        finally:
+            for stream in streams:
+                await stream.aclose()
+
+    async def aclose(self) -> None:
+        await self.primary.aclose()
+        await self.secondary.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "primary": self.primary.model,
+            "secondary": self.secondary.model,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.calls, 4) if self.calls else 0.0,
+            "secondary_wins": self.secondary_wins,
+            "failovers": self.failovers,
+            "budget_exhausted": self.budget_exhausted,
+            "max_ratio": self.max_ratio,
+            "delay_ms": {kind: round(self.hedge_delay(kind) * 1000, 1) for kind in _KINDS},
+        }
+
+    async def _first(self, kind: str, start: Callable[[object], Awaitable], failed: Callable[[object], bool]):
+        """
+        Executa start(primário) e, passado o prazo ou no fallback do primário,
+        também start(secundário). Retorna (primary, secondary ou none, resposta);
+        com none nenhum dos dois escapou do fallback e a resposta é a do primário.
+        """
+        self.calls += 1
+        latencies = self._latencies[kind]
+        began = time.perf_counter()
+        tasks = {asyncio.ensure_future(start(self.primary)): "primary"}
+        reason = fallback = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(kind))
+            if not done and self._may_hedge():
+                reason = "slow"
+                self.hedged += 1
+                tasks[asyncio.ensure_future(start(self.secondary))] = "secondary"
+            elif not done:
+                self.budget_exhausted += 1
+            self._recent.append(reason == "slow")
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Empate: fica com o primário
+                for task in sorted(done, key=lambda task: tasks[task] != "primary"):
+                    name, value = tasks[task], task.result()
+                    if not failed(value):
+                        if name == "primary":
+                            latencies.append(time.perf_counter() - began)
+                        if reason is not None:
+                            self._count(reason, name)
+                        return name, value
+                    if name == "primary":
+                        fallback = value
+                        if reason is None:
+                            reason = "fallback"
+                            secondary = asyncio.ensure_future(start(self.secondary))
+                            tasks[secondary] = "secondary"
+                            pending.add(secondary)
+            self._count(reason, "none")
+            return "none", fallback
+        finally:
+            cancelled = [task for task in tasks if not task.done()]
+            for task in cancelled:
+                task.cancel()
+                if tasks[task] == "primary":
+                    # Limite inferior da latência: sem ele o percentil só veria as chamadas rápidas
+                    latencies.append(time.perf_counter() - began)
+            # Espera os cancelamentos: um stream só pode ser fechado depois que a tarefa termina
+            await asyncio.gather(*cancelled, return_exceptions=True)
+
+    def _may_hedge(self) -> bool:
+        return sum(self._recent) < max(1.0, self.max_ratio * len(self._recent))
+
+    def _count(self, reason: str, winner: str) -> None:
+        if reason == "fallback":
+            self.failovers += 1
+        if winner == "secondary":
+            self.secondary_wins += 1
+        metrics.LLM_HEDGES_TOTAL.inc(reason, winner)
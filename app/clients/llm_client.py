@@ -1,23 +1,55 @@
+import asyncio
+import hashlib
 import json
 import os
 import logging
-from openai import OpenAI
+import re
+import time
+from types import SimpleNamespace
+from typing import AsyncIterator
+from app import metrics
+from app.clients.circuit_breaker import CircuitBreaker
+from app.clients.rate_limiter import (
+    LLM_RETRY_MAX_ATTEMPTS,
+    REQUEST_PRIORITY,
+    AdaptiveRateLimiter,
+    latency_budget,
+    retry_delay,
+)
 from app.domain.email_category import EmailCategory
+from app.utils.keyword_matcher import KeywordMatcher
+from app.utils.text_reducer import CHARS_PER_TOKEN, LLM_INPUT_TOKEN_BUDGET
 
 logger = logging.getLogger(__name__)
 
+# Pool de conexões HTTP compartilhado pelas chamadas assíncronas ao LLM
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+
+# Tempo máximo por chamada e retentativas do SDK (padrão do SDK: 600s e 2 retries)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 15))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 0))
+
+# Proteção final: o texto já chega reduzido ao orçamento (app/utils/text_reducer.py)
+MAX_LLM_INPUT_CHARS = LLM_INPUT_TOKEN_BUDGET * CHARS_PER_TOKEN
+
+# Tokens de saída reservados por email no limitador (corrigido pelo uso real)
+LLM_OUTPUT_TOKENS_ESTIMATE = 150
+
 EMAIL_ANALYSIS_SCHEMA = {
     "name": "email_analysis",
     "schema": {
         "type": "object",
         "additionalProperties": False,
         "properties": {
+            # Saída estrita segue esta ordem: no streaming a categoria sai primeiro e a
+            # resposta sugerida logo depois, sem esperar o reason (que é só interno)
             "category": {"type": "string", "enum": ["PRODUTIVO", "IMPRODUTIVO"]},
             "confidence": {"type": "number", "minimum": 0, "maximum": 1},
-            "reason": {"type": "string", "minLength": 1},
             "suggested_reply": {"type": "string", "minLength": 1},
+            "reason": {"type": "string", "minLength": 1},
         },
-        "required": ["category", "confidence", "reason", "suggested_reply"],
+        "required": ["category", "confidence", "suggested_reply", "reason"],
     },
     "strict": True,
 }
@@ -49,58 +81,737 @@ Critérios:
 Retorne os campos do schema.
 """
 
+# Versão em lote: vários emails numerados em uma chamada, um resultado por id
+EMAIL_BATCH_ANALYSIS_SCHEMA = {
+    "name": "email_batch_analysis",
+    "schema": {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "properties": {
+                        "id": {"type": "integer"},
+                        **EMAIL_ANALYSIS_SCHEMA["schema"]["properties"],
+                    },
+                    "required": ["id", *EMAIL_ANALYSIS_SCHEMA["schema"]["required"]],
+                },
+            },
+        },
+        "required": ["results"],
+    },
+    "strict": True,
+}
+
+def build_batch_user_prompt(email_texts: list[str]) -> str:
+    emails = "\n\n".join(
+        f'Email {index}:\n\"\"\"{text}\"\"\"' for index, text in enumerate(email_texts)
+    )
+    return f"""Classifique cada email abaixo de forma independente e gere uma resposta automática adequada para cada um.
+
+{emails}
+
+Critérios:
+- Se houver pedido, dúvida, problema, cobrança, solicitação de status/acesso: PRODUTIVO.
+- Se for apenas agradecimento/felicitação/aviso sem demanda: IMPRODUTIVO.
+
+Retorne em "results" um item por email, com "id" igual ao número do email e os demais campos do schema.
+"""
+
+# Versão do prompt derivada do conteúdo: muda sozinha quando prompt ou schema mudam
+PROMPT_VERSION = hashlib.sha256(
+    (
+        SYSTEM_PROMPT + build_user_prompt("") + json.dumps(EMAIL_ANALYSIS_SCHEMA, sort_keys=True)
+        + build_batch_user_prompt([""]) + json.dumps(EMAIL_BATCH_ANALYSIS_SCHEMA, sort_keys=True)
+    ).encode("utf-8")
+).hexdigest()[:12]
+
 
 class OpenAILLMClient:
     """
     Cliente LLM (OpenAI) com saída estruturada (JSON Schema).
     Mantém a mesma assinatura do AIClient: analyze(content) -> dict
+
+    analyze_async usa um AsyncOpenAI com pool de conexões compartilhado,
+    permitindo várias análises concorrentes no mesmo event loop.
+
+    As chamadas passam por um circuit breaker: com o circuito aberto
+    (muitos erros ou chamadas lentas) o fallback heurístico responde
+    direto, sem esperar o timeout do modelo.
+
+    As chamadas assíncronas também passam pelo limitador de taxa (RPM/TPM)
+    e são repetidas em 429, 5xx e falhas de conexão; o fallback só é usado
+    quando esperar mais estouraria o orçamento de latência da análise.
+
+    analyze_stream_async usa o modo streaming do SDK para entregar a
+    categoria e a resposta sugerida conforme o modelo as gera.
     """
 
-    def __init__(self, model: str = "gpt-4.1-mini"):
-        api_key = os.getenv("OPENAI_API_KEY_EMAIL_ANALYZER")
+    def __init__(
+        self,
+        model: str = "gpt-4.1-mini",
+        base_url: str | None = None,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        breaker: CircuitBreaker | None = None,
+        limiter: AdaptiveRateLimiter | None = None,
+        api_key: str | None = None
+    ):
+        api_key = api_key or os.getenv("OPENAI_API_KEY_EMAIL_ANALYZER")
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY não configurada no ambiente.")
-        self.client = OpenAI(api_key=api_key)
+        # Importados só aqui: o SDK leva centenas de ms para carregar e quem
+        # usa apenas os prompts, o fallback ou o HeuristicLLMClient não precisa dele
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
+
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(name="openai")
+        # Baldes por modelo: os limites do provedor são por modelo (e compartilhados entre workers)
+        self.limiter = limiter or AdaptiveRateLimiter(name=f"openai:{model}")
+        # base_url=None mantém o padrão do SDK (inclui a env OPENAI_BASE_URL)
+        self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=max_retries)
+        self.async_client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=max_retries,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                )
+            ),
+        )
         self.model = model
 
     def analyze(self, content: str) -> dict:
-        # Proteção básica: não mandar texto gigante
-        trimmed = content[:6000]
+        if not self.breaker.allow_request():
+            return self._fallback(content, "circuit_open")
 
+        start = time.perf_counter()
         try:
-            resp = self.client.responses.create(
-                model=self.model,
-                input=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": build_user_prompt(trimmed)},
-                ],
-                text={
-                    "format": {
-                        "type": "json_schema",
-                        "name": EMAIL_ANALYSIS_SCHEMA["name"],
-                        "schema": EMAIL_ANALYSIS_SCHEMA["schema"],
-                        "strict": EMAIL_ANALYSIS_SCHEMA["strict"],
-                    }
-                },
-                temperature=0.2,
+            resp = self._request(self._build_request(content))
+            result = _parse_response(resp)
+
+        except Exception as e:
+            # Fallback: análise heurística simples baseada em keywords
+            self._record_call(time.perf_counter() - start, ok=False)
+            logger.warning("Falha ao consultar LLM, usando fallback: %s", e)
+            return self._fallback(content, "error")
+
+        self._record_call(time.perf_counter() - start, ok=True, resp=resp)
+        return result
+
+    async def analyze_async(self, content: str) -> dict:
+        """
+        Versão assíncrona de analyze: não bloqueia o event loop
+        durante o round-trip com o modelo.
+        """
+        if not self.breaker.allow_request():
+            return self._fallback(content, "circuit_open")
+
+        try:
+            resp, latency = await self._create_async(
+                self._build_request(content), _estimate_request_tokens([content])
             )
+        except LLMUnavailable as e:
+            logger.warning("Falha ao consultar LLM, usando fallback: %s", e)
+            return self._fallback(content, e.reason)
 
-            # SDK recente expõe output_text. Se não expuser no seu, ajuste para ler o item do output.
-            data = json.loads(resp.output_text)
+        try:
+            result = _parse_response(resp)
+        except Exception as e:
+            self._record_call(latency, ok=False)
+            logger.warning("Resposta inválida do LLM, usando fallback: %r", e)
+            return self._fallback(content, "error")
 
-            category = EmailCategory(data["category"])
+        self._record_call(latency, ok=True, resp=resp)
+        return result
 
-            return {
-                "category": category,
-                "suggested_reply": data["suggested_reply"],
-                "confidence": round(float(data["confidence"]), 2),
-                "reason": data["reason"],
-            }
+    async def analyze_stream_async(self, content: str) -> AsyncIterator[tuple[str, object]]:
+        """
+        Versão em streaming de analyze_async. Gera ("category", EmailCategory)
+        assim que o modelo fecha a categoria, ("delta", trecho) conforme a
+        resposta sugerida é escrita e, por último, ("result", dict) com a
+        análise completa, validada pelo EMAIL_ANALYSIS_SCHEMA.
+
+        Se a chamada falhar ou a resposta final for inválida, o "result" é o
+        fallback, que substitui o que já tiver sido enviado. Retentativas só
+        acontecem antes do primeiro evento.
+        """
+        if not self.breaker.allow_request():
+            yield "result", self._fallback(content, "circuit_open")
+            return
 
+        estimated_tokens = _estimate_request_tokens([content])
+        try:
+            stream, latency = await self._create_async(self._build_request(content), estimated_tokens, stream=True)
+        except LLMUnavailable as e:
+            logger.warning("Falha ao consultar LLM (streaming), usando fallback: %s", e)
+            yield "result", self._fallback(content, e.reason)
+            return
+
+        start = time.perf_counter()
+        parser = StreamingAnalysisParser()
+        completed = False
+        usage = None
+        try:
+            async for kind, value in self._stream_events(stream):
+                if kind == "delta":
+                    for event in parser.feed(value):
+                        yield event
+                else:
+                    completed, usage = True, value
+            if not completed:
+                raise RuntimeError("stream encerrado antes do fim da resposta")
+            # O texto acumulado é o output_text da resposta: valida exatamente o que foi enviado
+            result = _parse_output(parser.text, usage)
+        except (asyncio.CancelledError, GeneratorExit):
+            # Stream abandonado por quem consome (desconexão, hedge perdido)
+            self.breaker.release()
+            raise
         except Exception as e:
-            # Fallback: análise heurística simples baseada em keywords
-            logger.warning(f"Falha ao consultar LLM, usando fallback: {str(e)}")
-            return _fallback_classify(content)
+            self._record_call(latency + time.perf_counter() - start, ok=False)
+            logger.warning("Falha no streaming do LLM, usando fallback: %r", e)
+            yield "result", self._fallback(content, "error")
+            return
+        finally:
+            await stream.close()
+
+        if usage is not None:
+            await self.limiter.record_usage(estimated_tokens, (usage.input_tokens or 0) + (usage.output_tokens or 0))
+        self._record_call(latency + time.perf_counter() - start, ok=True, usage=usage)
+        yield "result", result
+
+    async def analyze_many_async(self, contents: list[str]) -> list[dict]:
+        """
+        Classifica vários emails em uma única chamada (schema em array),
+        dividindo o custo fixo do prompt entre eles. Itens ausentes ou
+        inválidos na resposta, ou o lote inteiro em caso de falha, caem
+        no fallback item a item.
+        """
+        if len(contents) == 1:
+            return [await self.analyze_async(contents[0])]
+
+        if not self.breaker.allow_request():
+            return [self._fallback(content, "circuit_open") for content in contents]
+
+        try:
+            resp, latency = await self._create_async(
+                self._build_batch_request(contents), _estimate_request_tokens(contents)
+            )
+        except LLMUnavailable as e:
+            logger.warning("Falha ao consultar LLM em lote (%d emails), usando fallback: %s", len(contents), e)
+            return [self._fallback(content, e.reason) for content in contents]
+
+        try:
+            parsed = _parse_batch_response(resp, len(contents))
+        except Exception as e:
+            self._record_call(latency, ok=False)
+            logger.warning("Resposta em lote inválida (%d emails), usando fallback: %r", len(contents), e)
+            return [self._fallback(content, "error") for content in contents]
+
+        self._record_call(latency, ok=True, resp=resp)
+        results = []
+        for content, result in zip(contents, parsed):
+            if result is None:
+                logger.warning("Item ausente ou inválido na resposta em lote, usando fallback")
+                result = self._fallback(content, "batch_item")
+            results.append(result)
+        return results
+
+    async def _create_async(self, request: dict, estimated_tokens: int, stream: bool = False):
+        """
+        Envia a requisição pelo limitador de taxa, repetindo em 429, 5xx,
+        falha de conexão e timeout (backoff com jitter) enquanto couber no
+        orçamento de latência da prioridade atual.
+        Retorna (resposta, latência da tentativa bem-sucedida); lança
+        LLMUnavailable ao desistir, com as falhas já registradas (sem
+        nenhuma registrada, a vaga do circuit breaker é devolvida).
+        Com stream, a resposta é o stream de eventos, aberto assim que
+        chegam os cabeçalhos; o uso de tokens fica para quem o consome.
+        """
+        import openai
+
+        priority = REQUEST_PRIORITY.get()
+        # No clock do limitador: com estado compartilhado é time.time, não monotonic
+        deadline = self.limiter.now() + latency_budget(priority)
+        attempt = 0
+        # Nenhuma tentativa registrada no circuit breaker (orçamento de latência, 429 até
+        # desistir, cancelamento na fila ou no backoff): a vaga de teste do half_open volta
+        recorded = False
+
+        try:
+            while True:
+                if not await self.limiter.acquire(estimated_tokens, priority, deadline):
+                    raise LLMUnavailable("latency_budget")
+
+                start = time.perf_counter()
+                try:
+                    # O timeout do SDK vale por operação de rede; wait_for limita a chamada inteira
+                    resp, headers = await asyncio.wait_for(
+                        self._request_async(request, stream),
+                        timeout=max(0.0, min(self.timeout, deadline - self.limiter.now()))
+                    )
+                except openai.RateLimitError as e:
+                    latency = time.perf_counter() - start
+                    if getattr(e, "code", None) == "insufficient_quota":
+                        # Cota esgotada não volta com espera: falha de verdade
+                        self._record_call(latency, ok=False)
+                        recorded = True
+                        raise LLMUnavailable("error", e)
+                    # 429 é controle de vazão, não indisponibilidade: não conta no circuit breaker
+                    pause = await self.limiter.on_rate_limited(e.response.headers)
+                    metrics.LLM_REQUEST_SECONDS.observe(latency, self.model, "rate_limited")
+                    error, reason = e, "rate_limited"
+                    logger.info("LLM respondeu 429, chamadas pausadas por %.2fs", pause)
+                except (openai.APIConnectionError, openai.InternalServerError, asyncio.TimeoutError) as e:
+                    self._record_call(time.perf_counter() - start, ok=False)
+                    recorded = True
+                    error, reason = e, "error"
+                except Exception as e:
+                    self._record_call(time.perf_counter() - start, ok=False)
+                    recorded = True
+                    raise LLMUnavailable("error", e)
+                else:
+                    await self.limiter.update_from_headers(headers)
+                    usage = getattr(resp, "usage", None)
+                    if usage is not None:
+                        await self.limiter.record_usage(estimated_tokens, (usage.input_tokens or 0) + (usage.output_tokens or 0))
+                    return resp, time.perf_counter() - start
+
+                attempt += 1
+                delay = retry_delay(attempt)
+                if attempt >= LLM_RETRY_MAX_ATTEMPTS or self.limiter.now() + delay >= deadline:
+                    raise LLMUnavailable(reason, error)
+                logger.info("Tentativa %d falhou (%r), nova tentativa em %.2fs", attempt, error, delay)
+                await asyncio.sleep(delay)
+        except BaseException:
+            if not recorded:
+                self.breaker.release()
+            raise
+
+    def _request(self, request: dict):
+        """Chamada síncrona à API; a resposta expõe output_text e usage"""
+        return self.client.responses.create(**request)
+
+    async def _request_async(self, request: dict, stream: bool = False):
+        """Chamada assíncrona à API: (resposta ou stream de eventos, cabeçalhos HTTP)"""
+        if stream:
+            resp = await self.async_client.responses.create(**request, stream=True)
+            return resp, resp.response.headers
+        raw = await self.async_client.responses.with_raw_response.create(**request)
+        return raw.parse(), raw.headers
+
+    async def _stream_events(self, stream) -> AsyncIterator[tuple[str, object]]:
+        """Eventos do stream como ("delta", texto) e, ao terminar bem, ("completed", usage)"""
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                yield "delta", event.delta
+            elif event.type == "response.completed":
+                yield "completed", getattr(event.response, "usage", None)
+            elif event.type in ("response.failed", "response.incomplete"):
+                raise RuntimeError(f"stream encerrado com {event.type}")
+
+    def _record_call(self, latency: float, ok: bool, resp=None, usage=None) -> None:
+        """Alimenta o circuit breaker e as métricas de latência/tokens"""
+        if ok:
+            self.breaker.record_success(latency)
+        else:
+            self.breaker.record_failure(latency)
+        metrics.LLM_REQUEST_SECONDS.observe(latency, self.model, "ok" if ok else "error")
+
+        usage = usage or getattr(resp, "usage", None)
+        if usage is not None:
+            metrics.LLM_TOKENS_TOTAL.inc(self.model, "input", amount=usage.input_tokens or 0)
+            metrics.LLM_TOKENS_TOTAL.inc(self.model, "output", amount=usage.output_tokens or 0)
+            details = getattr(usage, "input_tokens_details", None)
+            cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+            if cached:
+                metrics.LLM_TOKENS_TOTAL.inc(self.model, "cached_input", amount=cached)
+
+    def _fallback(self, content: str, reason: str) -> dict:
+        start = time.perf_counter()
+        result = _fallback_classify(content)
+        metrics.FALLBACK_SECONDS.observe(time.perf_counter() - start, reason)
+        return result
+
+    async def aclose(self) -> None:
+        """Fecha o pool de conexões HTTP do cliente assíncrono"""
+        await self.async_client.close()
+
+    def _build_request(self, content: str) -> dict:
+        trimmed = content[:MAX_LLM_INPUT_CHARS]
+
+        return {
+            "model": self.model,
+            "input": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": build_user_prompt(trimmed)},
+            ],
+            "text": {
+                "format": {
+                    "type": "json_schema",
+                    "name": EMAIL_ANALYSIS_SCHEMA["name"],
+                    "schema": EMAIL_ANALYSIS_SCHEMA["schema"],
+                    "strict": EMAIL_ANALYSIS_SCHEMA["strict"],
+                }
+            },
+            "temperature": 0.2,
+        }
+
+    def _build_batch_request(self, contents: list[str]) -> dict:
+        trimmed = [content[:MAX_LLM_INPUT_CHARS] for content in contents]
+
+        return {
+            "model": self.model,
+            "input": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": build_batch_user_prompt(trimmed)},
+            ],
+            "text": {
+                "format": {
+                    "type": "json_schema",
+                    "name": EMAIL_BATCH_ANALYSIS_SCHEMA["name"],
+                    "schema": EMAIL_BATCH_ANALYSIS_SCHEMA["schema"],
+                    "strict": EMAIL_BATCH_ANALYSIS_SCHEMA["strict"],
+                }
+            },
+            "temperature": 0.2,
+        }
+
+
+class LLMUnavailable(Exception):
+    """Chamada ao LLM abandonada; reason é o rótulo do fallback nas métricas"""
+
+    def __init__(self, reason: str, cause: Exception | None = None):
+        super().__init__(f"{reason}: {cause!r}" if cause is not None else reason)
+        self.reason = reason
+
+
+# Tamanho fixo dos prompts (sem os emails), para a estimativa de tokens
+_PROMPT_CHARS = len(SYSTEM_PROMPT) + len(build_user_prompt(""))
+_BATCH_PROMPT_CHARS = len(SYSTEM_PROMPT) + len(build_batch_user_prompt([]))
+_BATCH_ITEM_CHARS = len(build_batch_user_prompt([""])) - len(build_batch_user_prompt([]))
+
+
+def _estimate_request_tokens(contents: list[str]) -> int:
+    """Tokens reservados no limitador: prompt + emails + saída esperada"""
+    if len(contents) == 1:
+        chars = _PROMPT_CHARS
+    else:
+        chars = _BATCH_PROMPT_CHARS + _BATCH_ITEM_CHARS * len(contents)
+    chars += sum(min(len(content), MAX_LLM_INPUT_CHARS) for content in contents)
+    return chars // CHARS_PER_TOKEN + LLM_OUTPUT_TOKENS_ESTIMATE * len(contents)
+
+
+class OpenAICompatibleLLMClient(OpenAILLMClient):
+    """
+    Cliente para servidores compatíveis com a API de Chat Completions da
+    OpenAI (vLLM, llama.cpp, Ollama, um stub local). Mesmos prompts,
+    validação, limitador, retentativas e circuit breaker do OpenAILLMClient;
+    muda só o formato da chamada.
+
+    A saída estruturada vai em response_format (json_schema). Servidores
+    que ignoram o schema ainda são validados: resposta fora do formato
+    cai no fallback como qualquer outra resposta inválida.
+    """
+
+    def __init__(self, model: str, base_url: str, api_key: str | None = None, **kwargs):
+        kwargs.setdefault("breaker", CircuitBreaker(name=f"compatible:{model}"))
+        # Servidor próprio: sem cota do provedor para respeitar (um 429 ainda pausa as chamadas)
+        kwargs.setdefault("limiter", AdaptiveRateLimiter(rpm=0, tpm=0, name=f"compatible:{model}"))
+        # O SDK exige uma chave; a da OpenAI não é enviada para outro servidor
+        super().__init__(model=model, base_url=base_url, api_key=api_key or "local", **kwargs)
+
+    def _request(self, request: dict):
+        return _ChatOutput(self.client.chat.completions.create(**request))
+
+    async def _request_async(self, request: dict, stream: bool = False):
+        if stream:
+            resp = await self.async_client.chat.completions.create(**request, stream=True)
+            return resp, resp.response.headers
+        raw = await self.async_client.chat.completions.with_raw_response.create(**request)
+        return _ChatOutput(raw.parse()), raw.headers
+
+    async def _stream_events(self, stream) -> AsyncIterator[tuple[str, object]]:
+        finished, usage = False, None
+        async for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = _chat_usage(chunk.usage)
+            for choice in chunk.choices:
+                if choice.delta is not None and choice.delta.content:
+                    yield "delta", choice.delta.content
+                if choice.finish_reason == "length":
+                    raise RuntimeError("stream encerrado com finish_reason=length")
+                finished = finished or choice.finish_reason is not None
+        if finished:
+            yield "completed", usage
+
+    def _build_request(self, content: str) -> dict:
+        return self._chat_request(build_user_prompt(content[:MAX_LLM_INPUT_CHARS]), EMAIL_ANALYSIS_SCHEMA)
+
+    def _build_batch_request(self, contents: list[str]) -> dict:
+        trimmed = [content[:MAX_LLM_INPUT_CHARS] for content in contents]
+        return self._chat_request(build_batch_user_prompt(trimmed), EMAIL_BATCH_ANALYSIS_SCHEMA)
+
+    def _chat_request(self, user_prompt: str, schema: dict) -> dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt},
+            ],
+            "response_format": {"type": "json_schema", "json_schema": schema},
+            "temperature": 0.2,
+        }
+
+
+class _ChatOutput:
+    """Resposta de Chat Completions com os campos lidos da Responses API (output_text, usage)"""
+
+    def __init__(self, completion):
+        choice = completion.choices[0]
+        if choice.finish_reason == "length":
+            raise ValueError("resposta truncada (finish_reason=length)")
+        self.output_text = choice.message.content or ""
+        self.usage = _chat_usage(completion.usage)
+
+
+def _chat_usage(usage):
+    """prompt/completion_tokens de Chat Completions como input/output_tokens"""
+    if usage is None:
+        return None
+    return SimpleNamespace(input_tokens=usage.prompt_tokens or 0, output_tokens=usage.completion_tokens or 0)
+
+
+class HeuristicLLMClient:
+    """
+    Cliente sem rede: classifica apenas com a heurística de keywords.
+    Usado para avaliação offline e quando não há chave da OpenAI.
+    """
+
+    model = "heuristic"
+
+    def analyze(self, content: str) -> dict:
+        return _fallback_classify(content)
+
+    async def analyze_async(self, content: str) -> dict:
+        return _fallback_classify(content)
+
+    async def analyze_many_async(self, contents: list[str]) -> list[dict]:
+        return [_fallback_classify(content) for content in contents]
+
+    async def analyze_stream_async(self, content: str) -> AsyncIterator[tuple[str, object]]:
+        yield "result", _fallback_classify(content)
+
+    async def aclose(self) -> None:
+        pass
+
+
+_STREAM_CATEGORY = re.compile(r'"category"\s*:\s*"(\w+)"')
+_STREAM_REPLY_START = re.compile(r'"suggested_reply"\s*:\s*"')
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class StreamingAnalysisParser:
+    """
+    Lê o JSON da análise conforme o modelo o escreve. O schema estrito
+    gera os campos na ordem declarada (category, confidence e logo depois
+    suggested_reply), então a categoria sai logo no começo e a resposta
+    pode ser repassada aos pedaços. Aspas dentro dos valores vêm escapadas,
+    então as chaves não são confundidas com o conteúdo.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.category: EmailCategory | None = None
+        # Posição, em self.text, do próximo caractere da resposta ainda não repassado
+        self._reply_at: int | None = None
+        self._reply_done = False
+
+    def feed(self, delta: str) -> list[tuple[str, object]]:
+        """Acrescenta um trecho do JSON; retorna os eventos ("category" / "delta") que ele completou"""
+        self.text += delta
+        events = []
+        if self.category is None:
+            match = _STREAM_CATEGORY.search(self.text)
+            if match and match.group(1) in EmailCategory.__members__:
+                self.category = EmailCategory(match.group(1))
+                events.append(("category", self.category))
+        if self._reply_at is None:
+            match = _STREAM_REPLY_START.search(self.text)
+            if match:
+                self._reply_at = match.end()
+        if self._reply_at is not None and not self._reply_done:
+            chunk = self._decode_reply()
+            if chunk:
+                events.append(("delta", chunk))
+        return events
+
+    def _decode_reply(self) -> str:
+        """Decodifica a string JSON da resposta até onde chegou; escapes incompletos esperam o próximo trecho"""
+        text, i, out = self.text, self._reply_at, []
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                self._reply_done = True
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(text):
+                break
+            if text[i + 1] != "u":
+                out.append(_JSON_ESCAPES.get(text[i + 1], text[i + 1]))
+                i += 2
+                continue
+            if i + 6 > len(text):
+                break
+            code = int(text[i + 2:i + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # Par substituto (ex.: emoji): \uD83D\uDE00 vira um caractere só
+                if i + 12 > len(text):
+                    break
+                code = 0x10000 + ((code - 0xD800) << 10) + (int(text[i + 8:i + 12], 16) - 0xDC00)
+                i += 6
+            out.append(chr(code))
+            i += 6
+        self._reply_at = i
+        return "".join(out)
+
+
+_JSON_TYPES = {"string": str, "number": (int, float), "integer": int}
+
+
+def validate_analysis(data: dict, schema: dict = EMAIL_ANALYSIS_SCHEMA["schema"]) -> None:
+    """
+    Confere a análise contra o JSON Schema (campos obrigatórios e extras,
+    tipos, enum, minLength, minimum/maximum). Lança ValueError.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("análise não é um objeto JSON")
+    properties = schema["properties"]
+    missing = [name for name in schema["required"] if name not in data]
+    if missing:
+        raise ValueError(f"campos ausentes: {missing}")
+    if schema.get("additionalProperties") is False and data.keys() - properties.keys():
+        raise ValueError(f"campos inesperados: {sorted(data.keys() - properties.keys())}")
+    for name, rules in properties.items():
+        if name not in data:
+            continue
+        value = data[name]
+        if isinstance(value, bool) or not isinstance(value, _JSON_TYPES[rules["type"]]):
+            raise ValueError(f"{name}: esperado {rules['type']}")
+        if "enum" in rules and value not in rules["enum"]:
+            raise ValueError(f"{name}: {value!r} fora de {rules['enum']}")
+        if isinstance(value, str) and len(value) < rules.get("minLength", 0):
+            raise ValueError(f"{name}: vazio")
+        if "minimum" in rules and value < rules["minimum"] or "maximum" in rules and value > rules["maximum"]:
+            raise ValueError(f"{name}: {value} fora do intervalo")
+
+
+def _parse_response(resp) -> dict:
+    """Converte a resposta estruturada do modelo no dict de análise"""
+    # SDK recente expõe output_text. Se não expuser no seu, ajuste para ler o item do output.
+    return _parse_output(resp.output_text, getattr(resp, "usage", None))
+
+
+def _parse_output(output_text: str, usage=None) -> dict:
+    data = json.loads(output_text)
+    validate_analysis(data)
+
+    category = EmailCategory(data["category"])
+
+    result = {
+        "category": category,
+        "suggested_reply": data["suggested_reply"],
+        "confidence": round(float(data["confidence"]), 2),
+        "reason": data["reason"],
+        "fallback": False,
+    }
+    if usage is not None:
+        result["usage"] = {"input_tokens": usage.input_tokens, "output_tokens": usage.output_tokens}
+    return result
+
+
+def _parse_batch_response(resp, expected: int) -> list[dict | None]:
+    """
+    Converte a resposta em lote em um resultado por email, na ordem de entrada.
+    Posições sem resultado válido ficam como None. Os tokens consumidos
+    são divididos igualmente entre os itens.
+    """
+    data = json.loads(resp.output_text)
+    results: list[dict | None] = [None] * expected
+
+    for item in data["results"]:
+        index = item.get("id")
+        if not isinstance(index, int) or not 0 <= index < expected or results[index] is not None:
+            continue
+        try:
+            results[index] = {
+                "category": EmailCategory(item["category"]),
+                "suggested_reply": item["suggested_reply"],
+                "confidence": round(float(item["confidence"]), 2),
+                "reason": item["reason"],
+                "fallback": False,
+            }
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        share = {
+            "input_tokens": usage.input_tokens // expected,
+            "output_tokens": usage.output_tokens // expected,
+        }
+        for result in results:
+            if result is not None:
+                result["usage"] = dict(share)
+    return results
+
+
+# Keywords que indicam PRODUTIVO (requer ação)
+PRODUTIVO_KEYWORDS = frozenset({
+    "erro", "problema", "suporte", "ajuda", "socorro",
+    "urge", "urgente", "prazo", "deadline", "status",
+    "fazer", "realizar", "executar", "implementar",
+    "solicit", "pedido", "request", "chamado", "ticket",
+    "bug", "falha", "não funciona", "quebrou",
+    "preciso", "precisa", "necessário", "necessita",
+    "quando", "até quando", "para quando",
+    "aprovação", "aprovado", "rejeição", "rejeitado"
+})
+
+# Keywords que indicam IMPRODUTIVO (não requer ação)
+IMPRODUTIVO_KEYWORDS = frozenset({
+    "obrigado", "obrigada", "agradeço", "agradec",
+    "valeu", "thanks", "thank you", "muito obrigado",
+    "feliz", "felicid", "parabéns", "parabens",
+    "sucesso", "consegui", "conseguiu", "conseguiram",
+    "resolveu", "foi resolvido", "foi solucionado",
+    "funcionou", "deu certo", "ok", "perfeito",
+    "informação", "aviso", "notícia", "comunicado",
+    "passou para informar", "informando que",
+    "só pra avisar", "só informando"
+})
+
+# Respostas padrão quando a classificação não vem do LLM (fallback, modelo local)
+DEFAULT_REPLIES = {
+    EmailCategory.PRODUTIVO: (
+        "Olá! Recebemos sua mensagem e vamos analisar sua solicitação. "
+        "Se possível, envie mais detalhes para agilizar."
+    ),
+    EmailCategory.IMPRODUTIVO: "Olá! Obrigado pelo contato. Mensagem recebida.",
+}
+
+# Construído uma vez no import: uma única varredura encontra as keywords dos dois grupos
+_FALLBACK_KEYWORD_MATCHER = KeywordMatcher(PRODUTIVO_KEYWORDS | IMPRODUTIVO_KEYWORDS)
 
 
 def _fallback_classify(content: str) -> dict:
@@ -113,38 +824,13 @@ def _fallback_classify(content: str) -> dict:
         content: Texto preprocessado
         
     Returns:
-        Dict com classificação básica
+        Dict com classificação básica e ocorrências de cada keyword (keyword_hits)
     """
-    content_lower = content.lower()
+    keyword_hits = _FALLBACK_KEYWORD_MATCHER.count(content.lower())
     
-    # Keywords que indicam PRODUTIVO (requer ação)
-    produtivo_keywords = {
-        "erro", "problema", "suporte", "ajuda", "socorro",
-        "urge", "urgente", "prazo", "deadline", "status",
-        "fazer", "realizar", "executar", "implementar",
-        "solicit", "pedido", "request", "chamado", "ticket",
-        "bug", "falha", "não funciona", "quebrou",
-        "preciso", "precisa", "necessário", "necessita",
-        "quando", "até quando", "para quando",
-        "aprovação", "aprovado", "rejeição", "rejeitado"
-    }
-    
-    # Keywords que indicam IMPRODUTIVO (não requer ação)
-    improdutivo_keywords = {
-        "obrigado", "obrigada", "agradeço", "agradec",
-        "valeu", "thanks", "thank you", "muito obrigado",
-        "feliz", "felicid", "parabéns", "parabens",
-        "sucesso", "consegui", "conseguiu", "conseguiram",
-        "resolveu", "foi resolvido", "foi solucionado",
-        "funcionou", "deu certo", "ok", "perfeito",
-        "informação", "aviso", "notícia", "comunicado",
-        "passou para informar", "informando que",
-        "só pra avisar", "só informando"
-    }
-    
-    # Contar ocorrências
-    produtivo_count = sum(1 for kw in produtivo_keywords if kw in content_lower)
-    improdutivo_count = sum(1 for kw in improdutivo_keywords if kw in content_lower)
+    # Contar keywords distintas encontradas de cada grupo
+    produtivo_count = sum(1 for kw in keyword_hits if kw in PRODUTIVO_KEYWORDS)
+    improdutivo_count = sum(1 for kw in keyword_hits if kw in IMPRODUTIVO_KEYWORDS)
     
     # Calcular confiança baseado em clareza da decisão
     total_keywords = produtivo_count + improdutivo_count
@@ -165,13 +851,10 @@ def _fallback_classify(content: str) -> dict:
         confidence = 0.5  # Média confiança para textos muito curtos
     elif improdutivo_count > produtivo_count:
         categoria = EmailCategory.IMPRODUTIVO
-        reply = "Olá! Obrigado pelo contato. Mensagem recebida."
+        reply = DEFAULT_REPLIES[EmailCategory.IMPRODUTIVO]
     elif produtivo_count > improdutivo_count:
         categoria = EmailCategory.PRODUTIVO
-        reply = (
-            "Olá! Recebemos sua mensagem e vamos analisar sua solicitação. "
-            "Se possível, envie mais detalhes para agilizar."
-        )
+        reply = DEFAULT_REPLIES[EmailCategory.PRODUTIVO]
     else:
         # Empate ou ambos 0: sem contexto suficiente = IMPRODUTIVO
         categoria = EmailCategory.IMPRODUTIVO
@@ -181,5 +864,7 @@ def _fallback_classify(content: str) -> dict:
         "category": categoria,
         "suggested_reply": reply,
         "confidence": round(confidence, 2),
-        "reason": f"Fallback: análise heurística (produtivo_score={produtivo_count}, improdutivo_score={improdutivo_count})"
+        "reason": f"Fallback: análise heurística (produtivo_score={produtivo_count}, improdutivo_score={improdutivo_count})",
+        "fallback": True,
+        "keyword_hits": keyword_hits,
     }
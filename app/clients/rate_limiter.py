@@ -0,0 +1,433 @@
+"""
+Limitador de taxa adaptativo para as chamadas ao LLM.
+
+Dois baldes de fichas, um de requisições por minuto (RPM) e outro de
+tokens por minuto (TPM), compartilhados por todas as chamadas do
+serviço. Os limites começam nos valores configurados e são corrigidos
+pelos cabeçalhos da API (x-ratelimit-*). Um 429 pausa todas as chamadas
+pelo tempo de retry-after. Quem espera é atendido por prioridade
+(interativo antes de lote) e desiste quando a espera estouraria o
+orçamento de latência, usando então o fallback.
+
+Com SHARED_STATE_PATH (vários workers do gunicorn), baldes e pausa ficam
+no estado compartilhado (app/shared_state.py): os workers dividem o
+limite da chave em vez de cada um gastá-lo inteiro. Cada reserva é um
+único UPDATE no SQLite, rodado por asyncio.to_thread; os baldes locais
+guardam o último valor lido, usado nas estimativas de espera e em stats().
+A fila de espera continua por processo.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import sqlite3
+import time
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+
+from app.shared_state import SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+# Limites iniciais (padrão: gpt-4.1-mini no tier 1); 0 desativa o balde
+LLM_RPM_LIMIT = float(os.getenv("LLM_RPM_LIMIT", 500))
+LLM_TPM_LIMIT = float(os.getenv("LLM_TPM_LIMIT", 200_000))
+
+# Rajada máxima, em segundos de limite: a API aplica o limite por minuto em frações
+# menores (ex.: 600 RPM viram ~10 por segundo), então rajadas maiores recebem 429
+LLM_RATE_BURST_SECONDS = float(os.getenv("LLM_RATE_BURST_SECONDS", 1.0))
+
+# Tempo total (fila + retentativas) que uma análise pode esperar pelo LLM antes do fallback
+LLM_LATENCY_BUDGET_SECONDS = float(os.getenv("LLM_LATENCY_BUDGET_SECONDS", 20))
+LLM_BULK_LATENCY_BUDGET_SECONDS = float(os.getenv("LLM_BULK_LATENCY_BUDGET_SECONDS", 600))
+
+# Retentativas em 429, 5xx e falhas de conexão (backoff exponencial com jitter)
+LLM_RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", 4))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", 0.5))
+LLM_RETRY_MAX_SECONDS = 8.0
+
+# Pausa após um 429 sem retry-after nem x-ratelimit-reset-*
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+# Nova tentativa da fila quando o estado compartilhado falha (ex.: lock além do timeout)
+_SHARED_STATE_RETRY_SECONDS = 0.1
+
+# Menor valor = atendido primeiro
+PRIORITY_INTERACTIVE = 0  # /api/analyze
+PRIORITY_BATCH = 1        # lotes e mbox pela API: alguém espera a resposta
+PRIORITY_BULK = 2         # processamento offline (CLI bulk): pode esperar bem mais
+
+# Prioridade da análise em andamento; as tasks criadas a partir dela herdam o valor
+REQUEST_PRIORITY: ContextVar[int] = ContextVar("llm_request_priority", default=PRIORITY_INTERACTIVE)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def latency_budget(priority: int) -> float:
+    return LLM_BULK_LATENCY_BUDGET_SECONDS if priority >= PRIORITY_BULK else LLM_LATENCY_BUDGET_SECONDS
+
+
+def retry_delay(attempt: int) -> float:
+    """Backoff exponencial com jitter completo (evita retentativas sincronizadas)"""
+    return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+class TokenBucket:
+    """
+    Balde reabastecido continuamente a `limit` por minuto, com capacidade
+    de `burst_seconds` de limite (no mínimo 1).
+    """
+
+    def __init__(self, limit: float, now: float, burst_seconds: float = LLM_RATE_BURST_SECONDS):
+        self.burst_seconds = burst_seconds
+        self.limit = limit
+        self.level = self.capacity
+        self._updated = now
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    @property
+    def capacity(self) -> float:
+        return max(1.0, self.limit * self.burst_seconds / 60)
+
+    def level_at(self, now: float) -> float:
+        """Saldo em `now` sem alterar o balde (leitura segura fora do event loop)"""
+        if not self.enabled:
+            return self.level
+        return min(self.capacity, self.level + max(0.0, now - self._updated) * self.limit / 60)
+
+    def refill(self, now: float) -> None:
+        self.level = self.level_at(now)
+        self._updated = max(self._updated, now)
+
+    def restore(self, limit: float, level: float, updated: float) -> None:
+        """Copia o balde lido do estado compartilhado"""
+        self.limit, self.level, self._updated = limit, level, updated
+
+    def time_until(self, amount: float, now: float, capped: bool = True) -> float:
+        """
+        Segundos até haver `amount` no balde. Com capped, pedidos maiores
+        que a capacidade esperam só o balde cheio; sem, a estimativa é proporcional.
+        """
+        if not self.enabled:
+            return 0.0
+        self.refill(now)
+        missing = (min(amount, self.capacity) if capped else amount) - self.level
+        return max(0.0, missing * 60 / self.limit)
+
+    def take(self, amount: float) -> None:
+        if self.enabled:
+            # Pode ficar negativo (uso real acima do estimado): o déficit atrasa os próximos
+            self.level -= amount
+
+    def cap(self, level: float, now: float) -> None:
+        """Limita o saldo (ex.: ao restante informado pela API)"""
+        self.refill(now)
+        self.level = min(self.level, level)
+
+    def set_limit(self, limit: float, now: float) -> None:
+        self.refill(now)
+        self.limit = limit
+        self.level = min(self.level, self.capacity)
+
+
+class AdaptiveRateLimiter:
+    """
+    Uso (dentro do event loop):
+        deadline = limiter.now() + latency_budget(priority)
+        if not await limiter.acquire(tokens, priority, deadline):
+            return fallback()
+        ... chamada ...
+        await limiter.update_from_headers(headers)  # resposta OK
+        await limiter.on_rate_limited(headers)      # 429
+    """
+
+    def __init__(
+        self,
+        rpm: float = LLM_RPM_LIMIT,
+        tpm: float = LLM_TPM_LIMIT,
+        clock=None,
+        name: str = "llm",
+        state: SharedState | None = None
+    ):
+        """
+        name identifica o limitador no estado compartilhado (um por chave/modelo);
+        sem state usa get_shared_state(). O clock padrão é time.monotonic ou,
+        com estado compartilhado, time.time: o mesmo em todos os processos e
+        depois de um reboot.
+        """
+        self.name = name
+        self._state = state or get_shared_state()
+        self._clock = clock or (time.time if self._state is not None else time.monotonic)
+        now = self._clock()
+        self.requests = TokenBucket(rpm, now)
+        self.tokens = TokenBucket(tpm, now)
+        self._paused_until = 0.0
+        if self._state is not None:
+            self._restore(self._state.init_rate_limit(name, rpm, tpm, LLM_RATE_BURST_SECONDS, now))
+        # [prioridade, ordem de chegada, tokens, future]
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._drain_task: asyncio.Task | None = None
+
+        self.granted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.rate_limited = 0
+
+    def now(self) -> float:
+        """Instante atual no clock do limitador (a base dos deadlines de acquire)"""
+        return self._clock()
+
+    @property
+    def paused_until(self) -> float:
+        """Fim da pausa após 429 (com estado compartilhado, o último valor lido)"""
+        return self._paused_until
+
+    def set_limits(self, rpm: float | None = None, tpm: float | None = None) -> None:
+        """Limites iniciais (ex.: --rpm/--tpm da CLI), antes das chamadas começarem"""
+        now = self._clock()
+        if self._state is not None:
+            self._restore(self._state.update_rate_limit(self.name, now, LLM_RATE_BURST_SECONDS, rpm=rpm, tpm=tpm))
+            return
+        if rpm is not None:
+            self.requests.set_limit(rpm, now)
+        if tpm is not None:
+            self.tokens.set_limit(tpm, now)
+
+    async def acquire(self, tokens: int, priority: int = PRIORITY_INTERACTIVE, deadline: float | None = None) -> bool:
+        """
+        Reserva uma requisição e `tokens` tokens. Retorna False, sem reservar,
+        se a espera estimada (ou a real) passar do deadline (em self._clock).
+        """
+        now = self._clock()
+        if not self._waiters and await self._try_take(tokens, now):
+            return True
+
+        # Sem reserva, os baldes locais têm o saldo que acabou de ser lido
+        if deadline is not None and now + self._estimate_wait(tokens, priority, now) > deadline:
+            self.rejected += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._sequence), tokens, future])
+        self.queued += 1
+        self._schedule(0)
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - now)
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # wait_for cancelou o future: o _drain descarta a entrada
+            self.rejected += 1
+            return False
+        return True
+
+    async def record_usage(self, estimated: int, actual: int) -> None:
+        """Corrige o balde de tokens com o consumo real informado pela API"""
+        await self._consume(0, actual - estimated)
+
+    async def update_from_headers(self, headers) -> None:
+        """Ajusta limites e saldo com x-ratelimit-limit-* e x-ratelimit-remaining-*"""
+        if headers:
+            await self._update(self._clock(), **_header_limits(headers))
+
+    async def on_rate_limited(self, headers) -> float:
+        """Pausa todas as chamadas após um 429; retorna a pausa em segundos"""
+        self.rate_limited += 1
+        delay = _retry_after(headers)
+        if delay is None:
+            delay = DEFAULT_RETRY_AFTER_SECONDS
+        now = self._clock()
+        await self._update(now, pause_until=now + delay, **(_header_limits(headers) if headers else {}))
+        return delay
+
+    def stats(self) -> dict:
+        """Só leitura: chamado pelo /health e /metrics no threadpool, fora do event loop"""
+        now = self._clock()
+        return {
+            "rpm_limit": self.requests.limit,
+            "tpm_limit": self.tokens.limit,
+            "available_requests": round(self.requests.level_at(now), 1),
+            "available_tokens": round(self.tokens.level_at(now)),
+            "waiting": sum(1 for *_, future in list(self._waiters) if not future.done()),
+            "granted": self.granted,
+            "queued": self.queued,
+            "rejected_latency_budget": self.rejected,
+            "rate_limited_responses": self.rate_limited,
+            "paused_for_seconds": round(max(0.0, self._paused_until - now), 3),
+        }
+
+    def _restore(self, row: tuple) -> None:
+        rpm, tpm, requests, tokens, updated, paused_until = row
+        self.requests.restore(rpm, requests, updated)
+        self.tokens.restore(tpm, tokens, updated)
+        self._paused_until = paused_until
+
+    async def _try_take(self, tokens: int, now: float) -> bool:
+        """Reserva se houver saldo agora; com estado compartilhado, um UPDATE fora do loop"""
+        if self._state is None:
+            if self._ready_in(tokens, now) > 0:
+                return False
+        else:
+            taken, row = await asyncio.to_thread(
+                self._state.take_rate_limit, self.name, tokens, now, LLM_RATE_BURST_SECONDS
+            )
+            self._restore(row)
+            if not taken:
+                return False
+        self._take(tokens)
+        return True
+
+    def _take(self, tokens: int) -> None:
+        # No estado compartilhado a reserva já foi feita pelo UPDATE; aqui só os baldes locais
+        if self._state is None:
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        self.granted += 1
+
+    async def _consume(self, requests: float, tokens: float) -> None:
+        if self._state is None:
+            self.requests.take(requests)
+            self.tokens.take(tokens)
+        else:
+            self._restore(await asyncio.to_thread(self._state.consume_rate_limit, self.name, requests, tokens))
+
+    async def _update(self, now: float, pause_until: float | None = None, **limits) -> None:
+        if self._state is not None:
+            self._restore(await asyncio.to_thread(
+                self._state.update_rate_limit, self.name, now, LLM_RATE_BURST_SECONDS, pause_until=pause_until, **limits
+            ))
+            return
+        for bucket, limit_key, remaining_key in (
+            (self.requests, "rpm", "remaining_requests"), (self.tokens, "tpm", "remaining_tokens")
+        ):
+            limit = limits.get(limit_key)
+            if limit is not None:
+                bucket.set_limit(limit, now)
+            remaining = limits.get(remaining_key)
+            if remaining is not None and bucket.enabled:
+                # O servidor conta as chamadas de todos os processos que usam a mesma chave
+                bucket.cap(remaining, now)
+        if pause_until is not None:
+            self._paused_until = max(self._paused_until, pause_until)
+
+    def _ready_in(self, tokens: int, now: float) -> float:
+        return max(
+            self._paused_until - now,
+            self.requests.time_until(1, now),
+            self.tokens.time_until(tokens, now),
+        )
+
+    def _estimate_wait(self, tokens: int, priority: int, now: float) -> float:
+        """Espera até atender quem está na frente (mesma prioridade ou maior) e este pedido"""
+        ahead = [entry for entry in self._waiters if entry[0] <= priority and not entry[3].done()]
+        return max(
+            self._paused_until - now,
+            self.requests.time_until(len(ahead) + 1, now, capped=False),
+            self.tokens.time_until(sum(entry[2] for entry in ahead) + tokens, now, capped=False),
+        )
+
+    def _schedule(self, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        if self._timer is not None:
+            if self._timer.when() <= loop.time() + delay:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_later(delay, self._start_drain)
+
+    def _start_drain(self) -> None:
+        self._timer = None
+        # Um _drain por vez: o que está rodando confere a fila de novo depois de cada await
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.ensure_future(self._drain())
+
+    async def _drain(self) -> None:
+        while self._waiters:
+            entry = self._waiters[0]
+            tokens, future = entry[2], entry[3]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            now = self._clock()
+            try:
+                taken = await self._try_take(tokens, now)
+            except sqlite3.Error as e:
+                logger.warning("Falha ao reservar no limitador compartilhado: %s", e)
+                self._schedule(_SHARED_STATE_RETRY_SECONDS)
+                return
+            if not taken:
+                # Prioridade estrita: ninguém passa na frente do primeiro da fila.
+                # O mínimo evita repetir na hora se o arredondamento der espera 0
+                self._schedule(max(self._ready_in(tokens, now), 0.001))
+                return
+            # Durante o await a fila pode ter mudado (chegadas, desistências)
+            if self._waiters[0] is entry:
+                heapq.heappop(self._waiters)
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if future.done():
+                # Desistiu enquanto a reserva era feita: devolve
+                await self._consume(-1, -tokens)
+            else:
+                future.set_result(True)
+
+
+def _header_limits(headers) -> dict:
+    """Limites (x-ratelimit-limit-*, 0 ignorado) e saldos (x-ratelimit-remaining-*) dos cabeçalhos"""
+    return {
+        "rpm": _number(headers.get("x-ratelimit-limit-requests")) or None,
+        "tpm": _number(headers.get("x-ratelimit-limit-tokens")) or None,
+        "remaining_requests": _number(headers.get("x-ratelimit-remaining-requests")),
+        "remaining_tokens": _number(headers.get("x-ratelimit-remaining-tokens")),
+    }
+
+
+def _number(value) -> float | None:
+    try:
+        return float(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def _parse_duration(value: str | None) -> float | None:
+    """Durações da OpenAI: "1s", "120ms", "6m0s", "1h2m3.5s" """
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return _number(value)
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _retry_after(headers) -> float | None:
+    """Espera pedida pela API: retry-after-ms, retry-after (segundos ou data) ou reset dos limites esgotados"""
+    if not headers:
+        return None
+    milliseconds = _number(headers.get("retry-after-ms"))
+    if milliseconds is not None:
+        return milliseconds / 1000
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        seconds = _number(retry_after)
+        if seconds is not None:
+            return seconds
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    resets = [
+        _parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+        for kind in ("requests", "tokens")
+        if _number(headers.get(f"x-ratelimit-remaining-{kind}")) == 0
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
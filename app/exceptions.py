@@ -16,7 +16,7 @@ async def http_exception_handler(request, exc: HTTPException):
     """
     Handler para HTTPException com retornos padronizados
     """
-    logger.warning(f"HTTPException: {exc.status_code} - {exc.detail}")
+    logger.warning("HTTPException: %s - %s", exc.status_code, exc.detail)
     
     error_response = ErrorDetail(
         error=True,
@@ -27,7 +27,8 @@ async def http_exception_handler(request, exc: HTTPException):
     
     return JSONResponse(
         status_code=exc.status_code,
-        content=error_response.model_dump()
+        content=error_response.model_dump(),
+        headers=exc.headers
     )
 
 
@@ -35,7 +36,7 @@ async def validation_exception_handler(request, exc: RequestValidationError):
     """
     Handler para erros de validação de requisição
     """
-    logger.warning(f"Validation Error: {exc.errors()}")
+    logger.warning("Validation Error: %s", exc.errors())
     
     error_response = ValidationErrorDetail(
         error=True,
@@ -59,7 +60,7 @@ async def general_exception_handler(request, exc: Exception):
     error_msg = str(exc)
     
     logger.error(
-        f"Unhandled Exception [{error_type}]: {error_msg}",
+        "Unhandled Exception [%s]: %s", error_type, error_msg,
         exc_info=True,
         extra={
             "path": request.url.path,
@@ -90,6 +91,7 @@ def _get_error_message(status_code: int) -> str:
         401: "Autenticação necessária. Verifique suas credenciais.",
         403: "Acesso negado. Você não tem permissão para acessar este recurso.",
         404: "Recurso não encontrado.",
+        413: "Arquivo muito grande. Reduza o tamanho e tente novamente.",
         422: "Validação falhou. Verifique o formato dos dados.",
         500: "Erro interno do servidor. Tente novamente mais tarde.",
         502: "Gateway indisponível. Tente novamente em alguns momentos.",
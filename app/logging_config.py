@@ -0,0 +1,165 @@
+"""
+Configuração dos logs da aplicação.
+
+LOG_FORMAT=text mantém o formato de texto; json gera uma linha JSON por
+evento (ts, level, logger, message, request_id e os campos passados em
+extra=...). Nos dois modos o logger só enfileira o registro: formatação e
+escrita acontecem numa thread (QueueListener), então a requisição não
+espera o terminal, o pipe do Docker ou o coletor. Com a fila cheia o
+registro é descartado e contado, em vez de bloquear.
+
+Cada requisição HTTP (e cada job) recebe um request_id, copiado em todos
+os logs emitidos durante ela e devolvido no cabeçalho X-Request-ID.
+LOG_SAMPLE_RATE sorteia, por requisição, se os logs abaixo de WARNING são
+emitidos: com 0.01 só 1% das requisições deixa o rastro completo; avisos
+e erros saem sempre.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+# Registros aguardando a thread de escrita; acima disto são descartados
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+REQUEST_ID: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+# Se os logs abaixo de WARNING da requisição atual são emitidos (sorteado em start_request)
+LOG_SAMPLED: contextvars.ContextVar[bool] = contextvars.ContextVar("log_sampled", default=True)
+
+# Atributos de todo LogRecord; os demais vieram de extra=... (color_message é a cópia com cores do uvicorn)
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "taskName", "color_message",
+}
+
+_handler: "ContextQueueHandler | None" = None
+_listener: logging.handlers.QueueListener | None = None
+
+
+def start_request(request_id: str | None = None) -> str:
+    """Início de uma requisição ou job: define o request_id dos logs e sorteia a amostragem"""
+    # Só correlaciona logs: não precisa do os.urandom do uuid4, que custa dezenas de µs
+    request_id = request_id or f"{random.getrandbits(64):016x}"
+    REQUEST_ID.set(request_id)
+    LOG_SAMPLED.set(LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE)
+    return request_id
+
+
+def log_enabled(logger: logging.Logger, level: int = logging.INFO) -> bool:
+    """Se um registro neste nível sairia: permite pular a montagem de logs caros fora da amostra"""
+    return (level >= logging.WARNING or LOG_SAMPLED.get()) and logger.isEnabledFor(level)
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos de extra=... no primeiro nível"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enfileira o registro sem formatar. No contexto de quem loga só é feito o
+    que depende dele: copiar o request_id e aplicar a amostragem.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return (record.levelno >= logging.WARNING or LOG_SAMPLED.get()) and super().filter(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # A fila é do próprio processo: msg, args e exc_info seguem intactos e
+        # são formatados na thread de escrita
+        request_id = REQUEST_ID.get()
+        if request_id is not None:
+            record.request_id = request_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT, stream=None) -> None:
+    """Troca os handlers do root pela fila com escrita em segundo plano (stderr por padrão)"""
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+
+    if log_format == "json":
+        formatter = JsonFormatter()
+        route_uvicorn_logs()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT, defaults={"request_id": "-"})
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(formatter)
+
+    _handler = ContextQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(_handler.queue, output)
+    _listener.start()
+
+
+def route_uvicorn_logs() -> None:
+    """uvicorn (inclusive o access log) no mesmo formato, com request_id e pela mesma fila"""
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+
+
+def stop_logging() -> None:
+    """Escreve o que ainda está na fila e para a thread de escrita"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_logs() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+def _restart_in_child() -> None:
+    # Processo filho de um fork (ex.: workers do gunicorn com --preload) não herda a
+    # thread de escrita; fila nova, porque a antiga pode ter ficado com a trava presa
+    global _listener
+    if _listener is None:
+        return
+    handlers = _listener.handlers
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(_handler.queue, *handlers)
+    _listener.start()
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_in_child)
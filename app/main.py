@@ -1,28 +1,48 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from app.api.routes import router as api_router
+from app.api.routes import jobs, publish_metrics, publish_metrics_periodically, router as api_router, start_warmup
 from app.exceptions import (
     http_exception_handler,
     validation_exception_handler,
     general_exception_handler
 )
+from app.logging_config import configure_logging
+from app.middleware import RequestIdMiddleware, UploadSizeLimitMiddleware
+from app.shared_state import get_shared_state
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
 import logging
 import os
 
 load_dotenv()
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Logs formatados e escritos em segundo plano (LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATE)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Configurar limite de upload (16MB por padrão)
 MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 16 * 1024 * 1024))  # 16MB em bytes
+# Exportações mbox são lidas em streaming (4GB por padrão)
+MBOX_MAX_UPLOAD_SIZE = int(os.getenv("MBOX_MAX_UPLOAD_SIZE", 4 * 1024 * 1024 * 1024))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm-up em segundo plano: o servidor já aceita conexões (e o health responde)
+    # enquanto o serviço de análise carrega; ao terminar, inicia os workers de /api/jobs
+    start_warmup()
+    # Com vários workers (SHARED_STATE_PATH), as métricas deste vão para o estado compartilhado
+    publisher = asyncio.ensure_future(publish_metrics_periodically()) if get_shared_state() else None
+    yield
+    if publisher is not None:
+        publisher.cancel()
+        publish_metrics()
+    await jobs.stop()
 
 # Configurar FastAPI com metadata correta
 app = FastAPI(
+    lifespan=lifespan,
     title="Email Analyzer API",
     version="1.0.0",
     description="""
@@ -32,7 +52,7 @@ Sistema de análise e classificação automática de emails corporativos usando
 
 * **Análise de Emails**: Classifica emails em PRODUTIVO ou IMPRODUTIVO
 * **Sugestão de Resposta**: Gera respostas automáticas contextualizadas
-* **Múltiplos Formatos**: Suporta texto direto, arquivos .txt e .pdf
+* **Múltiplos Formatos**: Suporta texto direto, arquivos .txt, .pdf e .eml e exportações .mbox
 
 ## Categorias
 
@@ -62,21 +82,18 @@ allow_origins=[
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
+)
+
+# Middleware para validar tamanho do arquivo (header e bytes recebidos)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_size=MAX_UPLOAD_SIZE,
+    path_limits={"/api/analyze/mbox": MBOX_MAX_UPLOAD_SIZE}
 )
 
-# Middleware para validar tamanho do arquivo
-@app.middleware("http")
-async def limit_upload_size(request, call_next):
-    if request.method == "POST":
-        content_length = request.headers.get("content-length")
-        if content_length and int(content_length) > MAX_UPLOAD_SIZE:
-            return JSONResponse(
-                status_code=413,
-                content={
-                    "detail": f"Arquivo muito grande. Tamanho máximo permitido: {MAX_UPLOAD_SIZE // (1024 * 1024)}MB"
-                }
-            )
-    return await call_next(request)
+# Adicionado por último para ser o mais externo: até um 413 sai com X-Request-ID
+app.add_middleware(RequestIdMiddleware)
 
 # Registrar Exception Handlers
 app.add_exception_handler(HTTPException, http_exception_handler)
@@ -103,6 +120,8 @@ async def root():
     }
 
 if __name__ == "__main__":
+    # Só para desenvolvimento (um processo; RELOAD=true recarrega a cada mudança).
+    # Em produção: gunicorn app.main:app (gunicorn.conf.py), com um worker por CPU
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=os.getenv("RELOAD", "false").lower() == "true")
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""
+Métricas da aplicação no formato texto do Prometheus.
+
+Implementação mínima (counters e histogramas com labels), sem dependências:
+cada observação custa uma busca binária e dois incrementos sob um lock.
+Os valores são por processo; com vários workers, cada um publica um
+retrato (Registry.snapshot) no estado compartilhado e a coleta soma os
+de todos (Registry.render(snapshots)).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Buckets em segundos: de microssegundos (fallback, cache) a dezenas de segundos (LLM)
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Contador monotônico com labels (valores passados na ordem de labelnames)"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> Dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, snapshots: List[Tuple[bool, dict]]) -> Dict[tuple, float]:
+        merged: Dict[tuple, float] = {}
+        for _, values in snapshots:
+            for labels, value in values.items():
+                merged[labels] = merged.get(labels, 0.0) + value
+        return merged
+
+    def collect(self, values: Dict[tuple, float] | None = None) -> List[str]:
+        items = sorted((self.snapshot() if values is None else values).items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Histogram:
+    """Histograma com buckets fixos e labels"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [contagem por bucket (não acumulada, +Inf no fim), soma]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def snapshot(self) -> Dict[tuple, list]:
+        with self._lock:
+            return {labels: [list(counts), total] for labels, (counts, total) in self._values.items()}
+
+    def merge(self, snapshots: List[Tuple[bool, dict]]) -> Dict[tuple, list]:
+        merged: Dict[tuple, list] = {}
+        for _, values in snapshots:
+            for labels, (counts, total) in values.items():
+                entry = merged.get(labels)
+                if entry is None:
+                    merged[labels] = [list(counts), total]
+                else:
+                    entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                    entry[1] += total
+        return merged
+
+    def collect(self, values: Dict[tuple, list] | None = None) -> List[str]:
+        items = sorted((self.snapshot() if values is None else values).items())
+
+        lines = []
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {repr(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Métrica sem labels cujo valor é lido na hora da coleta (ex.: contadores do cache).
+
+    Entre workers, contadores somam os de todos (inclusive os que já saíram);
+    gauges usam só os workers vivos, somados ou, com aggregate="max", o maior
+    (estado do circuito, ou um valor que todos leem do mesmo lugar).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        func: Callable[[], float],
+        type: str = "gauge",
+        aggregate: str = "sum"
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.aggregate = aggregate
+        self._func = func
+
+    def snapshot(self) -> Dict[tuple, float]:
+        return {(): self._func()}
+
+    def merge(self, snapshots: List[Tuple[bool, dict]]) -> Dict[tuple, float]:
+        values = [
+            value for live, snapshot in snapshots if live or self.type == "counter"
+            for value in snapshot.values()
+        ]
+        if not values:
+            return {}
+        return {(): max(values) if self.aggregate == "max" else sum(values)}
+
+    def collect(self, values: Dict[tuple, float] | None = None) -> List[str]:
+        value = self._func() if values is None else values.get(())
+        return [] if value is None else [f"{self.name} {_format_value(value)}"]
+
+
+class StageTimer:
+    """
+    Acumula a duração das etapas de uma análise. Os labels (ex.: se houve
+    fallback) só são conhecidos no fim, então tudo é observado de uma vez.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + time.perf_counter() - start
+
+    def observe(self, input_type: str, model: str, fallback: bool) -> None:
+        fallback_label = "true" if fallback else "false"
+        for name, seconds in self.durations.items():
+            STAGE_SECONDS.observe(seconds, name, input_type, model, fallback_label)
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, "total", input_type, model, fallback_label)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        # Re-registro com o mesmo nome substitui (ex.: serviço recriado)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> dict:
+        """Valores de todas as métricas deste processo, serializáveis em JSON"""
+        return {
+            name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+            for name, metric in self._metrics.items()
+        }
+
+    def render(self, snapshots: List[Tuple[bool, dict]] | None = None) -> str:
+        """
+        Sem snapshots, os valores deste processo; com eles (worker vivo,
+        Registry.snapshot()) de cada worker, a soma de todos.
+        """
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            if snapshots is None:
+                lines.extend(metric.collect())
+            else:
+                values = [
+                    (live, {tuple(labels): value for labels, value in snapshot.get(name, [])})
+                    for live, snapshot in snapshots
+                ]
+                lines.extend(metric.collect(metric.merge(values)))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "email_analyzer_stage_seconds",
+    "Duração de cada etapa do pipeline de análise",
+    ("stage", "input_type", "model", "fallback"),
+))
+
+ANALYSES_TOTAL = REGISTRY.register(Counter(
+    "email_analyzer_analyses_total",
+    "Análises concluídas",
+    ("input_type", "category", "fallback"),
+))
+
+LLM_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "email_analyzer_llm_request_seconds",
+    "Duração das chamadas ao LLM (outcome: ok ou error)",
+    ("model", "outcome"),
+))
+
+FALLBACK_SECONDS = REGISTRY.register(Histogram(
+    "email_analyzer_fallback_seconds",
+    "Duração da classificação heurística (reason: error ou circuit_open)",
+    ("reason",),
+))
+
+LLM_TOKENS_TOTAL = REGISTRY.register(Counter(
+    "email_analyzer_llm_tokens_total",
+    "Tokens consumidos no LLM, lidos de response.usage",
+    ("model", "type"),
+))
+
+LLM_HEDGES_TOTAL = REGISTRY.register(Counter(
+    "email_analyzer_llm_hedges_total",
+    "Chamadas repetidas no backend secundário (reason: slow ou fallback; winner: primary, secondary ou none)",
+    ("reason", "winner"),
+))
@@ -0,0 +1,88 @@
+"""
+Middlewares ASGI da aplicação.
+"""
+
+import re
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.logging_config import start_request
+
+# X-Request-ID aceito do cliente/proxy; outros valores são trocados por um novo (evita injeção nos logs)
+_REQUEST_ID = re.compile(rb"[A-Za-z0-9._-]{1,128}")
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Limita o tamanho do corpo das requisições POST.
+
+    Rejeita cedo pelo header Content-Length e, como o header pode faltar
+    (chunked) ou mentir, também conta os bytes realmente recebidos:
+    ao passar do limite a leitura do corpo é interrompida com 413.
+    Rotas em path_limits (ex.: upload de mbox) têm limite próprio.
+    """
+
+    def __init__(self, app, max_size: int, path_limits: dict[str, int] | None = None):
+        self.app = app
+        self.max_size = max_size
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        max_size = self.path_limits.get(scope["path"], self.max_size)
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and int(content_length) > max_size:
+            response = JSONResponse(
+                status_code=413,
+                content={"detail": self._detail(max_size)}
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_size:
+                    raise HTTPException(status_code=413, detail=self._detail(max_size))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self, max_size: int) -> str:
+        return f"Arquivo muito grande. Tamanho máximo permitido: {max_size // (1024 * 1024)}MB"
+
+
+class RequestIdMiddleware:
+    """
+    Correlation ID por requisição: usa o X-Request-ID recebido (ex.: do
+    nginx) ou gera um, marca com ele os logs emitidos durante a requisição
+    (app/logging_config.py) e o devolve no cabeçalho da resposta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(b"x-request-id")
+        valid = incoming is not None and _REQUEST_ID.fullmatch(incoming)
+        request_id = start_request(incoming.decode("ascii") if valid else None)
+        header = (b"x-request-id", request_id.encode("ascii"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), header]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
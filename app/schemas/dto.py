@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from datetime import datetime
+from typing import Literal, Optional, List
 from app.domain.email_category import EmailCategory
 
 class AnalyzeResponse(BaseModel):
@@ -21,16 +22,68 @@ class AnalyzeResponse(BaseModel):
     le=1.0,
     example=0.95
   )
+  fallback: bool = Field(
+    default=False,
+    description="True quando a classificação veio da heurística local (LLM indisponível)",
+    example=False
+  )
 
   class Config:
     json_schema_extra = {
       "example": {
         "category": "PRODUTIVO",
         "suggested_reply": "Olá! Recebemos sua mensagem e iremos analisar sua solicitação em breve. Se possível, envie mais detalhes.",
-        "confidence": 0.92
+        "confidence": 0.92,
+        "fallback": False
       }
     }
 
+class BatchEmail(BaseModel):
+  """Email de entrada da análise em lote"""
+  id: Optional[str] = Field(
+    default=None,
+    description="Identificador opcional devolvido no resultado",
+    example="msg-001"
+  )
+  text: str = Field(
+    ...,
+    description="Texto do email",
+    example="Bom dia, poderia me informar o status do chamado #1234?"
+  )
+
+class BatchItemResult(BaseModel):
+  """Resultado de um item do lote"""
+  index: int = Field(..., description="Posição do item na entrada")
+  id: Optional[str] = Field(default=None, description="Identificador enviado na entrada (ou nome do arquivo)")
+  ok: bool = Field(..., description="Indica se a análise do item teve sucesso")
+  result: Optional[AnalyzeResponse] = Field(default=None, description="Análise do item, quando ok")
+  status_code: Optional[int] = Field(default=None, description="Código HTTP do erro do item")
+  detail: Optional[str] = Field(default=None, description="Descrição do erro do item")
+
+class BatchAnalyzeResponse(BaseModel):
+  """Resposta da análise em lote"""
+  total: int = Field(..., description="Quantidade de itens recebidos")
+  succeeded: int = Field(..., description="Itens analisados com sucesso")
+  failed: int = Field(..., description="Itens com erro")
+  results: List[BatchItemResult] = Field(..., description="Resultados na ordem de entrada")
+
+class JobResponse(BaseModel):
+  """Estado de uma análise assíncrona"""
+  id: str = Field(..., description="Identificador do job", example="3f2b9c0d8e4a4f7b9a1c2d3e4f5a6b7c")
+  status: Literal["queued", "running", "done", "failed"] = Field(
+    ...,
+    description="queued: aguardando; running: em análise; done: concluído; failed: erro",
+    example="queued"
+  )
+  filename: Optional[str] = Field(default=None, description="Nome do arquivo enviado (vazio para texto)")
+  attempts: int = Field(default=0, description="Vezes que o processamento foi iniciado")
+  result: Optional[AnalyzeResponse] = Field(default=None, description="Análise, quando done")
+  status_code: Optional[int] = Field(default=None, description="Código HTTP do erro, quando failed")
+  detail: Optional[str] = Field(default=None, description="Descrição do erro, quando failed")
+  created_at: datetime = Field(..., description="Recebimento do job")
+  started_at: Optional[datetime] = Field(default=None, description="Início do processamento")
+  finished_at: Optional[datetime] = Field(default=None, description="Fim do processamento")
+
 class ErrorDetail(BaseModel):
   """Detalhe de erro"""
   error: bool = Field(..., description="Indicador de erro")
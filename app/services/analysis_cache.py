@@ -0,0 +1,225 @@
+"""
+Cache de resultados de análise endereçado por conteúdo.
+
+A chave é o hash do texto preprocessado + modelo + versão do prompt,
+então emails repetidos (newsletters, respostas automáticas, agradecimentos)
+não geram nova chamada ao LLM.
+
+Camadas:
+1. LRU em memória do processo, com TTL
+2. Backend compartilhado opcional (arquivo SQLite) para múltiplos workers
+
+O acesso ao SQLite (que pode esperar até 5 s por um lock de outro
+processo) roda numa thread, fora do event loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from app.domain.email_category import EmailCategory
+from app.shared_state import SHARED_STATE_PATH
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", 10000))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", 24 * 60 * 60))  # segundos
+# Sem arquivo próprio, usa o do estado compartilhado entre workers (se houver)
+ANALYSIS_CACHE_SQLITE_PATH = os.getenv("ANALYSIS_CACHE_SQLITE_PATH") or SHARED_STATE_PATH
+# Limite de linhas do arquivo; acima dele saem as que expiram primeiro (0 desativa)
+ANALYSIS_CACHE_SQLITE_MAX_ROWS = int(os.getenv("ANALYSIS_CACHE_SQLITE_MAX_ROWS", 100000))
+
+# Intervalo mínimo (segundos) entre limpezas do arquivo, feitas na escrita
+SQLITE_PURGE_INTERVAL = 60.0
+
+
+def build_cache_key(content: str, model: str, prompt_version: str) -> str:
+    """
+    Gera a chave do cache a partir do conteúdo preprocessado.
+
+    Args:
+        content: Texto já preprocessado
+        model: Nome do modelo usado na análise
+        prompt_version: Versão do prompt/schema
+
+    Returns:
+        Hash SHA-256 em hexadecimal
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{model}\x00{prompt_version}\x00".encode("utf-8"))
+    digest.update(content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def serialize_result(result: dict) -> str:
+    data = dict(result)
+    data["category"] = EmailCategory(data["category"]).value
+    return json.dumps(data, ensure_ascii=False)
+
+
+def deserialize_result(raw: str) -> dict:
+    data = json.loads(raw)
+    data["category"] = EmailCategory(data["category"])
+    return data
+
+
+class SQLiteCacheBackend:
+    """
+    Backend compartilhado em SQLite (modo WAL), seguro para vários
+    processos lendo e escrevendo o mesmo arquivo. Entradas expiradas e o
+    excesso sobre max_rows são removidos a cada purge_interval segundos,
+    na escrita: sem isso só sairiam quando a mesma chave fosse lida de novo.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = ANALYSIS_CACHE_TTL,
+        max_rows: int = ANALYSIS_CACHE_SQLITE_MAX_ROWS,
+        purge_interval: float = SQLITE_PURGE_INTERVAL
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS analysis_cache_expires ON analysis_cache (expires_at)")
+
+    def get(self, key: str) -> dict | None:
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM analysis_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+            return None
+        return deserialize_result(row[0])
+
+    def set(self, key: str, value: dict) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO analysis_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, serialize_result(value), time.time() + self.ttl),
+        )
+        now = time.monotonic()
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            self.purge()
+
+    def purge(self) -> int:
+        """Remove as entradas expiradas e, acima de max_rows, as que expiram primeiro; retorna quantas saíram"""
+        removed = self._conn.execute("DELETE FROM analysis_cache WHERE expires_at < ?", (time.time(),)).rowcount
+        if self.max_rows > 0:
+            removed += self._conn.execute(
+                "DELETE FROM analysis_cache WHERE key IN ("
+                "SELECT key FROM analysis_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,)
+            ).rowcount
+        return removed
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class AnalysisCache:
+    """
+    LRU em memória com TTL, opcionalmente apoiado por um backend compartilhado.
+    Um max_size <= 0 desativa o cache.
+    """
+
+    def __init__(
+        self,
+        max_size: int = ANALYSIS_CACHE_SIZE,
+        ttl: float = ANALYSIS_CACHE_TTL,
+        backend: SQLiteCacheBackend | None = None
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.backend_hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    async def get(self, key: str) -> dict | None:
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at >= time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(value)
+            del self._entries[key]
+
+        if self.backend is not None:
+            try:
+                value = await asyncio.to_thread(self.backend.get, key)
+            except sqlite3.Error as e:
+                logger.warning("Falha ao ler cache compartilhado: %s", e)
+                value = None
+            if value is not None:
+                self._store(key, value)
+                self.hits += 1
+                self.backend_hits += 1
+                return dict(value)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict) -> None:
+        if not self.enabled:
+            return
+
+        self._store(key, dict(value))
+        if self.backend is not None:
+            try:
+                await asyncio.to_thread(self.backend.set, key, value)
+            except sqlite3.Error as e:
+                logger.warning("Falha ao gravar cache compartilhado: %s", e)
+
+    def _store(self, key: str, value: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Contadores de hit/miss (cada hit é uma chamada ao LLM economizada)"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "backend_hits": self.backend_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "llm_calls_saved": self.hits,
+        }
+
+
+def build_analysis_cache() -> AnalysisCache:
+    """Monta o cache a partir das variáveis de ambiente"""
+    backend = None
+    if ANALYSIS_CACHE_SQLITE_PATH:
+        backend = SQLiteCacheBackend(ANALYSIS_CACHE_SQLITE_PATH, ANALYSIS_CACHE_TTL)
+    return AnalysisCache(ANALYSIS_CACHE_SIZE, ANALYSIS_CACHE_TTL, backend)
@@ -1,15 +1,41 @@
-from app.clients.llm_client import OpenAILLMClient
+from app.clients.backends import LLMBackend, build_llm_client
+from app.clients.llm_client import MAX_LLM_INPUT_CHARS, PROMPT_VERSION
+from app.clients.rate_limiter import PRIORITY_BATCH, PRIORITY_BULK, REQUEST_PRIORITY
+from app.logging_config import log_enabled
+from app.metrics import ANALYSES_TOTAL, StageTimer
+from app.services.analysis_cache import build_analysis_cache, build_cache_key
+from app.services.local_classifier import LocalTierRouter, build_local_tier
+from app.services.micro_batcher import MicroBatcher
+from app.services.near_duplicate import build_near_duplicate_index
+from app.services.single_flight import SingleFlight
 from app.utils.file_reader import extract_text
+from app.utils.mime_reader import ParsedEmail
+from app.utils.text_reducer import reduce_email
 from app.utils.text_preprocessor import preprocess_text
 from fastapi import HTTPException, UploadFile
 from app.schemas.dto import AnalyzeResponse
+from typing import AsyncIterator
+import asyncio
 import logging
+import os
+import time
 
 logger = logging.getLogger(__name__)
 
+# Quantidade de emails de um lote processados ao mesmo tempo
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+
 class EmailAnalyzerService:
-  def __init__(self):
-      self.ai_client = OpenAILLMClient()
+  def __init__(self, ai_client: LLMBackend | None = None, local_tier: LocalTierRouter | None = None):
+      # Sem ai_client, o backend (e o hedge) vem das variáveis LLM_* (app/clients/backends.py)
+      self.ai_client = ai_client or build_llm_client()
+      self.cache = build_analysis_cache()
+      self.single_flight = SingleFlight()
+      self.local_tier = local_tier or build_local_tier()
+      # Emails de template (mesmo texto com outro nome/número) reaproveitam a análise do LLM
+      self.near_duplicates = build_near_duplicate_index(f"{self.ai_client.model}:{PROMPT_VERSION}")
+      # Emails pendentes agrupados em uma chamada ao LLM (desativado com LLM_BATCH_WINDOW_MS=0)
+      self.batcher = MicroBatcher(self._analyze_many, max_item_chars=MAX_LLM_INPUT_CHARS)
 
 
   async def analyze(
@@ -19,49 +45,418 @@ class EmailAnalyzerService:
   ) -> AnalyzeResponse:
         """
         Orquestra o pipeline:
-        entrada -> extração -> pré-processamento -> IA(stub) -> response
+        entrada -> extração -> redução -> pré-processamento -> cache -> quase duplicados -> modelo local -> IA -> response
         """
         
         try:
-            logger.info(f"Iniciando análise. text={bool(text)}, file={bool(file)}")
-            
-            if text and text.strip():
-                content = text.strip()
-                logger.info(f"Usando texto direto. Tamanho: {len(content)} chars")
-            elif file:
-                logger.info(f"Extraindo texto do arquivo: {file.filename}")
-                content = await extract_text(file)
-            else:
-                content = ""
+            timer = StageTimer()
+            content = await self._prepare_content(text, file, timer)
             
-            logger.info(f"Conteúdo bruto extraído: {len(content)} chars")
-            
-            content = preprocess_text(content)
-            logger.info(f"Conteúdo processado: {len(content)} chars")
-
-            if not content:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Conteúdo do email está vazio"
-                )
-            
-            logger.info("Enviando para análise de IA...")
-            ai_result = self.ai_client.analyze(content)
-            logger.info(f"IA respondeu: categoria={ai_result['category']}, confidence={ai_result['confidence']}")
-            logger.debug(f"Reason (interno): {ai_result['reason']}")
+            ai_result = await self._classify(content, timer)
+            self._observe(timer, text, file, ai_result)
 
             return AnalyzeResponse(
                 category=ai_result["category"],
                 suggested_reply=ai_result["suggested_reply"],
-                confidence=ai_result["confidence"]
+                confidence=ai_result["confidence"],
+                fallback=ai_result.get("fallback", False)
             )
             
         except HTTPException as exc:
-            logger.warning(f"HTTPException lançada: {exc.status_code}")
+            # O handler de HTTPException (app/exceptions.py) já registra o aviso
+            logger.debug("HTTPException lançada: %s", exc.status_code)
             raise
         except Exception as e:
-            logger.error(f"Erro durante análise: {type(e).__name__}: {str(e)}", exc_info=True)
+            logger.error("Erro durante análise: %s: %s", type(e).__name__, e, exc_info=True)
             raise HTTPException(
                 status_code=500,
                 detail=f"Erro ao processar: {str(e)}"
-            )
\ No newline at end of file
+            )
+
+
+  async def analyze_events(
+    self,
+    text: str | None = None,
+    file: UploadFile | None = None
+  ) -> AsyncIterator[tuple[str, object]]:
+        """
+        Versão em streaming de analyze(), para o /api/analyze/stream.
+
+        Extrai e preprocessa antes de retornar, então erros de entrada
+        (HTTPException) saem antes do stream começar. O iterador retornado gera
+        ("category", EmailCategory), ("delta", trecho da resposta sugerida)
+        conforme o LLM escreve e, por último, ("result", AnalyzeResponse).
+        Cache, quase duplicados e modelo local respondem sem "delta".
+        """
+        timer = StageTimer()
+        content = await self._prepare_content(text, file, timer)
+        return self._stream_classification(content, timer, text, file)
+
+
+  async def _stream_classification(
+    self,
+    content: str,
+    timer: StageTimer,
+    text: str | None,
+    file: UploadFile | None
+  ) -> AsyncIterator[tuple[str, object]]:
+        cache_key = build_cache_key(content, self.ai_client.model, PROMPT_VERSION)
+        ai_result, signature = await self._classify_without_llm(cache_key, content, timer)
+        stream = getattr(self.ai_client, "analyze_stream_async", None)
+        category_sent = False
+
+        if ai_result is None and stream is not None:
+            # Sem single flight nem micro-batch: a chamada é exclusiva desta conexão
+            logger.debug("Enviando para análise de IA (streaming)")
+            updates = stream(content)
+            try:
+                while True:
+                    # Só a espera pelo LLM conta: o tempo de leitura do cliente do SSE fica de fora
+                    with timer.stage("llm"):
+                        try:
+                            kind, value = await anext(updates)
+                        except StopAsyncIteration:
+                            break
+                    if kind == "result":
+                        ai_result = value
+                        continue
+                    category_sent = category_sent or kind == "category"
+                    yield kind, value
+            finally:
+                # Cliente desconectado no meio: fecha o stream do LLM já, sem esperar o coletor
+                if hasattr(updates, "aclose"):
+                    await updates.aclose()
+            self.local_tier.record_llm_call(timer.durations["llm"], ai_result)
+            await self._remember(cache_key, signature, ai_result)
+        elif ai_result is None:
+            with timer.stage("llm"):
+                ai_result = await self._classify_uncached(cache_key, content, signature)
+
+        self._observe(timer, text, file, ai_result)
+        if not category_sent:
+            yield "category", ai_result["category"]
+        # Se o LLM falhar no meio do stream, o fallback aqui substitui o que já foi enviado
+        yield "result", _to_response(ai_result)
+
+
+  async def analyze_batch(
+    self,
+    items: list[tuple[str | None, UploadFile | None]],
+    concurrency: int = BATCH_CONCURRENCY
+  ) -> list[AnalyzeResponse | HTTPException]:
+        """
+        Analisa um lote de emails (texto ou arquivo) com concorrência limitada.
+        Conteúdos idênticos após o pré-processamento são classificados uma única vez.
+        Retorna, na ordem de entrada, a resposta ou a HTTPException de cada item.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
+
+        timers = [StageTimer() for _ in items]
+        prepared = await asyncio.gather(
+            *(
+                bounded(self._prepare_content(text, file, timer))
+                for (text, file), timer in zip(items, timers)
+            ),
+            return_exceptions=True
+        )
+
+        unique_contents = {
+            content for content in prepared if isinstance(content, str)
+        }
+        logger.info("Lote com %d itens, %d conteúdos únicos", len(items), len(unique_contents))
+
+        classify_timers = {content: StageTimer() for content in unique_contents}
+        # As tasks do gather herdam a prioridade: chamadas interativas passam na frente do lote
+        priority = REQUEST_PRIORITY.set(PRIORITY_BATCH)
+        try:
+            classified = dict(zip(
+                unique_contents,
+                await asyncio.gather(
+                    *(
+                        bounded(self._classify(content, classify_timers[content]))
+                        for content in unique_contents
+                    ),
+                    return_exceptions=True
+                )
+            ))
+        finally:
+            REQUEST_PRIORITY.reset(priority)
+
+        results = []
+        for (text, file), timer, content in zip(items, timers, prepared):
+            outcome = classified[content] if isinstance(content, str) else content
+            if isinstance(outcome, dict):
+                timer.durations.update(classify_timers[content].durations)
+                self._observe(timer, text, file, outcome)
+                results.append(AnalyzeResponse(
+                    category=outcome["category"],
+                    suggested_reply=outcome["suggested_reply"],
+                    confidence=outcome["confidence"],
+                    fallback=outcome.get("fallback", False)
+                ))
+            elif isinstance(outcome, HTTPException):
+                results.append(outcome)
+            else:
+                logger.error("Erro durante análise do lote: %s: %s", type(outcome).__name__, outcome)
+                results.append(HTTPException(
+                    status_code=500,
+                    detail=f"Erro ao processar: {str(outcome)}"
+                ))
+        return results
+
+
+  async def analyze_stream(
+    self,
+    messages: AsyncIterator[ParsedEmail],
+    input_type: str = "mbox",
+    concurrency: int = BATCH_CONCURRENCY
+  ) -> AsyncIterator[tuple[ParsedEmail, AnalyzeResponse | HTTPException]]:
+        """
+        Analisa mensagens conforme chegam (ex.: as de um mbox), com no máximo
+        `concurrency` análises em andamento. Gera (mensagem, resposta ou
+        HTTPException) na ordem de entrada, cada uma assim que fica pronta,
+        mesmo com a próxima mensagem ainda por chegar; só a janela em
+        andamento fica em memória. Erros da fonte de mensagens são relançados.
+        """
+        slots = asyncio.Semaphore(max(1, concurrency))
+        ready: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            # Task própria: a leitura da fonte não espera as respostas serem consumidas
+            try:
+                async for message in messages:
+                    await slots.acquire()
+                    ready.put_nowait((message, asyncio.ensure_future(
+                        self._analyze_message(message.text, input_type)
+                    )))
+            except Exception as e:
+                ready.put_nowait(e)
+            else:
+                ready.put_nowait(None)
+
+        producer = asyncio.ensure_future(produce())
+        task = None
+        try:
+            while True:
+                item = await ready.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                message, task = item
+                try:
+                    outcome = await task
+                finally:
+                    slots.release()
+                yield message, outcome
+        finally:
+            # Cliente desconectou no meio do stream: não deixar leitura nem análises órfãs
+            producer.cancel()
+            if task is not None:
+                task.cancel()
+            while not ready.empty():
+                item = ready.get_nowait()
+                if isinstance(item, tuple):
+                    item[1].cancel()
+
+
+  async def _analyze_message(self, text: str, input_type: str) -> AnalyzeResponse | HTTPException:
+        # Roda na própria task: a prioridade vale só para esta mensagem
+        REQUEST_PRIORITY.set(PRIORITY_BATCH)
+        timer = StageTimer()
+        try:
+            content = await self._prepare_content(text, None, timer)
+            ai_result = await self._classify(content, timer)
+        except HTTPException as exc:
+            return exc
+        except Exception as e:
+            logger.error("Erro durante análise da mensagem: %s: %s", type(e).__name__, e)
+            return HTTPException(status_code=500, detail=f"Erro ao processar: {str(e)}")
+
+        self._observe(timer, text, None, ai_result, input_type=input_type)
+        return _to_response(ai_result)
+
+
+  async def analyze_prepared(self, content: str, input_type: str = "text") -> AnalyzeResponse:
+        """
+        Classifica conteúdo já extraído, reduzido e preprocessado
+        (ex.: preparado nos processos da CLI bulk). Mesmo cache e camadas de analyze(),
+        com prioridade e orçamento de latência de processamento em massa.
+        """
+        timer = StageTimer()
+        priority = REQUEST_PRIORITY.set(PRIORITY_BULK)
+        try:
+            ai_result = await self._classify(content, timer)
+        finally:
+            REQUEST_PRIORITY.reset(priority)
+        self._observe(timer, None, None, ai_result, input_type=input_type)
+        return _to_response(ai_result)
+
+
+  async def _prepare_content(
+    self,
+    text: str | None = None,
+    file: UploadFile | None = None,
+    timer: StageTimer | None = None
+  ) -> str:
+        """
+        Extrai, reduz (sem histórico, assinatura e avisos legais, dentro do
+        orçamento de tokens) e preprocessa o conteúdo do email.
+        Lança HTTPException(400) se não sobrar conteúdo.
+        """
+        timer = timer or StageTimer()
+
+        source = "texto"
+        if text and text.strip():
+            content = text.strip()
+        elif file:
+            source = file.filename
+            with timer.stage("extract"):
+                content = await extract_text(file)
+        else:
+            content = ""
+        raw_chars = len(content)
+
+        with timer.stage("reduce"):
+            content = reduce_email(content)
+        reduced_chars = len(content)
+
+        with timer.stage("preprocess"):
+            content = preprocess_text(content)
+        # Argumentos em vez de f-string: com DEBUG desligado nada é formatado
+        logger.debug(
+            "Conteúdo preparado (%s): %d chars extraídos, %d após redução, %d após pré-processamento",
+            source, raw_chars, reduced_chars, len(content)
+        )
+
+        if not content:
+            raise HTTPException(
+                status_code=400,
+                detail="Conteúdo do email está vazio"
+            )
+        return content
+
+
+  async def _classify(self, content: str, timer: StageTimer | None = None) -> dict:
+        """
+        Classifica o conteúdo preprocessado, consultando o cache antes do LLM.
+        Emails quase iguais a um já classificado pelo LLM reaproveitam a análise.
+        Se o modelo local estiver confiante o LLM não é chamado.
+        Requisições idênticas em andamento compartilham uma única chamada ao LLM.
+        Resultados de fallback não são cacheados (são uma degradação temporária).
+        """
+        timer = timer or StageTimer()
+        cache_key = build_cache_key(content, self.ai_client.model, PROMPT_VERSION)
+
+        result, signature = await self._classify_without_llm(cache_key, content, timer)
+        if result is not None:
+            return result
+
+        with timer.stage("llm"):
+            return await self.single_flight.do(
+                cache_key, lambda: self._classify_uncached(cache_key, content, signature)
+            )
+
+
+  async def _classify_without_llm(self, cache_key: str, content: str, timer: StageTimer) -> tuple[dict | None, object]:
+        """
+        Camadas antes do LLM: cache, quase duplicados e modelo local.
+        Retorna (análise ou None, assinatura do email no índice de quase duplicados).
+        """
+        with timer.stage("cache"):
+            cached = await self.cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Resultado encontrado no cache")
+            return cached, None
+
+        with timer.stage("near_duplicate"):
+            near_duplicate, signature = self.near_duplicates.lookup(content)
+        if near_duplicate is not None:
+            logger.debug("Quase duplicado de email já analisado")
+            return near_duplicate, signature
+
+        with timer.stage("local"):
+            local_result = self.local_tier.classify(content)
+        if local_result is not None:
+            logger.debug("Classificado pelo modelo local")
+            return local_result, signature
+
+        return None, signature
+
+
+  async def _classify_uncached(self, cache_key: str, content: str, signature=None) -> dict:
+        logger.debug("Enviando para análise de IA")
+        start = time.perf_counter()
+        if self.batcher.enabled:
+            ai_result = await self.batcher.submit(content)
+        else:
+            ai_result = await self.ai_client.analyze_async(content)
+        self.local_tier.record_llm_call(time.perf_counter() - start, ai_result)
+
+        await self._remember(cache_key, signature, ai_result)
+        return ai_result
+
+
+  async def _remember(self, cache_key: str, signature, ai_result: dict) -> None:
+        if not ai_result.get("fallback"):
+            await self.cache.set(cache_key, ai_result)
+            await self.near_duplicates.add(cache_key, signature, ai_result)
+
+
+  async def _analyze_many(self, contents: list[str]) -> list[dict]:
+        analyze_many = getattr(self.ai_client, "analyze_many_async", None)
+        if analyze_many is None:
+            return list(await asyncio.gather(*(self.ai_client.analyze_async(c) for c in contents)))
+        return await analyze_many(contents)
+
+
+  def _observe(
+    self,
+    timer: StageTimer,
+    text: str | None,
+    file: UploadFile | None,
+    ai_result: dict,
+    input_type: str | None = None
+  ) -> None:
+        """Registra as durações das etapas e a análise concluída nas métricas e no log (uma linha por análise)"""
+        input_type = input_type or _input_type(text, file)
+
+        fallback = bool(ai_result.get("fallback"))
+        timer.observe(input_type, self.ai_client.model, fallback)
+        ANALYSES_TOTAL.inc(input_type, ai_result["category"].value, "true" if fallback else "false")
+        if log_enabled(logger):
+            duration_ms = (time.perf_counter() - timer.started) * 1000
+            logger.info(
+                "Análise concluída: categoria=%s confidence=%s fallback=%s em %.1f ms",
+                ai_result["category"].value, ai_result["confidence"], fallback, duration_ms,
+                extra={
+                    "category": ai_result["category"].value,
+                    "confidence": ai_result["confidence"],
+                    "fallback": fallback,
+                    "input_type": input_type,
+                    "duration_ms": round(duration_ms, 1),
+                    "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in timer.durations.items()},
+                }
+            )
+
+
+def _to_response(ai_result: dict) -> AnalyzeResponse:
+    return AnalyzeResponse(
+        category=ai_result["category"],
+        suggested_reply=ai_result["suggested_reply"],
+        confidence=ai_result["confidence"],
+        fallback=ai_result.get("fallback", False)
+    )
+
+
+def _input_type(text: str | None, file: UploadFile | None) -> str:
+    """Rótulo da entrada nas métricas: "text" ou a extensão do arquivo"""
+    if text and text.strip():
+        return "text"
+    if file is not None and file.filename:
+        return os.path.splitext(file.filename)[1].lstrip(".").lower() or "unknown"
+    return "unknown"
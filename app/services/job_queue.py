@@ -0,0 +1,325 @@
+"""
+Fila de análises assíncronas (jobs) para uploads grandes.
+
+POST /api/jobs só copia a entrada para o disco e registra o job; a
+extração, o pré-processamento e a chamada ao LLM rodam depois, em
+workers do próprio processo. O estado fica em SQLite (modo WAL), então
+os jobs sobrevivem a um restart e vários processos podem compartilhar a
+mesma fila: cada worker reserva um job por vez com um UPDATE atômico e,
+se o processo morrer no meio, a reserva expira e outro worker retoma.
+As consultas ao banco rodam fora do event loop (asyncio.to_thread): com
+vários processos disputando o arquivo, a espera pelo lock não trava as
+requisições.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import AsyncIterator, BinaryIO
+
+from fastapi import HTTPException, UploadFile
+
+from app.clients.rate_limiter import PRIORITY_BATCH, REQUEST_PRIORITY
+from app.logging_config import start_request
+
+logger = logging.getLogger(__name__)
+
+# Diretório com o banco da fila (jobs.db) e as entradas aguardando processamento
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "email-analyzer-jobs"))
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", 4))
+# Jobs aguardando (queued) acima disto: novos envios recebem 503
+JOBS_MAX_PENDING = int(os.getenv("JOBS_MAX_PENDING", 1000))
+# Tempo máximo de processamento de um job; também é a validade da reserva do worker
+JOBS_TIMEOUT_SECONDS = float(os.getenv("JOBS_TIMEOUT_SECONDS", 300))
+# Por quanto tempo o resultado fica disponível para consulta
+JOBS_TTL_SECONDS = float(os.getenv("JOBS_TTL_SECONDS", 24 * 60 * 60))
+JOBS_MAX_ATTEMPTS = 3
+
+# Consulta ao banco quando não há aviso local (jobs enviados por outro processo)
+JOBS_POLL_SECONDS = 1.0
+# Comentário enviado no stream de eventos para o proxy não fechar a conexão
+JOBS_SSE_PING_SECONDS = 15.0
+_CLEANUP_INTERVAL_SECONDS = 60.0
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+JOB_FILE_EXTENSIONS = (".txt", ".pdf", ".eml")
+_FINAL_STATUSES = {"done", "failed"}
+
+_COPY_CHUNK_SIZE = 64 * 1024
+
+
+class JobQueue:
+    """
+    Uso:
+        job = await jobs.submit(text=..., file=...)   # 202
+        await asyncio.to_thread(jobs.get, job_id)     # consulta
+        async for job in jobs.watch(job_id): ...      # eventos até o fim
+    """
+
+    def __init__(self, directory: str = JOBS_DIR, workers: int = JOBS_WORKERS):
+        self.analyzer = None
+        self.directory = directory
+        self.workers = max(1, workers)
+        self._uploads = os.path.join(directory, "uploads")
+        self._conn: sqlite3.Connection | None = None
+        self._connect_lock = threading.Lock()
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: asyncio.Event | None = None
+        self._changed: asyncio.Event | None = None
+        self._last_cleanup = 0.0
+
+    def start(self, analyzer) -> None:
+        """
+        Abre a fila e inicia os workers com o serviço de análise
+        (jobs pendentes de uma execução anterior são retomados).
+        Antes disso a fila já aceita envios e consultas.
+        """
+        if self._tasks:
+            return
+        self.analyzer = analyzer
+        self._connect()
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        logger.info("Fila de jobs iniciada em %s com %d workers", self.directory, self.workers)
+
+    async def stop(self) -> None:
+        """Interrompe os workers; jobs em andamento voltam para a fila quando a reserva expirar"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, text: str | None = None, file: UploadFile | None = None) -> dict:
+        """Copia a entrada para o disco e registra o job. Lança HTTPException(503) com a fila cheia"""
+        if not (text and text.strip()) and not (file.filename or "").lower().endswith(JOB_FILE_EXTENSIONS):
+            raise HTTPException(
+                status_code=400,
+                detail="Formato inválido. Envie no formato .txt, .pdf ou .eml"
+            )
+
+        pending = await asyncio.to_thread(self._pending)
+        if pending >= JOBS_MAX_PENDING:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Fila de análises cheia ({pending} aguardando). Tente novamente em instantes.",
+                headers={"Retry-After": "30"}
+            )
+
+        job_id = uuid.uuid4().hex
+        path = filename = None
+        if not (text and text.strip()) and file is not None:
+            filename = os.path.basename(file.filename)
+            path = os.path.join(self._uploads, job_id + os.path.splitext(filename)[1].lower())
+            await asyncio.to_thread(_copy_upload, file.file, path)
+            text = None
+
+        job = await asyncio.to_thread(self._insert, job_id, text, filename, path)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def _pending(self) -> int:
+        self._connect()
+        return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def _insert(self, job_id: str, text: str | None, filename: str | None, path: str | None) -> dict:
+        self._connect()
+        self._conn.execute(
+            "INSERT INTO jobs (id, status, text, filename, path, created_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, text, filename, path, time.time())
+        )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> dict | None:
+        """Consulta síncrona: chamar de rotas síncronas (threadpool) ou via asyncio.to_thread"""
+        self._connect()
+        row = self._conn.execute(
+            "SELECT id, status, filename, attempts, result, status_code, detail, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(
+            ("id", "status", "filename", "attempts", "result", "status_code", "detail",
+             "created_at", "started_at", "finished_at"),
+            row
+        ))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    async def watch(self, job_id: str) -> AsyncIterator[dict | None]:
+        """
+        Gera o job a cada mudança de status, até done ou failed.
+        Gera None a cada JOBS_SSE_PING_SECONDS sem mudança (para o keep-alive).
+        """
+        last_status = None
+        last_event = time.monotonic()
+        while True:
+            changed = self._changed
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None:
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                last_event = time.monotonic()
+                yield job
+                if last_status in _FINAL_STATUSES:
+                    return
+            elif time.monotonic() - last_event >= JOBS_SSE_PING_SECONDS:
+                last_event = time.monotonic()
+                yield None
+
+            if changed is None:
+                await asyncio.sleep(JOBS_POLL_SECONDS)
+            else:
+                try:
+                    await asyncio.wait_for(changed.wait(), JOBS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stats(self) -> dict:
+        """Síncrono, como get(): /health e /metrics rodam no threadpool"""
+        self._connect()
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "workers": len(self._tasks),
+            "max_pending": JOBS_MAX_PENDING,
+            **counts,
+        }
+
+    def _connect(self) -> None:
+        with self._connect_lock:
+            if self._conn is None:
+                self._open()
+
+    def _open(self) -> None:
+        os.makedirs(self._uploads, exist_ok=True)
+        conn = sqlite3.connect(
+            os.path.join(self.directory, "jobs.db"), check_same_thread=False, isolation_level=None, timeout=5
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, text TEXT, filename TEXT, path TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, result TEXT, status_code INTEGER, detail TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, lease_until REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._conn = conn
+
+    def _claim(self) -> tuple | None:
+        """Reserva o job mais antigo na fila (ou com a reserva vencida)"""
+        now = time.time()
+        return self._conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, lease_until = ? "
+            "WHERE id = ("
+            "  SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+            "  ORDER BY created_at LIMIT 1"
+            ") RETURNING id, text, filename, path, attempts",
+            (now, now + JOBS_TIMEOUT_SECONDS + JOBS_POLL_SECONDS, now)
+        ).fetchone()
+
+    async def _finish(self, job_id: str, path: str | None, result: str | None = None,
+                      status_code: int | None = None, detail: str | None = None) -> None:
+        await asyncio.to_thread(self._store_outcome, job_id, path, result, status_code, detail)
+        self._notify()
+
+    def _store_outcome(self, job_id: str, path: str | None, result: str | None,
+                       status_code: int | None, detail: str | None) -> None:
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, status_code = ?, detail = ?, text = NULL, "
+            "finished_at = ?, lease_until = NULL WHERE id = ?",
+            ("done" if result is not None else "failed", result, status_code, detail, time.time(), job_id)
+        )
+        if path:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        if changed is not None:
+            changed.set()
+
+    async def _worker(self) -> None:
+        # Jobs não têm ninguém esperando a conexão: prioridade de lote no limitador do LLM
+        REQUEST_PRIORITY.set(PRIORITY_BATCH)
+        while True:
+            # Limpo antes da consulta: um envio durante a consulta acorda o worker de novo
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except sqlite3.Error as e:
+                logger.warning("Falha ao reservar job: %s", e)
+                job = None
+            if job is None:
+                if time.time() - self._last_cleanup >= _CLEANUP_INTERVAL_SECONDS:
+                    self._last_cleanup = time.time()
+                    await asyncio.to_thread(self._cleanup)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOBS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(*job)
+
+    async def _run(self, job_id: str, text: str | None, filename: str | None, path: str | None, attempts: int) -> None:
+        if attempts > JOBS_MAX_ATTEMPTS:
+            logger.error("Job %s interrompido %d vezes; desistindo", job_id, JOBS_MAX_ATTEMPTS)
+            await self._finish(job_id, path, status_code=500, detail="Processamento interrompido repetidamente")
+            return
+
+        self._notify()
+        # Logs do processamento levam o id do job como request_id
+        start_request(job_id)
+        logger.info("Processando job %s (tentativa %d)", job_id, attempts)
+        upload = None
+        try:
+            if path:
+                upload = UploadFile(file=open(path, "rb"), filename=filename)
+            response = await asyncio.wait_for(
+                self.analyzer.analyze(text=text, file=upload), JOBS_TIMEOUT_SECONDS
+            )
+        except HTTPException as exc:
+            await self._finish(job_id, path, status_code=exc.status_code, detail=str(exc.detail))
+        except asyncio.TimeoutError:
+            await self._finish(
+                job_id, path, status_code=504,
+                detail=f"Tempo limite excedido ao processar o job ({JOBS_TIMEOUT_SECONDS:.0f}s)"
+            )
+        except Exception as e:
+            logger.error("Erro no job %s: %s: %s", job_id, type(e).__name__, e, exc_info=True)
+            await self._finish(job_id, path, status_code=500, detail=f"Erro ao processar: {str(e)}")
+        else:
+            await self._finish(job_id, path, result=response.model_dump_json())
+        finally:
+            if upload is not None:
+                upload.file.close()
+
+    def _cleanup(self) -> None:
+        """Remove jobs concluídos há mais de JOBS_TTL_SECONDS"""
+        try:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - JOBS_TTL_SECONDS,)
+            )
+        except sqlite3.Error as e:
+            logger.warning("Falha ao limpar jobs antigos: %s", e)
+
+
+def _copy_upload(source: BinaryIO, path: str) -> None:
+    source.seek(0)
+    with open(path, "wb") as target:
+        shutil.copyfileobj(source, target, _COPY_CHUNK_SIZE)
@@ -0,0 +1,269 @@
+"""
+Camada local de classificação: TF-IDF + regressão logística.
+
+Emails óbvios ("Parabéns!", "erro 500, podem verificar?") são respondidos
+pelo modelo local em microssegundos; só os incertos vão para o LLM.
+O modelo é treinado a partir do corpus de avaliação
+(python -m scripts.train_local_classifier) e salvo em JSON.
+
+Implementação em Python puro (vetores esparsos em dict): o projeto não
+depende de numpy/scikit-learn e o custo de inferência é proporcional
+ao número de tokens do email.
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Sequence
+
+from app.clients.llm_client import DEFAULT_REPLIES
+from app.domain.email_category import EmailCategory
+
+logger = logging.getLogger(__name__)
+
+LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH", "models/local_classifier.json")
+# Probabilidade mínima da classe prevista para responder sem o LLM
+LOCAL_TIER_THRESHOLD = float(os.getenv("LOCAL_TIER_THRESHOLD", 0.9))
+# Preço do LLM em USD por milhão de tokens (padrão: gpt-4.1-mini), para estimar a economia
+LLM_INPUT_COST_PER_MTOK = float(os.getenv("LLM_INPUT_COST_PER_MTOK", 0.40))
+LLM_OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", 1.60))
+
+MODEL_FORMAT_VERSION = 1
+
+
+def extract_features(content: str) -> Counter:
+    """Unigramas e bigramas do texto já preprocessado"""
+    tokens = content.split()
+    features = Counter(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return features
+
+
+class LocalClassifier:
+    """
+    Regressão logística binária sobre TF-IDF (tf sublinear, normalização L2).
+    predict_proba devolve P(PRODUTIVO), ou None se nenhum termo do email
+    está no vocabulário do modelo: a probabilidade seria só a do viés
+    (a proporção de classes do treino), sem nada do email.
+    """
+
+    def __init__(self, terms: Dict[str, tuple], bias: float, metadata: dict | None = None):
+        # termo -> (idf, peso)
+        self.terms = terms
+        self.bias = bias
+        self.metadata = metadata or {}
+
+    def predict_proba(self, content: str) -> float | None:
+        terms = self.terms
+        score = 0.0
+        norm = 0.0
+        matched = False
+        for term, count in extract_features(content).items():
+            entry = terms.get(term)
+            if entry is None:
+                continue
+            matched = True
+            value = (1.0 + math.log(count)) * entry[0]
+            norm += value * value
+            score += value * entry[1]
+        if not matched:
+            return None
+        if norm:
+            score /= math.sqrt(norm)
+        return _sigmoid(score + self.bias)
+
+    @classmethod
+    def train(
+        cls,
+        contents: Sequence[str],
+        labels: Sequence[EmailCategory],
+        epochs: int = 15,
+        learning_rate: float = 0.5,
+        l2: float = 1e-5,
+        min_df: int = 2,
+        seed: int = 42
+    ) -> "LocalClassifier":
+        """
+        Treina por SGD sobre os textos preprocessados.
+
+        Args:
+            contents: Textos já passados por preprocess_text
+            labels: Categoria de cada texto
+            min_df: Termos presentes em menos documentos que isto são descartados
+        """
+        docs = [extract_features(content) for content in contents]
+        targets = [1.0 if label == EmailCategory.PRODUTIVO else 0.0 for label in labels]
+
+        df = Counter(term for doc in docs for term in doc)
+        total = len(docs)
+        idf = {
+            term: math.log((1 + total) / (1 + freq)) + 1.0
+            for term, freq in df.items() if freq >= min_df
+        }
+
+        vectors = [_tfidf(doc, idf) for doc in docs]
+        weights: Dict[str, float] = dict.fromkeys(idf, 0.0)
+        bias = 0.0
+        order = list(range(total))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            rate = learning_rate / (1 + epoch)
+            for index in order:
+                vector = vectors[index]
+                score = bias + sum(value * weights[term] for term, value in vector)
+                gradient = _sigmoid(score) - targets[index]
+                for term, value in vector:
+                    weights[term] -= rate * (gradient * value + l2 * weights[term])
+                bias -= rate * gradient
+
+        terms = {term: (idf[term], weight) for term, weight in weights.items() if abs(weight) > 1e-6}
+        return cls(terms, bias, {"documents": total, "terms": len(terms)})
+
+    @classmethod
+    def load(cls, path: str) -> "LocalClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MODEL_FORMAT_VERSION:
+            raise ValueError(f"Versão de modelo não suportada: {data.get('version')}")
+        terms = {term: (idf, weight) for term, (idf, weight) in data["terms"].items()}
+        return cls(terms, data["bias"], data.get("metadata"))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": MODEL_FORMAT_VERSION,
+                "bias": self.bias,
+                "metadata": self.metadata,
+                "terms": {term: [round(idf, 6), round(weight, 6)] for term, (idf, weight) in self.terms.items()},
+            }, f, ensure_ascii=False)
+
+
+class LocalTierRouter:
+    """
+    Decide se o modelo local responde ou se o email segue para o LLM,
+    e contabiliza a parcela de tráfego atendida localmente e a economia
+    estimada (latência e custo médios das chamadas ao LLM observadas).
+    """
+
+    def __init__(self, classifier: LocalClassifier | None = None, threshold: float = LOCAL_TIER_THRESHOLD):
+        self.classifier = classifier
+        self.threshold = threshold
+        self.local = 0
+        self.escalated = 0
+        self._local_seconds = 0.0
+        self._llm_calls = 0
+        self._llm_seconds = 0.0
+        self._llm_cost = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.classifier is not None
+
+    def classify(self, content: str) -> dict | None:
+        """
+        Resultado do modelo local se a confiança passar do limiar; senão None (vai para o LLM).
+        Email sem nenhum termo conhecido também vai para o LLM.
+        """
+        if self.classifier is None:
+            return None
+
+        start = time.perf_counter()
+        produtivo = self.classifier.predict_proba(content)
+        self._local_seconds += time.perf_counter() - start
+
+        if produtivo is None:
+            self.escalated += 1
+            return None
+        category = EmailCategory.PRODUTIVO if produtivo >= 0.5 else EmailCategory.IMPRODUTIVO
+        confidence = max(produtivo, 1.0 - produtivo)
+        if confidence < self.threshold:
+            self.escalated += 1
+            return None
+
+        self.local += 1
+        return {
+            "category": category,
+            "suggested_reply": DEFAULT_REPLIES[category],
+            "confidence": round(confidence, 2),
+            "reason": f"Modelo local (p={confidence:.3f} >= {self.threshold})",
+            "fallback": False,
+            "tier": "local",
+        }
+
+    def record_llm_call(self, latency: float, result: dict) -> None:
+        """Alimenta as médias de latência e custo do LLM (só respostas reais, não fallback)"""
+        if result.get("fallback"):
+            return
+        self._llm_calls += 1
+        self._llm_seconds += latency
+        usage = result.get("usage") or {}
+        self._llm_cost += (
+            usage.get("input_tokens", 0) * LLM_INPUT_COST_PER_MTOK
+            + usage.get("output_tokens", 0) * LLM_OUTPUT_COST_PER_MTOK
+        ) / 1_000_000
+
+    def stats(self) -> dict:
+        decided = self.local + self.escalated
+        mean_llm = self._llm_seconds / self._llm_calls if self._llm_calls else 0.0
+        mean_local = self._local_seconds / decided if decided else 0.0
+        mean_cost = self._llm_cost / self._llm_calls if self._llm_calls else 0.0
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "served_locally": self.local,
+            "escalated_to_llm": self.escalated,
+            "local_share": round(self.local / decided, 4) if decided else 0.0,
+            "mean_local_ms": round(mean_local * 1000, 3),
+            "mean_llm_ms": round(mean_llm * 1000, 1),
+            "latency_saved_seconds": round(self.local * max(0.0, mean_llm - mean_local), 3),
+            "cost_saved_usd": round(self.local * mean_cost, 6),
+        }
+
+
+# Modelo carregado no mestre do gunicorn antes do fork: os workers compartilham as páginas
+_preloaded: LocalClassifier | None = None
+
+
+def preload_local_classifier() -> None:
+    """Carrega o modelo de LOCAL_MODEL_PATH para o build_local_tier dos workers reaproveitar"""
+    global _preloaded
+    try:
+        _preloaded = LocalClassifier.load(LOCAL_MODEL_PATH) if os.path.exists(LOCAL_MODEL_PATH) else None
+    except (OSError, ValueError, KeyError):
+        # build_local_tier tenta de novo no worker e registra o erro
+        _preloaded = None
+
+
+def build_local_tier() -> LocalTierRouter:
+    """Carrega o modelo de LOCAL_MODEL_PATH; sem modelo a camada fica desativada"""
+    if not os.path.exists(LOCAL_MODEL_PATH):
+        return LocalTierRouter()
+    try:
+        classifier = _preloaded or LocalClassifier.load(LOCAL_MODEL_PATH)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Modelo local inválido em %s, camada local desativada: %s", LOCAL_MODEL_PATH, e)
+        return LocalTierRouter()
+    logger.info("Modelo local carregado: %d termos, limiar %s", len(classifier.terms), LOCAL_TIER_THRESHOLD)
+    return LocalTierRouter(classifier)
+
+
+def _tfidf(features: Counter, idf: Dict[str, float]) -> List[tuple]:
+    vector = [
+        (term, (1.0 + math.log(count)) * idf[term])
+        for term, count in features.items() if term in idf
+    ]
+    norm = math.sqrt(sum(value * value for _, value in vector))
+    return [(term, value / norm) for term, value in vector] if norm else vector
+
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
@@ -0,0 +1,122 @@
+"""
+Agrupamento de emails pendentes em lotes para uma única chamada ao LLM.
+
+Os emails que chegam dentro de uma janela curta (alguns milissegundos)
+são enviados juntos, dividindo o custo fixo do prompt. O lote é
+disparado ao fim da janela, ao atingir o número máximo de itens ou
+quando o próximo email estouraria o orçamento de tokens.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List
+
+from app.utils.text_reducer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Janela de espera em ms; 0 desativa o agrupamento (uma chamada por email)
+LLM_BATCH_WINDOW_MS = float(os.getenv("LLM_BATCH_WINDOW_MS", 0))
+LLM_BATCH_MAX_ITEMS = int(os.getenv("LLM_BATCH_MAX_ITEMS", 16))
+# Orçamento de tokens de entrada por lote
+LLM_BATCH_MAX_TOKENS = int(os.getenv("LLM_BATCH_MAX_TOKENS", 8000))
+
+
+class MicroBatcher:
+    """
+    Acumula chamadas submit(content) e as processa em lotes com
+    process_batch(contents) -> resultados na mesma ordem.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[str]], Awaitable[List[dict]]],
+        window_ms: float = LLM_BATCH_WINDOW_MS,
+        max_items: int = LLM_BATCH_MAX_ITEMS,
+        max_tokens: int = LLM_BATCH_MAX_TOKENS,
+        max_item_chars: int | None = None
+    ):
+        self._process_batch = process_batch
+        self.window = window_ms / 1000
+        self.max_items = max(1, max_items)
+        self.max_tokens = max_tokens
+        # O cliente corta cada email neste tamanho; a estimativa de tokens considera o corte
+        self.max_item_chars = max_item_chars
+        self._pending: List[tuple] = []
+        self._pending_tokens = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set = set()
+
+        self.batches = 0
+        self.items = 0
+        self.flush_reasons = {"window": 0, "max_items": 0, "max_tokens": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def submit(self, content: str) -> dict:
+        """Enfileira o email no lote atual e espera o seu resultado"""
+        loop = asyncio.get_running_loop()
+        tokens = estimate_tokens(content[:self.max_item_chars] if self.max_item_chars else content)
+
+        if self._pending and self._pending_tokens + tokens > self.max_tokens:
+            self._flush("max_tokens")
+
+        future = loop.create_future()
+        self._pending.append((content, future))
+        self._pending_tokens += tokens
+
+        if len(self._pending) >= self.max_items:
+            self._flush("max_items")
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush, "window")
+
+        return await future
+
+    def _flush(self, reason: str) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        self.batches += 1
+        self.items += len(batch)
+        self.flush_reasons[reason] += 1
+
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple]) -> None:
+        contents = [content for content, _ in batch]
+        try:
+            results = await self._process_batch(contents)
+            if len(results) != len(batch):
+                raise RuntimeError(f"Lote com {len(batch)} emails retornou {len(results)} resultados")
+        except Exception as e:
+            logger.error("Falha ao processar lote de %d emails: %r", len(batch), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # Quem esperava pode ter sido cancelado (ex.: cliente desconectou)
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window * 1000,
+            "max_items": self.max_items,
+            "max_tokens": self.max_tokens,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "flush_reasons": dict(self.flush_reasons),
+        }
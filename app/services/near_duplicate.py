@@ -0,0 +1,310 @@
+"""
+Detecção de emails quase duplicados (MinHash + LSH) antes do LLM.
+
+Boa parte do volume é email de template: a mesma notificação com outro
+nome, número de chamado ou data. O cache exato não pega esses casos;
+aqui cada email vira uma assinatura MinHash dos tokens do texto
+preprocessado e um índice LSH encontra, sem comparar
+com todos, os emails já classificados pelo LLM com Jaccard estimado
+acima do limiar. O email novo reaproveita a categoria; a resposta é a
+padrão da categoria, nunca o texto gerado para o outro remetente (que
+pode citar nome, protocolo ou valor dele).
+
+O índice é limitado (LRU) e pode ser persistido em SQLite; as gravações
+rodam fora do event loop (asyncio.to_thread), como no cache de análises.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import random
+import sqlite3
+import time
+from array import array
+from collections import OrderedDict
+from typing import Iterable, List
+
+from app.clients.llm_client import DEFAULT_REPLIES
+from app.services.analysis_cache import deserialize_result, serialize_result
+from app.utils.text_preprocessor import get_tokens
+
+logger = logging.getLogger(__name__)
+
+# Entradas no índice; 0 desativa a detecção
+NEAR_DUP_INDEX_SIZE = int(os.getenv("NEAR_DUP_INDEX_SIZE", 5000))
+# Similaridade de Jaccard mínima (entre os shingles) para reaproveitar a análise
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", 0.85))
+# Emails mais curtos que isto (em tokens) sempre seguem adiante: em poucas
+# palavras, uma diferente já muda o assunto ("chamado aberto" x "chamado encerrado")
+NEAR_DUP_MIN_TOKENS = int(os.getenv("NEAR_DUP_MIN_TOKENS", 10))
+NEAR_DUP_SQLITE_PATH = os.getenv("NEAR_DUP_SQLITE_PATH")
+
+# Features (tokens distintos) por assinatura; acima disso entra uma amostra.
+# Limita o custo, que roda no event loop: ~30 ms num email de 900 tokens distintos sem o limite
+NEAR_DUP_MAX_SHINGLES = int(os.getenv("NEAR_DUP_MAX_SHINGLES", 64))
+
+NUM_PERM = 128
+# Tokens isolados: os campos de template (nome, mês, código) têm 1-3 tokens e,
+# com pares, cada troca derrubaria dois shingles
+SHINGLE_SIZE = 1
+# Peso dos falsos positivos na escolha de bandas/linhas: candidatos são conferidos
+# pela similaridade estimada, então deixar de achar um duplicado custa mais
+_LSH_FALSE_POSITIVE_WEIGHT = 0.05
+_SEED = 1
+# Primo de Mersenne 2^61 - 1: as permutações são (a * x + b) mod _PRIME
+_PRIME = (1 << 61) - 1
+_HASH_BYTES = 8
+# Só os campos usados em lookup: a resposta gerada para um email não sai para outro
+_STORED_FIELDS = ("category", "confidence")
+
+
+def shingles(tokens: List[str], size: int = SHINGLE_SIZE) -> set:
+    """Sequências de `size` tokens consecutivos (o texto inteiro, se for mais curto)"""
+    if len(tokens) <= size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """
+    Assinaturas MinHash com NUM_PERM permutações fixas (iguais entre processos).
+
+    O custo é permutações x features; emails longos entram com uma amostra
+    consistente: as max_features features de menor hash (bottom-k), as
+    mesmas em dois emails iguais e quase as mesmas em dois parecidos.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = _SEED, max_features: int = NEAR_DUP_MAX_SHINGLES):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.max_features = max_features
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, features: Iterable[str]) -> array:
+        # blake2b em vez de hash(): estável entre processos, necessário para persistir
+        hashes = [
+            int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=_HASH_BYTES).digest(), "little")
+            for feature in features
+        ]
+        if self.max_features > 0 and len(hashes) > self.max_features:
+            hashes = heapq.nsmallest(self.max_features, hashes)
+        return array("Q", [min((a * x + b) % _PRIME for x in hashes) for a, b in self._perms])
+
+
+def lsh_params(num_perm: int, threshold: float) -> tuple[int, int]:
+    """
+    Bandas e linhas por banda que minimizam a soma ponderada das áreas de
+    falso positivo (abaixo do limiar) e falso negativo (acima) da curva
+    P(candidato) = 1 - (1 - J^linhas)^bandas.
+    """
+    def area(probability, start: float, end: float, steps: int = 100) -> float:
+        width = (end - start) / steps
+        return sum(probability(start + (i + 0.5) * width) for i in range(steps)) * width
+
+    best, best_error = (1, num_perm), math.inf
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        false_positive = area(lambda j: 1 - (1 - j ** rows) ** bands, 0.0, threshold)
+        false_negative = area(lambda j: (1 - j ** rows) ** bands, threshold, 1.0)
+        error = _LSH_FALSE_POSITIVE_WEIGHT * false_positive + (1 - _LSH_FALSE_POSITIVE_WEIGHT) * false_negative
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    Índice LSH de emails classificados pelo LLM.
+
+    lookup(content) devolve a análise de um email parecido (ou None) e a
+    assinatura calculada, que é repassada a add() depois que o LLM responde.
+    """
+
+    def __init__(
+        self,
+        max_size: int = NEAR_DUP_INDEX_SIZE,
+        threshold: float = NEAR_DUP_THRESHOLD,
+        min_tokens: int = NEAR_DUP_MIN_TOKENS,
+        num_perm: int = NUM_PERM,
+        sqlite_path: str | None = None,
+        version: str = ""
+    ):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.min_tokens = min_tokens
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = lsh_params(num_perm, threshold)
+        # chave -> (assinatura, análise); a ordem é a de uso (LRU)
+        self._entries: OrderedDict[str, tuple[array, dict]] = OrderedDict()
+        self._buckets: List[dict] = [{} for _ in range(self.bands)]
+        self._conn: sqlite3.Connection | None = None
+
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.candidates = 0
+        self._lookup_seconds = 0.0
+
+        if sqlite_path and self.enabled:
+            # Assinaturas só são comparáveis com os mesmos parâmetros; a versão
+            # (modelo e prompt) invalida as análises antigas
+            self._open(sqlite_path, json.dumps([num_perm, SHINGLE_SIZE, _SEED, self.hasher.max_features, version]))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def lookup(self, content: str) -> tuple[dict | None, array | None]:
+        """
+        Procura um email já classificado com Jaccard estimado >= threshold.
+        Retorna (análise ou None, assinatura ou None se o email não entra no índice).
+        """
+        if not self.enabled:
+            return None, None
+        tokens = get_tokens(content)
+        if len(tokens) < self.min_tokens:
+            self.skipped += 1
+            return None, None
+
+        start = time.perf_counter()
+        signature = self.hasher.signature(shingles(tokens))
+        candidates = set()
+        for band, buckets in zip(self._band_keys(signature), self._buckets):
+            candidates.update(buckets.get(band, ()))
+        self.candidates += len(candidates)
+
+        best_key, best_similarity = None, 0.0
+        for key in candidates:
+            other = self._entries[key][0]
+            similarity = sum(1 for a, b in zip(signature, other) if a == b) / len(signature)
+            if similarity > best_similarity:
+                best_key, best_similarity = key, similarity
+        self._lookup_seconds += time.perf_counter() - start
+
+        if best_key is None or best_similarity < self.threshold:
+            self.misses += 1
+            return None, signature
+
+        self.hits += 1
+        self._entries.move_to_end(best_key)
+        stored = self._entries[best_key][1]
+        category = stored["category"]
+        result = {
+            "category": category,
+            "suggested_reply": DEFAULT_REPLIES[category],
+            "confidence": stored.get("confidence", 0.0),
+            "reason": f"Quase duplicado de email já analisado (Jaccard ~{best_similarity:.2f})",
+            "fallback": False,
+            "tier": "near_duplicate",
+        }
+        return result, signature
+
+    async def add(self, key: str, signature: array | None, result: dict) -> None:
+        """Indexa a análise do LLM para o email com esta assinatura (de lookup)"""
+        if signature is None or not self.enabled or result.get("fallback"):
+            return
+        evicted = self._store(key, signature, result)
+        if self._conn is not None:
+            try:
+                await asyncio.to_thread(self._persist, key, signature, _stored(result), evicted)
+            except sqlite3.Error as e:
+                logger.warning("Falha ao gravar índice de quase duplicados: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "bands": self.bands,
+            "rows_per_band": self.rows,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped_short": self.skipped,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "mean_candidates": round(self.candidates / lookups, 2) if lookups else 0.0,
+            "mean_lookup_ms": round(self._lookup_seconds / lookups * 1000, 3) if lookups else 0.0,
+            "llm_calls_saved": self.hits,
+        }
+
+    def _band_keys(self, signature: array) -> List[int]:
+        rows = self.rows
+        return [hash(signature[i * rows:(i + 1) * rows].tobytes()) for i in range(self.bands)]
+
+    def _store(self, key: str, signature: array, result: dict) -> List[str]:
+        """Indexa na memória; retorna as chaves removidas pelo LRU"""
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (signature, _stored(result))
+        for band, buckets in zip(self._band_keys(signature), self._buckets):
+            buckets.setdefault(band, set()).add(key)
+        evicted = []
+        while len(self._entries) > self.max_size:
+            evicted.append(next(iter(self._entries)))
+            self._remove(evicted[-1])
+        return evicted
+
+    def _persist(self, key: str, signature: array, stored: dict, evicted: List[str]) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO near_duplicates (key, signature, result, added_at) VALUES (?, ?, ?, ?)",
+            (key, signature.tobytes(), serialize_result(stored), time.time())
+        )
+        if evicted:
+            self._conn.executemany("DELETE FROM near_duplicates WHERE key = ?", ((k,) for k in evicted))
+
+    def _remove(self, key: str) -> None:
+        signature, _ = self._entries.pop(key)
+        for band, buckets in zip(self._band_keys(signature), self._buckets):
+            keys = buckets.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del buckets[band]
+
+    def _open(self, path: str, params: str) -> None:
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS near_duplicates ("
+            "key TEXT PRIMARY KEY, signature BLOB NOT NULL, result TEXT NOT NULL, added_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS near_duplicates_meta (name TEXT PRIMARY KEY, value TEXT)")
+
+        row = self._conn.execute("SELECT value FROM near_duplicates_meta WHERE name = 'params'").fetchone()
+        if row is None or row[0] != params:
+            if row is not None:
+                logger.info("Parâmetros do índice de quase duplicados mudaram; índice persistido descartado")
+            self._conn.execute("DELETE FROM near_duplicates")
+            self._conn.execute("INSERT OR REPLACE INTO near_duplicates_meta (name, value) VALUES ('params', ?)", (params,))
+            return
+
+        rows = self._conn.execute(
+            "SELECT key, signature, result FROM ("
+            "  SELECT key, signature, result, added_at FROM near_duplicates ORDER BY added_at DESC LIMIT ?"
+            ") ORDER BY added_at",
+            (self.max_size,)
+        ).fetchall()
+        for key, raw_signature, raw_result in rows:
+            signature = array("Q")
+            signature.frombytes(raw_signature)
+            if len(signature) == self.hasher.num_perm:
+                self._store(key, signature, deserialize_result(raw_result))
+        logger.info("Índice de quase duplicados carregado: %d emails", len(self._entries))
+
+
+def _stored(result: dict) -> dict:
+    return {field: result[field] for field in _STORED_FIELDS if field in result}
+
+
+def build_near_duplicate_index(version: str = "") -> NearDuplicateIndex:
+    """Monta o índice a partir das variáveis de ambiente; version identifica modelo e prompt"""
+    return NearDuplicateIndex(
+        NEAR_DUP_INDEX_SIZE, NEAR_DUP_THRESHOLD, NEAR_DUP_MIN_TOKENS,
+        sqlite_path=NEAR_DUP_SQLITE_PATH, version=version
+    )
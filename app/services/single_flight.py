@@ -0,0 +1,63 @@
+"""
+Deduplicação de chamadas concorrentes idênticas (single-flight).
+
+Enquanto uma chamada para uma chave está em andamento, as chamadas
+seguintes com a mesma chave aguardam o mesmo resultado em vez de
+disparar outra chamada ao serviço externo.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Agrupa chamadas assíncronas em andamento por chave.
+
+    A chamada roda numa task própria: se quem a iniciou for cancelado
+    (ex.: cliente desconectou), as demais continuam recebendo o resultado.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Executa func() uma única vez por chave em andamento.
+
+        Args:
+            key: Identifica chamadas equivalentes (ex.: chave do cache)
+            func: Fábrica da corrotina a executar
+
+        Returns:
+            O resultado (ou a exceção) compartilhado por todas as chamadas da chave
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Marca a exceção como lida caso todos os interessados tenham sido cancelados
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        total = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / total, 4) if total else 0.0,
+        }
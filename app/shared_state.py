@@ -0,0 +1,191 @@
+"""
+Estado compartilhado entre os processos da API (workers do gunicorn).
+
+Cada worker tem a própria memória: sem isto, o limitador de taxa deixaria
+cada um gastar o RPM/TPM inteiro da chave (N workers, N vezes o limite e
+429 em sequência) e /api/metrics mostraria só o worker que atendeu a
+coleta. Com SHARED_STATE_PATH, um arquivo SQLite (modo WAL) no mesmo
+host guarda:
+
+- os baldes de fichas e a pausa após 429 do limitador de taxa (uma linha por limitador)
+- o último retrato das métricas de cada worker, somado na coleta
+- o cache de análises, se ANALYSIS_CACHE_SQLITE_PATH não indicar outro arquivo
+
+Toda alteração é um único comando SQL (atômico entre processos), sem
+transações abertas na conexão compartilhada pelas threads do processo.
+Quem roda no event loop chama estes métodos por asyncio.to_thread: com
+vários workers disputando o arquivo, a espera pelo lock (até 5 s) não
+pode travar o loop.
+Conexões SQLite não podem atravessar um fork: get_shared_state() abre
+uma por processo.
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import time
+
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH")
+
+
+class SharedState:
+    def __init__(self, path: str):
+        self.path = path
+        # Identifica os retratos deste processo: um pid pode ser reaproveitado por um worker novo
+        self.worker = f"{os.getpid()}-{time.time_ns()}"
+        self._grants = itertools.count()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "name TEXT PRIMARY KEY, rpm REAL NOT NULL, tpm REAL NOT NULL, requests REAL NOT NULL, "
+            "tokens REAL NOT NULL, updated REAL NOT NULL, paused_until REAL NOT NULL DEFAULT 0, last_grant TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metric_snapshots ("
+            "worker TEXT PRIMARY KEY, pid INTEGER NOT NULL, live INTEGER NOT NULL, "
+            "updated_at REAL NOT NULL, data TEXT NOT NULL)"
+        )
+
+    # Limitador de taxa (app/clients/rate_limiter.py): os dois baldes e a pausa após
+    # 429 ficam na mesma linha, então reabastecer, conferir e reservar é um comando só.
+    # Os instantes vêm do clock do limitador, que precisa ser comum aos processos
+    # (time.time). Todos retornam a linha atualizada:
+    # (rpm, tpm, requests, tokens, updated, paused_until)
+
+    def init_rate_limit(self, name: str, rpm: float, tpm: float, burst_seconds: float, now: float) -> tuple:
+        """Cria o limitador com os baldes cheios ou, se outro worker já o criou, só atualiza os limites"""
+        return self._conn.execute(
+            "INSERT INTO rate_limits (name, rpm, tpm, requests, tokens, updated) "
+            "VALUES (:name, :rpm, :tpm, :requests, :tokens, :now) "
+            "ON CONFLICT (name) DO UPDATE SET rpm = excluded.rpm, tpm = excluded.tpm, "
+            "requests = MIN(requests, excluded.requests), tokens = MIN(tokens, excluded.tokens) "
+            f"RETURNING {_RATE_LIMIT_ROW}",
+            {"name": name, "rpm": rpm, "tpm": tpm, "now": now,
+             "requests": _capacity(rpm, burst_seconds), "tokens": _capacity(tpm, burst_seconds)}
+        ).fetchone()
+
+    def take_rate_limit(self, name: str, tokens: float, now: float, burst_seconds: float) -> tuple[bool, tuple]:
+        """
+        Reabastece os baldes e, se houver uma requisição e `tokens` disponíveis
+        e não houver pausa, reserva. Retorna (reservou, linha).
+        """
+        grant = f"{self.worker}:{next(self._grants)}"
+        row = self._conn.execute(
+            f"UPDATE rate_limits SET "
+            f"requests = {_REQUESTS} - CASE WHEN {_READY} AND rpm > 0 THEN 1 ELSE 0 END, "
+            f"tokens = {_TOKENS} - CASE WHEN {_READY} AND tpm > 0 THEN :tokens ELSE 0 END, "
+            f"last_grant = CASE WHEN {_READY} THEN :grant ELSE last_grant END, "
+            f"updated = MAX(updated, :now) "
+            f"WHERE name = :name RETURNING {_RATE_LIMIT_ROW}, last_grant",
+            {"name": name, "tokens": tokens, "now": now, "burst": burst_seconds, "grant": grant}
+        ).fetchone()
+        return row[-1] == grant, row[:-1]
+
+    def consume_rate_limit(self, name: str, requests: float, tokens: float) -> tuple:
+        """Desconta (ou devolve, com valores negativos) dos baldes ativos, sem esperar saldo"""
+        return self._conn.execute(
+            "UPDATE rate_limits SET "
+            "requests = requests - CASE WHEN rpm > 0 THEN :requests ELSE 0 END, "
+            "tokens = tokens - CASE WHEN tpm > 0 THEN :tokens ELSE 0 END "
+            f"WHERE name = :name RETURNING {_RATE_LIMIT_ROW}",
+            {"name": name, "requests": requests, "tokens": tokens}
+        ).fetchone()
+
+    def update_rate_limit(
+        self,
+        name: str,
+        now: float,
+        burst_seconds: float,
+        rpm: float | None = None,
+        tpm: float | None = None,
+        remaining_requests: float | None = None,
+        remaining_tokens: float | None = None,
+        pause_until: float | None = None
+    ) -> tuple:
+        """
+        Reabastece pelo limite antigo, troca os limites informados, limita o
+        saldo à nova capacidade e ao restante informado pela API (baldes
+        ativos) e estende a pausa (nunca encurta).
+        """
+        return self._conn.execute(
+            "UPDATE rate_limits SET "
+            f"requests = {_adjusted('requests', 'rpm')}, tokens = {_adjusted('tokens', 'tpm')}, "
+            "rpm = COALESCE(:rpm, rpm), tpm = COALESCE(:tpm, tpm), "
+            "paused_until = MAX(paused_until, COALESCE(:pause_until, 0)), updated = MAX(updated, :now) "
+            f"WHERE name = :name RETURNING {_RATE_LIMIT_ROW}",
+            {"name": name, "now": now, "burst": burst_seconds, "rpm": rpm, "tpm": tpm,
+             "remaining_requests": remaining_requests, "remaining_tokens": remaining_tokens,
+             "pause_until": pause_until}
+        ).fetchone()
+
+    # Métricas (app/metrics.py): cada worker publica seus valores e quem atende
+    # /api/metrics soma os de todos
+
+    def publish_metrics(self, snapshot: dict) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO metric_snapshots (worker, pid, live, updated_at, data) VALUES (?, ?, 1, ?, ?)",
+            (self.worker, os.getpid(), time.time(), json.dumps(snapshot))
+        )
+
+    def metric_snapshots(self) -> list[tuple[bool, dict]]:
+        """(worker vivo, valores) de cada worker; os que saíram contam só nos contadores"""
+        rows = self._conn.execute("SELECT live, data FROM metric_snapshots").fetchall()
+        return [(bool(live), json.loads(data)) for live, data in rows]
+
+    def retire_worker(self, pid: int) -> None:
+        """Worker encerrado: os gauges dele deixam de contar, os contadores continuam na soma"""
+        self._conn.execute("UPDATE metric_snapshots SET live = 0 WHERE pid = ? AND live = 1", (pid,))
+
+    def reset_metrics(self) -> None:
+        """Início do servidor: descarta os retratos de uma execução anterior"""
+        self._conn.execute("DELETE FROM metric_snapshots")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _capacity(limit: float, burst_seconds: float) -> float:
+    return max(1.0, limit * burst_seconds / 60)
+
+
+def _refilled(level: str, limit: str) -> str:
+    """Saldo reabastecido até :now, limitado à capacidade (:burst segundos de limite, no mínimo 1)"""
+    return (
+        f"(CASE WHEN {limit} > 0 THEN MIN(MAX(1.0, {limit} * :burst / 60), "
+        f"{level} + MAX(0.0, :now - updated) * {limit} / 60) ELSE {level} END)"
+    )
+
+
+def _adjusted(level: str, limit: str) -> str:
+    new_limit = f"COALESCE(:{limit}, {limit})"
+    capped = f"MIN({_refilled(level, limit)}, MAX(1.0, {new_limit} * :burst / 60))"
+    return f"(CASE WHEN {new_limit} > 0 AND :remaining_{level} IS NOT NULL THEN MIN({capped}, :remaining_{level}) ELSE {capped} END)"
+
+
+_RATE_LIMIT_ROW = "rpm, tpm, requests, tokens, updated, paused_until"
+_REQUESTS = _refilled("requests", "rpm")
+_TOKENS = _refilled("tokens", "tpm")
+# Pedidos maiores que a capacidade esperam só o balde cheio (como TokenBucket.time_until)
+_READY = (
+    f"(paused_until <= :now AND (rpm <= 0 OR {_REQUESTS} >= 1) "
+    f"AND (tpm <= 0 OR {_TOKENS} >= MIN(:tokens, MAX(1.0, tpm * :burst / 60))))"
+)
+
+_state: SharedState | None = None
+_state_pid: int | None = None
+
+
+def get_shared_state() -> SharedState | None:
+    """Estado compartilhado do processo atual; None sem SHARED_STATE_PATH (processo único)"""
+    global _state, _state_pid
+    if not SHARED_STATE_PATH:
+        return None
+    if _state is None or _state_pid != os.getpid():
+        # A conexão herdada de um fork fica para trás sem ser usada nem fechada
+        _state = SharedState(SHARED_STATE_PATH)
+        _state_pid = os.getpid()
+    return _state
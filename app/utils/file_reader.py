@@ -1,10 +1,42 @@
-from fastapi import UploadFile, HTTPException
-from pypdf import PdfReader
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import Request, UploadFile, HTTPException
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import codecs
 import io
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import weakref
+from typing import AsyncIterator
+from app.utils.mime_reader import iter_chunks, parse_eml
+from app.utils.text_reducer import CHARS_PER_TOKEN, EXTRACT_OVERSAMPLE, LLM_INPUT_TOKEN_BUDGET
+
+# Limites da extração: o LLM só recebe LLM_INPUT_TOKEN_BUDGET tokens do texto reduzido
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 50))
+EXTRACT_MAX_CHARS = int(os.getenv(
+  "EXTRACT_MAX_CHARS", LLM_INPUT_TOKEN_BUDGET * CHARS_PER_TOKEN * EXTRACT_OVERSAMPLE
+))
+
+# Tamanho dos blocos lidos do upload
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Pool de processos para o parsing de PDF (CPU-bound, fora do event loop)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_TIMEOUT_SECONDS = float(os.getenv("PDF_TIMEOUT_SECONDS", 20))
+
+_pdf_pool: ProcessPoolExecutor | None = None
+# Pools mortos por timeout (ver _recycle_pdf_pool)
+_recycled_pools: "weakref.WeakSet[ProcessPoolExecutor]" = weakref.WeakSet()
 
 async def extract_text(file: UploadFile) -> str:
   """
-  Extrai texto de UploadFile (.txt ou .pdf).
+  Extrai texto de UploadFile (.txt, .pdf ou .eml).
   Retorna string com conteúdo.
   Lança HTTPException(400) para formato inválido ou arquivo vazio.
   """
@@ -12,31 +44,39 @@ async def extract_text(file: UploadFile) -> str:
   filename = (file.filename or "").lower().strip()
 
   if filename.endswith(".txt"):
-    data = await file.read()
-    text = data.decode("utf-8", errors="ignore").strip()
+    text = await _read_text_stream(file)
     if not text:
       raise HTTPException(status_code=400, detail="Arquivo .txt vazio")
     return text
   
   if filename.endswith(".pdf"):
-    data = await file.read()
-    if not data:
+    pdf_path, size = await run_in_threadpool(_spool_to_tempfile, file.file)
+    try:
+      if not size:
+        raise HTTPException(
+          status_code=400,
+          detail="Arquivo .pdf vazio"
+          )
+      text = await _run_pdf_job(pdf_path)
+    except HTTPException:
+      raise
+    except asyncio.TimeoutError:
       raise HTTPException(
-        status_code=400,
-        detail="Arquivo .pdf vazio"
+        status_code=503,
+        detail=f"Tempo limite excedido ao ler o PDF ({PDF_TIMEOUT_SECONDS:.0f}s)"
+        )
+    except BrokenProcessPool:
+      raise HTTPException(
+        status_code=503,
+        detail="Processo de leitura de PDF interrompido. Tente novamente."
         )
-    
-    try:
-      reader = PdfReader(io.BytesIO(data))
-      pages_text = []
-      for page in reader.pages:
-        pages_text.append(page.extract_text() or "")
-      text = "\n".join(pages_text).strip()
     except Exception as e:
       raise HTTPException(
         status_code=400,
         detail=f"Falha ao ler o PDF: {str(e)}"
         )
+    finally:
+      os.unlink(pdf_path)
     
     if not text:
       raise HTTPException(
@@ -45,7 +85,275 @@ async def extract_text(file: UploadFile) -> str:
       )
     return text
   
+  if filename.endswith(".eml"):
+    text = await run_in_threadpool(_read_eml, file.file)
+    if not text:
+      raise HTTPException(
+        status_code=400,
+        detail="Não foi possível extrair o texto do .eml (sem parte de texto)"
+      )
+    return text
+  
+  if filename.endswith(".mbox"):
+    raise HTTPException(
+      status_code=400,
+      detail="Arquivos .mbox contêm várias mensagens. Envie para /api/analyze/mbox"
+    )
+  
   raise HTTPException(
     status_code=400,
-    detail="Formato inválido. Envie no formato .txt ou .pdf"
-  )
\ No newline at end of file
+    detail="Formato inválido. Envie no formato .txt, .pdf ou .eml"
+  )
+
+
+async def _read_text_stream(file: UploadFile) -> str:
+  """
+  Lê um .txt em blocos com decodificação UTF-8 incremental.
+  Para assim que EXTRACT_MAX_CHARS caracteres foram coletados,
+  sem carregar o restante do arquivo em memória.
+  """
+  decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+  parts = []
+  collected = 0
+
+  while collected < EXTRACT_MAX_CHARS:
+    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    piece = decoder.decode(chunk, final=not chunk)
+    if not parts:
+      # Espaços iniciais não contam para o limite
+      piece = piece.lstrip()
+    if piece:
+      parts.append(piece)
+      collected += len(piece)
+    if not chunk:
+      break
+
+  return "".join(parts)[:EXTRACT_MAX_CHARS].strip()
+
+
+class MultipartFileStream:
+  """
+  Lê um campo de arquivo de um corpo multipart/form-data conforme ele chega
+  (request.stream()), sem gravar o upload: open() avança até os cabeçalhos
+  do campo e chunks() entrega o conteúdo dele em blocos.
+  Lança HTTPException(400) para corpo que não é multipart ou malformado.
+  """
+
+  def __init__(self, request: Request, field: str = "file"):
+    self.field = field
+    self.filename: str | None = None
+    self._body = request.stream().__aiter__()
+    self._data: list[bytes] = []
+    self._headers: dict[bytes, bytes] = {}
+    self._header_name = b""
+    self._header_value = b""
+    self._in_field = False
+    self._field_done = False
+
+    _, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if not boundary:
+      raise HTTPException(status_code=400, detail="Envie o arquivo como multipart/form-data")
+    self._parser = MultipartParser(boundary, {
+      "on_part_begin": self._on_part_begin,
+      "on_header_field": self._on_header_field,
+      "on_header_value": self._on_header_value,
+      "on_header_end": self._on_header_end,
+      "on_headers_finished": self._on_headers_finished,
+      "on_part_data": self._on_part_data,
+      "on_part_end": self._on_part_end,
+    })
+
+  async def open(self) -> str | None:
+    """Lê o corpo até o início do campo; retorna o nome do arquivo (None se o campo não veio)"""
+    while self.filename is None and not self._field_done and await self._read():
+      pass
+    return self.filename
+
+  async def chunks(self) -> AsyncIterator[bytes]:
+    """Conteúdo do campo, um bloco por pedaço do corpo recebido"""
+    while True:
+      if self._data:
+        data, self._data = b"".join(self._data), []
+        yield data
+      if self._field_done or not await self._read():
+        return
+
+  async def _read(self) -> bool:
+    try:
+      chunk = await self._body.__anext__()
+    except StopAsyncIteration:
+      return False
+    try:
+      self._parser.write(chunk)
+    except MultipartParseError as e:
+      raise HTTPException(status_code=400, detail=f"Corpo multipart inválido: {e}")
+    return True
+
+  def _on_part_begin(self) -> None:
+    self._headers = {}
+
+  def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+    self._header_name += data[start:end]
+
+  def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+    self._header_value += data[start:end]
+
+  def _on_header_end(self) -> None:
+    self._headers[self._header_name.lower()] = self._header_value
+    self._header_name = self._header_value = b""
+
+  def _on_headers_finished(self) -> None:
+    _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+    name = options.get(b"name", b"").decode("utf-8", "replace")
+    # Só o primeiro campo com o nome; o conteúdo de outros campos é ignorado
+    if name == self.field and self.filename is None and not self._field_done:
+      self._in_field = True
+      self.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+
+  def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+    if self._in_field:
+      self._data.append(data[start:end])
+
+  def _on_part_end(self) -> None:
+    if self._in_field:
+      self._in_field = False
+      self._field_done = True
+
+
+def read_file_text(path: str) -> str:
+  """
+  Versão síncrona de extract_text para arquivos em disco (.txt, .pdf ou .eml),
+  usada fora do event loop (ex.: processos da CLI bulk).
+  Lança HTTPException(400) para formato inválido ou arquivo sem texto.
+  """
+  filename = path.lower()
+
+  if filename.endswith(".txt"):
+    # Até 4 bytes por caractere em UTF-8
+    with open(path, "rb") as f:
+      raw = f.read(EXTRACT_MAX_CHARS * 4)
+    text = raw.decode("utf-8", errors="ignore").strip()[:EXTRACT_MAX_CHARS]
+  elif filename.endswith(".pdf"):
+    text = extract_pdf_text(path)
+  elif filename.endswith(".eml"):
+    with open(path, "rb") as f:
+      text = _read_eml(f)
+  else:
+    raise HTTPException(
+      status_code=400,
+      detail="Formato inválido. Envie no formato .txt, .pdf ou .eml"
+    )
+
+  if not text:
+    raise HTTPException(
+      status_code=400,
+      detail=f"Não foi possível extrair texto de {os.path.basename(path)}"
+    )
+  return text
+
+
+def _read_eml(source) -> str:
+  """
+  Lê a mensagem RFC 822 em blocos: só o texto (text/plain ou text/html
+  sem tags) é guardado; anexos são lidos e descartados.
+  """
+  source.seek(0)
+  return parse_eml(iter_chunks(source, UPLOAD_CHUNK_SIZE), EXTRACT_MAX_CHARS).text
+
+
+def _spool_to_tempfile(source) -> tuple[str, int]:
+  """
+  Copia o upload em blocos para um arquivo temporário em disco,
+  de onde o processo do pool lê o PDF sem cópia em memória.
+  Retorna (caminho, tamanho em bytes); quem chama remove o arquivo.
+  """
+  source.seek(0)
+  with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+    shutil.copyfileobj(source, tmp, UPLOAD_CHUNK_SIZE)
+    return tmp.name, tmp.tell()
+
+
+def extract_pdf_text(
+  source: str | bytes,
+  max_pages: int = PDF_MAX_PAGES,
+  max_chars: int = EXTRACT_MAX_CHARS
+) -> str:
+  """
+  Extrai o texto das primeiras páginas de um PDF (caminho ou bytes).
+  Para de ler ao atingir max_pages ou max_chars.
+  Executa nos processos do pool (precisa ser picklable).
+  """
+  # Importado aqui: o processo da API não precisa do pypdf, só os processos do pool
+  from pypdf import PdfReader
+
+  reader = PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+  pages_text = []
+  total_chars = 0
+  for page in itertools.islice(reader.pages, max_pages):
+    page_text = page.extract_text() or ""
+    pages_text.append(page_text)
+    total_chars += len(page_text)
+    if total_chars >= max_chars:
+      break
+  return "\n".join(pages_text).strip()[:max_chars]
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+  global _pdf_pool
+  if _pdf_pool is None:
+    # spawn: não herda threads/estado do event loop do processo da API
+    _pdf_pool = ProcessPoolExecutor(
+      max_workers=PDF_WORKERS,
+      mp_context=multiprocessing.get_context("spawn")
+    )
+  return _pdf_pool
+
+
+def shutdown_pdf_pool() -> None:
+  """Encerra o pool de PDF (será recriado no próximo uso)"""
+  global _pdf_pool
+  if _pdf_pool is not None:
+    _pdf_pool.shutdown(wait=False, cancel_futures=True)
+    _pdf_pool = None
+
+
+def _recycle_pdf_pool(pool: ProcessPoolExecutor) -> None:
+  """
+  Mata os processos do pool e tira ele de uso: é o único jeito de parar um
+  pypdf já em execução. Os outros jobs do pool recebem BrokenProcessPool
+  e _run_pdf_job os reenvia ao pool novo.
+  """
+  global _pdf_pool
+  if pool is _pdf_pool:
+    _pdf_pool = None
+  _recycled_pools.add(pool)
+  for process in list((pool._processes or {}).values()):
+    process.terminate()
+  pool.shutdown(wait=False)
+
+
+async def _run_pdf_job(source: str | bytes) -> str:
+  """
+  Envia o parsing para o pool de processos com timeout.
+  wait_for só cancela jobs ainda na fila; no timeout de um job em execução
+  o pool é reciclado, senão um PDF hostil prenderia o processo até terminar.
+  """
+  loop = asyncio.get_running_loop()
+  deadline = loop.time() + PDF_TIMEOUT_SECONDS
+  while True:
+    pool = _get_pdf_pool()
+    job = pool.submit(extract_pdf_text, source, PDF_MAX_PAGES, EXTRACT_MAX_CHARS)
+    try:
+      return await asyncio.wait_for(asyncio.wrap_future(job), timeout=deadline - loop.time())
+    except asyncio.TimeoutError:
+      # cancel() só funciona com o job ainda na fila; em execução, só matando o processo
+      if not job.cancel() and not job.done():
+        _recycle_pdf_pool(pool)
+      raise
+    except BrokenProcessPool:
+      # Pool reciclado pelo timeout de outro job: este não teve culpa, vai para o novo
+      if pool not in _recycled_pools or loop.time() >= deadline:
+        if pool is _pdf_pool:
+          shutdown_pdf_pool()
+        raise
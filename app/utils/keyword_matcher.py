@@ -0,0 +1,99 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable
+
+
+class KeywordMatcher:
+    """
+    Busca várias keywords (como substrings) em uma única varredura do texto.
+
+    As keywords viram uma única regex em forma de trie, construída uma vez:
+    em cada posição ela casa a keyword mais longa que começa ali. As
+    ocorrências que a varredura pula por estarem dentro de um casamento
+    (ex.: "obrigado" dentro de "muito obrigado") saem de tabelas
+    pré-calculadas, então as contagens são as mesmas de procurar cada
+    keyword separadamente, com sobreposição.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = frozenset(k for k in keywords if k)
+        self._pattern = re.compile(_trie_pattern(self.keywords))
+
+        # Por keyword: (keywords contidas nela com multiplicidade,
+        #              caracteres possíveis logo após o fim dela,
+        #              keywords que começam dentro dela e passam do fim)
+        self._overlaps: Dict[str, tuple] = {}
+
+        for keyword in self.keywords:
+            contained = Counter()
+            straddling = []
+            for offset in range(len(keyword)):
+                tail = keyword[offset:]
+                for other in self.keywords:
+                    if offset == 0 and other == keyword:
+                        continue
+                    if tail.startswith(other):
+                        contained[other] += 1
+                    elif offset > 0 and other.startswith(tail):
+                        straddling.append((offset, other))
+            next_chars = frozenset(other[len(keyword) - offset] for offset, other in straddling)
+            if contained or straddling:
+                self._overlaps[keyword] = (tuple(contained.items()), next_chars, tuple(straddling))
+
+    def count(self, text: str) -> Dict[str, int]:
+        """
+        Conta as ocorrências de cada keyword no texto (com sobreposição).
+
+        Args:
+            text: Texto já normalizado (ex.: em lowercase)
+
+        Returns:
+            Dict keyword -> ocorrências, apenas para keywords encontradas
+        """
+        hits: Dict[str, int] = {}
+        overlaps = self._overlaps
+        text_length = len(text)
+        for match in self._pattern.finditer(text):
+            keyword = match.group()
+            hits[keyword] = hits.get(keyword, 0) + 1
+            if keyword not in overlaps:
+                continue
+
+            contained, next_chars, straddling = overlaps[keyword]
+            for other, times in contained:
+                hits[other] = hits.get(other, 0) + times
+            end = match.end()
+            # Só há keyword atravessando o fim se o próximo caractere permitir
+            if end < text_length and text[end] in next_chars:
+                start = match.start()
+                for offset, other in straddling:
+                    if text.startswith(other, start + offset):
+                        hits[other] = hits.get(other, 0) + 1
+        return hits
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """
+    Monta uma alternação em forma de trie (ex.: "obrigad(?:a|o)").
+    Cada ramo começa com um caractere distinto e os quantificadores
+    são gulosos, então a regex casa a keyword mais longa em cada posição.
+    """
+    trie: dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        is_end = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if is_end else group
+
+    # (?!) nunca casa: evita uma regex vazia que casaria em toda posição
+    return build(trie) or "(?!)"
@@ -0,0 +1,351 @@
+"""
+Leitura em streaming de emails no formato RFC 822 (.eml) e de exportações mbox.
+
+O parser trabalha linha a linha: escolhe a parte text/plain (ou remove as
+tags da text/html quando não há texto puro), decodifica base64 e
+quoted-printable de forma incremental e descarta anexos binários sem
+guardá-los em memória. No mbox cada mensagem é entregue assim que termina,
+então o consumo de memória não depende do tamanho do arquivo.
+"""
+
+import binascii
+import codecs
+import re
+from email.header import decode_header, make_header
+from email.parser import BytesHeaderParser
+from html.parser import HTMLParser
+from typing import BinaryIO, Iterable, Iterator, List, NamedTuple
+
+from app.utils.text_reducer import CHARS_PER_TOKEN, EXTRACT_OVERSAMPLE, LLM_INPUT_TOKEN_BUDGET
+
+# Texto guardado por mensagem (mesmo limite da extração de .txt e .pdf)
+MIME_MAX_CHARS = LLM_INPUT_TOKEN_BUDGET * CHARS_PER_TOKEN * EXTRACT_OVERSAMPLE
+
+# Linhas maiores que isto (ex.: anexo sem quebras) são processadas em pedaços
+MAX_LINE_BYTES = 64 * 1024
+# Bloco de cabeçalhos de uma parte; o excesso é ignorado
+MAX_HEADER_BYTES = 64 * 1024
+
+# compat32: bem mais rápido que policy.default; só Subject precisa de decodificação RFC 2047
+_header_parser = BytesHeaderParser()
+_NON_BASE64 = re.compile(rb"[^A-Za-z0-9+/=]")
+_MBOX_ESCAPED_FROM = re.compile(rb"^>+From ")
+_BLANK_LINES = re.compile(r"\n\s*\n(?:\s*\n)+")
+
+_SKIPPED_TAGS = {"script", "style", "head", "title"}
+_BLOCK_TAGS = {"br", "p", "div", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "table"}
+
+
+class ParsedEmail(NamedTuple):
+    """Texto extraído de uma mensagem e os cabeçalhos usados para identificá-la"""
+    text: str
+    subject: str
+    message_id: str
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Remove tags de HTML recebido em pedaços, mantendo quebras nos blocos"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.size = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+            self.size += len(data)
+
+
+class _Part:
+    """Estado da parte MIME em leitura: tipo, codificação e destino do texto"""
+
+    def __init__(self, kind: str, encoding: str = "", charset: str = ""):
+        # kind: "plain", "html" ou "skip" (anexo, parte não textual, limite atingido)
+        self.kind = kind
+        self.encoding = encoding
+        self._base64_rest = b""
+        try:
+            self._decoder = codecs.getincrementaldecoder(charset or "utf-8")(errors="replace")
+        except LookupError:
+            self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def decode(self, line: bytes, final: bool = False) -> str:
+        if self.encoding == "base64":
+            data = self._base64_rest + _NON_BASE64.sub(b"", line)
+            usable = len(data) if final else len(data) // 4 * 4
+            data, self._base64_rest = data[:usable], data[usable:]
+            try:
+                line = binascii.a2b_base64(data) if data else b""
+            except binascii.Error:
+                line = b""
+        elif self.encoding == "quoted-printable":
+            line = binascii.a2b_qp(line)
+        return self._decoder.decode(line, final=final)
+
+
+class MimeTextExtractor:
+    """
+    Recebe as linhas de uma mensagem (feed) e devolve o texto em close().
+    Só o texto das partes text/plain (ou text/html, sem tags) é guardado,
+    até max_chars caracteres; o restante é lido e descartado.
+    """
+
+    def __init__(self, max_chars: int = MIME_MAX_CHARS):
+        self.max_chars = max_chars
+        self.subject = ""
+        self.message_id = ""
+        self._plain: List[str] = []
+        self._plain_size = 0
+        self._html = _HTMLTextExtractor()
+        self._boundaries: List[bytes] = []
+        self._headers: List[bytes] = []
+        self._header_size = 0
+        self._in_headers = True
+        self._top_level = True
+        self._part: _Part | None = None
+
+    def feed(self, line: bytes) -> None:
+        if self._in_headers:
+            self._feed_header(line)
+            return
+
+        if self._boundaries and line.startswith(b"--"):
+            marker = line.rstrip()
+            for depth in range(len(self._boundaries) - 1, -1, -1):
+                boundary = self._boundaries[depth]
+                if marker == boundary or marker == boundary + b"--":
+                    self._end_part()
+                    del self._boundaries[depth + 1:]
+                    if marker == boundary:
+                        self._in_headers = True
+                    else:
+                        # Fim do multipart: o epílogo até a próxima fronteira é ignorado
+                        self._boundaries.pop()
+                    return
+
+        part = self._part
+        if part is None or part.kind == "skip":
+            return
+        text = part.decode(line.replace(b"\r\n", b"\n"))
+        if part.kind == "plain":
+            self._plain.append(text)
+            self._plain_size += len(text)
+            if self._plain_size >= self.max_chars:
+                part.kind = "skip"
+        else:
+            self._html.feed(text)
+            if self._html.size >= self.max_chars:
+                part.kind = "skip"
+
+    def close(self) -> ParsedEmail:
+        if self._in_headers and self._headers:
+            # Mensagem sem corpo: só cabeçalhos
+            self._start_part(b"".join(self._headers))
+        self._end_part()
+        self._html.close()
+
+        text = "".join(self._plain)
+        if not text.strip():
+            text = "".join(self._html.parts)
+        text = _BLANK_LINES.sub("\n\n", text[:self.max_chars]).strip()
+        if self.subject and self.subject not in text[:len(self.subject) + 10]:
+            text = f"{self.subject}\n\n{text}".strip()
+        return ParsedEmail(text, self.subject, self.message_id)
+
+    def _feed_header(self, line: bytes) -> None:
+        if line.strip():
+            if self._header_size < MAX_HEADER_BYTES:
+                self._headers.append(line)
+                self._header_size += len(line)
+            return
+        self._start_part(b"".join(self._headers))
+
+    def _start_part(self, raw_headers: bytes) -> None:
+        self._headers, self._header_size, self._in_headers = [], 0, False
+        headers = _header_parser.parsebytes(raw_headers)
+
+        if self._top_level:
+            self._top_level = False
+            self.subject = _header_value(headers, "subject")
+            self.message_id = _header_value(headers, "message-id")
+
+        content_type = headers.get_content_type()
+        if headers.get_content_maintype() == "multipart":
+            boundary = headers.get_boundary()
+            if boundary:
+                # Preâmbulo até a primeira fronteira é ignorado
+                self._boundaries.append(b"--" + boundary.encode("ascii", "ignore"))
+                self._part = None
+                return
+        if content_type == "message/rfc822" and headers.get_content_disposition() != "attachment":
+            # Mensagem encaminhada em anexo inline: o corpo começa com os cabeçalhos dela
+            self._in_headers = True
+            return
+
+        encoding = _header_value(headers, "content-transfer-encoding").lower()
+        if headers.get_content_disposition() == "attachment":
+            kind = "skip"
+        elif content_type == "text/plain" and self._plain_size < self.max_chars:
+            kind = "plain"
+        elif content_type == "text/html" and not self._plain_size and self._html.size < self.max_chars:
+            kind = "html"
+        else:
+            kind = "skip"
+        self._part = _Part(kind, encoding, headers.get_content_charset() or "")
+
+    def _end_part(self) -> None:
+        part, self._part = self._part, None
+        if part is None or part.kind == "skip":
+            return
+        text = part.decode(b"", final=True)
+        if part.kind == "plain":
+            self._plain.append(text)
+            self._plain_size += len(text)
+        else:
+            self._html.feed(text)
+
+
+class MboxSplitter:
+    """
+    Separa um mbox nas mensagens, entregando cada uma já extraída.
+    feed(linha) devolve a mensagem anterior quando começa uma nova
+    (linha "From " no início do arquivo ou após uma linha vazia).
+    """
+
+    def __init__(self, max_chars: int = MIME_MAX_CHARS):
+        self.max_chars = max_chars
+        self._current: MimeTextExtractor | None = None
+        self._previous_blank = True
+        self._pending_blank = b""
+
+    def feed(self, line: bytes) -> ParsedEmail | None:
+        finished = None
+        if self._previous_blank and line.startswith(b"From "):
+            finished = self._finish()
+            self._current = MimeTextExtractor(self.max_chars)
+            self._previous_blank = False
+            return finished
+
+        if self._current is None:
+            # Conteúdo antes do primeiro separador: arquivo .eml ou mbox sem "From "
+            self._current = MimeTextExtractor(self.max_chars)
+
+        # A linha vazia antes do separador pertence ao formato, não à mensagem
+        if self._pending_blank:
+            self._current.feed(self._pending_blank)
+            self._pending_blank = b""
+        self._previous_blank = not line.strip()
+        if self._previous_blank:
+            self._pending_blank = line
+            return None
+
+        if _MBOX_ESCAPED_FROM.match(line):
+            line = line[1:]
+        self._current.feed(line)
+        return None
+
+    def close(self) -> ParsedEmail | None:
+        return self._finish()
+
+    def _finish(self) -> ParsedEmail | None:
+        current, self._current = self._current, None
+        self._pending_blank = b""
+        return current.close() if current is not None else None
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Junta blocos de bytes em linhas (com o fim de linha), limitadas a MAX_LINE_BYTES"""
+    buffer = b""
+    for chunk in chunks:
+        lines, buffer = _split_lines(buffer + chunk)
+        yield from lines
+    if buffer:
+        yield buffer
+
+
+def _split_lines(buffer: bytes) -> tuple[List[bytes], bytes]:
+    """(linhas completas do buffer, resto sem quebra de linha)"""
+    lines = []
+    start = 0
+    while True:
+        end = buffer.find(b"\n", start)
+        if end == -1:
+            break
+        lines.append(buffer[start:end + 1])
+        start = end + 1
+    buffer = buffer[start:]
+    while len(buffer) > MAX_LINE_BYTES:
+        lines.append(buffer[:MAX_LINE_BYTES])
+        buffer = buffer[MAX_LINE_BYTES:]
+    return lines, buffer
+
+
+def iter_chunks(source: BinaryIO, chunk_size: int = MAX_LINE_BYTES) -> Iterator[bytes]:
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_eml(chunks: Iterable[bytes], max_chars: int = MIME_MAX_CHARS) -> ParsedEmail:
+    """Extrai o texto de uma mensagem RFC 822 recebida em blocos"""
+    extractor = MimeTextExtractor(max_chars)
+    for line in iter_lines(chunks):
+        extractor.feed(line)
+    return extractor.close()
+
+
+def iter_mbox(chunks: Iterable[bytes], max_chars: int = MIME_MAX_CHARS) -> Iterator[ParsedEmail]:
+    """Gera as mensagens de um mbox, uma por vez, a partir de blocos de bytes"""
+    reader = MboxReader(max_chars)
+    for chunk in chunks:
+        yield from reader.feed(chunk)
+    yield from reader.close()
+
+
+class MboxReader:
+    """
+    iter_mbox para blocos que chegam aos poucos (ex.: upload ainda em
+    andamento): feed(bloco) devolve as mensagens que o bloco completou e
+    close() a última.
+    """
+
+    def __init__(self, max_chars: int = MIME_MAX_CHARS):
+        self._splitter = MboxSplitter(max_chars)
+        self._buffer = b""
+
+    def feed(self, chunk: bytes) -> List[ParsedEmail]:
+        lines, self._buffer = _split_lines(self._buffer + chunk)
+        return [message for message in map(self._splitter.feed, lines) if message is not None]
+
+    def close(self) -> List[ParsedEmail]:
+        # Última linha sem quebra no fim do arquivo
+        last, self._buffer = self._buffer, b""
+        messages = [self._splitter.feed(last) if last else None, self._splitter.close()]
+        return [message for message in messages if message is not None]
+
+
+def _header_value(headers, name: str) -> str:
+    try:
+        value = headers.get(name)
+        if value and name == "subject":
+            value = make_header(decode_header(value))
+    except Exception:
+        # Cabeçalho malformado não deve impedir a leitura do corpo
+        return ""
+    return " ".join(str(value).split()) if value else ""
@@ -17,6 +17,10 @@ PORTUGUESE_STOP_WORDS = {
     "nos", "vos", "o", "a", "os", "as", "um", "uma", "uns", "umas"
 }
 
+# Após remover pontuação, cada token é uma sequência de letras/dígitos/_ e hífens
+_TOKEN_PATTERN = re.compile(r"[\w\-]+")
+
+
 def preprocess_text(text: str) -> str:
     """
     Pré-processa o texto com processamento NLP completo:
@@ -26,6 +30,49 @@ def preprocess_text(text: str) -> str:
     4. Remove stop words
     5. Remove números isolados
     6. Remove espaços duplicados finais
+
+    Todas as etapas são feitas em uma única passada: um lower() e um
+    findall compilado que já separa os tokens sem pontuação; stop words
+    e números são filtrados token a token. A saída é idêntica à da
+    versão em etapas (_preprocess_text_multipass).
+    
+    Args:
+        text: Texto bruto a processar
+        
+    Returns:
+        Texto preprocessado e limpo
+    """
+    
+    if not text or not isinstance(text, str):
+        return ""
+    
+    stop_words = PORTUGUESE_STOP_WORDS
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if len(token) < 2 or token in stop_words or token.isdecimal():
+            continue
+        if "-" in token:
+            # Números isolados entre hífens (ex.: "2024-final" -> "-final")
+            token = "-".join(
+                "" if part.isdecimal() else part for part in token.split("-")
+            )
+        tokens.append(token)
+    
+    return " ".join(tokens)
+
+
+def _preprocess_text_multipass(text: str) -> str:
+    """
+    Versão em etapas do pré-processamento (uma passada por etapa).
+    Mantida como referência de comportamento e para benchmark.
+
+    Pré-processa o texto com processamento NLP completo:
+    1. Normaliza quebras de linha e espaços
+    2. Remove pontuação e caracteres especiais
+    3. Converte para lowercase
+    4. Remove stop words
+    5. Remove números isolados
+    6. Remove espaços duplicados finais
     
     Args:
         text: Texto bruto a processar
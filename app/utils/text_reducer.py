@@ -0,0 +1,154 @@
+"""
+Redução do email ao que interessa para a classificação, dentro de um orçamento de tokens.
+
+Remove histórico citado (respostas anteriores), assinaturas, avisos legais
+e cabeçalhos de encaminhamento; se ainda assim o texto passar do orçamento,
+mantém o começo e o fim da mensagem. Roda antes do pré-processamento,
+sobre o texto bruto, porque depende de quebras de linha e pontuação.
+"""
+
+import os
+import re
+
+# Estimativa usada em todo o projeto: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+# Orçamento de tokens do email enviado ao LLM (1500 tokens ~ 6000 caracteres)
+LLM_INPUT_TOKEN_BUDGET = int(os.getenv("LLM_INPUT_TOKEN_BUDGET", 1500))
+
+# Fração do orçamento para o começo do texto; o restante fica com o fim
+HEAD_RATIO = 0.7
+
+# Lido a mais na extração: a limpeza costuma descartar boa parte de threads longas
+EXTRACT_OVERSAMPLE = 4
+
+_REPLY_MARKER = re.compile(
+    r"^\s*(?:"
+    r"em\s.{0,200}\sescreveu:"
+    r"|on\s.{0,200}\swrote:"
+    r"|-{2,}\s*(?:mensagem original|original message)\s*-{2,}"
+    r")\s*$",
+    re.IGNORECASE,
+)
+_FORWARD_MARKER = re.compile(
+    r"^\s*-{2,}\s*(?:mensagem encaminhada|forwarded message)\s*-{2,}\s*$|^\s*(?:begin forwarded message|início da mensagem encaminhada):\s*$",
+    re.IGNORECASE,
+)
+_HEADER_LINE = re.compile(
+    r"^\s*\*?(?:de|from|para|to|cc|cco|bcc|data|date|enviad[oa](?: em)?|sent|assunto|subject)\*?:\s",
+    re.IGNORECASE,
+)
+_HEADER_START = re.compile(r"^\s*\*?(?:de|from)\*?:\s", re.IGNORECASE)
+_SIGNATURE_START = re.compile(
+    r"^\s*(?:--\s*"
+    r"|(?:atenciosamente|att|abs|abraços?|cordialmente|saudações|best regards|kind regards|regards)[\s,.!]*"
+    r"|(?:enviado do meu|sent from my)\s.{0,40}"
+    r")$",
+    re.IGNORECASE,
+)
+_DISCLAIMER_TERMS = re.compile(
+    r"confidencial|confidential|destinatário|intended recipient|privilegiad|privileged"
+    r"|aviso legal|disclaimer|proibida|prohibited|apague esta mensagem|delete this message"
+    r"|recebeu esta mensagem por engano|received this (?:e-?mail|message) in error",
+    re.IGNORECASE,
+)
+_BLANK_LINES = re.compile(r"\n\s*\n(?:\s*\n)+")
+
+# Linha acima disto é texto corrido: encerra o bloco de assinatura
+_SIGNATURE_MAX_LINE = 80
+# Assinaturas têm poucas linhas; depois disso (ou de uma linha vazia) volta o corpo,
+# como em texto puro quebrado em 72 colunas após um "Atenciosamente" no meio
+_SIGNATURE_MAX_LINES = 6
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def strip_noise(text: str) -> str:
+    """
+    Remove histórico citado, assinaturas, cabeçalhos de encaminhamento
+    e avisos legais. O conteúdo de mensagens encaminhadas é mantido.
+    """
+    lines = text.splitlines()
+    kept = []
+    in_headers = False
+    in_signature = False
+    signature_lines = 0
+    has_content = False
+
+    for index, line in enumerate(lines):
+        if _FORWARD_MARKER.match(line):
+            in_headers, in_signature = True, False
+            continue
+        if in_headers:
+            # Cabeçalhos (De:, Para:, Assunto:...) e linhas vazias logo após o marcador
+            if not line.strip() or _HEADER_LINE.match(line):
+                continue
+            in_headers = False
+
+        if _REPLY_MARKER.match(line) and has_content:
+            break
+        # Bloco "De: / Enviado: / Para:" do Outlook abre o histórico da resposta
+        if has_content and _HEADER_START.match(line) and any(
+            _HEADER_LINE.match(following) for following in lines[index + 1:index + 4]
+        ):
+            break
+
+        if line.lstrip().startswith(">"):
+            continue
+        if _SIGNATURE_START.match(line):
+            in_signature, signature_lines = True, 0
+            continue
+        if in_signature:
+            stripped = line.strip()
+            if not stripped and not signature_lines:
+                continue
+            if stripped and len(stripped) <= _SIGNATURE_MAX_LINE and signature_lines < _SIGNATURE_MAX_LINES:
+                signature_lines += 1
+                continue
+            in_signature = False
+        kept.append(line)
+        has_content = has_content or bool(line.strip())
+
+    paragraphs = re.split(r"\n\s*\n", "\n".join(kept))
+    paragraphs = [p for p in paragraphs if len(_DISCLAIMER_TERMS.findall(p)) < 2]
+    return _BLANK_LINES.sub("\n\n", "\n\n".join(paragraphs)).strip()
+
+
+def fit_budget(text: str, max_tokens: int) -> str:
+    """Mantém começo e fim do texto (em limites de palavra) dentro do orçamento"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+
+    head_chars = int(max_chars * HEAD_RATIO)
+    tail_chars = max_chars - head_chars
+    head = text[:head_chars]
+    tail = text[-tail_chars:] if tail_chars > 0 else ""
+    # Não cortar palavras no meio
+    if " " in head:
+        head = head[:head.rfind(" ")]
+    if " " in tail:
+        tail = tail[tail.find(" ") + 1:]
+    return f"{head}\n[...]\n{tail}".strip()
+
+
+def reduce_email(text: str, max_tokens: int = LLM_INPUT_TOKEN_BUDGET) -> str:
+    """
+    Reduz o email bruto ao conteúdo informativo dentro de max_tokens.
+
+    Args:
+        text: Texto bruto (antes do pré-processamento)
+        max_tokens: Orçamento de tokens
+
+    Returns:
+        Texto reduzido; se a limpeza descartar tudo (ex.: email só com
+        citação), o começo do texto original dentro do orçamento
+    """
+    if not text:
+        return ""
+    # Não há por que limpar além do que a extração leria de um arquivo
+    text = text[:max_tokens * CHARS_PER_TOKEN * EXTRACT_OVERSAMPLE]
+    reduced = strip_noise(text) or text.strip()
+    return fit_budget(reduced, max_tokens)
@@ -135,16 +135,16 @@ emailForm.addEventListener("submit", async (e) => {
   showLoading();
 
   try {
-    const response = await fetch(`${API_URL}/analyze`, {
+    // Streaming: category first, then the suggested reply as it is generated
+    const response = await fetch(`${API_URL}/analyze/stream`, {
       method: "POST",
       body: formData,
     });
 
-    const data = await response.json();
-
     if (response.ok) {
-      displayResults(data);
+      await readAnalysisStream(response);
     } else {
+      const data = await response.json();
       showError(data.detail || data.message || "Erro ao processar email");
     }
   } catch (error) {
@@ -157,16 +157,64 @@ emailForm.addEventListener("submit", async (e) => {
   }
 });
 
-// Display Results
-function displayResults(data) {
-  // Show results section
+// Server-sent events from /analyze/stream (EventSource only supports GET)
+async function readAnalysisStream(response) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      handleStreamEvent(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+    }
+  }
+}
+
+function handleStreamEvent(block) {
+  let event = "message";
+  let data = "";
+  for (const line of block.split("\n")) {
+    if (line.startsWith("event: ")) event = line.slice(7);
+    else if (line.startsWith("data: ")) data += line.slice(6);
+  }
+  if (!data) return;
+  const payload = JSON.parse(data);
+
+  if (event === "category") {
+    hideLoading();
+    submitBtn.disabled = true;
+    displayCategory(payload.category);
+    confidenceValue.textContent = "…";
+    responseContent.textContent = "";
+  } else if (event === "delta") {
+    responseContent.textContent += payload.text;
+  } else if (event === "result") {
+    // Final, validated analysis: replaces whatever was streamed
+    displayResults(payload);
+  } else if (event === "error") {
+    showError(payload.detail || "Erro ao processar email");
+  }
+}
+
+function displayCategory(categoryName) {
   resultsSection.classList.remove("is-empty");
   resultsSection.classList.add("has-results");
 
-  // Display category
-  const category = data.category.toLowerCase();
-  categoryBadge.textContent = data.category;
-  categoryBadge.className = `category-badge ${category}`;
+  categoryBadge.textContent = categoryName;
+  categoryBadge.className = `category-badge ${categoryName.toLowerCase()}`;
+}
+
+// Display Results
+function displayResults(data) {
+  // Show results section and category
+  displayCategory(data.category);
 
   // Display confidence
   const confidencePercent = data.confidence
@@ -0,0 +1,88 @@
+"""
+Configuração do gunicorn para produção: vários processos, cada um com um
+worker do uvicorn (event loop próprio).
+
+    gunicorn app.main:app            # lê este arquivo do diretório atual
+
+- WEB_CONCURRENCY: número de workers (padrão: um por CPU disponível)
+- GUNICORN_PRELOAD (padrão true): o app é importado uma vez no mestre,
+  antes do fork, junto com o que os workers só leem (SDK do LLM, modelo
+  local); essas páginas ficam compartilhadas entre os workers (cópia na
+  escrita) e gc.freeze() evita que a coleta de lixo as copie
+- SHARED_STATE_PATH: limitador de taxa, métricas e cache de análises
+  compartilhados entre os workers (app/shared_state.py)
+
+Conexões, pools e o serviço de análise são criados depois do fork, no
+lifespan de cada worker.
+"""
+
+import gc
+import os
+import tempfile
+
+
+def _available_cpus() -> int:
+    # sched_getaffinity respeita o cpuset do container; cpu_count vê o host inteiro
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Definido antes de o app ser importado: as constantes dos módulos leem o ambiente no import
+os.environ.setdefault("SHARED_STATE_PATH", os.path.join(tempfile.gettempdir(), "email-analyzer", "state.db"))
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', 8000)}")
+# Workers assíncronos: a espera pelo LLM não ocupa o processo, então um por CPU basta
+workers = int(os.getenv("WEB_CONCURRENCY", _available_cpus()))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Worker sem sinal de vida por este tempo (event loop travado) é reiniciado
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+# Tempo para terminar requisições e streams em andamento num restart
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+# Reinicia cada worker depois de N requisições (0 desativa), com jitter para não reiniciarem juntos
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+# Heartbeat dos workers em memória: no overlayfs do Docker o fsync pode travar o mestre
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+
+def on_starting(server):
+    # Retratos de métricas de uma execução anterior não entram na soma
+    from app.shared_state import SharedState
+
+    state = SharedState(os.environ["SHARED_STATE_PATH"])
+    state.reset_metrics()
+    state.close()
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from app.api.routes import preload_shared
+
+    preload_shared()
+    # Tudo o que existe até aqui vai para a geração permanente: o GC dos workers
+    # não percorre (e não copia) as páginas herdadas do mestre
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # O UvicornWorker troca os handlers dos loggers do uvicorn pelos do gunicorn;
+    # em JSON eles voltam para a fila do app (mesmo formato, com request_id)
+    from app.logging_config import LOG_FORMAT, route_uvicorn_logs
+
+    if LOG_FORMAT == "json":
+        route_uvicorn_logs()
+
+
+def child_exit(server, worker):
+    # Os gauges do worker encerrado saem da soma; os contadores dele continuam
+    from app.shared_state import SharedState
+
+    state = SharedState(os.environ["SHARED_STATE_PATH"])
+    state.retire_worker(worker.pid)
+    state.close()
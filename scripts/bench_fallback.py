@@ -0,0 +1,83 @@
+"""
+Benchmark do classificador heurístico (_fallback_classify) em regime de queda do LLM.
+
+Compara a versão anterior (um `kw in texto` por keyword, sem contagens)
+com o KeywordMatcher (uma varredura, com contagem por keyword) e estima
+quanto de um core cada uma consome na taxa de requisições informada.
+
+Uso:
+    python -m scripts.bench_fallback --rps 500 --sizes 500 6000 24000
+"""
+
+import argparse
+import timeit
+
+from app.clients.llm_client import IMPRODUTIVO_KEYWORDS, PRODUTIVO_KEYWORDS, _fallback_classify
+from app.utils.keyword_matcher import KeywordMatcher
+from app.utils.text_preprocessor import preprocess_text
+from scripts.bench_preprocess import build_email
+
+_MATCHER = KeywordMatcher(PRODUTIVO_KEYWORDS | IMPRODUTIVO_KEYWORDS)
+
+
+def legacy_scores(content: str) -> tuple:
+    """Contagem da versão anterior: uma busca de substring por keyword"""
+    content_lower = content.lower()
+    return (
+        sum(1 for kw in PRODUTIVO_KEYWORDS if kw in content_lower),
+        sum(1 for kw in IMPRODUTIVO_KEYWORDS if kw in content_lower),
+    )
+
+
+def legacy_hits(content: str) -> dict:
+    """Versão anterior estendida com contagem por keyword (um count() por keyword)"""
+    content_lower = content.lower()
+    hits = {}
+    for kw in PRODUTIVO_KEYWORDS | IMPRODUTIVO_KEYWORDS:
+        if kw in content_lower:
+            hits[kw] = content_lower.count(kw)
+    return hits
+
+
+def per_call(func, arg) -> float:
+    timer = timeit.Timer(lambda: func(arg))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=500.0, help="Requisições/s durante a queda do LLM")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 6000, 24000])
+    args = parser.parse_args()
+
+    print(f"{'chars':>7} {'anterior (us)':>14} {'anterior+contagem (us)':>23} {'matcher (us)':>13} "
+          f"{'_fallback_classify (us)':>24} {f'core @ {args.rps:.0f} rps':>15}")
+    for size in args.sizes:
+        content = preprocess_text(build_email(size * 2))[:size]
+
+        produtivo, improdutivo = legacy_scores(content)
+        assert _fallback_classify(content)["reason"].endswith(
+            f"produtivo_score={produtivo}, improdutivo_score={improdutivo})"
+        ), "classificação divergente da versão anterior"
+
+        legacy = per_call(legacy_scores, content)
+        legacy_counted = per_call(legacy_hits, content)
+        matcher = per_call(_MATCHER.count, content.lower())
+        full = per_call(_fallback_classify, content)
+        print(f"{len(content):>7} {legacy * 1e6:>14.1f} {legacy_counted * 1e6:>23.1f} {matcher * 1e6:>13.1f} "
+              f"{full * 1e6:>24.1f} {full * args.rps * 100:>14.2f}%")
+
+    # Escala com o número de keywords: o custo da busca por keyword cresce linearmente
+    content = preprocess_text(build_email(12000))[:6000].lower()
+    base = sorted(PRODUTIVO_KEYWORDS | IMPRODUTIVO_KEYWORDS)
+    print(f"\n{'keywords':>9} {'anterior (us)':>14} {'matcher (us)':>13}")
+    for factor in (1, 4, 16):
+        keywords = [kw if i == 0 else f"{kw}{i}" for i in range(factor) for kw in base]
+        matcher = KeywordMatcher(keywords)
+        legacy = per_call(lambda text: sum(1 for kw in keywords if kw in text), content)
+        print(f"{len(keywords):>9} {legacy * 1e6:>14.1f} {per_call(matcher.count, content) * 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark: latência de cauda com e sem hedge entre backends de LLM.
+
+Sobe dois servidores stub com a mesma distribuição de latência e uma
+cauda longa independente (--slow-rate das chamadas leva --slow-ms a
+mais): o primário na Responses API e o secundário em Chat Completions,
+como um servidor local (vLLM, llama.cpp). Mede a mesma sequência de
+análises só no primário e no HedgedLLMClient (secundário disparado no
+p95 das latências recentes do primário), com p50/p95/p99 e quantas
+chamadas extras o hedge gerou.
+
+Uso:
+    python -m scripts.bench_hedging --requests 400 --latency-ms 300 --slow-rate 0.05 --slow-ms 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.clients.hedged_client import HedgedLLMClient
+from app.clients.llm_client import OpenAICompatibleLLMClient, OpenAILLMClient
+from app.clients.rate_limiter import AdaptiveRateLimiter
+from scripts.bench_preprocess import build_email
+from scripts.loadtest import percentile
+from scripts.mock_llm_server import start_mock_server
+
+# Chamadas fora da medição para a janela de latências do hedge sair do prazo inicial
+WARMUP_CALLS = 30
+
+
+async def measure(client, texts: list[str], concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text: str) -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            result = await client.analyze_async(text)
+            if result["fallback"]:
+                raise RuntimeError("Análise caiu no fallback: o benchmark mede só respostas do LLM")
+            return time.perf_counter() - start
+
+    return list(await asyncio.gather(*(one(text) for text in texts)))
+
+
+def row(name: str, samples: list[float], extra: str = "") -> str:
+    values = [sample * 1000 for sample in samples]
+    return (f"{name:<22} {percentile(values, 50):>9.0f} {percentile(values, 95):>9.0f} "
+            f"{percentile(values, 99):>9.0f} {max(values):>9.0f}  {extra}")
+
+
+async def drive(args) -> None:
+    texts = [build_email(args.email_chars, seed=seed) for seed in range(args.requests)]
+    warmup = [build_email(args.email_chars, seed=-seed) for seed in range(1, WARMUP_CALLS + 1)]
+
+    def backends():
+        # Sem limite de taxa: a fila do limitador esconderia a latência do servidor
+        primary = OpenAILLMClient(
+            model="primary", base_url=f"http://127.0.0.1:{args.primary_port}/v1", api_key="bench-key",
+            limiter=AdaptiveRateLimiter(rpm=0, tpm=0)
+        )
+        secondary = OpenAICompatibleLLMClient(model="secondary", base_url=f"http://127.0.0.1:{args.secondary_port}/v1")
+        return primary, secondary
+
+    primary, secondary = backends()
+    await measure(primary, warmup, args.concurrency)
+    plain = await measure(primary, texts, args.concurrency)
+    await primary.aclose()
+    await secondary.aclose()
+
+    hedged = HedgedLLMClient(*backends(), max_ratio=args.max_ratio)
+    await measure(hedged, warmup, args.concurrency)
+    before = hedged.stats()
+    with_hedge = await measure(hedged, texts, args.concurrency)
+    stats = hedged.stats()
+    await hedged.aclose()
+
+    hedges = stats["hedged"] - before["hedged"]
+    wins = stats["secondary_wins"] - before["secondary_wins"]
+    print(f"{args.requests} análises, concorrência {args.concurrency}; LLM: {args.latency_ms:.0f} ± "
+          f"{args.jitter_ms:.0f} ms, {args.slow_rate:.0%} das chamadas +{args.slow_ms:.0f} ms")
+    print(f"{'modo':<22} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'máx (ms)':>9}")
+    print(row("só primário", plain))
+    print(row(
+        "hedge no p95", with_hedge,
+        f"prazo {stats['delay_ms']['single']:.0f} ms, secundário em {hedges / args.requests:.1%} "
+        f"das chamadas, venceu {wins}"
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--email-chars", type=int, default=800)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Fração das chamadas na cauda")
+    parser.add_argument("--slow-ms", type=float, default=2000.0, help="Latência extra das chamadas na cauda")
+    parser.add_argument("--max-ratio", type=float, default=0.1, help="Fração máxima de chamadas com hedge")
+    parser.add_argument("--primary-port", type=int, default=8220)
+    parser.add_argument("--secondary-port", type=int, default=8221)
+    args = parser.parse_args()
+
+    servers = [
+        start_mock_server(port, args.latency_ms, args.jitter_ms, slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+        for port in (args.primary_port, args.secondary_port)
+    ]
+    try:
+        asyncio.run(drive(args))
+    finally:
+        for proc in servers:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
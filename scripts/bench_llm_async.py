@@ -0,0 +1,78 @@
+"""
+Benchmark: cliente LLM síncrono (bloqueia o event loop) x assíncrono.
+
+Sobe o servidor stub (scripts/mock_llm_server.py) localmente e dispara
+N análises concorrentes em um único event loop, como um worker uvicorn
+faria com N requisições simultâneas.
+
+Uso:
+    python -m scripts.bench_llm_async --requests 50 --concurrency 1 10 50
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from app.clients.llm_client import OpenAILLMClient
+from scripts.mock_llm_server import start_mock_server
+
+EMAIL = "Olá, não consigo acessar o sistema desde ontem. Aparece erro 500. Podem verificar?"
+
+
+async def run_sync(client: OpenAILLMClient, total: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            # Caminho antigo: chamada síncrona dentro de uma coroutine
+            client.analyze(EMAIL)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - start
+
+
+async def run_async(client: OpenAILLMClient, total: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            await client.analyze_async(EMAIL)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - start
+
+
+async def main(args):
+    client = OpenAILLMClient(base_url=f"http://127.0.0.1:{args.port}/v1")
+    # Aquece conexões dos dois clientes
+    client.analyze(EMAIL)
+    await client.analyze_async(EMAIL)
+
+    print(f"latência simulada do modelo: {args.latency_ms:.0f} ms, {args.requests} requisições")
+    print(f"{'modo':<8} {'concorrência':>12} {'tempo (s)':>10} {'req/s':>8}")
+    for concurrency in args.concurrency:
+        for name, runner in (("sync", run_sync), ("async", run_async)):
+            elapsed = await runner(client, args.requests, concurrency)
+            print(f"{name:<8} {concurrency:>12} {elapsed:>10.2f} {args.requests / elapsed:>8.1f}")
+
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY_EMAIL_ANALYZER", "bench-key")
+    server = start_mock_server(args.port, args.latency_ms)
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.terminate()
+        server.wait()
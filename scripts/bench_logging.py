@@ -0,0 +1,172 @@
+"""
+Benchmark: custo dos logs por análise.
+
+Cada modo roda num processo novo (a configuração de logging é global),
+com o EmailAnalyzerService e o HeuristicLLMClient (sem rede), cache e
+índice de quase duplicados desativados, e o stderr num arquivo. Mede o
+tempo de parede e de CPU (inclui a thread de escrita) por análise, e
+quantas linhas de log cada uma gerou, contra o modo sem logs. Com
+--write-delay-us cada escrita no stderr leva esse tempo a mais, como um
+terminal ou um pipe de coletor lento:
+
+- off: só WARNING, nenhuma linha no caminho de sucesso
+- text-sync: logging.basicConfig em INFO, escrita no próprio contexto
+- text / json: fila com escrita em segundo plano (app/logging_config.py)
+- json-sampled: json com LOG_SAMPLE_RATE (padrão 0.01)
+
+Uso:
+    python -m scripts.bench_logging --requests 5000 --runs 5
+    python -m scripts.bench_logging --write-delay-us 200
+
+    # Comparar com outra versão do código (sem app/logging_config.py só
+    # roda off e text-sync)
+    git worktree add /tmp/base HEAD~1
+    python -m scripts.bench_logging --root /tmp/base
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MODES = ("off", "text-sync", "text", "json", "json-sampled")
+
+# Executado no processo filho; escreve o resultado em JSON no stdout
+_CHILD = r"""
+import asyncio, json, logging, os, sys, time
+
+mode = os.environ["BENCH_LOG_MODE"]
+requests = int(os.environ["BENCH_LOG_REQUESTS"])
+email_chars = int(os.environ["BENCH_LOG_EMAIL_CHARS"])
+write_delay = float(os.environ["BENCH_LOG_WRITE_DELAY_US"]) / 1e6
+
+
+class SlowStream:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        time.sleep(write_delay)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+stream = SlowStream(sys.stderr) if write_delay else sys.stderr
+
+from app.clients.llm_client import HeuristicLLMClient
+from app.services.analyzer_service import EmailAnalyzerService
+from scripts.bench_preprocess import build_email
+
+try:
+    from app import logging_config
+except ImportError:
+    logging_config = None
+
+if mode == "off":
+    logging.basicConfig(level=logging.WARNING, stream=stream)
+elif mode == "text-sync":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s", stream=stream)
+elif logging_config is None:
+    print(json.dumps({"skipped": "sem app/logging_config.py"}))
+    sys.exit(0)
+else:
+    logging_config.configure_logging(stream=stream)
+
+start_request = logging_config.start_request if logging_config else (lambda request_id=None: None)
+service = EmailAnalyzerService(ai_client=HeuristicLLMClient())
+texts = [build_email(email_chars, seed=seed) for seed in range(requests)]
+
+
+async def run(batch):
+    for text in batch:
+        start_request()
+        await service.analyze(text=text)
+
+
+asyncio.run(run(texts[:200]))
+sys.stderr.flush()
+bytes_before = os.fstat(2).st_size
+
+wall, cpu = time.perf_counter(), time.process_time()
+asyncio.run(run(texts))
+wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+if logging_config is not None:
+    logging_config.stop_logging()
+sys.stderr.flush()
+print(json.dumps({"wall": wall, "cpu": cpu, "bytes_before": bytes_before}))
+"""
+
+
+def run_mode(root: str, mode: str, args) -> dict | None:
+    env = {
+        **os.environ,
+        "PYTHONPATH": root,
+        "BENCH_LOG_MODE": mode,
+        "BENCH_LOG_REQUESTS": str(args.requests),
+        "BENCH_LOG_EMAIL_CHARS": str(args.email_chars),
+        "BENCH_LOG_WRITE_DELAY_US": str(args.write_delay_us),
+        "ANALYSIS_CACHE_SIZE": "0",
+        "NEAR_DUP_INDEX_SIZE": "0",
+        "LOCAL_MODEL_PATH": os.path.join(tempfile.gettempdir(), "bench-logging-sem-modelo.json"),
+        "LOG_LEVEL": "INFO",
+        "LOG_FORMAT": "json" if mode.startswith("json") else "text",
+        "LOG_SAMPLE_RATE": str(args.sample_rate if mode == "json-sampled" else 1.0),
+    }
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.run(
+            [sys.executable, "-c", _CHILD], cwd=root, env=env, stdout=subprocess.PIPE, stderr=stderr, text=True
+        )
+        stderr.seek(0)
+        output = stderr.read()
+    if proc.returncode != 0:
+        raise RuntimeError(f"Modo {mode} falhou:\n{output.decode(errors='replace')[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if "skipped" in result:
+        return None
+    # Só as linhas escritas durante a medição
+    result["lines"] = output[result.pop("bytes_before"):].count(b"\n")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=5, help="Rodadas por modo; vale a melhor")
+    parser.add_argument("--email-chars", type=int, default=800)
+    parser.add_argument("--write-delay-us", type=float, default=0.0, help="Atraso extra por escrita no stderr")
+    parser.add_argument("--sample-rate", type=float, default=0.01, help="LOG_SAMPLE_RATE do modo json-sampled")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--root", default=".", help="Raiz do código medido")
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+
+    # Rodadas intercaladas entre os modos, para variações da máquina afetarem todos
+    runs = {mode: [] for mode in args.modes}
+    for _ in range(args.runs):
+        for mode in args.modes:
+            runs[mode].append(run_mode(root, mode, args))
+
+    results = {}
+    for mode, samples in runs.items():
+        if samples[0] is None:
+            print(f"{mode}: não suportado em {root}")
+            continue
+        results[mode] = {key: min(run[key] for run in samples) / args.requests for key in ("wall", "cpu", "lines")}
+
+    base = results.get("off")
+    print(f"{args.requests} análises de {args.email_chars} caracteres, melhor de {args.runs} rodadas, "
+          f"+{args.write_delay_us:.0f} µs por escrita ({root})")
+    print(f"{'modo':<14} {'µs/análise':>11} {'Δ parede':>9} {'CPU µs':>9} {'Δ CPU':>9} {'linhas':>7}")
+    for mode, result in results.items():
+        wall, cpu = result["wall"] * 1e6, result["cpu"] * 1e6
+        delta_wall = f"{wall - base['wall'] * 1e6:+.1f}" if base else "-"
+        delta_cpu = f"{cpu - base['cpu'] * 1e6:+.1f}" if base else "-"
+        print(f"{mode:<14} {wall:>11.1f} {delta_wall:>9} {cpu:>9.1f} {delta_cpu:>9} {result['lines']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Benchmark do índice de quase duplicados (MinHash + LSH).
+
+Gera um fluxo de emails de template (mesma notificação com outro nome,
+mês, valor e número de chamado) misturado a emails distintos, passa pelo
+preprocess_text e compara quantas chamadas ao LLM o cache exato evita
+com quantas o cache exato + índice de quase duplicados evita. Também
+mede acertos com a categoria errada, o tempo de consulta, a memória do
+índice e o tempo da assinatura de um email longo (tokens distintos).
+
+Uso:
+    python -m scripts.bench_near_duplicate --emails 5000 --index-size 5000
+    python -m scripts.bench_near_duplicate --threshold 0.8 0.85 0.9
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from app.domain.email_category import EmailCategory
+from app.services.near_duplicate import MinHasher, NearDuplicateIndex, shingles
+from app.utils.text_preprocessor import preprocess_text
+
+FIRST_NAMES = ["Maria", "João", "Ana", "Carlos Alberto", "Fernanda", "Pedro", "Juliana", "Rafael", "Beatriz", "Lucas"]
+LAST_NAMES = ["Souza", "Pereira", "Lima", "Santos", "Rocha", "Oliveira", "Costa", "Almeida", "Ferreira", "Ribeiro"]
+MONTHS = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho", "agosto", "setembro", "outubro"]
+
+# (categoria, template): os campos variáveis são os de uma notificação real
+TEMPLATES = [
+    (EmailCategory.PRODUTIVO, "Olá {name}, seu chamado {code} foi aberto e está em análise pela equipe de suporte. "
+                  "O prazo de atendimento é de até 2 dias úteis. Caso precise complementar a solicitação, "
+                  "responda este email informando o número do chamado."),
+    (EmailCategory.PRODUTIVO, "Prezado {name}, identificamos uma falha no pagamento da fatura de {month} no valor de "
+                  "R$ {amount}. Por favor verifique os dados do cartão cadastrado ou entre em contato com o "
+                  "financeiro para regularizar a pendência antes do bloqueio do acesso."),
+    (EmailCategory.PRODUTIVO, "Bom dia {name}, o acesso ao sistema de pedidos está indisponível desde {month}. O erro "
+                  "informado é o código {code}. Precisamos de retorno urgente pois a operação está parada."),
+    (EmailCategory.IMPRODUTIVO, "Olá {name}, a equipe deseja a você um feliz aniversário! Que este novo ciclo seja repleto "
+                    "de conquistas. Aproveite o dia e conte sempre com a gente. Abraços de todo o time."),
+    (EmailCategory.IMPRODUTIVO, "Oi {name}, obrigado pela participação no evento de {month}. Foi ótimo contar com sua "
+                    "presença e esperamos vê-lo novamente na próxima edição do nosso encontro anual."),
+    (EmailCategory.IMPRODUTIVO, "Olá {name}, nossa newsletter de {month} já está disponível. Confira as novidades do mês, "
+                    "dicas de produtividade e as fotos da confraternização da empresa no portal interno."),
+]
+
+VOCABULARY = (
+    "sistema acesso relatório fatura contrato reunião projeto servidor cliente pedido entrega prazo "
+    "documento proposta orçamento equipe cadastro senha atualização backup rede impressora planilha "
+    "parabéns agradecimento convite férias almoço feriado confraternização treinamento viagem "
+    "fornecedor estoque compra nota fiscal boleto reembolso auditoria jurídico cláusula assinatura "
+    "aprovação diretoria gerente coordenador analista estagiário contratação desligamento benefício "
+    "salário ponto jornada escala plantão turno licença atestado consulta exame vacina campanha "
+    "marketing vendas meta resultado indicador painel gráfico apresentação slide arquivo pasta "
+    "migração banco dados consulta índice lentidão travamento instalação licença antivírus firewall "
+    "certificado domínio hospedagem site aplicativo celular notebook monitor teclado mouse cabo "
+    "sala auditório agenda calendário horário adiamento cancelamento confirmação presença lista "
+    "café bolo aniversário despedida boas-vindas homenagem sorteio brinde prêmio festa música "
+    "obra reforma mudança endereço chave estacionamento crachá portaria segurança limpeza manutenção"
+).split()
+
+
+def build_stream(total: int, template_share: float, seed: int) -> list[tuple[str, str]]:
+    """(categoria, texto preprocessado) para cada email do fluxo"""
+    rng = random.Random(seed)
+    stream = []
+    for _ in range(total):
+        if rng.random() < template_share:
+            category, template = rng.choice(TEMPLATES)
+            text = template.format(
+                name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", month=rng.choice(MONTHS),
+                # Protocolos alfanuméricos sobrevivem ao preprocess_text (números puros não)
+                code=f"INC-{rng.randrange(16 ** 5):05X}", amount=f"{rng.randrange(50, 5000)},{rng.randrange(100):02d}"
+            )
+        else:
+            # Email distinto: palavras sorteadas, sem relação com os anteriores
+            category = rng.choice((EmailCategory.PRODUTIVO, EmailCategory.IMPRODUTIVO))
+            text = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randrange(15, 60)))
+        stream.append((category, preprocess_text(text)))
+    return stream
+
+
+def run(stream: list[tuple[str, str]], index_size: int, threshold: float) -> dict:
+    """Simula o _classify: cache exato, depois o índice, e o "LLM" responde a categoria verdadeira"""
+    exact = set()
+    exact_hits = near_hits = wrong = 0
+
+    index = NearDuplicateIndex(max_size=index_size, threshold=threshold)
+    start = time.perf_counter()
+    for number, (category, content) in enumerate(stream):
+        if content in exact:
+            exact_hits += 1
+            continue
+        result, signature = index.lookup(content)
+        if result is not None:
+            near_hits += 1
+            wrong += result["category"] != category
+            continue
+        exact.add(content)
+        # Só a parte em memória de add() (sem SQLite não há o que aguardar)
+        index._store(str(number), signature, {"category": category, "suggested_reply": "...", "confidence": 0.9})
+    elapsed = time.perf_counter() - start
+
+    # Memória medida à parte: com o tracemalloc ligado a consulta fica ~10x mais lenta
+    tracemalloc.start()
+    copy = NearDuplicateIndex(max_size=index_size, threshold=threshold)
+    for key, (signature, result) in index._entries.items():
+        copy._store(key, signature, result)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    stats = index.stats()
+    return {
+        "exact_hits": exact_hits,
+        "near_hits": near_hits,
+        "wrong": wrong,
+        "bands": f"{stats['bands']}x{stats['rows_per_band']}",
+        "size": stats["size"],
+        "lookup_ms": stats["mean_lookup_ms"],
+        "per_email_ms": elapsed / len(stream) * 1000,
+        "memory_mb": memory / 1024 / 1024,
+    }
+
+
+def signature_ms(tokens: int, repeat: int = 20) -> float:
+    """Tempo da assinatura de um email com `tokens` tokens distintos (o pior caso)"""
+    rng = random.Random(0)
+    features = shingles([f"{rng.choice(VOCABULARY)}{index}" for index in range(tokens)])
+    hasher = MinHasher()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        hasher.signature(features)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=5000)
+    parser.add_argument("--template-share", type=float, default=0.7, help="Fração de emails de template")
+    parser.add_argument("--index-size", type=int, default=5000)
+    parser.add_argument("--threshold", type=float, nargs="+", default=[0.85])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--long-email-tokens", type=int, default=900, help="Tokens do email longo medido à parte")
+    args = parser.parse_args()
+
+    stream = build_stream(args.emails, args.template_share, args.seed)
+    total = len(stream)
+    print(f"{total} emails, {args.template_share:.0%} de template, índice com até {args.index_size} emails")
+    print(f"{'modo':<22} {'LLM evitado':>12} {'cat. errada':>12} {'bandas':>7} {'consulta (ms)':>14} "
+          f"{'por email (ms)':>15} {'índice':>7} {'memória (MB)':>13}")
+
+    baseline = run(stream, 0, 1.0)
+    print(f"{'só cache exato':<22} {baseline['exact_hits'] / total:>12.1%} {0:>12} {'-':>7} {'-':>14} "
+          f"{baseline['per_email_ms']:>15.3f} {'-':>7} {'-':>13}")
+    for threshold in args.threshold:
+        report = run(stream, args.index_size, threshold)
+        saved = (report["exact_hits"] + report["near_hits"]) / total
+        print(f"{f'+ quase dup. J>={threshold:.2f}':<22} {saved:>12.1%} {report['wrong']:>12} "
+              f"{report['bands']:>7} {report['lookup_ms']:>14.3f} {report['per_email_ms']:>15.3f} "
+              f"{report['size']:>7} {report['memory_mb']:>13.1f}")
+    print(f"Assinatura de um email com {args.long_email_tokens} tokens distintos: "
+          f"{signature_ms(args.long_email_tokens):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: latência de requisições .txt enquanto PDFs grandes são processados.
+
+Compara o caminho antigo (PdfReader inline no event loop, todas as páginas)
+com o pool de processos + limites de páginas/caracteres de extract_text.
+
+Uso:
+    python -m scripts.bench_pdf_offload --pages 300 --pdf-concurrency 2 --duration 10
+"""
+
+import argparse
+import asyncio
+import io
+import statistics
+import time
+
+from pypdf import PdfReader
+from starlette.datastructures import UploadFile
+
+from app.utils.file_reader import extract_text, shutdown_pdf_pool
+from scripts.sample_data import SAMPLE_LINE, build_text_pdf
+
+
+async def extract_inline(data: bytes) -> str:
+    """Reproduz o caminho anterior: parsing completo dentro do event loop"""
+    reader = PdfReader(io.BytesIO(data))
+    return "\n".join(page.extract_text() or "" for page in reader.pages).strip()
+
+
+async def extract_pooled(data: bytes) -> str:
+    return await extract_text(UploadFile(file=io.BytesIO(data), filename="big.pdf"))
+
+
+async def pdf_load(extract, data: bytes, stop: float, done: list):
+    while time.perf_counter() < stop:
+        await extract(data)
+        done.append(1)
+
+
+async def text_load(stop: float, interval: float, latencies: list):
+    payload = (SAMPLE_LINE + "\n").encode("utf-8") * 20
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        await extract_text(UploadFile(file=io.BytesIO(payload), filename="email.txt"))
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def scenario(name: str, extract, data: bytes, args) -> None:
+    stop = time.perf_counter() + args.duration
+    latencies, pdfs_done = [], []
+    await asyncio.gather(
+        text_load(stop, args.interval_ms / 1000, latencies),
+        *(pdf_load(extract, data, stop, pdfs_done) for _ in range(args.pdf_concurrency)),
+    )
+    print(
+        f"{name:<8} {len(latencies):>8} {statistics.median(latencies) * 1000:>9.1f} "
+        f"{percentile(latencies, 99) * 1000:>9.1f} {max(latencies) * 1000:>9.1f} {len(pdfs_done):>6}"
+    )
+
+
+async def main(args):
+    data = build_text_pdf(args.pages)
+    # Aquece o pool (spawn dos processos) fora da medição
+    await extract_pooled(data)
+
+    print(f"PDF: {args.pages} páginas, {len(data) / 1024:.0f} KB; {args.pdf_concurrency} PDFs concorrentes")
+    print(f"{'modo':<8} {'txt reqs':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9} {'PDFs':>6}")
+    await scenario("inline", extract_inline, data, args)
+    await scenario("pool", extract_pooled, data, args)
+    shutdown_pdf_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--pdf-concurrency", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--interval-ms", type=float, default=10.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,111 @@
+"""
+Benchmark: rajada de análises acima do limite de taxa do LLM.
+
+Sobe o servidor stub com limite de requisições por minuto (429 com
+retry-after ao estourar) e dispara uma rajada de análises concorrentes,
+parte interativa e parte em lote. Compara o comportamento anterior
+(429 vira fallback na hora) com o limitador adaptativo (fila por
+prioridade, pausa no retry-after, fallback só ao estourar o orçamento).
+
+Uso:
+    python -m scripts.bench_rate_limit --rpm-limit 1200 --requests 300 --concurrency 100
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+
+from app.clients import llm_client
+from app.clients.llm_client import OpenAILLMClient
+from app.clients.rate_limiter import PRIORITY_BATCH, PRIORITY_INTERACTIVE, REQUEST_PRIORITY, AdaptiveRateLimiter
+from scripts.loadtest import percentile
+from scripts.mock_llm_server import start_mock_server
+
+EMAIL = "Olá, não consigo acessar o sistema desde ontem. Aparece erro 500. Podem verificar?"
+
+
+async def run(client: OpenAILLMClient, total: int, concurrency: int, interactive_share: float) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    samples = {PRIORITY_INTERACTIVE: [], PRIORITY_BATCH: []}
+    rng = random.Random(42)
+
+    async def one(priority: int):
+        REQUEST_PRIORITY.set(priority)
+        async with sem:
+            start = time.perf_counter()
+            result = await client.analyze_async(EMAIL)
+            samples[priority].append((time.perf_counter() - start, result.get("fallback", False)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        one(PRIORITY_INTERACTIVE if rng.random() < interactive_share else PRIORITY_BATCH)
+        for _ in range(total)
+    ))
+    elapsed = time.perf_counter() - start
+
+    report = {"elapsed": elapsed, "rate_limited": client.limiter.rate_limited}
+    for priority, name in ((PRIORITY_INTERACTIVE, "interativo"), (PRIORITY_BATCH, "lote")):
+        latencies = [latency * 1000 for latency, _ in samples[priority]]
+        report[name] = {
+            "count": len(latencies),
+            "fallback": sum(1 for _, fallback in samples[priority] if fallback),
+            "p50": percentile(latencies, 50) if latencies else 0.0,
+            "p95": percentile(latencies, 95) if latencies else 0.0,
+        }
+    return report
+
+
+async def _count_only(limiter: AdaptiveRateLimiter) -> float:
+    limiter.rate_limited += 1
+    return 0.0
+
+
+async def main(args):
+    print(f"limite do servidor: {args.rpm_limit:.0f} RPM, latência {args.latency_ms:.0f} ms, "
+          f"{args.requests} análises, concorrência {args.concurrency}")
+    print(f"{'modo':<12} {'classe':<11} {'n':>5} {'fallback':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+          f"{'429s':>6} {'tempo (s)':>10}")
+
+    for mode in ("anterior", "adaptativo"):
+        port = args.port
+        server = start_mock_server(port, args.latency_ms, rpm_limit=args.rpm_limit)
+        retries = llm_client.LLM_RETRY_MAX_ATTEMPTS
+        try:
+            if mode == "anterior":
+                # Sem limitador, pausa nem retentativas: cada 429 vira fallback
+                limiter = AdaptiveRateLimiter(rpm=0, tpm=0)
+                limiter.on_rate_limited = lambda headers, limiter=limiter: _count_only(limiter)
+                llm_client.LLM_RETRY_MAX_ATTEMPTS = 1
+            else:
+                limiter = AdaptiveRateLimiter()
+            client = OpenAILLMClient(base_url=f"http://127.0.0.1:{port}/v1", limiter=limiter)
+            report = await run(client, args.requests, args.concurrency, args.interactive_share)
+            await client.aclose()
+        finally:
+            llm_client.LLM_RETRY_MAX_ATTEMPTS = retries
+            server.terminate()
+            server.wait()
+
+        for name in ("interativo", "lote"):
+            row = report[name]
+            share = row["fallback"] / row["count"] if row["count"] else 0.0
+            print(f"{mode:<12} {name:<11} {row['count']:>5} {share:>9.1%} {row['p50']:>9.0f} {row['p95']:>9.0f} "
+                  f"{report['rate_limited']:>6} {report['elapsed']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--rpm-limit", type=float, default=1200.0)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--interactive-share", type=float, default=0.2, help="Fração de análises interativas")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY_EMAIL_ANALYZER", "bench-key")
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(main(args))
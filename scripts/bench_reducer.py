@@ -0,0 +1,72 @@
+"""
+Benchmark da redução de emails: threads longas (respostas citadas,
+assinaturas, avisos legais) antes e depois do text_reducer.
+
+Compara o caminho anterior (preprocess_text sobre o texto inteiro e corte
+em 6000 caracteres) com reduce_email -> preprocess_text, em tempo de CPU
+e em tokens estimados enviados ao LLM.
+
+Uso:
+    python -m scripts.bench_reducer --replies 5 50 500
+"""
+
+import argparse
+import timeit
+
+from app.utils.text_preprocessor import preprocess_text
+from app.utils.text_reducer import estimate_tokens, reduce_email
+
+SIGNATURE = "Atenciosamente,\nMaria Souza\nAnalista de Operações | Tel.: (11) 98765-4321\n"
+DISCLAIMER = (
+    "AVISO LEGAL: Esta mensagem é confidencial e destinada exclusivamente ao destinatário. "
+    "Se você recebeu esta mensagem por engano, apague-a imediatamente.\n"
+)
+MESSAGES = [
+    "Ainda não recebemos retorno sobre o chamado #4521. O sistema continua fora do ar e precisamos de previsão.",
+    "Estamos verificando com a equipe de infraestrutura e retornamos em breve.",
+    "Alguma novidade? O prazo para o fechamento do mês é sexta-feira.",
+]
+
+
+def build_thread(replies: int) -> str:
+    """Thread no estilo Gmail: a mensagem mais nova no topo, as anteriores citadas com '>'"""
+    thread = ""
+    for index in range(replies, 0, -1):
+        body = f"Olá,\n\n{MESSAGES[index % len(MESSAGES)]}\n\n{SIGNATURE}\n{DISCLAIMER}"
+        quoted = "\n".join("> " + line for line in thread.splitlines())
+        header = f"Em seg., {index} de mar. de 2024 às 10:{index % 60:02d}, Fulano <f@x.com> escreveu:\n" if thread else ""
+        thread = f"{body}\n{header}{quoted}"
+    return thread
+
+
+def old_path(text: str) -> str:
+    return preprocess_text(text)[:6000]
+
+
+def new_path(text: str) -> str:
+    return preprocess_text(reduce_email(text))
+
+
+def per_call(func, arg) -> float:
+    timer = timeit.Timer(lambda: func(arg))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replies", type=int, nargs="+", default=[5, 50, 500])
+    args = parser.parse_args()
+
+    print(f"{'respostas':>9} {'chars':>9} {'antes (ms)':>11} {'depois (ms)':>12} "
+          f"{'tokens antes':>13} {'tokens depois':>14}")
+    for replies in args.replies:
+        # Limita o tamanho: threads muito profundas crescem quadraticamente com as citações
+        text = build_thread(replies)[:5_000_000]
+        before, after = old_path(text), new_path(text)
+        print(f"{replies:>9} {len(text):>9} {per_call(old_path, text) * 1000:>11.2f} "
+              f"{per_call(new_path, text) * 1000:>12.3f} {estimate_tokens(before):>13} {estimate_tokens(after):>14}")
+
+
+if __name__ == "__main__":
+    main()
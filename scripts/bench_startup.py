@@ -0,0 +1,151 @@
+"""
+Benchmark: tempo de inicialização a frio da API.
+
+Cada rodada usa processos novos (sem cache de módulos) e mede:
+- import de app.main com `python -X importtime`, com os pacotes que mais pesam
+- com uvicorn, o tempo até o /api/health responder e até o serviço de
+  análise terminar o warm-up (status "ok")
+
+Uso:
+    python -m scripts.bench_startup --runs 5
+    python -m scripts.bench_startup --json startup.json --max-ready-ms 3000
+
+    # Comparar com outra versão do código
+    git worktree add /tmp/base HEAD~1
+    python -m scripts.bench_startup --root /tmp/base
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def run_importtime(root: str, env: dict) -> dict:
+    """Importa app.main num processo novo; tempos em ms"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=root, env=env, capture_output=True, text=True
+    )
+    wall = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falha ao importar app.main:\n{proc.stderr[-2000:]}")
+
+    total = 0.0
+    packages = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, module = match.groups()
+        packages[module.split(".")[0]] += int(own) / 1000
+        if module == "app.main" and not indent:
+            total = int(cumulative) / 1000
+    return {"import_ms": total, "process_ms": wall, "packages": dict(packages)}
+
+
+def run_server(root: str, env: dict, port: int, timeout: float) -> dict:
+    """Sobe o uvicorn e mede até o primeiro health e até o warm-up terminar; tempos em ms"""
+    url = f"http://127.0.0.1:{port}/api/health"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    first_health = ready = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn terminou com código {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    status = json.loads(response.read()).get("status")
+            except urllib.error.HTTPError as e:
+                status = f"http {e.code}"
+            except OSError:
+                time.sleep(0.005)
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            if first_health is None:
+                first_health = elapsed
+            # Versões sem warm-up respondem "ok" direto
+            if status == "ok":
+                ready = elapsed
+                break
+            time.sleep(0.005)
+    finally:
+        proc.terminate()
+        proc.wait()
+    if ready is None:
+        raise RuntimeError(f"Serviço não ficou pronto em {timeout:.0f}s")
+    return {"first_health_ms": first_health, "ready_ms": ready}
+
+
+def summarize(values: list) -> str:
+    return f"{statistics.median(values):>8.0f} {min(values):>8.0f} {max(values):>8.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--root", default=os.getcwd(), help="Diretório do código medido (padrão: atual)")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Espera máxima pelo warm-up, em segundos")
+    parser.add_argument("--top", type=int, default=10, help="Pacotes listados no detalhamento do import")
+    parser.add_argument("--json", help="Salva os resultados neste arquivo")
+    parser.add_argument("--max-ready-ms", type=float, help="Falha (exit 1) se a mediana até o warm-up passar disto")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as jobs_dir:
+        env = dict(
+            os.environ,
+            OPENAI_API_KEY_EMAIL_ANALYZER="bench-key",
+            JOBS_DIR=jobs_dir,
+        )
+        # Bytecode já compilado, como numa imagem construída: mede só o import
+        subprocess.run([sys.executable, "-m", "compileall", "-q", "app"], cwd=args.root, env=env, check=True)
+
+        imports = [run_importtime(args.root, env) for _ in range(args.runs)]
+        servers = [run_server(args.root, env, args.port, args.timeout) for _ in range(args.runs)]
+
+    print(f"{args.runs} rodadas em {args.root}")
+    print(f"{'etapa':<28} {'mediana':>8} {'mín':>8} {'máx':>8}   (ms)")
+    print(f"{'import app.main':<28} {summarize([r['import_ms'] for r in imports])}")
+    print(f"{'processo python + import':<28} {summarize([r['process_ms'] for r in imports])}")
+    print(f"{'uvicorn até 1º health':<28} {summarize([r['first_health_ms'] for r in servers])}")
+    print(f"{'uvicorn até warm-up pronto':<28} {summarize([r['ready_ms'] for r in servers])}")
+
+    packages = defaultdict(list)
+    for run in imports:
+        for package, ms in run["packages"].items():
+            packages[package].append(ms)
+    heaviest = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))[:args.top]
+    print("\nimport por pacote (mediana, ms, tempo próprio dos módulos):")
+    for package, values in heaviest:
+        print(f"  {package:<26} {statistics.median(values):>8.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "imports": imports, "servers": servers}, f, indent=2, ensure_ascii=False)
+
+    if args.max_ready_ms is not None:
+        ready = statistics.median(r["ready_ms"] for r in servers)
+        if ready > args.max_ready_ms:
+            print(f"warm-up em {ready:.0f} ms, acima de {args.max_ready_ms:.0f} ms")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: /api/analyze x /api/analyze/stream (server-sent events).
+
+Sobe o servidor stub do LLM com tempo de geração por token (--token-ms)
+e a API, e mede, para a mesma sequência de emails, quanto tempo o
+usuário espera até ver algo: no /api/analyze, a resposta inteira; no
+streaming, a categoria, o primeiro trecho da resposta sugerida e o
+resultado final. Cache e índice de quase duplicados ficam desligados
+para todas as requisições chegarem ao LLM.
+
+Uso:
+    python -m scripts.bench_stream --requests 50 --latency-ms 300 --token-ms 20
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from scripts.bench_preprocess import build_email
+from scripts.loadtest import percentile
+from scripts.mock_llm_server import start_mock_server, wait_for_port
+
+
+async def measure_plain(client: httpx.AsyncClient, text: str) -> dict:
+    start = time.perf_counter()
+    response = await client.post("/api/analyze", data={"text": text})
+    response.raise_for_status()
+    return {"result": time.perf_counter() - start}
+
+
+async def measure_stream(client: httpx.AsyncClient, text: str) -> dict:
+    """Instantes (desde o envio) do primeiro byte e de cada tipo de evento, na primeira ocorrência"""
+    start = time.perf_counter()
+    times = {}
+    async with client.stream("POST", "/api/analyze/stream", data={"text": text}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            times.setdefault("first_byte", time.perf_counter() - start)
+            if line.startswith("event: "):
+                times.setdefault(line[7:], time.perf_counter() - start)
+    if "result" not in times:
+        raise RuntimeError(f"Stream terminou sem resultado: {times}")
+    return times
+
+
+def row(name: str, samples: list) -> str:
+    values = [sample * 1000 for sample in samples]
+    return f"{name:<38} {percentile(values, 50):>9.0f} {percentile(values, 95):>9.0f}"
+
+
+async def drive(args) -> None:
+    texts = [build_email(args.email_chars, seed=seed) for seed in range(args.requests)]
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60) as client:
+        # Aquecimento: warm-up do serviço e conexões fora da medição
+        while (await client.get("/api/health")).json().get("status") != "ok":
+            await asyncio.sleep(0.1)
+        await measure_stream(client, build_email(args.email_chars, seed=-1))
+
+        plain = [await measure_plain(client, text) for text in texts]
+        # Mesmos textos com um sufixo: sem cache, o streaming também chega ao LLM
+        stream = [await measure_stream(client, text + " (stream)") for text in texts]
+
+    print(f"{args.requests} emails, LLM: {args.latency_ms:.0f} ms até o 1º token + {args.token_ms:.0f} ms/token")
+    print(f"{'espera até':<38} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    print(row("/analyze: resposta completa", [sample["result"] for sample in plain]))
+    print(row("/analyze/stream: primeiro byte", [sample["first_byte"] for sample in stream]))
+    print(row("/analyze/stream: categoria", [sample["category"] for sample in stream]))
+    print(row("/analyze/stream: 1º trecho da resposta", [sample.get("delta", sample["result"]) for sample in stream]))
+    print(row("/analyze/stream: resultado final", [sample["result"] for sample in stream]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--email-chars", type=int, default=800)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Tempo do LLM até o primeiro token")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="Tempo de geração por token de saída")
+    parser.add_argument("--port", type=int, default=8210)
+    parser.add_argument("--llm-port", type=int, default=8211)
+    args = parser.parse_args()
+
+    llm = start_mock_server(args.llm_port, args.latency_ms, token_ms=args.token_ms)
+    app = None
+    try:
+        with tempfile.TemporaryDirectory() as jobs_dir:
+            env = dict(
+                os.environ,
+                OPENAI_API_KEY_EMAIL_ANALYZER="bench-key",
+                OPENAI_BASE_URL=f"http://127.0.0.1:{args.llm_port}/v1",
+                ANALYSIS_CACHE_SIZE="0",
+                NEAR_DUP_INDEX_SIZE="0",
+                JOBS_DIR=jobs_dir,
+            )
+            app = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app",
+                 "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            wait_for_port(args.port, app, timeout=30)
+            asyncio.run(drive(args))
+    finally:
+        for proc in (app, llm):
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    main()
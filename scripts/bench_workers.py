@@ -0,0 +1,191 @@
+"""
+Benchmark: vazão da API com 1, 2, 4... workers do gunicorn.
+
+Para cada quantidade de workers sobe `gunicorn app.main:app`
+(gunicorn.conf.py) com estado compartilhado novo e dispara as mesmas
+análises de texto de vários processos clientes (um cliente só viraria o
+gargalo). Sem --llm-latency-ms o backend é o heurístico, sem cache nem
+índice de quase duplicados: cada requisição é CPU pura (HTTP, multipart,
+redução, pré-processamento, classificação), o caso em que mais processos
+ajudam; com ele, um stub do LLM responde com essa latência.
+
+Reporta RPS, ganho sobre 1 worker, latências, memória (PSS somado do
+mestre e dos workers, que conta uma vez as páginas compartilhadas pelo
+preload) e se o total de análises em /api/metrics, somado entre os
+workers pelo estado compartilhado, bate com as requisições enviadas.
+
+Uso:
+    python -m scripts.bench_workers --workers 1 2 4 --requests 3000 --concurrency 32
+    python -m scripts.bench_workers --workers 4 --no-preload   # memória sem o preload
+    python -m scripts.bench_workers --llm-latency-ms 300       # LLM lento: I/O, não CPU
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from scripts.bench_preprocess import build_email
+from scripts.loadtest import percentile
+from scripts.mock_llm_server import start_mock_server, wait_for_port
+
+_ANALYSES_LINE = re.compile(r"^email_analyzer_analyses_total\{[^}]*\} (\S+)$", re.MULTILINE)
+
+# Requisições de aquecimento por rodada (fora da medição, mas dentro da contagem das métricas)
+WARMUP_REQUESTS = 100
+
+
+async def _drive(base_url: str, texts: list[str], concurrency: int) -> tuple:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies, errors = [], 0
+    queue = iter(texts)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal errors
+            for text in queue:
+                start = time.perf_counter()
+                try:
+                    resp = await client.post("/api/analyze", data={"text": text})
+                    errors += resp.status_code != 200
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.time()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return started, time.time(), latencies, errors
+
+
+def client_process(base_url: str, texts: list[str], concurrency: int) -> tuple:
+    """Executado em cada processo cliente"""
+    return asyncio.run(_drive(base_url, texts, concurrency))
+
+
+def run_load(base_url: str, texts: list[str], concurrency: int, clients: int) -> dict:
+    per_client = max(1, concurrency // clients)
+    shares = [texts[index::clients] for index in range(clients)]
+    with multiprocessing.get_context("spawn").Pool(clients) as pool:
+        results = pool.starmap(client_process, [(base_url, share, per_client) for share in shares])
+    elapsed = max(end for _, end, _, _ in results) - min(start for start, _, _, _ in results)
+    latencies = [value * 1000 for _, _, values, _ in results for value in values]
+    return {
+        "rps": len(texts) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "errors": sum(errors for *_, errors in results),
+    }
+
+
+def pss_mb(pid: int) -> float:
+    """PSS do processo e dos filhos diretos em MB (Linux)"""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        return float("nan")
+    total = 0
+    for each in pids:
+        try:
+            with open(f"/proc/{each}/smaps_rollup") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("Pss:"))
+        except (OSError, StopIteration):
+            return float("nan")
+    return total / 1024
+
+
+def analyses_counted(base_url: str) -> float:
+    resp = httpx.get(f"{base_url}/api/metrics", timeout=10)
+    return sum(float(value) for value in _ANALYSES_LINE.findall(resp.text))
+
+
+def start_server(args, workers: int, state_dir: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        BIND=f"127.0.0.1:{args.port}",
+        GUNICORN_PRELOAD="false" if args.no_preload else "true",
+        SHARED_STATE_PATH=os.path.join(state_dir, "state.db"),
+        JOBS_DIR=os.path.join(state_dir, "jobs"),
+        METRICS_PUBLISH_SECONDS="0.5",
+        ANALYSIS_CACHE_SIZE="0",
+        NEAR_DUP_INDEX_SIZE="0",
+        LOG_LEVEL="WARNING",
+    )
+    if args.llm_latency_ms:
+        env.update(
+            LLM_BACKEND="compatible", LLM_MODEL="stub", LLM_BASE_URL=f"http://127.0.0.1:{args.llm_port}/v1",
+            LLM_BATCH_WINDOW_MS="0",
+        )
+    else:
+        env["LLM_BACKEND"] = "heuristic"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app.main:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=None if args.app_logs else subprocess.DEVNULL,
+    )
+    wait_for_port(args.port, proc, timeout=60)
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--clients", type=int, default=4, help="Processos gerando carga")
+    parser.add_argument("--email-chars", type=int, default=3000)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="0 usa o backend heurístico (sem LLM)")
+    parser.add_argument("--no-preload", action="store_true", help="Cada worker importa o app depois do fork")
+    parser.add_argument("--port", type=int, default=8230)
+    parser.add_argument("--llm-port", type=int, default=8231)
+    parser.add_argument("--app-logs", action="store_true", help="Mostra os logs da API")
+    args = parser.parse_args()
+
+    texts = [build_email(args.email_chars, seed=seed) for seed in range(args.requests)]
+    warmup = [build_email(args.email_chars, seed=-seed) for seed in range(1, WARMUP_REQUESTS + 1)]
+    base_url = f"http://127.0.0.1:{args.port}"
+    llm = start_mock_server(args.llm_port, args.llm_latency_ms, 0.0) if args.llm_latency_ms else None
+
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    print(f"{args.requests} análises de {args.email_chars} caracteres, concorrência {args.concurrency}, "
+          f"{args.clients} processos clientes, {cpus} CPUs, "
+          f"{'LLM ' + format(args.llm_latency_ms, '.0f') + ' ms' if llm else 'backend heurístico'}, "
+          f"preload {'não' if args.no_preload else 'sim'}")
+    print(f"{'workers':>7} {'rps':>8} {'ganho':>6} {'p50 ms':>8} {'p99 ms':>8} {'erros':>6} "
+          f"{'PSS MB':>7} {'métricas':>9}")
+    baseline = None
+    try:
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as state_dir:
+                server = start_server(args, workers, state_dir)
+                try:
+                    run_load(base_url, warmup, min(args.concurrency, 8), 1)
+                    result = run_load(base_url, texts, args.concurrency, args.clients)
+                    memory = pss_mb(server.pid)
+                    # Espera cada worker publicar as métricas depois da última requisição
+                    time.sleep(1.5)
+                    counted = analyses_counted(base_url)
+                finally:
+                    server.terminate()
+                    server.wait()
+            baseline = baseline or result["rps"]
+            expected = len(texts) + len(warmup)
+            print(f"{workers:>7} {result['rps']:>8.1f} {result['rps'] / baseline:>5.2f}x {result['p50_ms']:>8.1f} "
+                  f"{result['p99_ms']:>8.1f} {result['errors']:>6} {memory:>7.1f} "
+                  f"{'ok' if counted == expected else f'{counted:.0f}/{expected}':>9}")
+    finally:
+        if llm is not None:
+            llm.terminate()
+            llm.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,38 @@
+"""
+Avaliação de acurácia do classificador sobre um corpus rotulado.
+
+Lê o dataset em streaming (JSONL ou CSV), analisa os emails com
+concorrência limitada pelo mesmo pipeline da API (EmailAnalyzerService)
+e grava cada resultado num checkpoint JSONL: uma execução interrompida
+continua de onde parou. No fim reporta acurácia, matriz de confusão,
+precisão/recall por classe, calibração da confiança e latência por item.
+
+Formato do dataset (campos aceitos):
+    JSONL: {"id": "42", "text": "...", "label": "PRODUTIVO"}
+    CSV:   id,text,label
+    ("email" é aceito no lugar de "text"; "expected"/"category" no lugar de "label")
+
+Uso:
+    python -m scripts.eval_emails                                  # casos embutidos
+    python -m scripts.eval_emails --dataset emails.jsonl --concurrency 32 --checkpoint eval.jsonl
+    python -m scripts.eval_emails --dataset emails.csv --fallback-only  # sem rede (heurística)
+"""
+
+import argparse
 import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from typing import Iterator
 
-from app.services.analyzer_service import EmailAnalyzerService
+from fastapi import HTTPException
+
+from app.clients.llm_client import HeuristicLLMClient, OpenAILLMClient
 from app.domain.email_category import EmailCategory
+from app.services.analyzer_service import EmailAnalyzerService
 
 TEST_CASES = [
     {
@@ -31,33 +62,239 @@ TEST_CASES = [
     },
 ]
 
-async def main():
-    service = EmailAnalyzerService()
-
-    total = len(TEST_CASES)
-    correct = 0
-
-    for t in TEST_CASES:
-        resp = await service.analyze(text=t["email"])
-        ok = resp.category == t["expected"]
-        correct += 1 if ok else 0
-
-        status = "✅ ACERTOU" if ok else "❌ ERROU"
-        print("=" * 80)
-        print(f"[{t['id']}] {status}")
-        print(f"Esperado: {t['expected']}")
-        print(f"Previsto : {resp.category} (conf={resp.confidence})")
-        if resp.reason:
-            print(f"Motivo   : {resp.reason}")
-        print("-" * 80)
-        print("Email:")
-        print(t["email"])
-        print("-" * 80)
-        print("Resposta sugerida:")
-        print(resp.suggested_reply)
+CATEGORIES = [category.value for category in EmailCategory]
+CALIBRATION_BINS = 10
+
+
+def _normalize(record: dict, position: int) -> dict:
+    text = record.get("text") or record.get("email") or ""
+    label = record.get("label") or record.get("expected") or record.get("category") or ""
+    label = getattr(label, "value", label)
+    return {
+        "id": str(record["id"]) if record.get("id") not in (None, "") else str(position),
+        "text": text,
+        "expected": str(label).strip().upper(),
+    }
+
+
+def load_dataset(path: str | None) -> Iterator[dict]:
+    """Lê o dataset item a item (sem carregar o arquivo inteiro)"""
+    if path is None:
+        for position, case in enumerate(TEST_CASES, start=1):
+            yield _normalize(case, position)
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for position, row in enumerate(rows, start=1):
+            item = _normalize(row, position)
+            if item["expected"] not in CATEGORIES:
+                raise ValueError(f"Item {item['id']}: rótulo inválido {item['expected']!r}")
+            yield item
+
+
+def load_checkpoint(path: str | None) -> dict:
+    """Resultados já gravados, por id (o último registro de cada id vale)"""
+    records = {}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["id"]] = record
+    return records
+
+
+async def evaluate(
+    service: EmailAnalyzerService,
+    items: Iterator[dict],
+    concurrency: int,
+    records: dict,
+    checkpoint=None,
+    progress_every: int = 500
+) -> None:
+    """
+    Analisa os itens com no máximo `concurrency` em andamento.
+    Os workers puxam do mesmo iterador, então o dataset é lido sob demanda.
+    """
+    started = time.perf_counter()
+    done = 0
+
+    async def worker():
+        nonlocal done
+        for item in items:
+            start = time.perf_counter()
+            record = {"id": item["id"], "expected": item["expected"]}
+            try:
+                resp = await service.analyze(text=item["text"])
+                record.update(
+                    predicted=resp.category.value,
+                    confidence=resp.confidence,
+                    fallback=resp.fallback,
+                )
+            except HTTPException as exc:
+                record["error"] = f"{exc.status_code}: {exc.detail}"
+            record["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+            records[item["id"]] = record
+            if checkpoint is not None:
+                checkpoint.write(json.dumps(record, ensure_ascii=False) + "\n")
+            done += 1
+            if progress_every and done % progress_every == 0:
+                rate = done / (time.perf_counter() - started)
+                print(f"  {done} itens ({rate:.0f}/s)", file=sys.stderr)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
 
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_report(records: list) -> dict:
+    scored = [r for r in records if "predicted" in r]
+    errors = [r for r in records if "error" in r]
+
+    confusion = {expected: {predicted: 0 for predicted in CATEGORIES} for expected in CATEGORIES}
+    for r in scored:
+        confusion[r["expected"]][r["predicted"]] += 1
+    correct = sum(confusion[c][c] for c in CATEGORIES)
+
+    per_class = {}
+    for c in CATEGORIES:
+        predicted = sum(confusion[e][c] for e in CATEGORIES)
+        actual = sum(confusion[c].values())
+        precision = confusion[c][c] / predicted if predicted else 0.0
+        recall = confusion[c][c] / actual if actual else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_class[c] = {
+            "precision": round(precision, 4), "recall": round(recall, 4),
+            "f1": round(f1, 4), "support": actual,
+        }
+
+    # Calibração: em cada faixa de confiança, a acurácia deveria ser próxima da confiança média
+    bins = [[] for _ in range(CALIBRATION_BINS)]
+    for r in scored:
+        if r.get("confidence") is None:
+            continue
+        index = min(CALIBRATION_BINS - 1, int(r["confidence"] * CALIBRATION_BINS))
+        bins[index].append(r)
+    calibration = []
+    ece = 0.0
+    for index, members in enumerate(bins):
+        if not members:
+            continue
+        mean_confidence = sum(r["confidence"] for r in members) / len(members)
+        accuracy = sum(r["predicted"] == r["expected"] for r in members) / len(members)
+        ece += abs(accuracy - mean_confidence) * len(members) / sum(map(len, bins))
+        calibration.append({
+            "range": f"{index / CALIBRATION_BINS:.1f}-{(index + 1) / CALIBRATION_BINS:.1f}",
+            "count": len(members),
+            "mean_confidence": round(mean_confidence, 4),
+            "accuracy": round(accuracy, 4),
+        })
+
+    latencies = [r["latency_ms"] for r in records]
+    return {
+        "total": len(records),
+        "scored": len(scored),
+        "errors": len(errors),
+        "fallback": sum(1 for r in scored if r.get("fallback")),
+        "accuracy": round(correct / len(scored), 4) if scored else 0.0,
+        "confusion_matrix": confusion,
+        "per_class": per_class,
+        "calibration": calibration,
+        "expected_calibration_error": round(ece, 4),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies),
+        } if latencies else {},
+    }
+
+
+def print_report(report: dict, elapsed: float) -> None:
     print("=" * 80)
-    print(f"Resumo: {correct}/{total} = {correct/total:.0%} accuracy")
+    print(f"Itens: {report['total']}  avaliados: {report['scored']}  erros: {report['errors']}  "
+          f"fallback: {report['fallback']}")
+    print(f"Acurácia: {report['accuracy']:.2%}")
+
+    width = max(len(c) for c in CATEGORIES) + 2
+    print("\nMatriz de confusão (linhas = esperado, colunas = previsto)")
+    print(" " * width + "".join(f"{c:>{width}}" for c in CATEGORIES))
+    for expected, row in report["confusion_matrix"].items():
+        print(f"{expected:<{width}}" + "".join(f"{row[c]:>{width}}" for c in CATEGORIES))
+
+    print(f"\n{'classe':<{width}}{'precisão':>10}{'recall':>10}{'f1':>10}{'suporte':>10}")
+    for c, m in report["per_class"].items():
+        print(f"{c:<{width}}{m['precision']:>10.2%}{m['recall']:>10.2%}{m['f1']:>10.2%}{m['support']:>10}")
+
+    print(f"\nCalibração (ECE = {report['expected_calibration_error']:.4f})")
+    print(f"{'confiança':>10}{'itens':>8}{'conf. média':>13}{'acurácia':>10}")
+    for b in report["calibration"]:
+        print(f"{b['range']:>10}{b['count']:>8}{b['mean_confidence']:>13.2f}{b['accuracy']:>10.2%}")
+
+    if report["latency_ms"]:
+        lat = report["latency_ms"]
+        print(f"\nLatência por item (ms): média={lat['mean']:.1f} p50={lat['p50']:.1f} "
+              f"p95={lat['p95']:.1f} p99={lat['p99']:.1f} máx={lat['max']:.1f}")
+    print(f"Tempo total desta execução: {elapsed:.1f}s")
+
+
+async def main(args):
+    ai_client = HeuristicLLMClient() if args.fallback_only else OpenAILLMClient(model=args.model)
+    service = EmailAnalyzerService(ai_client=ai_client)
+
+    if args.checkpoint and args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    records = load_checkpoint(args.checkpoint)
+    # Itens com erro são tentados de novo ao retomar
+    done = {item_id for item_id, r in records.items() if "error" not in r}
+    if done:
+        print(f"Retomando: {len(done)} itens já avaliados em {args.checkpoint}", file=sys.stderr)
+
+    items = (item for item in load_dataset(args.dataset) if item["id"] not in done)
+    if args.limit:
+        items = (item for _, item in zip(range(args.limit), items))
+
+    checkpoint = open(args.checkpoint, "a", encoding="utf-8", buffering=1) if args.checkpoint else None
+    start = time.perf_counter()
+    try:
+        await evaluate(service, items, args.concurrency, records, checkpoint)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        await ai_client.aclose()
+
+    report = build_report(list(records.values()))
+    print_report(report, time.perf_counter() - start)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", help="Arquivo .jsonl ou .csv (padrão: casos embutidos)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--checkpoint", help="JSONL com os resultados por item; permite retomar a execução")
+    parser.add_argument("--restart", action="store_true", help="Descarta o checkpoint existente")
+    parser.add_argument("--limit", type=int, help="Avalia no máximo N itens nesta execução")
+    parser.add_argument("--model", default="gpt-4.1-mini")
+    parser.add_argument("--fallback-only", action="store_true", help="Sem rede: usa só a heurística de keywords")
+    parser.add_argument("--report", help="Salva o relatório em JSON")
+    parser.add_argument("--log-level", default="ERROR", help="Nível de log do pipeline (padrão: ERROR)")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        print("\nInterrompido. Rode de novo com o mesmo --checkpoint para continuar.", file=sys.stderr)
+        sys.exit(130)
@@ -0,0 +1,214 @@
+"""
+Teste de carga do serviço completo, offline.
+
+Sobe o servidor stub do LLM (scripts/mock_llm_server.py) e a API
+(uvicorn app.main:app) em subprocessos, dispara uma mistura de
+requisições texto/.txt/.pdf em cada nível de concorrência e reporta
+RPS, latências p50/p95/p99, taxa de fallback e memória do processo da API.
+
+Uso:
+    python -m scripts.loadtest --concurrency 1 8 32 --requests 300
+    python -m scripts.loadtest --llm-error-rate 0.2 --mix text=1 --json resultado.json
+    python -m scripts.loadtest --max-p99-ms 1500  # código de saída 1 se algum nível passar do limite
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from scripts.bench_preprocess import build_email
+from scripts.mock_llm_server import start_mock_server, wait_for_port
+from scripts.sample_data import build_text_pdf
+
+# Emails distintos por tipo: o conteúdo varia entre requisições como no tráfego real
+PAYLOAD_VARIANTS = 50
+
+_FALLBACK_LINE = re.compile(r'^email_analyzer_analyses_total\{[^}]*fallback="true"[^}]*\} (\S+)$', re.MULTILINE)
+
+
+def parse_mix(value: str) -> dict:
+    """Converte "text=0.6,txt=0.3,pdf=0.1" em pesos por tipo de entrada"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("text", "txt", "pdf"):
+            raise argparse.ArgumentTypeError(f"Tipo de entrada desconhecido: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_payloads(args) -> dict:
+    """Monta as variações de cada tipo: kwargs prontos para httpx.post"""
+    payloads = {"text": [], "txt": [], "pdf": []}
+    for seed in range(PAYLOAD_VARIANTS):
+        body = build_email(args.email_chars, seed=seed)
+        payloads["text"].append({"data": {"text": body}})
+        payloads["txt"].append({"files": {"file": ("email.txt", body.encode("utf-8"), "text/plain")}})
+        # build_text_pdf aceita só ASCII: linha sem acentos, variando entre requisições
+        line = f"Pedido {seed}: temos um problema no sistema e precisamos de suporte urgente para o chamado."
+        pdf = build_text_pdf(args.pdf_pages, line=line)
+        payloads["pdf"].append({"files": {"file": ("email.pdf", pdf, "application/pdf")}})
+    return payloads
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def process_memory_mb(pid: int) -> tuple:
+    """RSS atual e pico (VmHWM) do processo em MB, lidos de /proc (Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return float("nan"), float("nan")
+
+
+async def fallback_count(client: httpx.AsyncClient) -> float:
+    resp = await client.get("/api/metrics")
+    return sum(float(value) for value in _FALLBACK_LINE.findall(resp.text))
+
+
+async def run_level(client: httpx.AsyncClient, payloads: dict, mix: dict, concurrency: int, total: int) -> dict:
+    rng = random.Random(concurrency)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=total)
+    latencies = {kind: [] for kind in mix}
+    statuses = {}
+    queue = iter(enumerate(kinds))
+
+    async def worker():
+        for index, kind in queue:
+            payload = payloads[kind][index % PAYLOAD_VARIANTS]
+            start = time.perf_counter()
+            try:
+                resp = await client.post("/api/analyze", **payload)
+                status = resp.status_code
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            latencies[kind].append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    fallbacks_before = await fallback_count(client)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    fallbacks = await fallback_count(client) - fallbacks_before
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(all_latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(all_latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(all_latencies, 99) * 1000, 1),
+        "errors": total - statuses.get(200, 0),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "fallback_rate": round(fallbacks / max(1, statuses.get(200, 0)), 3),
+        "p50_ms_by_type": {
+            kind: round(statistics.median(values) * 1000, 1) for kind, values in latencies.items() if values
+        },
+    }
+
+
+async def drive(args, app_pid: int) -> list:
+    payloads = build_payloads(args)
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    results = []
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=120) as client:
+        # Aquecimento: conexões, pool de PDF e imports tardios fora da medição
+        await run_level(client, payloads, mix, concurrency=2, total=min(20, args.requests))
+
+        print(f"mix={args.mix} email={args.email_chars} chars pdf={args.pdf_pages} páginas "
+              f"llm={args.llm_latency_ms:.0f}ms±{args.llm_jitter_ms:.0f} erros_llm={args.llm_error_rate:.0%}")
+        print(f"{'conc':>5} {'reqs':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'erros':>6} {'fallback':>9} {'rss MB':>7} {'pico MB':>8}")
+        for concurrency in args.concurrency:
+            result = await run_level(client, payloads, mix, concurrency, args.requests)
+            result["rss_mb"], result["peak_rss_mb"] = (round(value, 1) for value in process_memory_mb(app_pid))
+            results.append(result)
+            print(f"{concurrency:>5} {result['requests']:>6} {result['rps']:>8.1f} {result['p50_ms']:>8.1f} "
+                  f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>6} "
+                  f"{result['fallback_rate']:>9.1%} {result['rss_mb']:>7.1f} {result['peak_rss_mb']:>8.1f}")
+    return results
+
+
+def start_app(args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY_EMAIL_ANALYZER="loadtest-key",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.llm_port}/v1",
+        # Sem cache por padrão: cada requisição percorre o pipeline inteiro
+        ANALYSIS_CACHE_SIZE=os.getenv("ANALYSIS_CACHE_SIZE", "10000" if args.cache else "0"),
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.app_logs else subprocess.DEVNULL,
+    )
+    wait_for_port(args.port, proc, timeout=30)
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requisições por nível de concorrência")
+    parser.add_argument("--mix", default="text=0.6,txt=0.3,pdf=0.1", help="Pesos por tipo de entrada")
+    parser.add_argument("--email-chars", type=int, default=1500)
+    parser.add_argument("--pdf-pages", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-error-status", type=int, default=500)
+    parser.add_argument("--cache", action="store_true", help="Mantém o cache de análises ligado")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--llm-port", type=int, default=8201)
+    parser.add_argument("--app-logs", action="store_true", help="Mostra os logs da API")
+    parser.add_argument("--json", help="Salva os resultados neste arquivo")
+    parser.add_argument("--max-p99-ms", type=float, help="Falha (exit 1) se o p99 de algum nível passar disto")
+    args = parser.parse_args()
+
+    llm = start_mock_server(
+        args.llm_port, args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate, args.llm_error_status
+    )
+    app = None
+    try:
+        app = start_app(args)
+        results = asyncio.run(drive(args, app.pid))
+    finally:
+        for proc in (app, llm):
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2, ensure_ascii=False)
+
+    if args.max_p99_ms is not None:
+        slow = [r for r in results if r["p99_ms"] > args.max_p99_ms]
+        if slow:
+            print(f"p99 acima de {args.max_p99_ms:.0f} ms em concorrência {[r['concurrency'] for r in slow]}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
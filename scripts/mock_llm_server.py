@@ -0,0 +1,315 @@
+"""
+Servidor stub compatível com a Responses API da OpenAI (POST /v1/responses)
+e com Chat Completions (POST /v1/chat/completions), a API dos servidores
+locais como vLLM e llama.cpp.
+
+Usado pelos benchmarks para medir o serviço sem acesso à rede:
+a classificação é feita pela heurística local, a latência do
+modelo é simulada com asyncio.sleep e uma fração das chamadas
+pode falhar de propósito (ex.: 500 ou 429) para exercitar o fallback
+e o circuit breaker. Com --rpm-limit o servidor aplica um limite de
+requisições por minuto como a API real: cabeçalhos x-ratelimit-* em
+toda resposta e 429 com retry-after quando o limite estoura. Com
+"stream": true a resposta sai em server-sent events como na API real
+(response.output_text.delta ... response.completed); --token-ms simula o
+tempo de geração de cada token de saída, nos dois modos. --slow-rate e
+--slow-ms somam uma latência extra a uma fração das chamadas (cauda longa).
+
+Uso:
+    python -m scripts.mock_llm_server --port 8100 --latency-ms 300 --error-rate 0.1 --error-status 429
+    python -m scripts.mock_llm_server --port 8100 --latency-ms 100 --rpm-limit 600
+    python -m scripts.mock_llm_server --port 8100 --latency-ms 300 --token-ms 15
+    python -m scripts.mock_llm_server --port 8100 --latency-ms 300 --slow-rate 0.05 --slow-ms 3000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.clients.llm_client import _fallback_classify
+
+
+def create_app(
+    latency_ms: float = 300.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 500,
+    rpm_limit: float = 0.0,
+    token_ms: float = 0.0,
+    slow_rate: float = 0.0,
+    slow_ms: float = 0.0
+) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    # Balde de requisições do limite simulado; como na API real, o limite por
+    # minuto vale em frações de um segundo (capacidade de 1 s de limite)
+    capacity = max(1.0, rpm_limit / 60)
+    bucket = {"level": capacity, "updated": time.monotonic()}
+
+    def take_request() -> dict:
+        """Consome uma requisição do balde; com retry-after-ms = limite estourado"""
+        now = time.monotonic()
+        bucket["level"] = min(capacity, bucket["level"] + (now - bucket["updated"]) * rpm_limit / 60)
+        bucket["updated"] = now
+        allowed = bucket["level"] >= 1
+        if allowed:
+            bucket["level"] -= 1
+        reset = max(0.0, (1 - bucket["level"]) * 60 / rpm_limit)
+        headers = {
+            "x-ratelimit-limit-requests": str(int(rpm_limit)),
+            "x-ratelimit-remaining-requests": str(max(0, int(bucket["level"]))),
+            "x-ratelimit-reset-requests": f"{reset:.3f}s",
+        }
+        return headers if allowed else {**headers, "retry-after-ms": str(int(reset * 1000) + 1)}
+
+    async def simulate() -> tuple[JSONResponse | None, dict]:
+        """Limite de taxa, latência e falhas injetadas: (resposta de erro ou None, cabeçalhos)"""
+        rate_headers = take_request() if rpm_limit else {}
+        if "retry-after-ms" in rate_headers:
+            return JSONResponse(
+                status_code=429,
+                content={"error": {
+                    "message": "Rate limit reached (servidor stub)",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded",
+                }},
+                headers=rate_headers,
+            ), rate_headers
+        delay = max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms))
+        if slow_rate and random.random() < slow_rate:
+            # Cauda longa: a chamada ocasional que demora várias vezes a mediana
+            delay += slow_ms
+        await asyncio.sleep(delay / 1000)
+
+        if error_rate and random.random() < error_rate:
+            # Mesmo formato de erro da API da OpenAI
+            return JSONResponse(
+                status_code=error_status,
+                content={"error": {
+                    "message": "Erro injetado pelo servidor stub",
+                    "type": "rate_limit_error" if error_status == 429 else "server_error",
+                    "code": None,
+                }},
+                headers={"retry-after": "1"} if error_status == 429 else None,
+            ), rate_headers
+        return None, rate_headers
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        body = await request.json()
+        error, rate_headers = await simulate()
+        if error is not None:
+            return error
+
+        user_content = body["input"][-1]["content"]
+        batch = body.get("text", {}).get("format", {}).get("name") == "email_batch_analysis"
+        output_text = _mock_output(user_content, batch)
+        tokens = _split_tokens(output_text)
+
+        response = {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": body.get("model", "mock"),
+            "status": "completed",
+            "output": [{
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": output_text, "annotations": []}],
+            }],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": len(user_content) // 4,
+                "output_tokens": len(output_text) // 4,
+                "total_tokens": (len(user_content) + len(output_text)) // 4,
+            },
+        }
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream_events(response, tokens, token_ms), media_type="text/event-stream", headers=rate_headers
+            )
+        await asyncio.sleep(len(tokens) * token_ms / 1000)
+        return JSONResponse(headers=rate_headers, content=response)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        """Mesmo comportamento em Chat Completions, a API dos servidores locais (vLLM, llama.cpp)"""
+        body = await request.json()
+        error, rate_headers = await simulate()
+        if error is not None:
+            return error
+
+        user_content = body["messages"][-1]["content"]
+        batch = body.get("response_format", {}).get("json_schema", {}).get("name") == "email_batch_analysis"
+        output_text = _mock_output(user_content, batch)
+        tokens = _split_tokens(output_text)
+
+        completion = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": output_text},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(user_content) // 4,
+                "completion_tokens": len(output_text) // 4,
+                "total_tokens": (len(user_content) + len(output_text)) // 4,
+            },
+        }
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream_chunks(completion, tokens, token_ms), media_type="text/event-stream", headers=rate_headers
+            )
+        await asyncio.sleep(len(tokens) * token_ms / 1000)
+        return JSONResponse(headers=rate_headers, content=completion)
+
+    return app
+
+
+def _mock_output(user_content: str, batch: bool) -> str:
+    # Classifica só os emails entre aspas triplas, não as instruções do prompt
+    parts = user_content.split('"""')
+    email_texts = parts[1::2] if len(parts) >= 3 else [user_content]
+    analyses = [_mock_analysis(text) for text in email_texts]
+    if batch:
+        payload = {"results": [{"id": index, **analysis} for index, analysis in enumerate(analyses)]}
+    else:
+        payload = analyses[0]
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def _split_tokens(text: str, size: int = 4) -> list[str]:
+    """Trechos de ~4 caracteres, o tamanho médio de um token"""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def _stream_events(response: dict, tokens: list[str], token_ms: float):
+    item_id = response["output"][0]["id"]
+
+    def event(data: dict) -> str:
+        return f"event: {data['type']}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    yield event({"type": "response.created", "response": {**response, "status": "in_progress", "output": []}})
+    for token in tokens:
+        await asyncio.sleep(token_ms / 1000)
+        yield event({
+            "type": "response.output_text.delta",
+            "item_id": item_id, "output_index": 0, "content_index": 0, "delta": token,
+        })
+    yield event({"type": "response.completed", "response": response})
+
+
+async def _stream_chunks(completion: dict, tokens: list[str], token_ms: float):
+    """Stream de Chat Completions: chunks só com data: e um [DONE] no fim"""
+    base = {key: completion[key] for key in ("id", "created", "model")}
+
+    def chunk(delta: dict, finish_reason: str | None = None) -> str:
+        data = {**base, "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    for token in tokens:
+        await asyncio.sleep(token_ms / 1000)
+        yield chunk({"content": token})
+    yield chunk({}, "stop")
+    yield "data: [DONE]\n\n"
+
+
+def _mock_analysis(email_text: str) -> dict:
+    result = _fallback_classify(email_text)
+    return {
+        "category": result["category"].value,
+        "confidence": result["confidence"],
+        "suggested_reply": result["suggested_reply"],
+        "reason": "mock",
+    }
+
+
+def wait_for_port(port: int, proc: subprocess.Popen, timeout: float = 15.0) -> None:
+    """Espera o processo começar a aceitar conexões em 127.0.0.1:port"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Processo encerrou antes de abrir a porta {port}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"Porta {port} não abriu a tempo")
+
+
+def start_mock_server(
+    port: int,
+    latency_ms: float,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 500,
+    rpm_limit: float = 0.0,
+    token_ms: float = 0.0,
+    slow_rate: float = 0.0,
+    slow_ms: float = 0.0
+) -> subprocess.Popen:
+    """Sobe o servidor stub em um subprocesso e espera ele aceitar conexões"""
+    proc = subprocess.Popen([
+        sys.executable, "-m", "scripts.mock_llm_server",
+        "--port", str(port),
+        "--latency-ms", str(latency_ms),
+        "--jitter-ms", str(jitter_ms),
+        "--error-rate", str(error_rate),
+        "--error-status", str(error_status),
+        "--rpm-limit", str(rpm_limit),
+        "--token-ms", str(token_ms),
+        "--slow-rate", str(slow_rate),
+        "--slow-ms", str(slow_ms),
+    ])
+    wait_for_port(port, proc)
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração das chamadas que falham (0 a 1)")
+    parser.add_argument("--error-status", type=int, default=500, help="Status HTTP das falhas injetadas")
+    parser.add_argument("--rpm-limit", type=float, default=0.0, help="Limite simulado de requisições por minuto (0 = sem limite)")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Tempo de geração por token de saída")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fração das chamadas com latência extra (0 a 1)")
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="Latência extra dessas chamadas")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(
+            args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.rpm_limit, args.token_ms,
+            args.slow_rate, args.slow_ms
+        ),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
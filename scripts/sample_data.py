@@ -0,0 +1,52 @@
+"""
+Geração de dados sintéticos para benchmarks (sem dependências externas).
+"""
+
+SAMPLE_LINE = "Prezados, temos um problema no sistema de pedidos e precisamos de suporte urgente para o chamado."
+
+
+def build_text_pdf(pages: int, lines_per_page: int = 45, line: str = SAMPLE_LINE) -> bytes:
+    """
+    Monta um PDF válido com texto extraível em todas as páginas.
+
+    Args:
+        pages: Quantidade de páginas
+        lines_per_page: Linhas de texto por página
+        line: Conteúdo de cada linha (apenas ASCII)
+
+    Returns:
+        Bytes do arquivo PDF
+    """
+    text_ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+    for _ in range(lines_per_page):
+        text_ops.append(f"({line}) Tj T*")
+    text_ops.append("ET")
+    stream = "\n".join(text_ops).encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # árvore de páginas, preenchida depois de conhecer os filhos
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+    ]
+    kids = []
+    for _ in range(pages):
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents 4 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    return bytes(out)
@@ -0,0 +1,107 @@
+"""
+Treina o modelo local (TF-IDF + regressão logística) a partir do corpus rotulado.
+
+Usa o mesmo formato de dataset de scripts/eval_emails.py (JSONL ou CSV com
+id, text, label), separa uma parte para validação e mostra, para cada
+limiar de confiança, a parcela de emails que o modelo responderia sozinho
+e a acurácia nessa parcela. Sugere o menor limiar que atinge a acurácia alvo.
+
+Uso:
+    python -m scripts.train_local_classifier --dataset emails.jsonl --out models/local_classifier.json
+    LOCAL_MODEL_PATH=models/local_classifier.json LOCAL_TIER_THRESHOLD=0.95 uvicorn app.main:app
+"""
+
+import argparse
+import random
+import time
+
+from app.domain.email_category import EmailCategory
+from app.services.local_classifier import LocalClassifier
+from app.utils.text_preprocessor import preprocess_text
+from scripts.eval_emails import load_dataset
+
+THRESHOLDS = (0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.97, 0.99)
+
+
+def threshold_table(classifier: LocalClassifier, contents: list, labels: list) -> list:
+    """Cobertura e acurácia do modelo local em cada limiar"""
+    predictions = []
+    for content, label in zip(contents, labels):
+        produtivo = classifier.predict_proba(content)
+        if produtivo is None:
+            # Nenhum termo conhecido: sempre vai para o LLM, em qualquer limiar
+            predictions.append((0.0, False))
+            continue
+        predicted = EmailCategory.PRODUTIVO if produtivo >= 0.5 else EmailCategory.IMPRODUTIVO
+        predictions.append((max(produtivo, 1 - produtivo), predicted == label))
+
+    rows = []
+    for threshold in THRESHOLDS:
+        covered = [correct for confidence, correct in predictions if confidence >= threshold]
+        rows.append({
+            "threshold": threshold,
+            "coverage": round(len(covered) / len(predictions), 4) if predictions else 0.0,
+            "accuracy": round(sum(covered) / len(covered), 4) if covered else None,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", required=True, help="Arquivo .jsonl ou .csv rotulado")
+    parser.add_argument("--out", default="models/local_classifier.json")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fração reservada para validação")
+    parser.add_argument("--target-accuracy", type=float, default=0.98)
+    parser.add_argument("--epochs", type=int, default=15)
+    parser.add_argument("--min-df", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    items = [(preprocess_text(item["text"]), EmailCategory(item["expected"])) for item in load_dataset(args.dataset)]
+    items = [(content, label) for content, label in items if content]
+    random.Random(args.seed).shuffle(items)
+    split = int(len(items) * (1 - args.holdout))
+    train, holdout = items[:split], items[split:]
+    print(f"{len(items)} emails: {len(train)} treino, {len(holdout)} validação")
+
+    start = time.perf_counter()
+    classifier = LocalClassifier.train(
+        [content for content, _ in train], [label for _, label in train],
+        epochs=args.epochs, min_df=args.min_df, seed=args.seed
+    )
+    print(f"Treinado em {time.perf_counter() - start:.1f}s: {len(classifier.terms)} termos")
+
+    rows = threshold_table(classifier, [c for c, _ in holdout], [label for _, label in holdout]) if holdout else []
+    if rows:
+        print(f"\n{'limiar':>7} {'cobertura':>10} {'acurácia':>9}")
+        for row in rows:
+            accuracy = f"{row['accuracy']:.2%}" if row["accuracy"] is not None else "-"
+            print(f"{row['threshold']:>7.2f} {row['coverage']:>10.1%} {accuracy:>9}")
+
+        start = time.perf_counter()
+        for content, _ in holdout:
+            classifier.predict_proba(content)
+        per_email = (time.perf_counter() - start) / len(holdout)
+        print(f"\nInferência: {per_email * 1e6:.0f} us por email")
+
+    suggested = next(
+        (r["threshold"] for r in rows if r["accuracy"] is not None and r["accuracy"] >= args.target_accuracy),
+        None
+    )
+    if suggested is not None:
+        print(f"Limiar sugerido para acurácia >= {args.target_accuracy:.0%}: LOCAL_TIER_THRESHOLD={suggested}")
+    elif rows:
+        print(f"Nenhum limiar atinge {args.target_accuracy:.0%} na validação; mantenha a camada local desativada")
+
+    classifier.metadata.update(
+        dataset=args.dataset,
+        trained_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        holdout=rows,
+        suggested_threshold=suggested,
+    )
+    classifier.save(args.out)
+    print(f"Modelo salvo em {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import os
+
+# Lidos no import dos módulos do app: nada de estado compartilhado, modelo local nem rede
+os.environ.pop("SHARED_STATE_PATH", None)
+os.environ.pop("ANALYSIS_CACHE_SQLITE_PATH", None)
+os.environ.pop("NEAR_DUP_SQLITE_PATH", None)
+os.environ["LOCAL_MODEL_PATH"] = os.path.join(os.path.dirname(__file__), "sem-modelo-local.json")
+os.environ["LLM_BACKEND"] = "heuristic"
+
+import httpx
+import pytest
+
+from app.clients.llm_client import HeuristicLLMClient
+from app.services.analyzer_service import EmailAnalyzerService
+
+
+@pytest.fixture
+def analyzer() -> EmailAnalyzerService:
+    return EmailAnalyzerService(ai_client=HeuristicLLMClient())
+
+
+@pytest.fixture
+async def api_client(analyzer, monkeypatch):
+    """Cliente HTTP da API em processo, com o serviço já pronto (sem warm-up nem lifespan)"""
+    from app.api import routes
+    from app.main import app
+
+    monkeypatch.setattr(routes, "analyzer", analyzer)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
@@ -0,0 +1,162 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.domain.email_category import EmailCategory
+from app.services import analysis_cache
+from app.services.analysis_cache import AnalysisCache, SQLiteCacheBackend, build_cache_key
+
+
+def _result(reply: str = "Obrigado pelo contato.") -> dict:
+    return {"category": EmailCategory.PRODUTIVO, "suggested_reply": reply, "confidence": 0.9}
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(analysis_cache.time, "monotonic", fake)
+    monkeypatch.setattr(analysis_cache.time, "time", fake)
+    return fake
+
+
+def _rows(path) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+
+def test_cache_key_depends_on_content_model_and_prompt_version():
+    key = build_cache_key("texto", "gpt-4o-mini", "v1")
+
+    assert key == build_cache_key("texto", "gpt-4o-mini", "v1")
+    assert key != build_cache_key("texto!", "gpt-4o-mini", "v1")
+    assert key != build_cache_key("texto", "gpt-4o", "v1")
+    assert key != build_cache_key("texto", "gpt-4o-mini", "v2")
+
+
+async def test_hit_returns_copy_and_counts():
+    cache = AnalysisCache(max_size=10, ttl=60)
+    await cache.set("k", _result())
+
+    first = await cache.get("k")
+    first["suggested_reply"] = "alterado"
+
+    assert (await cache.get("k"))["suggested_reply"] == "Obrigado pelo contato."
+    assert await cache.get("outra") is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+async def test_entries_expire_after_ttl(clock):
+    cache = AnalysisCache(max_size=10, ttl=60)
+    await cache.set("k", _result())
+
+    clock.now += 59
+    assert await cache.get("k") is not None
+    clock.now += 2
+    assert await cache.get("k") is None
+    assert cache.stats()["size"] == 0
+
+
+async def test_evicts_least_recently_used():
+    cache = AnalysisCache(max_size=2, ttl=60)
+    await cache.set("a", _result("a"))
+    await cache.set("b", _result("b"))
+    await cache.get("a")
+    await cache.set("c", _result("c"))
+
+    assert await cache.get("b") is None
+    assert (await cache.get("a"))["suggested_reply"] == "a"
+    assert (await cache.get("c"))["suggested_reply"] == "c"
+
+
+async def test_disabled_cache_stores_nothing():
+    cache = AnalysisCache(max_size=0, ttl=60)
+    await cache.set("k", _result())
+
+    assert await cache.get("k") is None
+    assert cache.stats()["misses"] == 0
+
+
+async def test_backend_shares_results_between_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = AnalysisCache(max_size=10, ttl=60, backend=SQLiteCacheBackend(path, ttl=60))
+    reader = AnalysisCache(max_size=10, ttl=60, backend=SQLiteCacheBackend(path, ttl=60))
+
+    await writer.set("k", _result())
+    value = await reader.get("k")
+
+    assert value["category"] is EmailCategory.PRODUTIVO
+    assert reader.stats()["backend_hits"] == 1
+
+
+async def test_backend_error_is_a_miss(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+    backend.close()
+    cache = AnalysisCache(max_size=10, ttl=60, backend=backend)
+
+    await cache.set("k", _result())
+    cache._entries.clear()
+
+    assert await cache.get("k") is None
+
+
+async def test_backend_runs_off_the_event_loop(tmp_path, monkeypatch):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+    threads = []
+
+    def get(key):
+        threads.append(threading.get_ident())
+        return None
+
+    monkeypatch.setattr(backend, "get", get)
+    cache = AnalysisCache(max_size=10, ttl=60, backend=backend)
+    await cache.get("k")
+
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_backend_purges_expired_rows_on_write(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteCacheBackend(path, ttl=60, purge_interval=10)
+    for index in range(5):
+        backend.set(f"old{index}", _result())
+
+    clock.now += 61
+    backend.set("new", _result())
+
+    assert _rows(path) == 1
+    assert backend.get("new") is not None
+
+
+def test_backend_purge_waits_for_interval(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteCacheBackend(path, ttl=60, purge_interval=120)
+    backend.set("old", _result())
+
+    clock.now += 61
+    backend.set("new", _result())
+    assert _rows(path) == 2
+
+    clock.now += 60
+    backend.set("newer", _result())
+    assert _rows(path) == 2
+
+
+def test_backend_caps_rows_keeping_latest(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteCacheBackend(path, ttl=60, max_rows=3, purge_interval=0)
+    for index in range(6):
+        clock.now += 1
+        backend.set(f"k{index}", _result())
+
+    assert _rows(path) == 3
+    assert [backend.get(f"k{index}") is not None for index in range(6)] == [False] * 3 + [True] * 3
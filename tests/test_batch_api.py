@@ -0,0 +1,67 @@
+import pytest
+
+from app.api import routes
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(routes, "BATCH_MAX_ITEMS", 3)
+
+
+async def test_json_batch_returns_results_in_order(api_client):
+    response = await api_client.post("/api/analyze/batch", json=[
+        {"id": "a", "text": "Preciso de suporte: o pedido 123 não chegou, podem verificar o status?"},
+        "Feliz Natal a toda a equipe!",
+        {"id": "c", "text": "   "},
+    ])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["total"], body["succeeded"], body["failed"]) == (3, 2, 1)
+    assert [item["index"] for item in body["results"]] == [0, 1, 2]
+    assert [item["id"] for item in body["results"]] == ["a", None, "c"]
+    assert body["results"][0]["result"]["category"] == "PRODUTIVO"
+    assert body["results"][2]["status_code"] == 400
+
+
+async def test_json_batch_above_limit_is_rejected(api_client, analyzer, monkeypatch):
+    calls = []
+    monkeypatch.setattr(analyzer, "analyze_batch", lambda items: calls.append(items))
+
+    response = await api_client.post("/api/analyze/batch", json=["email"] * 4)
+
+    assert response.status_code == 400
+    assert "Máximo de 3 emails" in response.json()["detail"]
+    assert calls == []
+
+
+async def test_empty_batch_is_rejected(api_client):
+    response = await api_client.post("/api/analyze/batch", json=[])
+
+    assert response.status_code == 400
+
+
+async def test_invalid_json_batch_is_a_validation_error(api_client):
+    response = await api_client.post("/api/analyze/batch", json={"text": "não é uma lista"})
+
+    assert response.status_code == 422
+
+
+async def test_multipart_batch_analyzes_each_file(api_client):
+    files = [
+        ("files", ("a.txt", b"Solicito o reembolso do pedido 456, cobrado em duplicidade.", "text/plain")),
+        ("files", ("b.txt", b"Obrigado pela ajuda de ontem, pessoal!", "text/plain")),
+    ]
+
+    response = await api_client.post("/api/analyze/batch", files=files)
+
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["results"]] == ["a.txt", "b.txt"]
+
+
+async def test_multipart_batch_above_limit_is_rejected(api_client):
+    files = [("files", (f"{index}.txt", b"Texto do email.", "text/plain")) for index in range(4)]
+
+    response = await api_client.post("/api/analyze/batch", files=files)
+
+    assert response.status_code == 400
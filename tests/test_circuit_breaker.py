@@ -0,0 +1,135 @@
+from app.clients.circuit_breaker import CircuitBreaker, CircuitState
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(clock: FakeClock, **kwargs) -> CircuitBreaker:
+    options = dict(
+        error_rate_threshold=0.5, slow_call_seconds=1.0, slow_call_rate_threshold=0.5,
+        window_seconds=60, minimum_calls=4, open_seconds=30, half_open_max_calls=2, clock=clock,
+    )
+    return CircuitBreaker(**{**options, **kwargs})
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.minimum_calls):
+        breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+
+
+def test_stays_closed_below_minimum_calls():
+    breaker = _breaker(FakeClock())
+    for _ in range(3):
+        breaker.record_failure()
+
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.allow_request()
+
+
+def test_opens_on_error_rate_and_rejects():
+    breaker = _breaker(FakeClock())
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state is CircuitState.OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()["rejected_calls"] == 1
+
+
+def test_opens_on_slow_call_rate():
+    breaker = _breaker(FakeClock())
+    for latency in (0.1, 0.1, 2.0, 2.0):
+        breaker.record_success(latency)
+
+    assert breaker.state is CircuitState.OPEN
+
+
+def test_old_calls_leave_the_window():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 61
+    breaker.record_failure()
+
+    assert breaker.state is CircuitState.CLOSED
+
+
+def test_half_open_after_wait_limits_trial_calls():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _open(breaker)
+
+    clock.now += 29
+    assert not breaker.allow_request()
+    clock.now += 1
+    assert breaker.allow_request()
+    assert breaker.state is CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_half_open_closes_after_successful_trials():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _open(breaker)
+    clock.now += 30
+
+    for _ in range(2):
+        assert breaker.allow_request()
+        breaker.record_success(0.1)
+
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.snapshot()["window_calls"] == 0
+
+
+def test_half_open_reopens_on_failure_or_slow_trial():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_success(5.0)
+    assert breaker.state is CircuitState.OPEN
+
+
+def test_release_frees_a_half_open_slot():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # Chamadas abandonadas não contam como sucesso nem falha, mas devolvem a vaga
+    breaker.release()
+    breaker.release()
+
+    assert breaker.state is CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+    breaker.record_success(0.1)
+    assert breaker.allow_request()
+    breaker.record_success(0.1)
+    assert breaker.state is CircuitState.CLOSED
+
+
+def test_release_outside_half_open_is_a_no_op():
+    breaker = _breaker(FakeClock())
+    breaker.release()
+
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.snapshot()["window_calls"] == 0
@@ -0,0 +1,118 @@
+import json
+import threading
+from types import SimpleNamespace
+
+from app import cli
+from app.cli import Checkpoint
+
+MBOX = (
+    b"From a@example.com\nSubject: Suporte\nMessage-ID: <1@example.com>\n\n"
+    b"Preciso de suporte: o pedido 123 apresenta erro, podem verificar?\n\n"
+    b"From b@example.com\nSubject: Obrigado\nMessage-ID: <2@example.com>\n\nMuito obrigado pela ajuda!\n"
+)
+
+
+def _args(tmp_path, **overrides) -> SimpleNamespace:
+    args = SimpleNamespace(
+        source=str(tmp_path / "emails"), out=str(tmp_path / "saida.jsonl"), format="jsonl",
+        checkpoint=None, restart=False, workers=1, chunk_size=2, concurrency=4, rpm=None, tpm=None,
+        item_timeout=30, limit=None, model=None, fallback_only=True,
+    )
+    args.__dict__.update(overrides)
+    return args
+
+
+def _source(tmp_path):
+    emails = tmp_path / "emails"
+    emails.mkdir()
+    (emails / "a.txt").write_text("Preciso de suporte com o pedido 123, está com erro.", encoding="utf-8")
+    (emails / "b.txt").write_text("Muito obrigado pela ajuda!", encoding="utf-8")
+    (emails / "vazio.txt").write_text("", encoding="utf-8")
+    (emails / "caixa.mbox").write_bytes(MBOX)
+
+
+def _records(tmp_path) -> list[dict]:
+    with open(tmp_path / "saida.jsonl", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / "run.checkpoint")
+    checkpoint = Checkpoint(path)
+    checkpoint.add(["a.txt", "caixa.mbox#0"])
+    checkpoint.close()
+
+    reopened = Checkpoint(path)
+    assert "a.txt" in reopened
+    assert "caixa.mbox#0" in reopened
+    assert "b.txt" not in reopened
+    assert len(reopened) == 2
+
+
+def test_checkpoint_index_catches_up_with_the_file(tmp_path):
+    path = tmp_path / "run.checkpoint"
+    checkpoint = Checkpoint(str(path))
+    checkpoint.add(["a.txt"])
+    checkpoint.close()
+    # Interrompido entre as escritas: o arquivo tem ids que o índice não viu, e uma linha pela metade
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('"b.txt"\n"c.t')
+
+    reopened = Checkpoint(str(path))
+    reopened.add(["d.txt"])
+
+    assert len(reopened) == 3
+    assert "b.txt" in reopened and "d.txt" in reopened
+    assert path.read_text(encoding="utf-8").splitlines() == ['"a.txt"', '"b.txt"', '"d.txt"']
+
+
+def test_checkpoint_rebuilds_a_missing_index(tmp_path):
+    path = tmp_path / "run.checkpoint"
+    path.write_text('"a.txt"\n"b.txt"\n', encoding="utf-8")
+
+    assert len(Checkpoint(str(path))) == 2
+
+
+async def test_bulk_resume_continues_without_duplicates(tmp_path):
+    _source(tmp_path)
+
+    first = await cli.run_bulk(_args(tmp_path, limit=2))
+    second = await cli.run_bulk(_args(tmp_path))
+    third = await cli.run_bulk(_args(tmp_path))
+
+    records = _records(tmp_path)
+    assert (first["processed"], second["processed"], third["processed"]) == (2, 3, 0)
+    assert sorted(record["id"] for record in records) == [
+        "a.txt", "b.txt", "caixa.mbox#0", "caixa.mbox#1", "vazio.txt",
+    ]
+    assert next(record for record in records if record["id"] == "vazio.txt")["status_code"] == 400
+
+
+async def test_server_errors_are_checkpointed_too(tmp_path):
+    _source(tmp_path)
+
+    # Tempo limite que nenhum bloco cumpre: todo item vira 504
+    first = await cli.run_bulk(_args(tmp_path, item_timeout=0.0))
+    second = await cli.run_bulk(_args(tmp_path, item_timeout=0.0))
+
+    assert first["errors"] == 5
+    assert second["processed"] == 0
+    assert len(_records(tmp_path)) == 5
+    assert {record["status_code"] for record in _records(tmp_path)} == {504}
+
+
+async def test_sources_are_listed_off_the_event_loop(tmp_path, monkeypatch):
+    _source(tmp_path)
+    threads = []
+    original = cli.iter_items
+
+    def iter_items(source):
+        for item in original(source):
+            threads.append(threading.current_thread())
+            yield item
+
+    monkeypatch.setattr(cli, "iter_items", iter_items)
+    await cli.run_bulk(_args(tmp_path))
+
+    assert len(threads) == 5
+    assert threading.main_thread() not in threads
@@ -0,0 +1,81 @@
+import asyncio
+import io
+import time
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from app.utils import file_reader
+from scripts.sample_data import build_text_pdf
+
+# Rodam nos processos do pool (spawn): precisam ser funções de módulo, importáveis
+
+
+def _hang(source, max_pages, max_chars) -> str:
+    time.sleep(60)
+    return "nunca"
+
+
+def _slow(source, max_pages, max_chars) -> str:
+    time.sleep(source)
+    return "lido"
+
+
+@pytest.fixture
+def pdf_pool(monkeypatch):
+    monkeypatch.setattr(file_reader, "PDF_WORKERS", 2)
+    yield
+    file_reader.shutdown_pdf_pool()
+
+
+async def test_pdf_text_is_extracted_in_the_pool(pdf_pool):
+    upload = UploadFile(file=io.BytesIO(build_text_pdf(pages=2)), filename="email.pdf")
+
+    assert (await file_reader.extract_text(upload)).startswith("Prezados, temos um problema")
+
+
+async def test_hanging_pdf_job_is_killed_on_timeout(pdf_pool, monkeypatch):
+    monkeypatch.setattr(file_reader, "PDF_TIMEOUT_SECONDS", 1.0)
+    monkeypatch.setattr(file_reader, "extract_pdf_text", _hang)
+    pool = file_reader._get_pdf_pool()
+    # O shutdown do pool solta o dict; os processos continuam nele
+    processes = pool._processes
+
+    start = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        await file_reader._run_pdf_job(b"%PDF")
+
+    assert time.perf_counter() - start < 5
+    assert processes
+    for process in processes.values():
+        process.join(timeout=5)
+        assert not process.is_alive()
+    assert file_reader._pdf_pool is not pool
+
+    # O próximo PDF vai para um pool novo, com todos os processos livres
+    monkeypatch.setattr(file_reader, "extract_pdf_text", _slow)
+    assert await file_reader._run_pdf_job(0) == "lido"
+
+
+async def test_jobs_sharing_a_recycled_pool_are_resubmitted(pdf_pool, monkeypatch):
+    monkeypatch.setattr(file_reader, "PDF_TIMEOUT_SECONDS", 3.0)
+    monkeypatch.setattr(file_reader, "extract_pdf_text", _hang)
+    hanging = asyncio.ensure_future(file_reader._run_pdf_job(b"%PDF"))
+    await asyncio.sleep(2.5)
+
+    # Começa no pool que vai ser reciclado (aos 3 s) e termina no novo
+    monkeypatch.setattr(file_reader, "extract_pdf_text", _slow)
+    assert await file_reader._run_pdf_job(1.0) == "lido"
+    with pytest.raises(asyncio.TimeoutError):
+        await hanging
+
+
+async def test_timeout_becomes_503(pdf_pool, monkeypatch):
+    monkeypatch.setattr(file_reader, "PDF_TIMEOUT_SECONDS", 0.5)
+    monkeypatch.setattr(file_reader, "extract_pdf_text", _hang)
+    upload = UploadFile(file=io.BytesIO(b"%PDF-1.4 hostil"), filename="hostil.pdf")
+
+    with pytest.raises(file_reader.HTTPException) as error:
+        await file_reader.extract_text(upload)
+
+    assert error.value.status_code == 503
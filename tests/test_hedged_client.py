@@ -0,0 +1,200 @@
+import asyncio
+import time
+
+from app.clients.hedged_client import HedgedLLMClient
+from app.domain.email_category import EmailCategory
+
+
+class FakeClient:
+    """Backend falso: responde depois de `delay` segundos, com a análise do LLM ou o fallback"""
+
+    def __init__(self, model: str, delay: float = 0.0, fallback: bool = False):
+        self.model = model
+        self.delay = delay
+        self.fallback = fallback
+        self.calls = 0
+        self.cancelled = 0
+        self.streams_closed = 0
+
+    def _result(self) -> dict:
+        return {
+            "category": EmailCategory.PRODUTIVO,
+            "suggested_reply": f"resposta do {self.model}",
+            "confidence": 0.9,
+            "fallback": self.fallback,
+        }
+
+    async def _wait(self) -> None:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+    async def analyze_async(self, content: str) -> dict:
+        await self._wait()
+        return self._result()
+
+    async def analyze_many_async(self, contents: list[str]) -> list[dict]:
+        await self._wait()
+        return [self._result() for _ in contents]
+
+    async def analyze_stream_async(self, content: str):
+        try:
+            await self._wait()
+            if not self.fallback:
+                yield "category", EmailCategory.PRODUTIVO
+                yield "delta", self.model
+            yield "result", self._result()
+        finally:
+            self.streams_closed += 1
+
+    async def aclose(self) -> None:
+        pass
+
+
+def _hedged(primary, secondary, initial_delay: float = 0.05, **kwargs) -> HedgedLLMClient:
+    return HedgedLLMClient(primary, secondary, initial_delay=initial_delay, min_delay=0.001, max_delay=5, **kwargs)
+
+
+def test_delay_is_the_percentile_of_recent_primary_latencies():
+    client = _hedged(FakeClient("p"), FakeClient("s"), initial_delay=2.0)
+    # Poucas amostras: prazo inicial
+    client._latencies["single"].extend([0.01] * 19)
+    assert client.hedge_delay() == 2.0
+
+    client._latencies["single"].clear()
+    client._latencies["single"].extend(i / 1000 for i in range(1, 101))
+    assert client.hedge_delay() == 0.096
+    # Cada tipo de chamada tem a sua janela
+    assert client.hedge_delay("batch") == 2.0
+
+
+async def test_fast_primary_does_not_call_the_secondary():
+    primary, secondary = FakeClient("p", delay=0.0), FakeClient("s")
+    client = _hedged(primary, secondary, initial_delay=0.5)
+
+    result = await client.analyze_async("email")
+
+    assert result["suggested_reply"] == "resposta do p"
+    assert secondary.calls == 0
+    assert client.stats()["hedged"] == 0
+    assert len(client._latencies["single"]) == 1
+
+
+async def test_slow_primary_past_p95_is_hedged_and_cancelled():
+    primary, secondary = FakeClient("p", delay=5.0), FakeClient("s", delay=0.01)
+    client = _hedged(primary, secondary, initial_delay=5.0)
+    client._latencies["single"].extend([0.02] * 40)
+
+    start = time.perf_counter()
+    result = await client.analyze_async("email")
+
+    assert time.perf_counter() - start < 1
+    assert result["suggested_reply"] == "resposta do s"
+    assert primary.cancelled == 1
+    stats = client.stats()
+    assert (stats["hedged"], stats["secondary_wins"], stats["failovers"]) == (1, 1, 0)
+    # A chamada cancelada entra como limite inferior da latência do primário
+    assert len(client._latencies["single"]) == 41
+
+
+async def test_primary_finishing_first_cancels_the_hedge():
+    primary, secondary = FakeClient("p", delay=0.05), FakeClient("s", delay=5.0)
+    client = _hedged(primary, secondary, initial_delay=0.01)
+
+    result = await client.analyze_async("email")
+
+    assert result["suggested_reply"] == "resposta do p"
+    assert secondary.calls == 1
+    assert secondary.cancelled == 1
+    assert client.stats()["hedged"] == 1
+    assert client.stats()["secondary_wins"] == 0
+
+
+async def test_primary_fallback_fails_over_without_waiting():
+    primary, secondary = FakeClient("p", fallback=True), FakeClient("s")
+    client = _hedged(primary, secondary, initial_delay=5.0)
+
+    start = time.perf_counter()
+    result = await client.analyze_async("email")
+
+    assert time.perf_counter() - start < 1
+    assert result["suggested_reply"] == "resposta do s"
+    assert result["fallback"] is False
+    stats = client.stats()
+    assert (stats["hedged"], stats["failovers"], stats["secondary_wins"]) == (0, 1, 1)
+    # Fallback não é latência do primário
+    assert len(client._latencies["single"]) == 0
+
+
+async def test_both_failing_returns_the_primary_fallback():
+    primary, secondary = FakeClient("p", fallback=True), FakeClient("s", fallback=True)
+    client = _hedged(primary, secondary)
+
+    result = await client.analyze_async("email")
+
+    assert result["fallback"] is True
+    assert result["suggested_reply"] == "resposta do p"
+    assert secondary.calls == 1
+    assert client.stats()["failovers"] == 1
+    assert client.stats()["secondary_wins"] == 0
+
+
+async def test_both_failing_after_a_hedge_returns_the_primary_fallback():
+    primary, secondary = FakeClient("p", delay=0.05, fallback=True), FakeClient("s", fallback=True)
+    client = _hedged(primary, secondary, initial_delay=0.01)
+
+    result = await client.analyze_async("email")
+
+    assert result["suggested_reply"] == "resposta do p"
+    assert secondary.calls == 1
+    assert client.stats()["hedged"] == 1
+
+
+async def test_hedge_budget_limits_slow_hedges():
+    primary, secondary = FakeClient("p", delay=0.03), FakeClient("s", delay=5.0)
+    client = _hedged(primary, secondary, initial_delay=0.01, max_ratio=0.0)
+
+    await client.analyze_async("email")
+    await client.analyze_async("email")
+
+    # Com max_ratio 0 só cabe um hedge na janela
+    assert client.stats()["hedged"] == 1
+    assert client.stats()["budget_exhausted"] == 1
+    assert secondary.calls == 1
+
+
+async def test_batch_fails_over_only_when_every_item_is_fallback():
+    primary, secondary = FakeClient("p", fallback=True), FakeClient("s")
+    client = _hedged(primary, secondary)
+
+    results = await client.analyze_many_async(["a", "b"])
+
+    assert [result["suggested_reply"] for result in results] == ["resposta do s"] * 2
+
+
+async def test_stream_follows_the_secondary_and_closes_the_slow_primary():
+    primary, secondary = FakeClient("p", delay=5.0), FakeClient("s", delay=0.01)
+    client = _hedged(primary, secondary, initial_delay=0.02)
+
+    events = [event async for event in client.analyze_stream_async("email")]
+
+    assert events[0] == ("category", EmailCategory.PRODUTIVO)
+    assert ("delta", "s") in events
+    assert events[-1][1]["suggested_reply"] == "resposta do s"
+    assert primary.cancelled == 1
+    assert primary.streams_closed == 1
+    assert secondary.streams_closed == 1
+
+
+async def test_stream_fails_over_when_the_primary_starts_with_a_fallback():
+    primary, secondary = FakeClient("p", fallback=True), FakeClient("s")
+    client = _hedged(primary, secondary, initial_delay=5.0)
+
+    events = [event async for event in client.analyze_stream_async("email")]
+
+    assert [kind for kind, _ in events] == ["category", "delta", "result"]
+    assert events[-1][1]["fallback"] is False
+    assert client.stats()["failovers"] == 1
@@ -0,0 +1,174 @@
+import asyncio
+import io
+import os
+import sqlite3
+import time
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.services import job_queue
+from app.services.job_queue import JobQueue
+
+TEXT = "Preciso de suporte: o pedido 123 apresenta erro, podem verificar?"
+
+
+class Analyzer:
+    """Serviço de análise falso: espera release() e repassa para o analisador real ou lança o erro"""
+
+    def __init__(self, analyzer, error: Exception | None = None):
+        self.analyzer = analyzer
+        self.error = error
+        self.calls = 0
+        self.released = asyncio.Event()
+
+    async def analyze(self, text=None, file=None):
+        self.calls += 1
+        await self.released.wait()
+        if self.error is not None:
+            raise self.error
+        return await self.analyzer.analyze(text=text, file=file)
+
+
+@pytest.fixture
+async def queue(tmp_path):
+    jobs = JobQueue(directory=str(tmp_path), workers=1)
+    yield jobs
+    await jobs.stop()
+
+
+async def _get(jobs: JobQueue, job_id: str) -> dict:
+    return await asyncio.to_thread(jobs.get, job_id)
+
+
+async def _until_final(jobs: JobQueue, job_id: str) -> dict:
+    async def wait():
+        while (job := await _get(jobs, job_id))["status"] not in ("done", "failed"):
+            await asyncio.sleep(0.01)
+        return job
+    return await asyncio.wait_for(wait(), 5)
+
+
+async def test_job_goes_through_queued_running_done(queue, analyzer):
+    fake = Analyzer(analyzer)
+    job = await queue.submit(text=TEXT)
+    assert job["status"] == "queued"
+
+    statuses = []
+    queued = asyncio.Event()
+
+    async def watch():
+        async for event in queue.watch(job["id"]):
+            statuses.append(event["status"])
+            if event["status"] == "queued":
+                queued.set()
+            elif event["status"] == "running":
+                fake.released.set()
+
+    watcher = asyncio.ensure_future(watch())
+    await asyncio.wait_for(queued.wait(), 5)
+    queue.start(fake)
+    await asyncio.wait_for(watcher, 5)
+
+    done = await _get(queue, job["id"])
+    assert statuses == ["queued", "running", "done"]
+    assert done["attempts"] == 1
+    assert done["result"]["category"] == "PRODUTIVO"
+    assert done["finished_at"] >= done["started_at"] >= done["created_at"]
+    assert queue.stats()["done"] == 1
+
+
+async def test_analysis_error_marks_the_job_failed(queue, analyzer):
+    fake = Analyzer(analyzer, error=HTTPException(status_code=422, detail="Conteúdo inválido"))
+    fake.released.set()
+    job = await queue.submit(text=TEXT)
+
+    queue.start(fake)
+    failed = await _until_final(queue, job["id"])
+
+    assert failed["status"] == "failed"
+    assert failed["status_code"] == 422
+    assert failed["detail"] == "Conteúdo inválido"
+    assert failed["result"] is None
+
+
+async def test_uploaded_file_is_removed_after_the_job(queue, analyzer, tmp_path):
+    fake = Analyzer(analyzer)
+    fake.released.set()
+    upload = UploadFile(file=io.BytesIO(TEXT.encode()), filename="email.txt")
+
+    job = await queue.submit(file=upload)
+    assert os.listdir(tmp_path / "uploads")
+
+    queue.start(fake)
+    done = await _until_final(queue, job["id"])
+
+    assert done["status"] == "done"
+    assert done["filename"] == "email.txt"
+    assert os.listdir(tmp_path / "uploads") == []
+
+
+async def test_expired_lease_is_claimed_again(queue):
+    job = await queue.submit(text=TEXT)
+
+    first = await asyncio.to_thread(queue._claim)
+    assert first[0] == job["id"]
+    # Reserva ainda válida: ninguém mais pega o job
+    assert await asyncio.to_thread(queue._claim) is None
+
+    # Worker morreu: a reserva vence e o job volta a ser reservado
+    queue._conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() - 1, job["id"]))
+    second = await asyncio.to_thread(queue._claim)
+
+    assert second[0] == job["id"]
+    assert second[4] == 2
+    assert (await _get(queue, job["id"]))["status"] == "running"
+
+
+async def test_job_interrupted_too_many_times_fails_without_running(queue, analyzer, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOBS_MAX_ATTEMPTS", 1)
+    fake = Analyzer(analyzer)
+    fake.released.set()
+    job = await queue.submit(text=TEXT)
+    await asyncio.to_thread(queue._claim)
+    queue._conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() - 1, job["id"]))
+
+    queue.start(fake)
+    failed = await _until_final(queue, job["id"])
+
+    assert failed["status"] == "failed"
+    assert failed["status_code"] == 500
+    assert failed["attempts"] == 2
+    assert fake.calls == 0
+
+
+async def test_full_queue_rejects_new_jobs(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOBS_MAX_PENDING", 1)
+    await queue.submit(text=TEXT)
+
+    with pytest.raises(HTTPException) as exc:
+        await queue.submit(text=TEXT)
+
+    assert exc.value.status_code == 503
+    assert queue.stats()["queued"] == 1
+
+
+async def test_database_lock_does_not_block_the_event_loop(queue, tmp_path):
+    await queue.submit(text=TEXT)
+    # Outro processo segurando o lock de escrita do banco
+    other = sqlite3.connect(str(tmp_path / "jobs.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    submit = asyncio.ensure_future(queue.submit(text=TEXT))
+    start = time.monotonic()
+    for _ in range(10):
+        await asyncio.sleep(0.02)
+    # O INSERT espera o lock numa thread; o loop segue atendendo
+    assert time.monotonic() - start < 1
+    assert not submit.done()
+
+    other.execute("COMMIT")
+    other.close()
+    job = await asyncio.wait_for(submit, 5)
+
+    assert job["status"] == "queued"
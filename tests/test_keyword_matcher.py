@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from app.clients.llm_client import IMPRODUTIVO_KEYWORDS, PRODUTIVO_KEYWORDS, _fallback_classify
+from app.utils.keyword_matcher import KeywordMatcher
+
+FALLBACK_KEYWORDS = PRODUTIVO_KEYWORDS | IMPRODUTIVO_KEYWORDS
+
+
+def _brute_count(keywords, text: str) -> dict:
+    """Matcher antigo: cada keyword procurada separadamente, com sobreposição"""
+    hits = {}
+    for keyword in keywords:
+        count = sum(1 for start in range(len(text)) if text.startswith(keyword, start))
+        if count:
+            hits[keyword] = count
+    return hits
+
+
+@pytest.mark.parametrize("keywords, text", [
+    ({"obrigado", "muito obrigado", "obrigada"}, "muito obrigado, muito obrigada e obrigado de novo"),
+    ({"aa", "aaa", "a"}, "aaaaa"),
+    ({"abab", "bab", "ba"}, "abababab"),
+    ({"até quando", "quando", "para quando"}, "até quando? para quando? quandoquando"),
+    ({"não funciona", "funciona", "função"}, "não funciona a função; não não funciona"),
+    ({"ção", "ação", "aprovação", "açã"}, "aprovação da ação e da reação"),
+    ({"só pra avisar", "só", "avisar"}, "só pra avisar: só avisar"),
+    ({"x"}, ""),
+    (set(), "qualquer texto"),
+])
+def test_counts_match_brute_force(keywords, text):
+    assert KeywordMatcher(keywords).count(text) == _brute_count(keywords, text)
+
+
+def test_counts_match_brute_force_on_random_overlapping_keywords():
+    rng = random.Random(7)
+    alphabet = "aãáçb "
+    for _ in range(300):
+        keywords = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))) for _ in range(rng.randint(1, 12))}
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+
+        assert KeywordMatcher(keywords).count(text) == _brute_count(keywords, text), (keywords, text)
+
+
+def test_regex_metacharacters_are_literal():
+    keywords = {"a.b", "(x)", "c++", "?"}
+
+    assert KeywordMatcher(keywords).count("a.b axb (x) c++ ?") == {"a.b": 1, "(x)": 1, "c++": 1, "?": 1}
+
+
+@pytest.mark.parametrize("text", [
+    "Muito obrigado pela ajuda, o problema foi resolvido e funcionou!",
+    "Preciso de suporte urgente: o sistema não funciona. Até quando fica o chamado?",
+    "Só informando que a aprovação saiu. Parabéns e obrigada!",
+    "Bom dia",
+])
+def test_fallback_keyword_hits_match_old_matcher(text):
+    lowered = text.lower()
+    result = _fallback_classify(text)
+
+    assert result["keyword_hits"] == _brute_count(FALLBACK_KEYWORDS, lowered)
+    # Os scores continuam contando keywords distintas presentes no texto
+    produtivo = sum(1 for kw in PRODUTIVO_KEYWORDS if kw in lowered)
+    improdutivo = sum(1 for kw in IMPRODUTIVO_KEYWORDS if kw in lowered)
+    assert f"produtivo_score={produtivo}, improdutivo_score={improdutivo}" in result["reason"]
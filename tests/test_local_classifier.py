@@ -0,0 +1,73 @@
+import pytest
+
+from app.domain.email_category import EmailCategory
+from app.services.local_classifier import LocalClassifier, LocalTierRouter
+from app.utils.text_preprocessor import preprocess_text
+
+PRODUTIVOS = [
+    "preciso de suporte o sistema apresenta erro 500 ao gerar o boleto",
+    "solicito o status do chamado aberto ontem sobre o erro no login",
+    "podem verificar o erro no pedido o sistema não finaliza a compra",
+    "o relatório apresenta erro e preciso de suporte urgente",
+]
+IMPRODUTIVOS = [
+    "feliz natal a toda a equipe",
+    "parabéns pelo aniversário tudo de bom",
+    "feliz ano novo a todos",
+    "parabéns pela conquista equipe",
+]
+
+
+@pytest.fixture(scope="module")
+def imbalanced_classifier() -> LocalClassifier:
+    # Corpus desbalanceado: o viés sozinho já passa do limiar
+    contents = PRODUTIVOS * 20 + IMPRODUTIVOS
+    labels = [EmailCategory.PRODUTIVO] * len(PRODUTIVOS) * 20 + [EmailCategory.IMPRODUTIVO] * len(IMPRODUTIVOS)
+    return LocalClassifier.train(contents, labels)
+
+
+def test_separates_the_training_classes(imbalanced_classifier):
+    assert imbalanced_classifier.predict_proba(preprocess_text("Preciso de suporte: erro 500 no boleto")) > 0.5
+    assert imbalanced_classifier.predict_proba(preprocess_text("Feliz Natal, equipe!")) < 0.5
+
+
+def test_unknown_vocabulary_has_no_probability(imbalanced_classifier):
+    assert imbalanced_classifier.predict_proba("xyzzy quux lorem ipsum") is None
+    assert imbalanced_classifier.predict_proba("") is None
+
+
+def test_router_escalates_email_without_known_terms(imbalanced_classifier):
+    router = LocalTierRouter(imbalanced_classifier, threshold=0.5)
+
+    assert router.classify("xyzzy quux lorem ipsum") is None
+    assert router.stats()["escalated_to_llm"] == 1
+    assert router.stats()["served_locally"] == 0
+
+
+def test_router_answers_confident_emails_locally(imbalanced_classifier):
+    router = LocalTierRouter(imbalanced_classifier, threshold=0.6)
+
+    result = router.classify(preprocess_text("Preciso de suporte, erro 500 ao gerar o boleto"))
+
+    assert result["category"] is EmailCategory.PRODUTIVO
+    assert result["tier"] == "local"
+    assert result["fallback"] is False
+
+
+def test_router_escalates_below_threshold(imbalanced_classifier):
+    router = LocalTierRouter(imbalanced_classifier, threshold=1.0)
+
+    assert router.classify(preprocess_text("Preciso de suporte, erro 500")) is None
+
+
+def test_save_and_load_round_trip(imbalanced_classifier, tmp_path):
+    path = str(tmp_path / "model.json")
+    imbalanced_classifier.save(path)
+    loaded = LocalClassifier.load(path)
+    content = preprocess_text("solicito o status do chamado")
+
+    assert loaded.predict_proba(content) == pytest.approx(imbalanced_classifier.predict_proba(content), abs=1e-4)
+
+
+def test_disabled_router_always_escalates():
+    assert LocalTierRouter().classify("qualquer texto") is None
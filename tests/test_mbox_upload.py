@@ -0,0 +1,176 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from app.api import routes
+from app.exceptions import http_exception_handler
+from app.main import app
+from app.middleware import UploadSizeLimitMiddleware
+from app.utils.mime_reader import ParsedEmail
+
+BOUNDARY = "limite-do-teste"
+FIRST = (
+    b"From a@example.com\nSubject: Suporte\nMessage-ID: <1@example.com>\n\n"
+    b"Preciso de suporte: o pedido 123 apresenta erro, podem verificar?\n\n"
+)
+SECOND = b"From b@example.com\nSubject: Obrigado\nMessage-ID: <2@example.com>\n\nMuito obrigado pela ajuda!\n"
+
+
+def _part_header(name: str = "file", filename: str = "caixa.mbox") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        "Content-Type: application/mbox\r\n\r\n"
+    ).encode()
+
+
+CLOSING = f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+class Client:
+    """Cliente ASGI que envia o corpo aos pedaços, quando o teste mandar"""
+
+    def __init__(self, app, path: str = "/api/analyze/mbox"):
+        self.app = app
+        self.path = path
+        self.body: asyncio.Queue = asyncio.Queue()
+        self.messages: list = []
+
+    def send_body(self, chunk: bytes, more: bool = True) -> None:
+        self.body.put_nowait({"type": "http.request", "body": chunk, "more_body": more})
+
+    async def request(self, content_type: str = f"multipart/form-data; boundary={BOUNDARY}") -> None:
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": self.path, "raw_path": self.path.encode(), "root_path": "",
+            "query_string": b"", "headers": [(b"content-type", content_type.encode())],
+            "client": ("test", 1), "server": ("test", 80),
+        }
+
+        async def send(message):
+            self.messages.append(message)
+
+        # Depois do corpo, receive() fica esperando como um cliente ainda conectado
+        await self.app(scope, self.body.get, send)
+
+    @property
+    def status(self) -> int | None:
+        starts = [message for message in self.messages if message["type"] == "http.response.start"]
+        return starts[0]["status"] if starts else None
+
+    @property
+    def lines(self) -> list[dict]:
+        body = b"".join(message.get("body", b"") for message in self.messages if message["type"] == "http.response.body")
+        return [json.loads(line) for line in body.splitlines() if line]
+
+
+@pytest.fixture
+def service(analyzer, monkeypatch):
+    monkeypatch.setattr(routes, "analyzer", analyzer)
+    return analyzer
+
+
+async def _until(condition, timeout: float = 5.0) -> None:
+    async def wait():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(wait(), timeout)
+
+
+async def test_results_stream_while_the_upload_is_still_arriving(service):
+    client = Client(app)
+    request = asyncio.ensure_future(client.request())
+
+    # A linha "From " da segunda mensagem fecha a primeira
+    client.send_body(_part_header() + FIRST + SECOND[:25])
+    await _until(lambda: client.lines)
+
+    assert client.status == 200
+    assert not request.done()
+    assert client.lines[0]["id"] == "<1@example.com>"
+    assert client.lines[0]["ok"] is True
+
+    client.send_body(SECOND[25:] + CLOSING, more=False)
+    await asyncio.wait_for(request, 5)
+
+    assert [line["id"] for line in client.lines] == ["<1@example.com>", "<2@example.com>"]
+    assert [line["index"] for line in client.lines] == [0, 1]
+
+
+async def test_missing_file_field_is_rejected_before_streaming(service):
+    client = Client(app)
+    client.send_body(_part_header(name="texto") + b"conteudo" + CLOSING, more=False)
+
+    await asyncio.wait_for(client.request(), 5)
+
+    assert client.status == 400
+
+
+async def test_non_multipart_body_is_rejected(service):
+    client = Client(app)
+    client.send_body(FIRST, more=False)
+
+    await asyncio.wait_for(client.request(content_type="application/mbox"), 5)
+
+    assert client.status == 400
+
+
+async def test_size_limit_hit_mid_stream_becomes_the_last_line(service):
+    limited = FastAPI()
+    limited.include_router(routes.router, prefix="/api")
+    limited.add_exception_handler(HTTPException, http_exception_handler)
+    header = _part_header() + FIRST + SECOND[:25]
+    limited = UploadSizeLimitMiddleware(limited, max_size=10, path_limits={"/api/analyze/mbox": len(header) + 10})
+    client = Client(limited)
+    request = asyncio.ensure_future(client.request())
+
+    client.send_body(header)
+    await _until(lambda: client.lines)
+    client.send_body(b"x" * 100)
+    await asyncio.wait_for(request, 5)
+
+    assert client.status == 200
+    assert client.lines[0]["ok"] is True
+    assert client.lines[-1]["ok"] is False
+    assert client.lines[-1]["status_code"] == 413
+
+
+async def test_analyze_stream_keeps_order_and_bounds_concurrency(analyzer, monkeypatch):
+    in_flight, peak = 0, 0
+
+    async def analyze(text, input_type):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        # As primeiras demoram mais: a ordem de saída é a de entrada, não a de término
+        await asyncio.sleep(0.05 if text in ("0", "1") else 0.0)
+        in_flight -= 1
+        return text
+
+    async def messages():
+        for index in range(6):
+            yield ParsedEmail(str(index), "", "")
+
+    monkeypatch.setattr(analyzer, "_analyze_message", analyze)
+    results = [outcome async for _, outcome in analyzer.analyze_stream(messages(), concurrency=2)]
+
+    assert results == ["0", "1", "2", "3", "4", "5"]
+    assert peak == 2
+
+
+async def test_analyze_stream_reraises_source_errors(analyzer, monkeypatch):
+    async def analyze(text, input_type):
+        return text
+
+    async def messages():
+        yield ParsedEmail("0", "", "")
+        raise HTTPException(status_code=413, detail="grande demais")
+
+    monkeypatch.setattr(analyzer, "_analyze_message", analyze)
+    stream = analyzer.analyze_stream(messages())
+
+    assert (await stream.__anext__())[1] == "0"
+    with pytest.raises(HTTPException):
+        await stream.__anext__()
@@ -0,0 +1,109 @@
+import json
+import os
+
+from app.metrics import CallbackMetric, Counter, Histogram, Registry
+from app.shared_state import SharedState
+
+
+def _lines(text: str, prefix: str) -> list[str]:
+    return [line for line in text.splitlines() if line.startswith(prefix)]
+
+
+def _published(registry: Registry) -> dict:
+    # Os retratos passam pelo SQLite como JSON: tuplas viram listas
+    return json.loads(json.dumps(registry.snapshot()))
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.register(Histogram("latency_seconds", "Latência", ("stage",), buckets=(0.1, 1.0)))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "llm")
+
+    text = registry.render()
+
+    assert "# TYPE latency_seconds histogram" in text
+    assert _lines(text, "latency_seconds_") == [
+        'latency_seconds_bucket{stage="llm",le="0.1"} 2',
+        'latency_seconds_bucket{stage="llm",le="1"} 3',
+        'latency_seconds_bucket{stage="llm",le="+Inf"} 4',
+        'latency_seconds_sum{stage="llm"} 3.65',
+        'latency_seconds_count{stage="llm"} 4',
+    ]
+
+
+def test_counter_labels_are_escaped_and_sorted():
+    registry = Registry()
+    counter = registry.register(Counter("analyses_total", "Análises", ("category",)))
+    counter.inc("b")
+    counter.inc('a"\n\\', amount=2)
+
+    assert _lines(registry.render(), "analyses_total") == [
+        'analyses_total{category="a\\"\\n\\\\"} 2',
+        'analyses_total{category="b"} 1',
+    ]
+
+
+def test_render_sums_workers():
+    workers = []
+    for observations in ((0.05, 0.5), (0.05, 5.0)):
+        registry = Registry()
+        histogram = registry.register(Histogram("latency_seconds", "Latência", buckets=(0.1, 1.0)))
+        counter = registry.register(Counter("analyses_total", "Análises", ("category",)))
+        for value in observations:
+            histogram.observe(value)
+            counter.inc("PRODUTIVO")
+        workers.append((True, _published(registry)))
+
+    text = registry.render(workers)
+
+    assert _lines(text, "latency_seconds_") == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 5.6",
+        "latency_seconds_count 4",
+    ]
+    assert _lines(text, "analyses_total{") == ['analyses_total{category="PRODUTIVO"} 4']
+
+
+def _callback_registry(value: float) -> Registry:
+    registry = Registry()
+    registry.register(CallbackMetric("cache_hits_total", "Hits", lambda: value, type="counter"))
+    registry.register(CallbackMetric("queue_size", "Fila", lambda: value))
+    registry.register(CallbackMetric("circuit_state", "Circuito", lambda: value, aggregate="max"))
+    return registry
+
+
+def test_callback_counters_keep_dead_workers_and_gauges_do_not():
+    live = (True, _published(_callback_registry(3)))
+    other_live = (True, _published(_callback_registry(1)))
+    dead = (False, _published(_callback_registry(10)))
+
+    text = _callback_registry(0).render([live, other_live, dead])
+
+    assert _lines(text, "cache_hits_total ") == ["cache_hits_total 14"]
+    assert _lines(text, "queue_size ") == ["queue_size 4"]
+    assert _lines(text, "circuit_state ") == ["circuit_state 3"]
+
+
+def test_gauge_without_live_workers_is_omitted():
+    text = _callback_registry(0).render([(False, _published(_callback_registry(5)))])
+
+    assert _lines(text, "cache_hits_total ") == ["cache_hits_total 5"]
+    assert _lines(text, "queue_size ") == []
+    assert "# TYPE queue_size gauge" in text
+
+
+def test_shared_state_round_trip_and_retired_worker(tmp_path):
+    state = SharedState(str(tmp_path / "state.db"))
+    registry = _callback_registry(2)
+    state.publish_metrics(registry.snapshot())
+
+    assert _lines(registry.render(state.metric_snapshots()), "queue_size ") == ["queue_size 2"]
+
+    state.retire_worker(os.getpid())
+    text = registry.render(state.metric_snapshots())
+
+    assert _lines(text, "queue_size ") == []
+    assert _lines(text, "cache_hits_total ") == ["cache_hits_total 2"]
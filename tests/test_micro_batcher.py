@@ -0,0 +1,125 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.clients.circuit_breaker import CircuitState
+from app.clients.llm_client import OpenAILLMClient
+from app.domain.email_category import EmailCategory
+from app.services.micro_batcher import MicroBatcher
+
+
+class Recorder:
+    """process_batch falso: guarda os lotes e responde um resultado por email"""
+
+    def __init__(self, error: Exception | None = None, drop_last: bool = False):
+        self.batches = []
+        self.error = error
+        self.drop_last = drop_last
+
+    async def __call__(self, contents):
+        self.batches.append(list(contents))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        results = [{"email": content} for content in contents]
+        return results[:-1] if self.drop_last else results
+
+
+async def test_flushes_when_max_items_is_reached():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, window_ms=10_000, max_items=3)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*(batcher.submit(f"email {i}") for i in range(3))), timeout=1
+    )
+
+    assert results == [{"email": f"email {i}"} for i in range(3)]
+    assert recorder.batches == [["email 0", "email 1", "email 2"]]
+    assert batcher.stats()["flush_reasons"] == {"window": 0, "max_items": 1, "max_tokens": 0}
+
+
+async def test_flushes_at_the_end_of_the_window():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, window_ms=30, max_items=100)
+    loop = asyncio.get_running_loop()
+
+    start = loop.time()
+    results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+
+    assert loop.time() - start >= 0.025
+    assert results == [{"email": "a"}, {"email": "b"}]
+    assert recorder.batches == [["a", "b"]]
+    assert batcher.stats()["flush_reasons"]["window"] == 1
+
+
+async def test_flushes_before_exceeding_the_token_budget():
+    recorder = Recorder()
+    # ~25 tokens por email (4 caracteres por token): dois não cabem em 40
+    batcher = MicroBatcher(recorder, window_ms=20, max_items=100, max_tokens=40)
+
+    await asyncio.gather(batcher.submit("x" * 100), batcher.submit("y" * 100))
+
+    assert recorder.batches == [["x" * 100], ["y" * 100]]
+    assert batcher.stats()["flush_reasons"]["max_tokens"] == 1
+
+
+async def test_batch_failure_reaches_every_waiter():
+    batcher = MicroBatcher(Recorder(error=RuntimeError("LLM fora do ar")), window_ms=10, max_items=2)
+
+    results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    assert [str(result) for result in results] == ["LLM fora do ar", "LLM fora do ar"]
+
+
+async def test_wrong_number_of_results_fails_the_batch():
+    batcher = MicroBatcher(Recorder(drop_last=True), window_ms=10, max_items=2)
+
+    results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_cancelled_waiter_does_not_affect_the_rest_of_the_batch():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, window_ms=20, max_items=100)
+
+    cancelled = asyncio.ensure_future(batcher.submit("desistiu"))
+    kept = asyncio.ensure_future(batcher.submit("esperou"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    assert await kept == {"email": "esperou"}
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    assert recorder.batches == [["desistiu", "esperou"]]
+
+
+def _batch_response(items) -> SimpleNamespace:
+    return SimpleNamespace(output_text=json.dumps({"results": items}), usage=None)
+
+
+async def test_invalid_items_fall_back_one_by_one(monkeypatch):
+    client = OpenAILLMClient(api_key="test")
+    response = _batch_response([
+        {"id": 0, "category": "PRODUTIVO", "suggested_reply": "Vamos verificar.", "confidence": 0.91, "reason": "Pedido"},
+        {"id": 1, "category": "INEXISTENTE", "suggested_reply": "?", "confidence": 0.5, "reason": "?"},
+        # id 2 ausente
+    ])
+
+    async def create(request, estimated_tokens, stream=False):
+        return response, 0.1
+
+    monkeypatch.setattr(client, "_create_async", create)
+    results = await client.analyze_many_async([
+        "Preciso de suporte com o pedido 123, está com erro.",
+        "Muito obrigado pela ajuda!",
+        "Qual o status do chamado?",
+    ])
+
+    assert results[0]["category"] == EmailCategory.PRODUTIVO
+    assert results[0]["fallback"] is False
+    assert results[1]["fallback"] is True
+    assert results[2]["fallback"] is True
+    assert client.breaker.state is CircuitState.CLOSED
@@ -0,0 +1,174 @@
+from email.message import EmailMessage
+
+from app.utils.mime_reader import MAX_LINE_BYTES, iter_lines, iter_mbox, parse_eml
+
+
+def _chunks(data: bytes, size: int = 7):
+    # Blocos pequenos: linhas e sequências base64 cortadas no meio
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def _message(body: str = "O sistema apresenta erro ao gerar o boleto.", subject: str = "Erro no boleto") -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = "cliente@example.com"
+    message["To"] = "suporte@example.com"
+    message["Message-ID"] = "<abc@example.com>"
+    message.set_content(body)
+    return message
+
+
+def test_plain_message_text_and_headers():
+    parsed = parse_eml(_chunks(_message().as_bytes()))
+
+    assert parsed.subject == "Erro no boleto"
+    assert parsed.message_id == "<abc@example.com>"
+    assert parsed.text == "Erro no boleto\n\nO sistema apresenta erro ao gerar o boleto."
+
+
+def test_encoded_subject_is_decoded():
+    message = _message(subject="Solicitação de reembolso")
+    raw = message.as_bytes()
+
+    assert b"=?utf-8?" in raw
+    assert parse_eml(_chunks(raw)).subject == "Solicitação de reembolso"
+
+
+def test_base64_and_quoted_printable_bodies():
+    body = "Não recebi a fatura de março; poderiam reenviar? " * 20
+    for encoding in ("base64", "quoted-printable"):
+        message = EmailMessage()
+        message["Subject"] = "Fatura"
+        message.set_content(body, cte=encoding)
+
+        assert parse_eml(_chunks(message.as_bytes())).text == f"Fatura\n\n{body.strip()}"
+
+
+def test_prefers_plain_over_html_and_skips_attachments():
+    message = _message("Texto puro do email.")
+    message.add_alternative("<html><body><p>Versão <b>HTML</b></p></body></html>", subtype="html")
+    message.add_attachment(b"\x89PNG" + bytes(range(256)) * 50, maintype="image", subtype="png", filename="print.png")
+    message.add_attachment("conteúdo do anexo em texto", filename="notas.txt")
+
+    text = parse_eml(_chunks(message.as_bytes(), size=64)).text
+
+    assert "Texto puro do email." in text
+    assert "HTML" not in text
+    assert "PNG" not in text
+    assert "conteúdo do anexo" not in text
+
+
+def test_html_only_message_drops_tags():
+    message = EmailMessage()
+    message["Subject"] = "Convite"
+    message.set_content(
+        "<html><head><style>p {color: red}</style></head>"
+        "<body><p>Olá&nbsp;equipe,</p><p>confirmem presença.</p><script>alert(1)</script></body></html>",
+        subtype="html",
+    )
+
+    text = parse_eml(_chunks(message.as_bytes())).text
+
+    assert "Olá\xa0equipe," in text
+    assert "confirmem presença." in text
+    assert "<p>" not in text and "color" not in text and "alert" not in text
+
+
+def test_inline_forwarded_message_is_read():
+    forwarded = _message("Conteúdo da mensagem encaminhada.", subject="Original")
+    message = _message("Veja abaixo.", subject="Fwd: Original")
+    message.make_mixed()
+    message.attach(_as_inline_rfc822(forwarded))
+
+    text = parse_eml(_chunks(message.as_bytes())).text
+
+    assert "Veja abaixo." in text
+    assert "Conteúdo da mensagem encaminhada." in text
+
+
+def _as_inline_rfc822(inner: EmailMessage) -> EmailMessage:
+    part = EmailMessage()
+    part.set_content(inner)
+    del part["Content-Disposition"]
+    return part
+
+
+def test_text_is_capped_at_max_chars():
+    parsed = parse_eml(_chunks(_message("x" * 10000).as_bytes(), size=512), max_chars=100)
+
+    assert len(parsed.text) <= 100 + len("Erro no boleto\n\n")
+
+
+def test_mbox_splits_messages_and_unescapes_from_lines():
+    mbox = (
+        b"From cliente@example.com Mon Mar  3 10:00:00 2025\n"
+        b"Subject: Primeiro\n"
+        b"\n"
+        b"Pedido 1 atrasado.\n"
+        b">From the team: obrigado\n"
+        b"\n"
+        b"From outro@example.com Mon Mar  3 11:00:00 2025\n"
+        b"Subject: Segundo\n"
+        b"\n"
+        b"Feliz Natal!\n"
+    )
+
+    messages = list(iter_mbox(_chunks(mbox)))
+
+    assert [message.subject for message in messages] == ["Primeiro", "Segundo"]
+    assert messages[0].text == "Primeiro\n\nPedido 1 atrasado.\nFrom the team: obrigado"
+    assert messages[1].text == "Segundo\n\nFeliz Natal!"
+
+
+def test_from_inside_body_without_blank_line_is_not_a_separator():
+    mbox = b"From a@example.com\nSubject: Um\n\nlinha\nFrom here on, texto\n"
+
+    messages = list(iter_mbox([mbox]))
+
+    assert len(messages) == 1
+    assert "From here on, texto" in messages[0].text
+
+
+def test_mbox_is_streamed_one_message_at_a_time():
+    def chunks():
+        for index in range(3):
+            yield f"From x@example.com\nSubject: Msg {index}\n\ncorpo {index}\n\n".encode()
+            produced.append(index)
+
+    produced = []
+    messages = iter_mbox(chunks())
+
+    assert next(messages).subject == "Msg 0"
+    assert produced == [0]
+
+
+def test_long_lines_are_split():
+    lines = list(iter_lines([b"a" * (MAX_LINE_BYTES * 2 + 10), b"\nfim"]))
+
+    assert [len(line) for line in lines] == [MAX_LINE_BYTES, MAX_LINE_BYTES, 11, 3]
+
+
+async def test_mbox_endpoint_returns_one_line_per_message(api_client):
+    mbox = (
+        b"From a@example.com\nSubject: Suporte\nMessage-ID: <1@example.com>\n\n"
+        b"Preciso de suporte: o pedido 123 apresenta erro, podem verificar?\n\n"
+        b"From b@example.com\nSubject: Sem corpo\nMessage-ID: <2@example.com>\n\n\n"
+    )
+
+    response = await api_client.post("/api/analyze/mbox", files={"file": ("caixa.mbox", mbox, "application/mbox")})
+
+    lines = [line for line in response.text.splitlines() if line]
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert len(lines) == 2
+    assert '"id":"<1@example.com>"' in lines[0] and '"ok":true' in lines[0]
+    assert '"index":1' in lines[1]
+
+
+async def test_eml_upload_is_analyzed(api_client):
+    raw = _message("Solicito o cancelamento do pedido 987, cobrado em duplicidade.").as_bytes()
+
+    response = await api_client.post("/api/analyze", files={"file": ("email.eml", raw, "message/rfc822")})
+
+    assert response.status_code == 200
+    assert response.json()["category"] == "PRODUTIVO"
@@ -0,0 +1,148 @@
+import time
+
+from app.clients.llm_client import DEFAULT_REPLIES
+from app.domain.email_category import EmailCategory
+from app.services.near_duplicate import MinHasher, NearDuplicateIndex, shingles
+
+TEMPLATE = (
+    "prezado {name} informamos que o chamado {ticket} referente ao pagamento de {amount} "
+    "foi registrado e sera analisado pela equipe financeira ate o fim do mes corrente"
+)
+
+
+def _email(name: str = "joao", ticket: str = "48213", amount: str = "1500") -> str:
+    return TEMPLATE.format(name=name, ticket=ticket, amount=amount)
+
+
+def _llm_result(reply: str = "Olá João, o chamado 48213 de R$ 1500 foi registrado.") -> dict:
+    return {
+        "category": EmailCategory.PRODUTIVO,
+        "suggested_reply": reply,
+        "confidence": 0.93,
+        "reason": "Pedido de acompanhamento",
+        "usage": {"total_tokens": 120},
+    }
+
+
+async def _indexed(index: NearDuplicateIndex, key: str, content: str, result: dict | None = None) -> None:
+    found, signature = index.lookup(content)
+    assert found is None
+    await index.add(key, signature, result or _llm_result())
+
+
+async def test_near_duplicate_reuses_category_with_default_reply():
+    index = NearDuplicateIndex(max_size=10, threshold=0.8)
+    await _indexed(index, "a", _email())
+
+    found, _ = index.lookup(_email(name="maria"))
+
+    assert found["category"] == EmailCategory.PRODUTIVO
+    assert found["confidence"] == 0.93
+    assert found["tier"] == "near_duplicate"
+    assert found["fallback"] is False
+    # A resposta gerada para João (nome, protocolo, valor) não vai para Maria
+    assert found["suggested_reply"] == DEFAULT_REPLIES[EmailCategory.PRODUTIVO]
+    assert "usage" not in found
+    assert index.stats()["hits"] == 1
+
+
+async def test_different_email_is_a_miss():
+    index = NearDuplicateIndex(max_size=10, threshold=0.8)
+    await _indexed(index, "a", _email())
+
+    found, signature = index.lookup(
+        "bom dia segue em anexo a apresentacao da reuniao de planejamento trimestral com as metas do time comercial"
+    )
+
+    assert found is None
+    assert signature is not None
+    assert index.stats()["misses"] == 2
+
+
+def test_short_emails_are_skipped():
+    index = NearDuplicateIndex(max_size=10, min_tokens=10)
+
+    assert index.lookup("obrigado pelo retorno") == (None, None)
+    assert index.stats()["skipped_short"] == 1
+
+
+async def test_disabled_index_never_matches():
+    index = NearDuplicateIndex(max_size=0)
+
+    assert index.lookup(_email()) == (None, None)
+    await index.add("a", None, _llm_result())
+    assert index.stats()["size"] == 0
+
+
+async def test_lru_evicts_least_recently_used():
+    index = NearDuplicateIndex(max_size=2, threshold=0.8)
+    others = [
+        "bom dia segue em anexo a apresentacao da reuniao de planejamento trimestral com as metas do time comercial",
+        "ola equipe o servidor de homologacao ficara indisponivel no sabado para manutencao programada da base de dados",
+    ]
+    await _indexed(index, "a", _email())
+    await _indexed(index, "b", others[0])
+    assert index.lookup(_email(name="maria"))[0] is not None  # "a" passa a ser o mais recente
+    await _indexed(index, "c", others[1])
+
+    assert index.lookup(_email(name="ana"))[0] is not None
+    assert index.lookup(others[0].replace("bom dia", "boa tarde"))[0] is None
+    assert index.stats()["size"] == 2
+
+
+async def test_persisted_index_keeps_only_category_and_confidence(tmp_path):
+    path = str(tmp_path / "near_dup.db")
+    index = NearDuplicateIndex(max_size=10, threshold=0.8, sqlite_path=path, version="m:v1")
+    await _indexed(index, "a", _email())
+
+    reloaded = NearDuplicateIndex(max_size=10, threshold=0.8, sqlite_path=path, version="m:v1")
+    found, _ = reloaded.lookup(_email(name="maria"))
+
+    assert found["category"] == EmailCategory.PRODUTIVO
+    assert found["suggested_reply"] == DEFAULT_REPLIES[EmailCategory.PRODUTIVO]
+    assert reloaded._entries["a"][1] == {"category": EmailCategory.PRODUTIVO, "confidence": 0.93}
+
+
+async def test_new_version_discards_persisted_index(tmp_path):
+    path = str(tmp_path / "near_dup.db")
+    await _indexed(NearDuplicateIndex(max_size=10, sqlite_path=path, version="m:v1"), "a", _email())
+
+    reloaded = NearDuplicateIndex(max_size=10, sqlite_path=path, version="m:v2")
+
+    assert reloaded.stats()["size"] == 0
+
+
+async def test_persisted_index_drops_evicted_entries(tmp_path):
+    path = str(tmp_path / "near_dup.db")
+    index = NearDuplicateIndex(max_size=1, threshold=0.8, sqlite_path=path, version="m:v1")
+    await _indexed(index, "a", _email())
+    await _indexed(index, "b", "bom dia segue em anexo a apresentacao da reuniao de planejamento trimestral com as metas")
+
+    rows = index._conn.execute("SELECT key FROM near_duplicates").fetchall()
+
+    assert rows == [("b",)]
+
+
+def test_signature_samples_long_emails_consistently():
+    hasher = MinHasher(max_features=64)
+    features = shingles([f"palavra{i}" for i in range(900)])
+    reordered = shingles([f"palavra{i}" for i in range(900)][::-1])
+
+    assert hasher.signature(features) == hasher.signature(reordered)
+    # Emails curtos não são amostrados
+    assert MinHasher(max_features=64).signature({"a", "b"}) == MinHasher(max_features=0).signature({"a", "b"})
+
+
+def test_signature_cost_is_bounded_by_sample():
+    tokens = [f"palavra{i}" for i in range(5000)]
+    capped = MinHasher(max_features=64)
+    uncapped = MinHasher(max_features=0)
+
+    start = time.perf_counter()
+    capped.signature(shingles(tokens))
+    capped_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    uncapped.signature(shingles(tokens))
+    uncapped_seconds = time.perf_counter() - start
+
+    assert capped_seconds * 5 < uncapped_seconds
@@ -0,0 +1,353 @@
+import asyncio
+import sqlite3
+import time
+
+import httpx
+import openai
+import pytest
+
+from app.clients import llm_client
+from app.clients.circuit_breaker import CircuitBreaker, CircuitState
+from app.clients.llm_client import OpenAILLMClient
+from app.clients.rate_limiter import (
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    AdaptiveRateLimiter,
+    TokenBucket,
+    _parse_duration,
+    _retry_after,
+)
+from app.shared_state import SharedState
+
+
+class FakeClock:
+    def __init__(self, now: float = 100.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_bucket_refills_up_to_burst_capacity():
+    bucket = TokenBucket(limit=600, now=0.0, burst_seconds=1.0)
+    assert bucket.capacity == 10
+
+    bucket.take(10)
+    assert bucket.time_until(1, now=0.0) == pytest.approx(0.1)
+    assert bucket.time_until(5, now=0.2) == pytest.approx(0.3)
+    bucket.refill(now=60.0)
+    assert bucket.level == 10
+
+
+def test_bucket_deficit_delays_next_requests():
+    bucket = TokenBucket(limit=60, now=0.0)
+    bucket.take(3)
+
+    assert bucket.level == -2
+    assert bucket.time_until(1, now=0.0) == pytest.approx(3.0)
+
+
+def test_disabled_bucket_never_waits():
+    bucket = TokenBucket(limit=0, now=0.0)
+    bucket.take(1000)
+
+    assert bucket.time_until(10**6, now=0.0) == 0.0
+
+
+def test_parse_openai_durations_and_retry_after():
+    assert _parse_duration("6m0s") == 360
+    assert _parse_duration("120ms") == pytest.approx(0.12)
+    assert _parse_duration("1h2m3.5s") == pytest.approx(3723.5)
+    assert _retry_after({"retry-after-ms": "250"}) == 0.25
+    assert _retry_after({"retry-after": "2"}) == 2
+    assert _retry_after({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "1.5s"}) == 1.5
+    assert _retry_after({"x-ratelimit-remaining-tokens": "10", "x-ratelimit-reset-tokens": "1.5s"}) is None
+
+
+async def test_acquire_is_immediate_while_tokens_last():
+    limiter = AdaptiveRateLimiter(rpm=120, tpm=0, clock=FakeClock())
+
+    assert await limiter.acquire(100)
+    assert await limiter.acquire(100)
+    assert limiter.stats()["granted"] == 2
+
+
+async def test_acquire_gives_up_when_wait_exceeds_deadline():
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(rpm=60, tpm=0, clock=clock)
+    assert await limiter.acquire(1)
+
+    assert not await limiter.acquire(1, deadline=clock.now + 0.5)
+    assert limiter.stats()["rejected_latency_budget"] == 1
+
+
+async def test_token_budget_limits_large_requests():
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(rpm=0, tpm=6000, clock=clock)
+
+    assert await limiter.acquire(100)
+    assert not await limiter.acquire(100, deadline=clock.now + 0.5)
+
+
+async def test_waiters_are_served_by_priority():
+    limiter = AdaptiveRateLimiter(rpm=6000, tpm=0)
+    limiter.requests.take(limiter.requests.level)
+    served = []
+
+    async def request(name, priority):
+        assert await limiter.acquire(1, priority)
+        served.append(name)
+
+    bulk = asyncio.ensure_future(request("bulk", PRIORITY_BULK))
+    await asyncio.sleep(0)
+    interactive = asyncio.ensure_future(request("interactive", PRIORITY_INTERACTIVE))
+    await asyncio.gather(bulk, interactive)
+
+    assert served == ["interactive", "bulk"]
+
+
+async def test_rate_limited_pauses_all_calls():
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(rpm=0, tpm=0, clock=clock)
+
+    assert await limiter.on_rate_limited({"retry-after": "3"}) == 3
+    assert not await limiter.acquire(1, deadline=clock.now + 2)
+    clock.now += 3
+    assert await limiter.acquire(1, deadline=clock.now)
+
+
+async def test_headers_adjust_limits_and_remaining():
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(rpm=500, tpm=200_000, clock=clock)
+
+    await limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "60",
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-limit-tokens": "1000",
+    })
+
+    stats = limiter.stats()
+    assert (stats["rpm_limit"], stats["tpm_limit"]) == (60, 1000)
+    assert stats["available_requests"] == 0
+
+
+async def test_usage_corrects_token_estimate():
+    limiter = AdaptiveRateLimiter(rpm=0, tpm=60_000, clock=FakeClock())
+    start = limiter.tokens.level
+
+    await limiter.record_usage(estimated=100, actual=300)
+
+    assert limiter.tokens.level == start - 200
+
+
+def _shared(tmp_path, clock=None, **limits) -> AdaptiveRateLimiter:
+    limits = {"rpm": 120, "tpm": 0, **limits}
+    return AdaptiveRateLimiter(**limits, clock=clock, name="m", state=SharedState(str(tmp_path / "state.db")))
+
+
+async def test_shared_buckets_split_the_limit_between_processes(tmp_path):
+    clock = FakeClock(1_000_000.0)
+    first, second = _shared(tmp_path, clock), _shared(tmp_path, clock)
+
+    assert await first.acquire(1)
+    assert await first.acquire(1)
+
+    # Capacidade 2: o segundo processo encontra o balde vazio e estima a espera pelo saldo lido
+    assert not await second._try_take(1, clock.now)
+    assert second._ready_in(1, clock.now) == pytest.approx(0.5)
+    assert not await second.acquire(1, deadline=clock.now + 0.1)
+
+    await second.on_rate_limited({"retry-after": "5"})
+    clock.now += 1
+    assert not await first.acquire(1, deadline=clock.now + 1)
+    assert first.paused_until == 1_000_005.0
+
+
+async def test_shared_take_is_all_or_nothing(tmp_path):
+    clock = FakeClock(1_000_000.0)
+    # Capacidade: 2 requisições e 1000 tokens
+    limiter = _shared(tmp_path, clock, tpm=60_000)
+
+    assert await limiter._try_take(900, clock.now)
+    assert not await limiter._try_take(900, clock.now)
+
+    stats = limiter.stats()
+    # A tentativa negada não descontou a requisição
+    assert (stats["available_requests"], stats["available_tokens"]) == (1, 100)
+
+
+async def test_shared_headers_usage_and_limits(tmp_path):
+    clock = FakeClock(1_000_000.0)
+    limiter = _shared(tmp_path, clock, rpm=500, tpm=200_000)
+    other = _shared(tmp_path, clock, rpm=500, tpm=200_000)
+
+    await limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "60",
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-limit-tokens": "60000",
+    })
+    await other.record_usage(estimated=100, actual=400)
+    await other._try_take(0, clock.now)
+
+    stats = other.stats()
+    assert (stats["rpm_limit"], stats["tpm_limit"]) == (60, 60_000)
+    assert stats["available_requests"] == 0
+    assert stats["available_tokens"] == 1000 - 300
+
+
+async def test_shared_waiters_are_served_by_priority(tmp_path):
+    limiter = _shared(tmp_path, rpm=6000)
+    while await limiter._try_take(1, limiter.now()):
+        pass
+    served = []
+
+    async def request(name, priority):
+        assert await limiter.acquire(1, priority)
+        served.append(name)
+
+    bulk = asyncio.ensure_future(request("bulk", PRIORITY_BULK))
+    await asyncio.sleep(0)
+    interactive = asyncio.ensure_future(request("interactive", PRIORITY_INTERACTIVE))
+    await asyncio.wait_for(asyncio.gather(bulk, interactive), 5)
+
+    assert served == ["interactive", "bulk"]
+    assert limiter.queued == 2
+
+
+async def test_shared_state_lock_does_not_block_the_event_loop(tmp_path):
+    limiter = _shared(tmp_path)
+    # Outro worker segurando o lock de escrita do estado compartilhado
+    other = sqlite3.connect(str(tmp_path / "state.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    acquire = asyncio.ensure_future(limiter.acquire(1))
+    start = time.monotonic()
+    for _ in range(10):
+        await asyncio.sleep(0.02)
+    assert time.monotonic() - start < 1
+    assert not acquire.done()
+
+    other.execute("COMMIT")
+    other.close()
+    assert await asyncio.wait_for(acquire, 5)
+
+
+async def test_stats_does_not_touch_the_buckets(tmp_path):
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(rpm=60, tpm=0, clock=clock)
+    assert await limiter.acquire(1)
+    clock.now += 0.5
+    before = (limiter.requests.level, limiter.requests._updated)
+
+    assert limiter.stats()["available_requests"] == 0.5
+    assert (limiter.requests.level, limiter.requests._updated) == before
+
+    # Com estado compartilhado, stats() lê só o último valor conhecido: nada de SQLite
+    state = SharedState(str(tmp_path / "state.db"))
+    shared = AdaptiveRateLimiter(rpm=60, tpm=0, clock=clock, name="m", state=state)
+    state.close()
+    assert shared.stats()["available_requests"] == 1
+
+
+# Circuit breaker em half_open: toda saída sem resultado registrado devolve a vaga de teste
+
+
+def _half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(minimum_calls=1, open_seconds=0, half_open_max_calls=3)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.release()
+    assert breaker.state is CircuitState.HALF_OPEN
+    return breaker
+
+
+def _client(breaker: CircuitBreaker, limiter: AdaptiveRateLimiter) -> OpenAILLMClient:
+    return OpenAILLMClient(api_key="test", breaker=breaker, limiter=limiter)
+
+
+def _rate_limit_error() -> openai.RateLimitError:
+    response = httpx.Response(429, headers={"retry-after-ms": "1"}, request=httpx.Request("POST", "http://llm"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+async def test_latency_budget_rejection_releases_half_open_slot(monkeypatch):
+    monkeypatch.setattr(llm_client, "latency_budget", lambda priority: 0.05)
+    breaker = _half_open_breaker()
+    limiter = AdaptiveRateLimiter(rpm=1, tpm=0)
+    limiter.requests.take(1)
+    client = _client(breaker, limiter)
+
+    for _ in range(3):
+        result = await client.analyze_async("Preciso de ajuda com o pedido 123.")
+        assert result["fallback"]
+
+    assert breaker._half_open_in_flight == 0
+    assert breaker.allow_request()
+
+
+async def test_exhausted_rate_limit_retries_release_half_open_slot(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_RETRY_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(llm_client, "retry_delay", lambda attempt: 0.0)
+    breaker = _half_open_breaker()
+    client = _client(breaker, AdaptiveRateLimiter(rpm=0, tpm=0))
+    calls = []
+
+    async def rate_limited(request, stream=False):
+        calls.append(request)
+        raise _rate_limit_error()
+
+    monkeypatch.setattr(client, "_request_async", rate_limited)
+    for _ in range(3):
+        assert (await client.analyze_async("Preciso de ajuda."))["fallback"]
+
+    assert len(calls) == 6
+    assert breaker._half_open_in_flight == 0
+    assert breaker.state is CircuitState.HALF_OPEN
+
+
+async def test_cancelled_while_queued_releases_half_open_slot():
+    breaker = _half_open_breaker()
+    # Próxima vaga em 10 s, dentro do orçamento de latência: a chamada fica na fila
+    limiter = AdaptiveRateLimiter(rpm=6, tpm=0)
+    limiter.requests.take(1)
+    client = _client(breaker, limiter)
+
+    task = asyncio.ensure_future(client.analyze_async("Preciso de ajuda."))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert breaker._half_open_in_flight == 0
+
+
+async def test_recorded_failure_does_not_release_twice(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_RETRY_MAX_ATTEMPTS", 1)
+    breaker = _half_open_breaker()
+    client = _client(breaker, AdaptiveRateLimiter(rpm=0, tpm=0))
+
+    async def fails(request, stream=False):
+        raise ValueError("resposta inesperada")
+
+    monkeypatch.setattr(client, "_request_async", fails)
+    await client.analyze_async("Preciso de ajuda.")
+
+    assert breaker.state is CircuitState.OPEN
+
+
+async def test_queued_call_with_shared_state_uses_limiter_clock(tmp_path, monkeypatch):
+    # Com estado compartilhado o clock é time.time: um deadline em time.monotonic
+    # rejeitaria toda chamada que precisasse esperar na fila
+    limiter = AdaptiveRateLimiter(rpm=600, tpm=0, name="m", state=SharedState(str(tmp_path / "state.db")))
+    client = _client(CircuitBreaker(), limiter)
+
+    async def answers(request, stream=False):
+        return object(), {}
+
+    monkeypatch.setattr(client, "_request_async", answers)
+    while await limiter._try_take(1, limiter.now()):
+        pass
+    await client._create_async({}, estimated_tokens=0)
+
+    assert limiter.queued == 1
+    assert limiter.rejected == 0
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from app.domain.email_category import EmailCategory
+from app.services.analyzer_service import EmailAnalyzerService
+from app.services.single_flight import SingleFlight
+
+
+class CountingCall:
+    """Chamada ao serviço externo que só termina quando release() é chamado"""
+
+    def __init__(self, error: Exception | None = None):
+        self.calls = 0
+        self.error = error
+        self.released = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.released.wait()
+        if self.error is not None:
+            raise self.error
+        return {"resultado": self.calls}
+
+
+async def _settle() -> None:
+    # Deixa todas as tasks chegarem ao await do resultado compartilhado
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+async def test_concurrent_identical_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    call = CountingCall()
+
+    tasks = [asyncio.ensure_future(flight.do("k", call)) for _ in range(5)]
+    await _settle()
+    call.released.set()
+    results = await asyncio.gather(*tasks)
+
+    assert call.calls == 1
+    assert results == [{"resultado": 1}] * 5
+    assert flight.stats()["calls"] == 1
+    assert flight.stats()["coalesced"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+async def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    call = CountingCall()
+    call.released.set()
+
+    await asyncio.gather(flight.do("a", call), flight.do("b", call))
+
+    assert call.calls == 2
+
+
+async def test_exception_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight()
+    failing = CountingCall(error=RuntimeError("LLM fora do ar"))
+
+    tasks = [asyncio.ensure_future(flight.do("k", failing)) for _ in range(3)]
+    await _settle()
+    failing.released.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert failing.calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    # A chave sai do mapa: a próxima chamada vai de novo ao serviço
+    working = CountingCall()
+    working.released.set()
+    assert await flight.do("k", working) == {"resultado": 1}
+    assert working.calls == 1
+
+
+async def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+    call = CountingCall()
+
+    first = asyncio.ensure_future(flight.do("k", call))
+    second = asyncio.ensure_future(flight.do("k", call))
+    await _settle()
+    first.cancel()
+    call.released.set()
+
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert await second == {"resultado": 1}
+    assert call.calls == 1
+
+
+class SlowClient:
+    model = "lento"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def analyze_async(self, content: str) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {
+            "category": EmailCategory.PRODUTIVO,
+            "suggested_reply": "Vamos verificar.",
+            "confidence": 0.9,
+            "fallback": False,
+        }
+
+
+async def test_identical_concurrent_analyses_call_the_llm_once():
+    client = SlowClient()
+    service = EmailAnalyzerService(ai_client=client)
+    text = "Preciso de suporte urgente: o sistema de pedidos não funciona desde ontem."
+
+    responses = await asyncio.gather(*(service.analyze(text=text) for _ in range(4)))
+
+    assert client.calls == 1
+    assert {response.category for response in responses} == {EmailCategory.PRODUTIVO}
+    assert service.single_flight.stats()["coalesced"] == 3
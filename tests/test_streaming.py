@@ -0,0 +1,162 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from app.clients.llm_client import EMAIL_ANALYSIS_SCHEMA, StreamingAnalysisParser
+from app.domain.email_category import EmailCategory
+from app.metrics import StageTimer
+from app.services.analyzer_service import EmailAnalyzerService
+
+REPLIES = [
+    "Olá! Vamos verificar o pedido 123.",
+    'Ele disse "urgente" e usou uma barra \\ no texto.\nAtt,\tSuporte',
+    "Ação, atenção e reunião às 10h — até já.",
+    "Obrigado 😀👍 pelo retorno!",
+    "Caminho C:\\novo\\teste e unicode \u2028 literal",
+]
+
+
+def _analysis(reply: str, ensure_ascii: bool) -> str:
+    # Na ordem do schema: category, confidence, suggested_reply, reason
+    return json.dumps(
+        {"category": "PRODUTIVO", "confidence": 0.9, "suggested_reply": reply, "reason": 'Pedido com "aspas"'},
+        ensure_ascii=ensure_ascii,
+    )
+
+
+def _feed(pieces) -> tuple[StreamingAnalysisParser, list]:
+    parser = StreamingAnalysisParser()
+    events = []
+    for piece in pieces:
+        events.extend(parser.feed(piece))
+    return parser, events
+
+
+def _check(pieces, reply: str) -> None:
+    parser, events = _feed(pieces)
+    assert events[0] == ("category", EmailCategory.PRODUTIVO)
+    assert [kind for kind, _ in events].count("category") == 1
+    assert "".join(value for kind, value in events if kind == "delta") == reply
+    assert parser.text == "".join(pieces)
+
+
+def test_schema_writes_the_reply_before_the_reason():
+    fields = list(EMAIL_ANALYSIS_SCHEMA["schema"]["properties"])
+
+    assert fields.index("category") < fields.index("suggested_reply") < fields.index("reason")
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("reply", REPLIES)
+def test_every_single_split_point(reply, ensure_ascii):
+    text = _analysis(reply, ensure_ascii)
+    for cut in range(len(text) + 1):
+        _check([text[:cut], text[cut:]], reply)
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("reply", REPLIES)
+def test_one_character_at_a_time(reply, ensure_ascii):
+    text = _analysis(reply, ensure_ascii)
+
+    _check(list(text), reply)
+
+
+def test_random_chunk_sizes():
+    rng = random.Random(3)
+    for _ in range(200):
+        reply = "".join(rng.choice('aé"\\\n😀ç ') for _ in range(rng.randint(1, 40)))
+        text = _analysis(reply, ensure_ascii=rng.random() < 0.5)
+        pieces, i = [], 0
+        while i < len(text):
+            size = rng.randint(1, 8)
+            pieces.append(text[i:i + size])
+            i += size
+        _check(pieces, reply)
+
+
+def test_incomplete_escapes_wait_for_the_next_chunk():
+    parser = StreamingAnalysisParser()
+    parser.feed('{"category": "IMPRODUTIVO", "confidence": 0.8, "suggested_reply": "a')
+
+    # Barra sozinha, \u pela metade e par substituto pela metade não geram nada
+    assert parser.feed("\\") == []
+    assert parser.feed('"b\\u00') == [("delta", '"b')]
+    assert parser.feed("e9\\ud83d") == [("delta", "é")]
+    assert parser.feed("\\ude00") == [("delta", "😀")]
+    assert parser.feed('", "reason": "x"}') == []
+
+
+def test_keys_split_across_chunks_are_only_read_when_complete():
+    parser = StreamingAnalysisParser()
+
+    assert parser.feed('{"categ') == []
+    assert parser.feed('ory": "PRODU') == []
+    assert parser.feed('TIVO", "confidence": 0.7, "suggested_') == [("category", EmailCategory.PRODUTIVO)]
+    assert parser.feed('reply"') == []
+    assert parser.feed(': "Oi') == [("delta", "Oi")]
+
+
+def test_unknown_category_is_not_emitted():
+    _, events = _feed(['{"category": "OUTRA", "confidence": 0.5, "suggested_reply": "x", "reason": "y"}'])
+
+    assert events == [("delta", "x")]
+
+
+class StreamingClient:
+    """Cliente de streaming que leva `delay` por evento"""
+
+    model = "stream"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.closed = False
+
+    async def analyze_async(self, content: str) -> dict:
+        raise AssertionError("o caminho de streaming não deve chamar analyze_async")
+
+    async def analyze_stream_async(self, content: str):
+        try:
+            yield "category", EmailCategory.PRODUTIVO
+            for word in ("Vamos ", "verificar."):
+                await asyncio.sleep(self.delay)
+                yield "delta", word
+            await asyncio.sleep(self.delay)
+            yield "result", {
+                "category": EmailCategory.PRODUTIVO,
+                "suggested_reply": "Vamos verificar.",
+                "confidence": 0.9,
+                "fallback": False,
+            }
+        finally:
+            self.closed = True
+
+
+CONTENT = "preciso de suporte com o pedido 123 que apresenta erro no sistema desde ontem"
+
+
+async def test_llm_stage_excludes_time_spent_by_the_reader():
+    service = EmailAnalyzerService(ai_client=StreamingClient(delay=0.01))
+    timer = StageTimer()
+
+    events = []
+    async for kind, value in service._stream_classification(CONTENT, timer, CONTENT, None):
+        events.append(kind)
+        # Cliente do SSE lento
+        await asyncio.sleep(0.1)
+
+    assert events == ["category", "delta", "delta", "result"]
+    assert 0.02 <= timer.durations["llm"] < 0.1
+
+
+async def test_abandoned_stream_closes_the_llm_stream():
+    client = StreamingClient(delay=0.01)
+    service = EmailAnalyzerService(ai_client=client)
+
+    stream = service._stream_classification(CONTENT, StageTimer(), CONTENT, None)
+    assert await anext(stream) == ("category", EmailCategory.PRODUTIVO)
+    await stream.aclose()
+
+    assert client.closed
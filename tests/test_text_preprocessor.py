@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from app.utils.text_preprocessor import _preprocess_text_multipass, get_tokens, preprocess_text
+
+CASES = [
+    "",
+    "   \n\t  ",
+    "Olá, equipe! Preciso de SUPORTE urgente no chamado #4521.",
+    "Reunião 2024-final e pedido 12-34-abc às 10:30h",
+    "e-mail - resposta -- teste - - fim -",
+    "-início e fim-",
+    "snake_case e __dunder__ com _ sozinho",
+    "Números 123 456,78 e 1a2b e v2 e ²³ e ٣ árabe",
+    "ÇÃO Ação ÉPICO maiúsculas İstanbul ß",
+    "linha\r\nwindows\rmac\n\n\n\nmuitas quebras",
+    "emoji 🚀 no meio😀colado e símbolos ©®™ € $",
+    "a o e é de da do em um uma x y z",
+    "pontuação...em!!!sequência???sem espaços",
+    "hífen-com-número-2023-e-sufixo 2023- -2023",
+]
+
+ALPHABET = (
+    "abcxyzABCXYZ" "áéíóúàãõâêôçÁÇÕ" "0123456789" "²³½٣"
+    " \t\n\r" "-_" ".,;:!?()[]{}\"'@#$%&*/\\+=<>|~^`" "🚀ß  "
+)
+WORDS = ["de", "não", "chamado", "2024", "e-mail", "x", "reunião", "-", "--", "a1", "nº"]
+
+
+def _fuzz_inputs(count: int, seed: int = 6):
+    rng = random.Random(seed)
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(0, 30)):
+            if rng.random() < 0.3:
+                parts.append(rng.choice(WORDS))
+            else:
+                parts.append("".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 8))))
+        yield rng.choice(["", " ", "-", "\n"]).join(parts)
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_single_pass_matches_multipass(text):
+    assert preprocess_text(text) == _preprocess_text_multipass(text)
+
+
+def test_single_pass_matches_multipass_on_random_text():
+    mismatches = [text for text in _fuzz_inputs(5000) if preprocess_text(text) != _preprocess_text_multipass(text)]
+
+    assert mismatches == []
+
+
+def test_removes_stop_words_punctuation_and_bare_numbers():
+    processed = preprocess_text("Olá, não recebi o boleto 2024 do pedido A15!")
+
+    assert get_tokens(processed) == ["olá", "recebi", "boleto", "pedido", "a15"]
+
+
+def test_non_string_input_is_empty():
+    assert preprocess_text(None) == ""
+    assert preprocess_text(123) == ""
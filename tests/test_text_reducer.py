@@ -0,0 +1,126 @@
+import time
+
+import pytest
+
+from app.utils.text_reducer import CHARS_PER_TOKEN, fit_budget, reduce_email, strip_noise
+
+
+def test_drops_quoted_reply_history():
+    text = (
+        "Olá, o boleto de março ainda não foi gerado.\n"
+        "\n"
+        "Em seg., 3 de mar. de 2025 às 10:00, Suporte <suporte@empresa.com> escreveu:\n"
+        "> Qual o número do contrato?\n"
+        "> Obrigado\n"
+    )
+
+    assert strip_noise(text) == "Olá, o boleto de março ainda não foi gerado."
+
+
+def test_drops_outlook_header_block():
+    text = (
+        "Segue o comprovante solicitado.\n"
+        "\n"
+        "De: Financeiro <fin@empresa.com>\n"
+        "Enviado: segunda-feira, 3 de março de 2025 10:00\n"
+        "Para: Cliente\n"
+        "Assunto: Comprovante\n"
+        "\n"
+        "Poderia enviar o comprovante?\n"
+    )
+
+    assert strip_noise(text) == "Segue o comprovante solicitado."
+
+
+def test_keeps_forwarded_content_without_headers():
+    text = (
+        "Podem verificar abaixo?\n"
+        "---------- Forwarded message ---------\n"
+        "From: Cliente <cliente@example.com>\n"
+        "Date: Mon, 3 Mar 2025\n"
+        "Subject: Erro no sistema\n"
+        "\n"
+        "O sistema apresenta erro 500 ao gerar o relatório.\n"
+    )
+
+    reduced = strip_noise(text)
+
+    assert "erro 500" in reduced
+    assert "From:" not in reduced
+    assert "Podem verificar" in reduced
+
+
+def test_drops_signature_and_disclaimer():
+    text = (
+        "Preciso da segunda via da fatura.\n"
+        "\n"
+        "Atenciosamente,\n"
+        "João Silva\n"
+        "Analista Financeiro | (11) 5555-0000\n"
+        "\n"
+        "Esta mensagem é confidencial e destinada apenas ao destinatário. "
+        "Se recebeu esta mensagem por engano, apague esta mensagem.\n"
+    )
+
+    assert strip_noise(text) == "Preciso da segunda via da fatura."
+
+
+def test_signature_mode_ends_at_blank_line():
+    # Texto puro quebrado em 72 colunas: linhas curtas depois do "Abs" voltam a ser corpo
+    body = [
+        "Depois de conversar com o time, segue a parte que faltou no pedido de",
+        "ontem: o lote 42 veio com 3 itens avariados e precisamos da troca.",
+    ]
+    text = "Obrigado pelo retorno.\nAbs\nMaria\n\n" + "\n".join(body) + "\n"
+
+    reduced = strip_noise(text)
+
+    assert "Maria" not in reduced
+    for line in body:
+        assert line in reduced
+
+
+def test_signature_mode_is_capped_at_a_few_lines():
+    wrapped = [f"linha {index} do corpo quebrado em 72 colunas sem linha vazia" for index in range(10)]
+    text = "Oi,\n--\n" + "\n".join(wrapped)
+
+    reduced = strip_noise(text)
+
+    assert "linha 0 " not in reduced
+    assert "linha 9 " in reduced
+
+
+def test_only_quoted_text_falls_back_to_original():
+    text = "> Só a citação\n> de outra mensagem"
+
+    assert reduce_email(text) == text
+
+
+def test_fit_budget_keeps_head_and_tail_on_word_boundaries():
+    words = " ".join(f"palavra{index}" for index in range(500))
+
+    reduced = fit_budget(words, max_tokens=50)
+
+    assert len(reduced) <= 50 * CHARS_PER_TOKEN + len("\n[...]\n")
+    head, tail = reduced.split("\n[...]\n")
+    assert head.startswith("palavra0 ")
+    assert tail.endswith("palavra499")
+    assert all(word.startswith("palavra") for word in head.split() + tail.split())
+
+
+def test_short_text_is_unchanged():
+    assert reduce_email("Bom dia, tudo certo?") == "Bom dia, tudo certo?"
+    assert reduce_email("") == ""
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["\n" * 24000, " \n" * 12000, "a\n" * 12000, "> x\n" * 6000, "--\n" * 12000],
+    ids=["blank", "spaces", "short-lines", "quoted", "signatures"],
+)
+def test_pathological_inputs_are_linear(text):
+    start = time.perf_counter()
+    reduce_email(text, max_tokens=6000)
+
+    # Quadrático levava segundos; linear fica bem abaixo disto
+    assert time.perf_counter() - start < 0.5
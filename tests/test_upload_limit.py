@@ -0,0 +1,91 @@
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+
+from app.exceptions import http_exception_handler
+from app.middleware import UploadSizeLimitMiddleware
+
+LIMIT = 1024
+
+
+def _build_app(received: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/upload")
+    @app.post("/mbox")
+    async def upload(request: Request):
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+        received.append(size)
+        return {"size": size}
+
+    @app.get("/upload")
+    async def read():
+        return {"ok": True}
+
+    app.add_middleware(UploadSizeLimitMiddleware, max_size=LIMIT, path_limits={"/mbox": 4 * LIMIT})
+    app.add_exception_handler(HTTPException, http_exception_handler)
+    return app
+
+
+@pytest.fixture
+def received() -> list:
+    return []
+
+
+@pytest.fixture
+async def client(received):
+    transport = httpx.ASGITransport(app=_build_app(received))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def _chunks(total: int, size: int = 256):
+    for start in range(0, total, size):
+        yield b"x" * min(size, total - start)
+
+
+async def test_body_within_limit_passes(client, received):
+    response = await client.post("/upload", content=b"x" * LIMIT)
+
+    assert response.status_code == 200
+    assert received == [LIMIT]
+
+
+async def test_content_length_above_limit_is_rejected_before_the_route(client, received):
+    response = await client.post("/upload", content=b"x" * (LIMIT + 1))
+
+    assert response.status_code == 413
+    assert "Tamanho máximo" in response.json()["detail"]
+    assert received == []
+
+
+async def test_chunked_body_is_cut_at_the_limit(client, received):
+    # Sem Content-Length: o limite vale para os bytes realmente recebidos
+    response = await client.post("/upload", content=_chunks(4 * LIMIT))
+
+    assert response.status_code == 413
+    assert received == []
+
+
+async def test_lying_content_length_is_cut_at_the_limit(client, received):
+    request = client.build_request("POST", "/upload", content=_chunks(4 * LIMIT), headers={"Content-Length": "10"})
+
+    response = await client.send(request)
+
+    assert response.status_code == 413
+    assert received == []
+
+
+async def test_path_limit_overrides_default(client, received):
+    response = await client.post("/mbox", content=b"x" * (2 * LIMIT))
+
+    assert response.status_code == 200
+    assert (await client.post("/mbox", content=b"x" * (4 * LIMIT + 1))).status_code == 413
+
+
+async def test_other_methods_are_not_limited(client):
+    response = await client.get("/upload")
+
+    assert response.status_code == 200